@@ -0,0 +1,39 @@
+from __future__ import annotations
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+
+from ...deps import admin_dep, engine_dep
+from ...services.profiler import ProfilerBusy
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(admin_dep)])
+
+
+@router.post("/profile")
+async def profile(
+    seconds: float = Query(10.0, gt=0, le=120),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    format: str = Query("speedscope", pattern="^(speedscope|collapsed)$"),
+    memory: bool = False,
+    shard: Optional[int] = Query(None, ge=0),
+    raw: bool = False,
+    engine=Depends(engine_dep),
+):
+    """
+    Сэмплирующий профиль движка (или воркера шарда) за `seconds`; запрос ждёт всё окно.
+    raw=true — только сам профиль: файл для speedscope.app или текст для flamegraph.pl.
+    """
+    try:
+        res = await engine.profile(seconds=seconds, interval_ms=interval_ms, fmt=format, memory=memory, shard=shard)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not raw:
+        return res
+    if format == "collapsed":
+        return PlainTextResponse(res["profile"])
+    return Response(json.dumps(res["profile"], separators=(",", ":")), media_type="application/json",
+                    headers={"Content-Disposition": f'attachment; filename="profile-{res.get("pid")}.speedscope.json"'})
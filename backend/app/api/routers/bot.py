@@ -1,20 +1,46 @@
 from __future__ import annotations
-from fastapi import APIRouter, Depends
-from ...deps import state_dep
+from fastapi import APIRouter, Depends, HTTPException
+from ...deps import engine_dep
 from ...models.schemas import BotStatus
 
 router = APIRouter(prefix="/bot", tags=["bot"])
 
-@router.post("/start", response_model=BotStatus)
-async def start_bot(state = Depends(state_dep)):
-    await state.start_bot()
-    return state.status()
+@router.post("/start", response_model=BotStatus, response_model_exclude_none=True)
+async def start_bot(engine = Depends(engine_dep)):
+    return await engine.start()
 
-@router.post("/stop", response_model=BotStatus)
-async def stop_bot(state = Depends(state_dep)):
-    await state.stop_bot()
-    return state.status()
+@router.post("/stop", response_model=BotStatus, response_model_exclude_none=True)
+async def stop_bot(engine = Depends(engine_dep)):
+    return await engine.stop()
 
-@router.get("/status", response_model=BotStatus)
-async def get_status(state = Depends(state_dep)):
-    return state.status()
+@router.get("/status", response_model=BotStatus, response_model_exclude_none=True)
+async def get_status(full: bool = False, engine = Depends(engine_dep)):
+    return await engine.status(full)
+
+@router.get("/loop")
+async def loop_health(engine = Depends(engine_dep)):
+    return await engine.loop_health()
+
+@router.get("/traces")
+async def traces(engine = Depends(engine_dep)):
+    return await engine.traces()
+
+# ---- по символам (супервизор) ----
+@router.get("/symbols")
+async def list_symbols(engine = Depends(engine_dep)):
+    return await engine.symbols()
+
+@router.post("/symbols/{symbol}/start")
+async def start_symbol(symbol: str, engine = Depends(engine_dep)):
+    if not symbol.isalnum():
+        raise HTTPException(status_code=400, detail=f"invalid symbol: {symbol}")
+    try:
+        started = await engine.start_symbol(symbol.upper())
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"ok": True, "symbol": symbol.upper(), "started": started}
+
+@router.post("/symbols/{symbol}/stop")
+async def stop_symbol(symbol: str, engine = Depends(engine_dep)):
+    stopped = await engine.stop_symbol(symbol.upper())
+    return {"ok": True, "symbol": symbol.upper(), "stopped": stopped}
@@ -7,7 +7,7 @@ from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import JSONResponse
 
 from ...core.config import settings
-from ...services.state import get_state
+from ...services.engine_api import get_engine
 
 router = APIRouter(prefix="/config", tags=["config"])
 
@@ -31,8 +31,7 @@ async def get_config():
     """
     Текущая runtime-конфигурация.
     """
-    cfg = settings.runtime_cfg or {}
-    return {"cfg": cfg}
+    return await get_engine().get_cfg()
 
 
 @router.put("")
@@ -51,12 +50,14 @@ async def put_config(request: Request):
     if not isinstance(new_cfg, dict):
         raise HTTPException(status_code=400, detail="Config must be object")
 
-    # сохраняем в settings и state
+    # сначала движок (валидация + горячее применение), затем settings
+    try:
+        res = await get_engine().set_cfg(new_cfg)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     settings.runtime_cfg = new_cfg
-    state = get_state()
-    state.cfg = new_cfg
 
-    return {"ok": True, "cfg": new_cfg}
+    return {"ok": True, **res}
 
 
 @router.post("")
@@ -88,6 +89,8 @@ async def restore_config():
     # пример, если решишь считать YAML/JSON с диска:
     # settings.load_yaml()
     # cfg = settings.runtime_cfg or {}
-    state = get_state()
-    state.cfg = cfg
-    return {"ok": True, "cfg": cfg}
\ No newline at end of file
+    try:
+        res = await get_engine().set_cfg(cfg)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"ok": True, **res}
\ No newline at end of file
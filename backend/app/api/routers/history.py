@@ -4,16 +4,23 @@ from typing import Any
 from fastapi import APIRouter, Query
 from starlette.responses import StreamingResponse
 
-from ...services.state import get_state
+from ...core.config import settings
+from ...services.engine_api import LocalEngine, get_engine
 
 router = APIRouter(prefix="/history", tags=["history"])
 
+_reader = None
+
 def _store():
-    state = get_state()
-    if getattr(state, "history", None) is None:
+    """Чтение — прямо из SQLite в этом процессе (экспорт не грузит движок); запись — через движок."""
+    global _reader
+    engine = get_engine()
+    if isinstance(engine, LocalEngine):
+        return engine.history_store()
+    if _reader is None:
         from ...services.history import HistoryStore
-        state.history = HistoryStore()
-    return state.history
+        _reader = HistoryStore.from_cfg(settings.runtime_cfg or {})
+    return _reader
 
 @router.get("/orders")
 async def history_orders(limit: int = Query(200, ge=1, le=1000), offset: int = Query(0, ge=0)):
@@ -27,9 +34,19 @@ async def history_trades(limit: int = Query(200, ge=1, le=1000), offset: int = Q
 async def history_stats():
     return await _store().stats()
 
+@router.get("/rollup")
+async def history_rollup(kind: str = Query("trades", pattern="^(orders|trades)$"),
+                         limit: int = Query(200, ge=1, le=5000), offset: int = Query(0, ge=0)):
+    return {"items": await _store().list_rollup(kind, limit=limit, offset=offset)}
+
+@router.post("/maintenance")
+async def history_maintenance():
+    """Прогнать обслуживание (rollup/компактация/архив/vacuum) вне расписания."""
+    return await get_engine().history_maintenance()
+
 @router.post("/clear")
 async def history_clear(kind: str = Query("all", pattern="^(orders|trades|all)$")):
-    return await _store().clear(kind)
+    return await get_engine().history_clear(kind)
 
 @router.get("/export.csv")
 async def history_export(kind: str = Query("orders", pattern="^(orders|trades)$")):
@@ -0,0 +1,26 @@
+from __future__ import annotations
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from ...deps import engine_dep
+
+router = APIRouter(prefix="/logs", tags=["logs"])
+
+
+@router.get("")
+async def logs(
+    limit: int = Query(100, ge=1, le=1000),
+    before: Optional[int] = Query(None, ge=1),
+    level: Optional[str] = Query(None, pattern="^(debug|info|warning|error)$"),
+    q: Optional[str] = Query(None, max_length=200),
+    symbol: Optional[str] = None,
+    source: Optional[str] = None,
+    since: Optional[float] = None,
+    engine=Depends(engine_dep),
+):
+    """
+    История diag из кольца движка (новые первыми). level — минимальный уровень, q — подстрока;
+    следующая страница — before=<next>, пока next не null.
+    """
+    return await engine.logs(limit=limit, before=before, level=level, q=q, symbol=symbol, source=source, since=since)
@@ -0,0 +1,16 @@
+from __future__ import annotations
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from ...deps import engine_dep
+
+router = APIRouter(tags=["metrics"])
+
+# text exposition format 0.0.4 — то, что ждёт Prometheus scrape
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_text(engine=Depends(engine_dep)):
+    """Метрики движка (в gateway-режиме — по RPC из процесса движка, вместе с воркерами шардов)."""
+    return PlainTextResponse(await engine.metrics(), media_type=CONTENT_TYPE)
@@ -0,0 +1,70 @@
+from __future__ import annotations
+import asyncio
+from pathlib import Path
+from typing import Dict
+
+from fastapi import APIRouter, HTTPException, Query
+
+from ...core.config import settings
+from ...models.schemas import SweepRequest
+from ...services.recording import parse_ts_ms
+from ...services.sweep import DATA_DIR, SweepStore, sweep_to_store
+
+router = APIRouter(prefix="/sweeps", tags=["sweeps"])
+
+# перебор — офлайн-работа этого процесса (пул процессов), движок и торговля не затрагиваются
+_store = SweepStore()
+_tasks: Dict[int, asyncio.Future] = {}
+
+
+def _data_path(p: str) -> str:
+    """Записи — только из data/ (API не читает произвольные файлы сервера)."""
+    path = Path(p)
+    path = (path if path.is_absolute() else DATA_DIR.parent / path).resolve()
+    root = DATA_DIR.resolve()
+    if path != root and root not in path.parents:
+        raise HTTPException(status_code=400, detail=f"path outside data dir: {p}")
+    return path.as_posix()
+
+
+@router.post("")
+async def start_sweep(req: SweepRequest):
+    paths = [_data_path(p) for p in req.paths]
+    symbols = [s.strip().upper() for s in req.symbols if s.strip()] if req.symbols else None
+    try:
+        sweep_id, task = await sweep_to_store(
+            _store, req.config or settings.runtime_cfg or {}, paths, req.space or {}, mode=req.mode, n=req.n,
+            seed=req.seed, symbols=symbols, start_ms=parse_ts_ms(req.start), end_ms=parse_ts_ms(req.end),
+            workers=req.workers, engine=req.engine)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    _tasks[sweep_id] = task
+    task.add_done_callback(lambda t, i=sweep_id: (_tasks.pop(i, None), t.cancelled() or t.exception()))
+    return await _store.get(sweep_id)
+
+
+@router.get("")
+async def list_sweeps(limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    return {"items": await _store.list_sweeps(limit=limit, offset=offset)}
+
+
+@router.get("/{sweep_id}")
+async def get_sweep(sweep_id: int, sort: str = "pnl", desc: bool = True,
+                    limit: int = Query(100, ge=1, le=10_000), offset: int = Query(0, ge=0)):
+    sweep = await _store.get(sweep_id)
+    if sweep is None:
+        raise HTTPException(status_code=404, detail=f"sweep {sweep_id} not found")
+    try:
+        sweep["results"] = await _store.results(sweep_id, sort=sort, desc=desc, limit=limit, offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return sweep
+
+
+@router.post("/{sweep_id}/cancel")
+async def cancel_sweep(sweep_id: int):
+    task = _tasks.get(sweep_id)
+    if task is None:
+        raise HTTPException(status_code=409, detail=f"sweep {sweep_id} is not running")
+    task.cancel()
+    return {"ok": True, "id": sweep_id}
@@ -5,7 +5,8 @@ import json
 from typing import Any, Callable, Optional
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from ...services.state import get_state
+from ...services.engine_api import get_engine
+from ...services.ws_journal import seq_of
 
 router = APIRouter()
 
@@ -24,73 +25,60 @@ async def _safe_send(ws: WebSocket, msg: Any) -> None:
             pass
 
 
-def _subscribe(state: Any) -> tuple[asyncio.Queue, Callable[[], None]]:
+def _subscribe(engine: Any) -> tuple[asyncio.Queue, Callable[[], None]]:
     """
-    Подписка на события state.
+    Подписка на события движка (в процессе — очереди AppState, в gateway — pub/sub поток).
     Важно: работаем ИМЕННО с той очередью, которую слушает роутер.
     """
     q: asyncio.Queue = asyncio.Queue(maxsize=1000)
+    unsub = engine.subscribe(q)
+    return q, unsub
 
-    # Предпочитаем state.ws_subscribe(q) -> unsub
-    if hasattr(state, "ws_subscribe"):
-        unsub = state.ws_subscribe(q)  # type: ignore
-        return q, unsub
-
-    # Совместимость: register/unregister
-    if hasattr(state, "register_ws"):
-        # добавим q напрямую в пул
-        if hasattr(state, "_clients") and isinstance(getattr(state, "_clients"), set):
-            getattr(state, "_clients").add(q)
-        def _unsub():
-            try:
-                state.unregister_ws(q)  # type: ignore
-            except Exception:
-                try:
-                    if hasattr(state, "_clients") and isinstance(getattr(state, "_clients"), set):
-                        getattr(state, "_clients").discard(q)
-                except Exception:
-                    pass
-        return q, _unsub
-
-    # Фолбэк на приватное множество
-    target_set_name = "_clients" if hasattr(state, "_clients") else "_ws_clients"
-    client_set = getattr(state, target_set_name, None)
-    if isinstance(client_set, set):
-        client_set.add(q)
-    def _unsub():
-        try:
-            if isinstance(client_set, set):
-                client_set.discard(q)
-        except Exception:
-            pass
-    return q, _unsub
+
+async def _initial_state(ws: WebSocket, engine: Any) -> int:
+    """
+    /ws?since=<seq>&epoch=<epoch> — resume: пропущенные сообщения как есть + {"type":"resumed"};
+    без since или если resume невозможен — {"type":"snapshot"}. Возвращает seq, до которого клиент в курсе.
+    """
+    since = ws.query_params.get("since")
+    try:
+        res = None
+        if since is not None:
+            res = await engine.ws_resume(int(since), ws.query_params.get("epoch"))
+        if res is not None and res.get("ok"):
+            for item in res["items"]:
+                await _safe_send(ws, item)
+            await _safe_send(ws, {"type": "resumed", "epoch": res["epoch"], "since": int(since), "seq": res["seq"],
+                                  "missed": len(res["items"])})
+            return int(res["seq"])
+        snap = res["snapshot"] if res is not None else await engine.ws_snapshot()
+        await _safe_send(ws, snap)
+        return int(snap.get("seq") or 0)
+    except Exception:
+        pass
+    # since не число, сбой снапшота — хотя бы первичный статус
+    try:
+        await _safe_send(ws, await engine.hello())
+    except Exception:
+        pass
+    return 0
 
 
 @router.websocket("/ws")
 async def ws_stream(ws: WebSocket):
     """Стрим событий в UI. Устойчив к отключениям и shutdown."""
     await ws.accept()
-    state = get_state()
+    engine = get_engine()
 
-    q, unsub = _subscribe(state)
+    q, unsub = _subscribe(engine)
 
     recv_task: Optional[asyncio.Task] = None
     send_task: Optional[asyncio.Task] = None
 
     try:
-        # привет + первичный статус
-        await _safe_send(ws, {"type": "hello", "version": "1.0"})
-        try:
-            cfg = getattr(state, "cfg", {}) or {}
-            symbol = (cfg.get("strategy") or {}).get("symbol")
-            await _safe_send(ws, {
-                "type": "status",
-                "running": bool(state.is_running()) if hasattr(state, "is_running") else False,
-                "equity": getattr(state, "equity", None),
-                "symbol": symbol,
-            })
-        except Exception:
-            pass
+        await _safe_send(ws, {"type": "hello", "version": "1.1"})
+        # подписка уже есть: всё, что новее снапшота/resume, придёт из очереди; старое — отбрасываем по seq
+        last_seq = await _initial_state(ws, engine)
 
         recv_task = asyncio.create_task(ws.receive_text())
         send_task = asyncio.create_task(q.get())
@@ -121,6 +109,10 @@ async def ws_stream(ws: WebSocket):
                 if msg is None:
                     break
 
+                seq = seq_of(msg)
+                if seq is not None and seq <= last_seq:
+                    send_task = asyncio.create_task(q.get())
+                    continue
                 await _safe_send(ws, msg)
                 send_task = asyncio.create_task(q.get())
 
@@ -0,0 +1,43 @@
+from __future__ import annotations
+import asyncio
+import time
+
+
+class WallClock:
+    """
+    Реальное время. time — сам time.time (без обёртки), поэтому компоненты могут
+    держать у себя `self._now = clock.time` без лишнего вызова на горячем пути.
+    """
+
+    time = staticmethod(time.time)
+    sleep = staticmethod(asyncio.sleep)
+
+
+class VirtualClock:
+    """
+    Виртуальное время для реплея/бэктеста: двигается только через set()/advance()
+    (драйвер ставит время очередной записи), назад не ходит. sleep() не ждёт —
+    задержки в виртуальном времени не моделируются.
+    """
+
+    def __init__(self, start: float = 0.0) -> None:
+        self._t = float(start)
+
+    def time(self) -> float:
+        return self._t
+
+    def set(self, ts: float) -> None:
+        if ts > self._t:
+            self._t = float(ts)
+
+    def advance(self, dt: float) -> None:
+        if dt > 0:
+            self._t += float(dt)
+
+    async def sleep(self, delay: float) -> None:
+        await asyncio.sleep(0)
+
+
+WALL_CLOCK = WallClock()
+
+__all__ = ["WallClock", "VirtualClock", "WALL_CLOCK"]
@@ -6,7 +6,7 @@ from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 DEFAULT_YAML = {
-    "api": {"paper": True},
+    "api": {"paper": True, "rest_base": "", "ws_base": ""},
     "shadow": {"enabled": True, "alpha": 0.85, "latency_ms": 120, "post_only_reject": True, "market_slippage_bps": 1.0},
     "scanner": {
         "enabled": False,
@@ -43,6 +43,39 @@ DEFAULT_YAML = {
         "rest_bootstrap_interval": 3.0,
         "plan_log_interval": 5.0,
         "paper_cash": 1000,
+        "stop_loss_pct": 0.0,
+    },
+    "ledger": {"method": "avg", "mark_interval_sec": 1.0},
+    "engine": {"mode": "inprocess", "workers": 0, "flush_ms": 20, "market_throttle_ms": 100},
+    "recorder": {
+        "enabled": False,
+        "dir": "data/recordings",
+        "segment_mb": 64,
+        "segment_minutes": 60,
+        "block_kb": 256,
+        "block_ms": 1000,
+        "retention_hours": 72,
+        "max_total_mb": 0,
+        "level": 1,
+    },
+    "metrics": {"enabled": True},
+    "loop_monitor": {"enabled": True, "interval_ms": 50, "slow_ms": 100, "lag_alert_ms": 50, "window_sec": 60,
+                     "alert_repeat_sec": 60},
+    "tracing": {"enabled": True, "slow_ms": 100, "sample_every": 1000, "keep": 200, "clock_sync_sec": 60},
+    "logging": {"json": False, "queue_size": 10000, "rate_per_sec": 20, "burst": 200, "sample": {}, "max_mb": 2,
+                "backups": 5},
+    "diag": {"live_level": "info", "dedup_sec": 10, "budget_per_sec": 20, "keep": 5000},
+    "ws": {"ring": 2000, "trades": 50},
+    "history": {
+        "maintenance": False,   # удаляет старые данные — только по явному включению
+        "retention_days": 365,
+        "raw_retention_days": 30,
+        "raw_compact_after_days": 3,
+        "raw_mode": "compress",
+        "partition": "none",
+        "archive_dir": "data/archive",
+        "maintenance_interval_sec": 600,
+        "vacuum_pages": 512,
     },
 }
 
@@ -59,6 +92,14 @@ class AppSettings(BaseSettings):
 
     app_config_file: Optional[str] = Field(None, alias="APP_CONFIG_FILE")
 
+    # local — движок внутри API-процесса (dev); remote — API ходит в отдельный процесс `python -m app.engine`
+    app_engine: str = Field("local", alias="APP_ENGINE")
+    # адрес движка для app.engine и gateway; пусто — engine_rpc.default_address() (сокет в tempfile.gettempdir())
+    app_engine_address: Optional[str] = Field(None, alias="APP_ENGINE_ADDRESS")
+
+    # /api/admin/*: обязателен заголовок X-Admin-Token с этим значением; не задан — эндпоинты закрыты
+    app_admin_token: Optional[str] = Field(None, alias="APP_ADMIN_TOKEN")
+
     runtime_cfg: Dict[str, Any] = DEFAULT_YAML.copy()
 
     def load_yaml(self):
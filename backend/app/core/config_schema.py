@@ -0,0 +1,414 @@
+from __future__ import annotations
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+
+class ConfigError(ValueError):
+    """Конфиг не проходит проверку — до живого бота он не доходит."""
+
+
+def _section(cfg: Dict[str, Any], name: str) -> Dict[str, Any]:
+    sec = cfg.get(name)
+    if sec is None:
+        return {}
+    if not isinstance(sec, dict):
+        raise ConfigError(f"{name}: expected object, got {type(sec).__name__}")
+    return sec
+
+
+def _num(sec: Dict[str, Any], path: str, key: str, default: float, min_value: Optional[float] = None) -> float:
+    raw = sec.get(key, default)
+    if isinstance(raw, bool):
+        raise ConfigError(f"{path}.{key}: expected number, got bool")
+    try:
+        v = float(raw)
+    except (TypeError, ValueError):
+        raise ConfigError(f"{path}.{key}: expected number, got {raw!r}") from None
+    if v != v:
+        raise ConfigError(f"{path}.{key}: NaN")
+    if min_value is not None and v < min_value:
+        raise ConfigError(f"{path}.{key}: must be >= {min_value}, got {v}")
+    return v
+
+
+def _flag(sec: Dict[str, Any], path: str, key: str, default: bool) -> bool:
+    raw = sec.get(key, default)
+    if isinstance(raw, bool):
+        return raw
+    if isinstance(raw, (int, float)) and raw in (0, 1):
+        return bool(raw)
+    if isinstance(raw, str) and raw.strip().lower() in ("true", "false", "1", "0", "yes", "no", "on", "off"):
+        return raw.strip().lower() in ("true", "1", "yes", "on")
+    raise ConfigError(f"{path}.{key}: expected bool, got {raw!r}")
+
+
+def _symbol(raw: Any, path: str) -> str:
+    sym = str(raw).strip().upper()
+    if not sym.isalnum():
+        raise ConfigError(f"{path}: invalid symbol {raw!r}")
+    return sym
+
+
+@dataclass(frozen=True, slots=True)
+class StrategyConfig:
+    symbol: str                 # основной символ (виджет рынка, статус)
+    symbols: Tuple[str, ...]    # все символы под котирование: strategy.symbols или (symbol,)
+    quote_size: float
+    min_spread_pct: float
+    cancel_timeout: float
+    reorder_interval: float
+    loop_sleep: float
+    post_only: bool
+    maker_fee_pct: float
+    taker_fee_pct: float
+    paper_cash: float
+    stop_loss_pct: float        # убыток позиции от средней цены, %, при котором она закрывается по рынку; 0 — выкл.
+
+    @classmethod
+    def from_dict(cls, cfg: Dict[str, Any]) -> "StrategyConfig":
+        s = _section(cfg, "strategy")
+        symbol = _symbol(s.get("symbol") or "BNBUSDT", "strategy.symbol")
+        raw = s.get("symbols")
+        if raw is None:
+            symbols: Tuple[str, ...] = (symbol,)
+        elif isinstance(raw, list) and raw:
+            # порядок сохраняем, дубли выкидываем
+            symbols = tuple(dict.fromkeys(_symbol(x, "strategy.symbols") for x in raw))
+        else:
+            raise ConfigError("strategy.symbols: expected non-empty list")
+        return cls(
+            symbol=symbol,
+            symbols=symbols,
+            quote_size=_num(s, "strategy", "quote_size", 10.0, 0.0),
+            min_spread_pct=_num(s, "strategy", "min_spread_pct", 0.0, 0.0),
+            cancel_timeout=_num(s, "strategy", "cancel_timeout", 10.0, 0.0),
+            reorder_interval=_num(s, "strategy", "reorder_interval", 1.0, 0.0),
+            loop_sleep=_num(s, "strategy", "loop_sleep", 0.2, 0.0),
+            post_only=_flag(s, "strategy", "post_only", True),
+            maker_fee_pct=_num(s, "strategy", "maker_fee_pct", 0.1, 0.0),
+            taker_fee_pct=_num(s, "strategy", "taker_fee_pct", 0.1, 0.0),
+            paper_cash=_num(s, "strategy", "paper_cash", 1000.0, 0.0),
+            stop_loss_pct=_num(s, "strategy", "stop_loss_pct", 0.0, 0.0),
+        )
+
+
+# корни хостов Binance по api.paper; api.rest_base / api.ws_base их переопределяют (офлайн-биржа, прокси)
+REST_BASES = {True: "https://testnet.binance.vision", False: "https://api.binance.com"}
+WS_BASES = {True: "wss://stream.testnet.binance.vision", False: "wss://stream.binance.com:9443"}
+
+
+def _base_url(sec: Dict[str, Any], path: str, key: str, default: str, schemes: Tuple[str, ...]) -> str:
+    url = str(sec.get(key) or "").strip() or default
+    if not url.startswith(schemes):
+        raise ConfigError(f"{path}.{key}: expected {'|'.join(s.rstrip(':/') for s in schemes)} URL, got {url!r}")
+    return url.rstrip("/")
+
+
+@dataclass(frozen=True, slots=True)
+class ApiConfig:
+    paper: bool
+    shadow: bool
+    autostart: bool
+    rest_base: str              # корень REST без /api
+    ws_base: str                # корень WS без /ws и /stream
+    rest_base_set: bool         # rest_base задан явно — им же ходит и shadow/виджет
+
+    @classmethod
+    def from_dict(cls, cfg: Dict[str, Any]) -> "ApiConfig":
+        a = _section(cfg, "api")
+        paper = _flag(a, "api", "paper", True)
+        return cls(
+            paper=paper,
+            shadow=_flag(a, "api", "shadow", True),
+            autostart=_flag(a, "api", "autostart", False),
+            rest_base=_base_url(a, "api", "rest_base", REST_BASES[paper], ("http://", "https://")),
+            ws_base=_base_url(a, "api", "ws_base", WS_BASES[paper], ("ws://", "wss://")),
+            rest_base_set=bool(str(a.get("rest_base") or "").strip()),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class FeaturesConfig:
+    risk_protections: bool
+    market_widget_feed: bool
+
+    @classmethod
+    def from_dict(cls, cfg: Dict[str, Any]) -> "FeaturesConfig":
+        f = _section(cfg, "features")
+        return cls(
+            risk_protections=_flag(f, "features", "risk_protections", True),
+            market_widget_feed=_flag(f, "features", "market_widget_feed", True),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class ShadowConfigView:
+    rest_base: str
+
+    @classmethod
+    def from_dict(cls, cfg: Dict[str, Any]) -> "ShadowConfigView":
+        s = _section(cfg, "shadow")
+        # без своего rest_base shadow смотрит на явно заданный api.rest_base, иначе — на mainnet
+        api = ApiConfig.from_dict(cfg)
+        default = api.rest_base if api.rest_base_set else REST_BASES[False]
+        return cls(rest_base=_base_url(s, "shadow", "rest_base", default, ("http://", "https://")))
+
+
+@dataclass(frozen=True, slots=True)
+class LedgerConfig:
+    method: str
+    mark_interval_sec: float
+
+    @classmethod
+    def from_dict(cls, cfg: Dict[str, Any]) -> "LedgerConfig":
+        led = _section(cfg, "ledger")
+        method = str(led.get("method", "avg")).lower()
+        if method not in ("avg", "fifo"):
+            raise ConfigError(f"ledger.method: expected avg|fifo, got {method!r}")
+        return cls(method=method, mark_interval_sec=_num(led, "ledger", "mark_interval_sec", 1.0, 0.0))
+
+
+@dataclass(frozen=True, slots=True)
+class RiskConfigView:
+    snapshot_interval_sec: float
+    decision_ttl_sec: float
+
+    @classmethod
+    def from_dict(cls, cfg: Dict[str, Any]) -> "RiskConfigView":
+        r = _section(cfg, "risk")
+        guards = r.get("guards")
+        if guards is not None and not isinstance(guards, list):
+            raise ConfigError("risk.guards: expected list")
+        return cls(
+            snapshot_interval_sec=_num(r, "risk", "snapshot_interval_sec", 30.0, 1.0),
+            decision_ttl_sec=_num(r, "risk", "decision_ttl_sec", 1.0, 0.0),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class EngineConfig:
+    mode: str                   # inprocess | sharded
+    workers: int                # 0 — по числу ядер
+    flush_ms: float             # пачка событий воркер → API
+    market_throttle_ms: float   # market-события воркера: не чаще раза в N мс на символ
+
+    @classmethod
+    def from_dict(cls, cfg: Dict[str, Any]) -> "EngineConfig":
+        e = _section(cfg, "engine")
+        mode = str(e.get("mode", "inprocess")).lower()
+        if mode not in ("inprocess", "sharded"):
+            raise ConfigError(f"engine.mode: expected inprocess|sharded, got {mode!r}")
+        return cls(
+            mode=mode,
+            workers=int(_num(e, "engine", "workers", 0, 0.0)),
+            flush_ms=_num(e, "engine", "flush_ms", 20.0, 1.0),
+            market_throttle_ms=_num(e, "engine", "market_throttle_ms", 100.0, 0.0),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class RecorderConfig:
+    enabled: bool
+    dir: str
+    segment_mb: float
+    segment_minutes: float
+    block_kb: float
+    block_ms: float
+    retention_hours: float      # 0 — без удаления по возрасту
+    max_total_mb: float         # 0 — без лимита объёма
+    level: int                  # zlib 1..9
+
+    @classmethod
+    def from_dict(cls, cfg: Dict[str, Any]) -> "RecorderConfig":
+        r = _section(cfg, "recorder")
+        level = int(_num(r, "recorder", "level", 1, 1.0))
+        if level > 9:
+            raise ConfigError(f"recorder.level: expected 1..9, got {level}")
+        return cls(
+            enabled=_flag(r, "recorder", "enabled", False),
+            dir=str(r.get("dir") or "data/recordings"),
+            segment_mb=_num(r, "recorder", "segment_mb", 64.0, 1.0),
+            segment_minutes=_num(r, "recorder", "segment_minutes", 60.0, 1.0),
+            block_kb=_num(r, "recorder", "block_kb", 256.0, 1.0),
+            block_ms=_num(r, "recorder", "block_ms", 1000.0, 10.0),
+            retention_hours=_num(r, "recorder", "retention_hours", 72.0, 0.0),
+            max_total_mb=_num(r, "recorder", "max_total_mb", 0.0, 0.0),
+            level=level,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class MetricsConfig:
+    enabled: bool               # точки замера горячих путей + /metrics; False — ноль накладных расходов
+
+    @classmethod
+    def from_dict(cls, cfg: Dict[str, Any]) -> "MetricsConfig":
+        m = _section(cfg, "metrics")
+        return cls(enabled=_flag(m, "metrics", "enabled", True))
+
+
+@dataclass(frozen=True, slots=True)
+class LoopMonitorConfig:
+    enabled: bool
+    interval_ms: float          # период пульса; lag — насколько позже срока он проснулся
+    slow_ms: float              # простой loop дольше — медленный колбэк: стек, лог, diag
+    lag_alert_ms: float         # p99 lag за окно выше — diag-алерт
+    window_sec: float           # окно для p50/p99
+    alert_repeat_sec: float     # алерты не чаще
+
+    @classmethod
+    def from_dict(cls, cfg: Dict[str, Any]) -> "LoopMonitorConfig":
+        m = _section(cfg, "loop_monitor")
+        return cls(
+            enabled=_flag(m, "loop_monitor", "enabled", True),
+            interval_ms=_num(m, "loop_monitor", "interval_ms", 50.0, 1.0),
+            slow_ms=_num(m, "loop_monitor", "slow_ms", 100.0, 1.0),
+            lag_alert_ms=_num(m, "loop_monitor", "lag_alert_ms", 50.0, 0.0),
+            window_sec=_num(m, "loop_monitor", "window_sec", 60.0, 1.0),
+            alert_repeat_sec=_num(m, "loop_monitor", "alert_repeat_sec", 60.0, 0.0),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class TracingConfig:
+    enabled: bool
+    slow_ms: float              # тик → ack дольше — трасса в выбросы целиком
+    sample_every: int           # и каждая N-я обычная (0 — только выбросы)
+    keep: int                   # размер колец выбросов/выборки
+    clock_sync_sec: float       # период сверки часов с биржей (/api/v3/time)
+
+    @classmethod
+    def from_dict(cls, cfg: Dict[str, Any]) -> "TracingConfig":
+        t = _section(cfg, "tracing")
+        return cls(
+            enabled=_flag(t, "tracing", "enabled", True),
+            slow_ms=_num(t, "tracing", "slow_ms", 100.0, 0.0),
+            sample_every=int(_num(t, "tracing", "sample_every", 1000, 0.0)),
+            keep=int(_num(t, "tracing", "keep", 200, 1.0)),
+            clock_sync_sec=_num(t, "tracing", "clock_sync_sec", 60.0, 5.0),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class LoggingConfig:
+    json: bool                  # файл лога — JSON-строки (консоль остаётся текстом)
+    queue_size: int             # очередь до фонового писателя; переполнение — запись отбрасывается и считается
+    rate_per_sec: float         # лимит на место вызова (логгер + строка): столько в секунду в среднем…
+    burst: int                  # …и столько подряд сверх него; 0 — без лимита
+    sample: Tuple[Tuple[str, float], ...]   # (префикс логгера, доля) для DEBUG/INFO, длинные префиксы первыми
+    max_mb: float               # ротация файла
+    backups: int
+
+    @classmethod
+    def from_dict(cls, cfg: Dict[str, Any]) -> "LoggingConfig":
+        lg = _section(cfg, "logging")
+        raw = lg.get("sample") or {}
+        if not isinstance(raw, dict):
+            raise ConfigError(f"logging.sample: expected object {{logger: fraction}}, got {type(raw).__name__}")
+        sample = []
+        for name in raw:
+            frac = _num(raw, "logging.sample", name, 1.0, 0.0)
+            if frac > 1.0:
+                raise ConfigError(f"logging.sample.{name}: expected fraction 0..1, got {frac}")
+            sample.append((str(name), frac))
+        sample.sort(key=lambda kv: -len(kv[0]))
+        return cls(
+            json=_flag(lg, "logging", "json", False),
+            queue_size=int(_num(lg, "logging", "queue_size", 10000, 100.0)),
+            rate_per_sec=_num(lg, "logging", "rate_per_sec", 20.0, 0.0),
+            burst=int(_num(lg, "logging", "burst", 200, 0.0)),
+            sample=tuple(sample),
+            max_mb=_num(lg, "logging", "max_mb", 2.0, 0.1),
+            backups=int(_num(lg, "logging", "backups", 5, 0.0)),
+        )
+
+
+DIAG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+
+@dataclass(frozen=True, slots=True)
+class DiagConfig:
+    live_level: str             # ниже — только в кольцо (/api/logs), в /ws не уходит
+    dedup_sec: float            # повтор того же сообщения в окне — счётчик ×N вместо строки; 0 — без дедупа
+    budget_per_sec: int         # diag в /ws в секунду, сверх — только в кольцо (со сводкой); 0 — без лимита
+    keep: int                   # размер кольца
+
+    @classmethod
+    def from_dict(cls, cfg: Dict[str, Any]) -> "DiagConfig":
+        d = _section(cfg, "diag")
+        level = str(d.get("live_level", "info")).lower()
+        if level not in DIAG_LEVELS:
+            raise ConfigError(f"diag.live_level: expected {'|'.join(DIAG_LEVELS)}, got {level!r}")
+        return cls(
+            live_level=level,
+            dedup_sec=_num(d, "diag", "dedup_sec", 10.0, 0.0),
+            budget_per_sec=int(_num(d, "diag", "budget_per_sec", 20, 0.0)),
+            keep=int(_num(d, "diag", "keep", 5000, 100.0)),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class WsConfig:
+    ring: int                   # дельт на тему /ws (order_event, trade, diag, …) для resume
+    trades: int                 # последних сделок в снапшоте нового клиента
+
+    @classmethod
+    def from_dict(cls, cfg: Dict[str, Any]) -> "WsConfig":
+        w = _section(cfg, "ws")
+        return cls(
+            ring=int(_num(w, "ws", "ring", 2000, 10.0)),
+            trades=int(_num(w, "ws", "trades", 50, 0.0)),
+        )
+
+
+def config_version(cfg: Dict[str, Any]) -> str:
+    """Короткий хеш канонического JSON: одинаковый конфиг — одинаковая версия."""
+    blob = json.dumps(cfg or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledConfig:
+    """
+    Разобранный и проверенный снимок конфига. Горячие пути читают атрибуты, а не
+    цепочки (cfg.get(...) or {}).get(...); исходный dict остаётся у AppState для API/сервисов.
+    """
+    version: str
+    strategy: StrategyConfig
+    api: ApiConfig
+    features: FeaturesConfig
+    shadow: ShadowConfigView
+    ledger: LedgerConfig
+    risk: RiskConfigView
+    engine: EngineConfig
+    recorder: RecorderConfig
+    metrics: MetricsConfig
+    loop_monitor: LoopMonitorConfig
+    tracing: TracingConfig
+    logging: LoggingConfig
+    diag: DiagConfig
+    ws: WsConfig
+
+
+def compile_cfg(cfg: Dict[str, Any]) -> CompiledConfig:
+    if not isinstance(cfg, dict):
+        raise ConfigError(f"config must be an object, got {type(cfg).__name__}")
+    return CompiledConfig(
+        version=config_version(cfg),
+        strategy=StrategyConfig.from_dict(cfg),
+        api=ApiConfig.from_dict(cfg),
+        features=FeaturesConfig.from_dict(cfg),
+        shadow=ShadowConfigView.from_dict(cfg),
+        ledger=LedgerConfig.from_dict(cfg),
+        risk=RiskConfigView.from_dict(cfg),
+        engine=EngineConfig.from_dict(cfg),
+        recorder=RecorderConfig.from_dict(cfg),
+        metrics=MetricsConfig.from_dict(cfg),
+        loop_monitor=LoopMonitorConfig.from_dict(cfg),
+        tracing=TracingConfig.from_dict(cfg),
+        logging=LoggingConfig.from_dict(cfg),
+        diag=DiagConfig.from_dict(cfg),
+        ws=WsConfig.from_dict(cfg),
+    )
@@ -1,19 +1,291 @@
+"""
+Логирование без блокирующего I/O в event loop.
+
+Корневой логгер пишет в очередь (QueueHandler), файл и консоль пишет фоновый поток (QueueListener).
+В потоке вызова остаются фильтр и getMessage(); форматирование трейсбека, запись и ротация —
+в писателе. Очередь ограничена (logging.queue_size): при переполнении запись отбрасывается,
+счётчик растёт, писатель при следующей записи сообщает, сколько потерял.
+
+Перед очередью — фильтр (тоже в потоке вызова, несколько мкс):
+  * sample — доля DEBUG/INFO по префиксу логгера ({"app.services.market_maker": 0.1} — каждая 10-я);
+  * rate_per_sec / burst — token bucket на место вызова (логгер + файл:строка): трейсбек на каждой
+    итерации цикла даст burst записей, дальше rate_per_sec в секунду; первая пропущенная после
+    паузы несёт число подавленных (`suppressed`).
+WARNING и выше сэмплирование не режет, лимит — режет (иначе шторм ошибок забьёт очередь).
+
+logging.json — файл в JSON-строках (ts, level, logger, msg, exc, suppressed и поля из extra=).
+Все ключи секции logging применяются горячо (configure). Очередь дописывается при выходе (atexit).
+"""
+from __future__ import annotations
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import sys
+import time
+from pathlib import Path
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional, Tuple
+
+from . import metrics
+from .config_schema import LoggingConfig
+
+FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+# относительный path в setup_logging — отсюда, а не от cwd (data/logs/ в .gitignore)
+LOG_DIR = Path(__file__).resolve().parents[2] / "data" / "logs"
+
+# атрибуты LogRecord; остальное пришло через extra= и уходит в JSON как есть
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_MAX_KEYS = 4096
+
+
+class TextFormatter(logging.Formatter):
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        s = super().formatMessage(record)
+        n = getattr(record, "suppressed", 0)
+        return f"{s} [+{n} similar suppressed]" if n else s
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна JSON-строка."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        if record.stack_info:
+            out["stack"] = record.stack_info
+        for k, v in vars(record).items():
+            if k not in _RECORD_ATTRS and k not in out:
+                out[k] = v
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class RateFilter(logging.Filter):
+    """Сэмплирование по логгеру и token bucket на место вызова; см. докстринг модуля."""
+
+    def __init__(self, conf: LoggingConfig) -> None:
+        super().__init__()
+        self.conf = conf
+        self._buckets: Dict[Tuple[str, str, int], list] = {}   # место вызова -> [токены, ts, подавлено]
+        self._sample_acc: Dict[str, float] = {}
+        self._sample_rate: Dict[str, float] = {}                # логгер -> доля (кеш сопоставления префиксов)
+        self.suppressed = 0
+        self.sampled_out = 0
+
+    def configure(self, conf: LoggingConfig) -> None:
+        self.conf = conf
+        self._sample_rate.clear()
+        self._buckets.clear()
+
+    def _rate_for(self, name: str) -> float:
+        rate = self._sample_rate.get(name)
+        if rate is None:
+            rate = 1.0
+            for prefix, frac in self.conf.sample:
+                if name == prefix or name.startswith(prefix + "."):
+                    rate = frac
+                    break
+            if len(self._sample_rate) > _MAX_KEYS:
+                self._sample_rate.clear()
+            self._sample_rate[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        conf = self.conf
+        # гонки между потоками (to_thread) безвредны: в худшем случае лишняя/пропущенная запись
+        if conf.sample and record.levelno < logging.WARNING:
+            rate = self._rate_for(record.name)
+            if rate < 1.0:
+                acc = self._sample_acc.get(record.name, 0.0) + rate
+                if acc < 1.0:
+                    self._sample_acc[record.name] = acc
+                    self.sampled_out += 1
+                    return False
+                self._sample_acc[record.name] = acc - 1.0
+
+        if conf.burst <= 0:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        b = self._buckets.get(key)
+        if b is None:
+            if len(self._buckets) > _MAX_KEYS:
+                self._buckets.clear()
+            b = self._buckets[key] = [float(conf.burst), now, 0]
+        else:
+            b[0] = min(float(conf.burst), b[0] + (now - b[1]) * conf.rate_per_sec)
+            b[1] = now
+        if b[0] < 1.0:
+            b[2] += 1
+            self.suppressed += 1
+            return False
+        b[0] -= 1.0
+        if b[2]:
+            record.suppressed = b[2]
+            b[2] = 0
+        return True
+
+
+class _BoundedQueueHandler(QueueHandler):
+    def __init__(self, q: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # сообщение — сейчас (аргументы могут измениться), трейсбек форматирует писатель
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
 
-def setup_logging(path: str = "bot.log", level=logging.INFO, to_console: bool = True):
+class _Listener(QueueListener):
+    """Писатель: перед очередной записью сообщает о потерянных при переполнении."""
+
+    def __init__(self, q: "queue.Queue[logging.LogRecord]", qh: _BoundedQueueHandler, *handlers: logging.Handler) -> None:
+        super().__init__(q, *handlers, respect_handler_level=True)
+        self._qh = qh
+        self._reported = 0
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)   # put_nowait упал бы на полной очереди
+
+    def handle(self, record: logging.LogRecord) -> None:
+        dropped = self._qh.dropped
+        if dropped != self._reported:
+            note = logging.LogRecord("app.core.logging", logging.WARNING, __file__, 0,
+                                     "log queue full: dropped %d records", (dropped - self._reported,), None)
+            self._reported = dropped
+            super().handle(note)
+        super().handle(record)
+
+
+class _Pipeline:
+    def __init__(self) -> None:
+        self.queue: Optional[queue.Queue] = None
+        self.handler: Optional[_BoundedQueueHandler] = None
+        self.listener: Optional[_Listener] = None
+        self.filter: Optional[RateFilter] = None
+        self.file: Optional[RotatingFileHandler] = None
+        self.conf = LoggingConfig.from_dict({})
+        self.fmt = FORMAT
+
+    def stop(self) -> None:
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()   # дописывает очередь до конца
+            for h in listener.handlers:
+                h.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "queue_size": self.conf.queue_size,
+            "dropped": self.handler.dropped if self.handler is not None else 0,
+            "suppressed": self.filter.suppressed if self.filter is not None else 0,
+            "sampled_out": self.filter.sampled_out if self.filter is not None else 0,
+        }
+
+    def collect(self):
+        s = self.stats()
+        yield "amadeus_log_queue_depth", "gauge", "Log records waiting for the writer thread", (), [((), s["queued"])]
+        yield ("amadeus_log_dropped_total", "counter", "Log records dropped on queue overflow", (),
+               [((), s["dropped"])])
+        yield ("amadeus_log_filtered_total", "counter", "Log records filtered before the queue", ("reason",),
+               [(("rate_limit",), s["suppressed"]), (("sample",), s["sampled_out"])])
+
+
+_PIPE = _Pipeline()
+atexit.register(_PIPE.stop)
+
+
+def setup_logging(path: Optional[str] = "bot.log", level=logging.INFO, to_console: bool = True,
+                  conf: Optional[LoggingConfig] = None, fmt: str = FORMAT):
+    """Корневой логгер → ограниченная очередь → фоновый писатель (файл path, если задан, и stderr).
+
+    Относительный path — под LOG_DIR (backend/data/logs).
+    """
     root = logging.getLogger()
     root.setLevel(level)
     for h in list(root.handlers):
         root.removeHandler(h)
+    _PIPE.stop()
 
-    fmt = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
-
-    fh = RotatingFileHandler(path, maxBytes=2_000_000, backupCount=5, encoding="utf-8")
-    fh.setLevel(level); fh.setFormatter(fmt); root.addHandler(fh)
-
+    conf = conf or _PIPE.conf
+    _PIPE.conf = conf
+    _PIPE.fmt = fmt
+    handlers = []
+    _PIPE.file = None
+    if path:
+        path = Path(path)
+        if not path.is_absolute():
+            path = LOG_DIR / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fh = RotatingFileHandler(path, maxBytes=int(conf.max_mb * 1_000_000), backupCount=conf.backups,
+                                 encoding="utf-8")
+        fh.setLevel(level)
+        fh.setFormatter(JsonFormatter() if conf.json else TextFormatter(fmt))
+        handlers.append(fh)
+        _PIPE.file = fh
     if to_console:
-        ch = logging.StreamHandler()
-        ch.setLevel(level); ch.setFormatter(fmt); root.addHandler(ch)
+        ch = logging.StreamHandler(sys.stderr)
+        ch.setLevel(level)
+        ch.setFormatter(TextFormatter(fmt))
+        handlers.append(ch)
 
+    _PIPE.queue = queue.Queue(maxsize=conf.queue_size)
+    _PIPE.handler = _BoundedQueueHandler(_PIPE.queue)
+    _PIPE.filter = RateFilter(conf)
+    _PIPE.handler.addFilter(_PIPE.filter)
+    root.addHandler(_PIPE.handler)
+    _PIPE.listener = _Listener(_PIPE.queue, _PIPE.handler, *handlers)
+    _PIPE.listener.start()
+    metrics.add_collector(_PIPE.collect)
     return root
+
+
+def configure(conf: LoggingConfig) -> None:
+    """Горячее применение секции logging к уже запущенному конвейеру."""
+    _PIPE.conf = conf
+    if _PIPE.queue is not None:
+        _PIPE.queue.maxsize = conf.queue_size   # Queue читает maxsize под своим мьютексом на каждом put
+    if _PIPE.filter is not None:
+        _PIPE.filter.configure(conf)
+    fh = _PIPE.file
+    if fh is not None:
+        fh.acquire()
+        try:
+            fh.maxBytes = int(conf.max_mb * 1_000_000)
+            fh.backupCount = conf.backups
+            if conf.json != isinstance(fh.formatter, JsonFormatter):
+                fh.setFormatter(JsonFormatter() if conf.json else TextFormatter(_PIPE.fmt))
+        finally:
+            fh.release()
+
+
+def stats() -> Dict[str, Any]:
+    return _PIPE.stats()
+
+
+def shutdown() -> None:
+    """Дописать очередь и остановить писателя (вызывается и из atexit)."""
+    _PIPE.stop()
+
+
+__all__ = ["setup_logging", "configure", "stats", "shutdown", "JsonFormatter", "TextFormatter", "RateFilter", "FORMAT",
+           "LOG_DIR"]
@@ -0,0 +1,218 @@
+"""
+Метрики процесса в текстовом формате Prometheus (exposition 0.0.4), без внешних зависимостей.
+
+Счётчики, гейджи и гистограммы с фиксированными корзинами. Метки привязываются один раз
+(`FAMILY.labels(stream="depth")` → дочерний объект), на горячем пути — только `.inc()` / `.observe()`:
+bisect по кортежу границ и два сложения, без словарей и форматирования.
+
+Точки замера проверяют модульный флаг `metrics.enabled` и при False ничего не делают (ни вызова,
+ни perf_counter). Флаг ставит AppState / воркер шарда по конфигу `metrics.enabled` (горячо).
+Значения, которые дешевле прочитать, чем поддерживать (глубина очередей, число клиентов), считают
+коллекторы в момент скрейпа. Воркеры шардов присылают snapshot() в shard_stats; render() дописывает
+их к своим метрикам с меткой shard.
+"""
+from __future__ import annotations
+import math
+from bisect import bisect_left
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+enabled = False
+
+# типовые корзины, секунды
+LATENCY_FAST = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2)
+LATENCY = (1e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+__all__ = ["enabled", "set_enabled", "now_ns", "counter", "gauge", "histogram", "add_collector", "render",
+           "snapshot", "REGISTRY", "LATENCY", "LATENCY_FAST"]
+
+now_ns = perf_counter_ns
+
+
+def set_enabled(on: bool) -> None:
+    global enabled
+    enabled = bool(on)
+
+
+class Value:
+    """Дочерний счётчик/гейдж: одно число."""
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, n: float = 1.0) -> None:
+        self.value += n
+
+    def dec(self, n: float = 1.0) -> None:
+        self.value -= n
+
+    def set(self, v: float) -> None:
+        self.value = v
+
+
+class Buckets:
+    """Дочерняя гистограмма: counts[i] — наблюдения в (bounds[i-1], bounds[i]], последний — +Inf."""
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.sum += v
+
+    def observe_since(self, t0_ns: int) -> None:
+        v = (perf_counter_ns() - t0_ns) * 1e-9
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.sum += v
+
+
+class Family:
+    def __init__(self, name: str, kind: str, help_: str, labelnames: Sequence[str],
+                 bounds: Optional[Tuple[float, ...]] = None) -> None:
+        self.name = name
+        self.kind = kind            # counter | gauge | histogram
+        self.help = help_
+        self.labelnames = tuple(labelnames)
+        self.bounds = tuple(sorted(bounds)) if bounds else None
+        self.children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: Any, **kv: Any) -> Any:
+        key = tuple(str(v) for v in values) if values else tuple(str(kv[n]) for n in self.labelnames)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {key}")
+        child = self.children.get(key)
+        if child is None:
+            child = self.children[key] = Buckets(self.bounds) if self.kind == "histogram" else Value()
+        return child
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        if self.kind == "histogram":
+            return [(k, [list(c.counts), c.sum]) for k, c in self.children.items()]
+        return [(k, c.value) for k, c in self.children.items()]
+
+
+# коллектор: () -> [(name, kind, help, labelnames, [(labelvalues, value), ...])]
+Collector = Callable[[], Iterable[Tuple[str, str, str, Sequence[str], Iterable[Tuple[Sequence[Any], float]]]]]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.families: Dict[str, Family] = {}
+        self.collectors: List[Collector] = []
+
+    def _family(self, name: str, kind: str, help_: str, labelnames: Sequence[str],
+                bounds: Optional[Tuple[float, ...]] = None) -> Family:
+        fam = self.families.get(name)
+        if fam is None:
+            fam = self.families[name] = Family(name, kind, help_, labelnames, bounds)
+        elif fam.kind != kind or fam.labelnames != tuple(labelnames):
+            raise ValueError(f"metric {name} already registered as {fam.kind}{fam.labelnames}")
+        return fam
+
+    def add_collector(self, fn: Collector) -> None:
+        if fn not in self.collectors:
+            self.collectors.append(fn)
+
+    def remove_collector(self, fn: Collector) -> None:
+        if fn in self.collectors:
+            self.collectors.remove(fn)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Собственные метрики процесса в JSON-совместимом виде (для передачи из воркера)."""
+        out = [{"name": f.name, "kind": f.kind, "help": f.help, "labels": list(f.labelnames),
+                "bounds": list(f.bounds) if f.bounds else None, "samples": f.samples()}
+               for f in self.families.values() if f.children]
+        for fn in list(self.collectors):
+            try:
+                for name, kind, help_, labelnames, samples in fn():
+                    out.append({"name": name, "kind": kind, "help": help_, "labels": list(labelnames),
+                                "bounds": None, "samples": [(tuple(str(x) for x in k), v) for k, v in samples]})
+            except Exception:
+                continue
+        return out
+
+    def render(self, extra: Iterable[Tuple[Dict[str, str], List[Dict[str, Any]]]] = ()) -> str:
+        """Текст для /metrics: свои метрики + снимки других процессов с дополнительными метками."""
+        merged: Dict[str, Dict[str, Any]] = {}
+        order: List[str] = []
+        for labels, snap in [({}, self.snapshot()), *extra]:
+            for fam in snap:
+                cur = merged.get(fam["name"])
+                if cur is None:
+                    cur = merged[fam["name"]] = {**fam, "rows": []}
+                    order.append(fam["name"])
+                names = list(labels) + list(fam["labels"])
+                for values, v in fam["samples"]:
+                    cur["rows"].append((names, [*labels.values(), *values], v, fam.get("bounds")))
+        lines: List[str] = []
+        for name in order:
+            fam = merged[name]
+            lines.append(f"# HELP {name} {_escape_help(fam['help'])}")
+            lines.append(f"# TYPE {name} {fam['kind']}")
+            for names, values, v, bounds in fam["rows"]:
+                if fam["kind"] != "histogram":
+                    lines.append(f"{name}{_labels(names, values)} {_num(v)}")
+                    continue
+                counts, total = v
+                acc = 0
+                for bound, n in zip(list(bounds) + [math.inf], counts):
+                    acc += n
+                    lines.append(f"{name}_bucket{_labels(names + ['le'], values + [_num(bound)])} {acc}")
+                lines.append(f"{name}_sum{_labels(names, values)} {_num(total)}")
+                lines.append(f"{name}_count{_labels(names, values)} {acc}")
+        return "\n".join(lines) + "\n"
+
+
+def _num(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if isinstance(v, int):
+        return str(v)
+    if isinstance(v, float) and v.is_integer() and abs(v) < 1e15:
+        return str(int(v))
+    return repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _escape_help(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help_: str, labels: Sequence[str] = ()) -> Family:
+    return REGISTRY._family(name, "counter", help_, labels)
+
+
+def gauge(name: str, help_: str, labels: Sequence[str] = ()) -> Family:
+    return REGISTRY._family(name, "gauge", help_, labels)
+
+
+def histogram(name: str, help_: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY) -> Family:
+    return REGISTRY._family(name, "histogram", help_, labels, tuple(buckets))
+
+
+def add_collector(fn: Collector) -> None:
+    REGISTRY.add_collector(fn)
+
+
+def snapshot() -> List[Dict[str, Any]]:
+    return REGISTRY.snapshot()
+
+
+def render(extra: Iterable[Tuple[Dict[str, str], List[Dict[str, Any]]]] = ()) -> str:
+    return REGISTRY.render(extra)
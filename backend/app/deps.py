@@ -1,6 +1,23 @@
 from __future__ import annotations
-from fastapi import Depends
+import secrets
+from typing import Optional
+from fastapi import Depends, Header, HTTPException
+from .core.config import settings
 from .services.state import AppState, get_state
+from .services.engine_api import get_engine
 
 def state_dep() -> AppState:
     return get_state()
+
+def engine_dep():
+    """LocalEngine (бот в этом процессе) или RemoteEngine (gateway к `python -m app.engine`)."""
+    return get_engine()
+
+def admin_dep(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Админ-эндпоинты: только с X-Admin-Token = APP_ADMIN_TOKEN; без токена в окружении закрыты."""
+    token = settings.app_admin_token
+    if not token:
+        # профилировщик (и tracemalloc в живом процессе) не должен быть открыт по умолчанию
+        raise HTTPException(status_code=403, detail="admin endpoints disabled: APP_ADMIN_TOKEN is not set")
+    if not secrets.compare_digest(x_admin_token or "", token):
+        raise HTTPException(status_code=403, detail="admin token required")
@@ -0,0 +1,59 @@
+# backend/app/engine.py — движок отдельным процессом: python -m app.engine
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+
+from .core.config import settings
+from .core.logging import setup_logging
+from .services.engine_api import LocalEngine
+from .services.engine_rpc import EngineServer, parse_address
+from .services.state import get_state
+
+log = logging.getLogger("amadeus.engine")
+
+
+async def serve() -> None:
+    state = get_state()
+    engine = LocalEngine(state)
+    server = EngineServer(engine, parse_address(settings.app_engine_address))
+    await server.start()
+    state.start_loop_monitor()
+
+    if state.conf.api.autostart:
+        log.warning("autostart=true — запускаю бота по конфигу…")
+        try:
+            await state.start_bot()
+        except Exception:
+            log.exception("Не удалось автозапустить бота")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: остаётся KeyboardInterrupt
+    try:
+        await stop.wait()
+    finally:
+        await server.close()
+        state.stop_loop_monitor()
+        if state.is_running():
+            await state.stop_bot()
+        else:
+            await state.save_risk_state()
+        log.info("engine stopped")
+
+
+def main() -> None:
+    setup_logging(path="engine.log", to_console=True)
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
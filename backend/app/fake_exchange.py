@@ -0,0 +1,39 @@
+# backend/app/fake_exchange.py — офлайн-биржа для нагрузочных прогонов: python -m app.fake_exchange --rate 200
+from __future__ import annotations
+
+import argparse
+import logging
+
+from .services.fake_exchange import FakeExchange, create_app
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Local stand-in for Binance Spot REST + WS (synthetic or replayed data)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9100)
+    p.add_argument("--symbols", default="BNBUSDT,ETHUSDT,BTCUSDT", help="comma-separated symbols (synthetic mode)")
+    p.add_argument("--rate", type=float, default=20.0, help="bookTicker updates per second per symbol")
+    p.add_argument("--trade-ratio", type=float, default=0.3, help="aggTrade events per bookTicker update")
+    p.add_argument("--vol-bps", type=float, default=1.0, help="mid volatility, bps per sqrt(second)")
+    p.add_argument("--replay", nargs="+", metavar="PATH", help="serve recorded data (*.jsonl[.gz], *.seg, dirs)")
+    p.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier (10 = 10x recorded rate)")
+    p.add_argument("--loop", action="store_true", help="restart the replay when it ends")
+    p.add_argument("--seed", type=int, help="random seed (synthetic mode)")
+    p.add_argument("--max-queue", type=int, default=10_000, help="per-connection frame queue; overflow is dropped")
+    args = p.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+    ex = FakeExchange(symbols=[] if args.replay else symbols, rate=args.rate, trade_ratio=args.trade_ratio,
+                      vol_bps_sec=args.vol_bps, replay=args.replay, speed=args.speed, loop=args.loop,
+                      seed=args.seed, max_queue=args.max_queue)
+
+    import uvicorn
+    logging.getLogger("amadeus.fake").info(
+        "fake exchange on %s:%d — api.rest_base: http://%s:%d, api.ws_base: ws://%s:%d",
+        args.host, args.port, args.host, args.port, args.host, args.port)
+    uvicorn.run(create_app(ex), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,14 @@
 from __future__ import annotations
 
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from .core.config import settings
 from .core.logging import setup_logging
 from .services.state import get_state
+from .services.engine_api import RemoteEngine, set_engine
 
 # Базовое логирование
 setup_logging(to_console=True)
@@ -49,20 +51,62 @@ try:
 except Exception as e:
     log.warning("Router /api/history недоступен: %s", e)
 
+try:
+    from .api.routers import sweep
+    app.include_router(sweep.router, prefix="/api")
+    log.info("Router /api/sweeps подключён")
+except Exception as e:
+    log.warning("Router /api/sweeps недоступен: %s", e)
+
+try:
+    from .api.routers import logs
+    app.include_router(logs.router, prefix="/api")
+    log.info("Router /api/logs подключён")
+except Exception as e:
+    log.warning("Router /api/logs недоступен: %s", e)
+
+try:
+    from .api.routers import admin
+    app.include_router(admin.router, prefix="/api")
+    log.info("Router /api/admin подключён")
+except Exception as e:
+    log.warning("Router /api/admin недоступен: %s", e)
+
+# ---- Prometheus (/metrics, без префикса /api — так его ищет scrape по умолчанию) ----
+from .api.routers import metrics as metrics_router
+app.include_router(metrics_router.router)
+
 # ---- WebSocket (/ws) ----
 from .api.routers import ws as ws_router
 app.include_router(ws_router.router)  # путь /ws
 
+# движок в отдельном процессе недоступен → 503, а не 500
+@app.exception_handler(ConnectionError)
+async def engine_unavailable(request: Request, exc: ConnectionError):
+    return JSONResponse(status_code=503, content={"detail": f"engine unavailable: {exc}"})
+
+_engine_client = None
+
 # ---- Старт/стоп хуки ----
 @app.on_event("startup")
 async def on_startup():
     """
     Никакого state.load_config(): конфиг уже прочитан в core.config при импорте.
-    Здесь только синхронизируем cfg и НЕ автозапускаем бота,
-    если явно не указан api.autostart=true.
+    APP_ENGINE=remote — API только шлюз к `python -m app.engine` (бот, рынок и риск живут там).
+    Иначе синхронизируем cfg и НЕ автозапускаем бота, если явно не указан api.autostart=true.
     """
+    global _engine_client
+    if (settings.app_engine or "local").lower() == "remote":
+        from .services.engine_rpc import EngineClient, parse_address
+        _engine_client = EngineClient(parse_address(settings.app_engine_address))
+        _engine_client.start()
+        set_engine(RemoteEngine(_engine_client))
+        log.info("Gateway mode: engine at %s", _engine_client.address)
+        return
+
     state = get_state()
     state.cfg = settings.runtime_cfg or {}
+    state.start_loop_monitor()
     log.info("Config синхронизирован: ui.chart=%s, api.paper=%s, api.shadow=%s",
              state.cfg.get("ui", {}).get("chart"),
              state.cfg.get("api", {}).get("paper"),
@@ -73,18 +117,24 @@ async def on_startup():
     if autostart:
         log.warning("autostart=true — запускаю бота по конфигу…")
         try:
-            await state.start()
+            await state.start_bot()
             log.info("Бот запущен (autostart).")
         except Exception as e:
             log.exception("Не удалось автозапустить бота: %s", e)
 
 @app.on_event("shutdown")
 async def on_shutdown():
+    if _engine_client is not None:
+        await _engine_client.close()
+        return
     state = get_state()
+    state.stop_loop_monitor()
     try:
-        if getattr(state, "running", False):
-            await state.stop()
+        if state.is_running():
+            await state.stop_bot()
             log.info("Бот остановлен на shutdown.")
+        else:
+            await state.save_risk_state()
     except Exception:
         log.exception("Ошибка остановки бота на shutdown")
 
@@ -92,5 +142,5 @@ async def on_shutdown():
 @app.get("/")
 def root():
     return {"ok": True, "name": "Amadeus Backend", "routers": [
-        "/api/config", "/api/bot", "/api/scanner", "/api/risk", "/api/history", "/ws"
+        "/api/config", "/api/bot", "/api/scanner", "/api/risk", "/api/history", "/api/sweeps", "/ws"
     ]}
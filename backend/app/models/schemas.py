@@ -22,7 +22,21 @@ class BotStatus(BaseModel):
     running: bool
     symbol: Optional[str] = None
     metrics: Dict[str, Any] = Field(default_factory=dict)
-    cfg: Dict[str, Any] = Field(default_factory=dict)
+    cfg_version: Optional[str] = None
+    cfg: Optional[Dict[str, Any]] = None  # только по ?full=1
 
 class ConfigEnvelope(BaseModel):
     cfg: Dict[str, Any]
+
+class SweepRequest(BaseModel):
+    paths: List[str]                            # файлы/папки записей внутри data/
+    space: Optional[Dict[str, Any]] = None      # {"strategy.quote_size": [5, 10], ...}; по умолчанию — DEFAULT_SPACE
+    mode: str = Field("grid", pattern="^(grid|random)$")
+    engine: str = Field("replay", pattern="^(replay|fast)$")  # fast — векторный симулятор (нужен numpy)
+    n: int = Field(50, ge=1, le=10_000)         # точек для random
+    seed: Optional[int] = None
+    symbols: Optional[List[str]] = None
+    start: Optional[str] = None                 # мс/с эпохи или ISO (UTC)
+    end: Optional[str] = None
+    workers: int = Field(0, ge=0)               # 0 — по числу CPU
+    config: Optional[Dict[str, Any]] = None     # базовый конфиг (по умолчанию — текущий)
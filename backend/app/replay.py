@@ -0,0 +1,55 @@
+# backend/app/replay.py — реплей/бэктест по записанным потокам: python -m app.replay data/rec/...
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+from pathlib import Path
+
+from .core.config import settings
+from .services.recording import parse_ts_ms
+from .services.replay import ReplayEngine
+
+
+async def _run(args: argparse.Namespace) -> dict:
+    if args.config:
+        settings.app_config_file = args.config
+        settings.load_yaml()
+    cfg = settings.runtime_cfg
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()] if args.symbols else None
+
+    history = None
+    if args.db:
+        from .services.history import HistoryStore
+        history = HistoryStore(db_path=Path(args.db))
+        await history.init()
+
+    engine = ReplayEngine(cfg, args.paths, symbols=symbols, history=history, curve_interval_sec=args.curve_sec,
+                          start_ms=parse_ts_ms(args.start), end_ms=parse_ts_ms(args.end))
+    return await engine.run()
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Deterministic replay of recorded market data through the strategy")
+    p.add_argument("paths", nargs="+", help="recording files (*.jsonl[.gz], *.seg) or directories")
+    p.add_argument("--config", help="config.yaml (default: APP_CONFIG_FILE / ./config.yaml)")
+    p.add_argument("--symbols", help="comma-separated symbols (default: strategy.symbols)")
+    p.add_argument("--db", help="write orders/trades to this SQLite file (same schema as live history)")
+    p.add_argument("--start", help="skip records before this time (epoch ms/s or ISO, UTC)")
+    p.add_argument("--end", help="stop after this time (epoch ms/s or ISO, UTC)")
+    p.add_argument("--out", help="write the JSON result here instead of stdout")
+    p.add_argument("--curve-sec", type=float, default=60.0, help="equity curve sampling interval")
+    args = p.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    res = asyncio.run(_run(args))
+    text = json.dumps(res, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,48 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
+import time
 from typing import Any, Dict, Optional, Callable, List, Iterable
 
 import httpx  # async HTTP client
 import websockets  # websockets client
 from websockets.legacy.client import WebSocketClientProtocol  # type hints
 
+from ..core import metrics
+from . import tracing
+
 logger = logging.getLogger(__name__)
 
+_WS_MESSAGES = metrics.counter("amadeus_ws_messages_total", "Market WS messages received", ("stream",))
+_WS_DECODE = metrics.histogram("amadeus_ws_decode_seconds", "JSON decode time of a WS frame",
+                               buckets=metrics.LATENCY_FAST).labels()
+_REST_REQUESTS = metrics.counter("amadeus_rest_requests_total", "Binance REST requests", ("endpoint", "status"))
+_REST_WEIGHT = metrics.gauge("amadeus_rest_used_weight_1m", "X-MBX-USED-WEIGHT-1M from the last REST response",
+                             ("host",))
+_MSG_BY_STREAM: Dict[str, Any] = {}  # имя потока → дочерний счётчик (combined-кадры несут имя в "stream")
+
+
+def _stream_counter(name: str) -> Any:
+    c = _MSG_BY_STREAM.get(name)
+    if c is None:
+        sym, sep, kind = name.partition("@")
+        kind = (kind if sep else sym).lstrip("!").partition("@")[0].rstrip("0123456789") or "unknown"
+        c = _MSG_BY_STREAM[name] = _WS_MESSAGES.labels(stream=kind)
+    return c
+
+
+async def observe_rest_response(r: httpx.Response) -> None:
+    """httpx response-хук: запросы по эндпоинтам и использованный вес (заголовок Binance)."""
+    if not metrics.enabled:
+        return
+    _REST_REQUESTS.labels(endpoint=r.request.url.path, status=str(r.status_code)).inc()
+    w = r.headers.get("x-mbx-used-weight-1m")
+    if w is not None:
+        try:
+            _REST_WEIGHT.labels(host=r.request.url.host).set(float(w))
+        except ValueError:
+            pass
+
 
 class OrderBlockedByRisk(RuntimeError):
     """Создание ордера заблокировано RiskManager'ом."""
@@ -26,6 +60,9 @@ class _WSContext:
         self._manager = manager
         self._url = url
         self._ws: Optional[WebSocketClientProtocol] = None
+        # ключ потока для записи: имя одиночного потока или '*' для combined (кадр сам несёт "stream")
+        tail = url.rsplit("/", 1)[-1]
+        self._stream = "*" if tail.startswith("stream?") else tail
 
     async def __aenter__(self) -> "_WSContext":
         # ping_interval/timeout — умеренные дефолты
@@ -45,10 +82,34 @@ class _WSContext:
         if self._ws is None:
             raise RuntimeError("WebSocket is not connected")
         msg = await self._ws.recv()
+        rec = self._manager.recorder
+        if rec is not None:
+            rec.put(self._stream, msg)  # сырой кадр + время приёма; запись — в потоке рекордера
+        traced = tracing.enabled
+        if not metrics.enabled and not traced:
+            try:
+                return json.loads(msg)
+            except Exception:
+                return msg
+        t0 = metrics.now_ns()
+        rx_wall = time.time() if traced else 0.0
         try:
-            return json.loads(msg)
+            obj = json.loads(msg)
         except Exception:
             return msg
+        combined = self._stream == "*" and isinstance(obj, dict)
+        if metrics.enabled:
+            _WS_DECODE.observe_since(t0)
+            _stream_counter(obj.get("stream", self._stream) if combined else self._stream).inc()
+        if traced:
+            tracing.stamp(obj.get("data", obj) if combined else obj, t0, rx_wall)
+        return obj
+
+    async def send(self, obj: Any) -> None:
+        """Управляющие сообщения в сокет (SUBSCRIBE/UNSUBSCRIBE на combined stream)."""
+        if self._ws is None:
+            raise RuntimeError("WebSocket is not connected")
+        await self._ws.send(obj if isinstance(obj, str) else json.dumps(obj))
 
     async def aclose(self):
         if self._ws is not None:
@@ -59,6 +120,11 @@ class _WSContext:
                 self._ws = None
 
 
+def _stream_name(stream: str) -> str:
+    sym, sep, rest = stream.partition("@")
+    return f"{sym.lower()}{sep}{rest}"
+
+
 class SimpleBinanceSocketManager:
     """
     Мини WS-менеджер с интерфейсом, схожим с python-binance BinanceSocketManager:
@@ -73,11 +139,13 @@ class SimpleBinanceSocketManager:
     WEBSOCKET_DEPTH_10 = 10
     WEBSOCKET_DEPTH_20 = 20
 
-    def __init__(self, paper: bool = True, user_timeout: Optional[int] = None):
-        base = "wss://stream.testnet.binance.vision" if paper else "wss://stream.binance.com:9443"
-        self._base = f"{base}/ws"
+    def __init__(self, paper: bool = True, user_timeout: Optional[int] = None, base_url: Optional[str] = None):
+        # base_url — корень без /ws (api.ws_base: офлайн-биржа app.fake_exchange, прокси)
+        base = base_url or ("wss://stream.testnet.binance.vision" if paper else "wss://stream.binance.com:9443")
+        self._base = f"{base.rstrip('/')}/ws"
         self._active: set[_WSContext] = set()
         self._user_timeout = user_timeout
+        self.recorder = None  # MarketRecorder (services/recorder.py), если recorder.enabled
 
     def _url(self, stream: str) -> str:
         # stream должен быть в нижнем регистре (требование Binance) :contentReference[oaicite:3]{index=3}
@@ -144,7 +212,8 @@ class SimpleBinanceSocketManager:
     def multiplex_socket(self, streams: Iterable[str]) -> _WSContext:
         # Combined streams: wss://.../stream?streams=<s1>/<s2>...
         # Оставляем как совместимость — большинство стратегий используют depth_socket напрямую.
-        path = "/stream?streams=" + "/".join(s.lower() for s in streams)
+        # символ — в нижнем регистре, имя потока как есть (bookTicker чувствителен к регистру)
+        path = "/stream?streams=" + "/".join(_stream_name(s) for s in streams)
         base = self._base.rsplit("/ws", 1)[0]  # получаем корень без /ws
         url = f"{base}{path}"
         return _WSContext(self, url)
@@ -157,10 +226,12 @@ class BinanceRestClient:
     Минимальный REST-клиент.
     /api/v3/exchangeInfo для получения торговых фильтров символа (PRICE_FILTER, LOT_SIZE, MIN_NOTIONAL и др.). :contentReference[oaicite:5]{index=5}
     """
-    def __init__(self, api_key: Optional[str], api_secret: Optional[str], paper: bool = True):
-        base = "https://testnet.binance.vision" if paper else "https://api.binance.com"
-        self.base_url = f"{base}/api"
-        self._client = httpx.AsyncClient(base_url=self.base_url, timeout=10.0)
+    def __init__(self, api_key: Optional[str], api_secret: Optional[str], paper: bool = True,
+                 base_url: Optional[str] = None):
+        base = base_url or ("https://testnet.binance.vision" if paper else "https://api.binance.com")
+        self.base_url = f"{base.rstrip('/')}/api"
+        self._client = httpx.AsyncClient(base_url=self.base_url, timeout=10.0,
+                                         event_hooks={"response": [observe_rest_response]})
         self.api_key = api_key
         self.api_secret = api_secret
 
@@ -170,6 +241,27 @@ class BinanceRestClient:
         except Exception:
             logger.exception("Failed to close httpx.AsyncClient")
 
+    async def _get(self, path: str, **params: Any) -> Any:
+        r = await self._client.get(path, params=params or None)
+        r.raise_for_status()
+        return r.json()
+
+    # публичные эндпоинты под именами python-binance AsyncClient — ими пользуется сканер пар
+    async def get_server_time(self) -> Dict[str, Any]:
+        return await self._get("/v3/time")
+
+    async def get_exchange_info(self) -> Dict[str, Any]:
+        return await self._get("/v3/exchangeInfo")
+
+    async def get_ticker(self, symbol: str) -> Dict[str, Any]:
+        return await self._get("/v3/ticker/24hr", symbol=symbol.upper())
+
+    async def get_orderbook_ticker(self, symbol: str) -> Dict[str, Any]:
+        return await self._get("/v3/ticker/bookTicker", symbol=symbol.upper())
+
+    async def get_klines(self, symbol: str, interval: str = "1m", limit: int = 500) -> List[List[Any]]:
+        return await self._get("/v3/klines", symbol=symbol.upper(), interval=interval, limit=int(limit))
+
     async def get_symbol_info(self, symbol: str) -> Dict[str, Any]:
         # /api/v3/exchangeInfo?symbol=BTCUSDT — Spot/Testnet одинаковы по схеме. :contentReference[oaicite:6]{index=6}
         r = await self._client.get("/v3/exchangeInfo", params={"symbol": symbol.upper()})
@@ -235,6 +327,8 @@ class BinanceAsync:
             shadow_opts: Optional[Dict[str, Any]] = None,
             events_cb: Optional[Callable[[Dict[str, Any]], Any]] = None,
             state: Optional["AppState"] = None,
+            rest_base: Optional[str] = None,
+            ws_base: Optional[str] = None,
     ) -> None:
         self.api_key = api_key
         self.api_secret = api_secret
@@ -245,9 +339,10 @@ class BinanceAsync:
         self.state = state
 
         # REST клиент
-        self.client = BinanceRestClient(api_key=self.api_key, api_secret=self.api_secret, paper=self.paper)
+        self.client = BinanceRestClient(api_key=self.api_key, api_secret=self.api_secret, paper=self.paper,
+                                        base_url=rest_base)
         # WS менеджер, ожидаемый стратегией как .bm
-        self.bm = SimpleBinanceSocketManager(paper=self.paper)
+        self.bm = SimpleBinanceSocketManager(paper=self.paper, base_url=ws_base)
 
     async def close(self):
         # закрыть WS и REST
@@ -272,12 +367,11 @@ class BinanceAsync:
 
     # -------------------- risk pre-check --------------------
     def _pre_order(self, symbol: Optional[str]):
+        # diag/лог о блокировке шлёт (с дедупом) сам state.check_risk
         if not self.state:
             return
         allowed, reason = self.state.check_risk(symbol or None)
         if not allowed:
-            logger.warning("Order blocked by risk: %s (%s)", symbol, reason)
-            self._emit({"type": "diag", "text": f"ORDER BLOCKED [{symbol}]: {reason}"})
             raise OrderBlockedByRisk(reason or "risk")
 
     # -------------------- orders API (заглушка) --------------------
@@ -302,21 +396,17 @@ class BinanceAsync:
         self._emit({"type": "order_event", "event": "NEW", "order": order})
         return order
 
-    # удобные врапперы — если используются
+    # удобные врапперы — если используются (риск проверяет create_order, один раз на ордер)
     async def create_limit_buy(self, symbol: str, quantity: float, price: float, **kwargs) -> Dict[str, Any]:
-        self._pre_order(symbol)
         return await self.create_order(symbol, "BUY", "LIMIT", quantity=quantity, price=price, **kwargs)
 
     async def create_limit_sell(self, symbol: str, quantity: float, price: float, **kwargs) -> Dict[str, Any]:
-        self._pre_order(symbol)
         return await self.create_order(symbol, "SELL", "LIMIT", quantity=quantity, price=price, **kwargs)
 
     async def create_market_buy(self, symbol: str, quantity: float, **kwargs) -> Dict[str, Any]:
-        self._pre_order(symbol)
         return await self.create_order(symbol, "BUY", "MARKET", quantity=quantity, **kwargs)
 
     async def create_market_sell(self, symbol: str, quantity: float, **kwargs) -> Dict[str, Any]:
-        self._pre_order(symbol)
         return await self.create_order(symbol, "SELL", "MARKET", quantity=quantity, **kwargs)
 
     # совместимость: вдруг где-то вызывается client_wrap.get_symbol_info(...)
@@ -0,0 +1,85 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+HOT = "hot"               # применяется к живым объектам без остановки
+RECONNECT = "reconnect"   # нужен только перезапуск потока по символу
+RESTART = "restart"       # нужен stop/start бота
+
+# первое совпадение по префиксу ключа выигрывает; неизвестные ключи — RESTART
+_RULES: List[Tuple[str, str]] = [
+    ("strategy.symbol", RECONNECT),
+    ("strategy.symbols", RECONNECT),
+    ("strategy.", HOT),
+    ("risk.state_file", RESTART),
+    ("risk.", HOT),
+    ("scanner.", HOT),
+    ("features.market_widget_feed", RESTART),
+    ("features.", HOT),
+    ("ui.", HOT),
+    ("ledger.mark_interval_sec", HOT),
+    ("ledger.", RESTART),
+    ("history.partition", RESTART),
+    ("history.archive_dir", RESTART),
+    ("history.", HOT),
+    ("api.autostart", HOT),
+    ("api.", RESTART),
+    ("shadow.", RESTART),
+    ("recorder.retention_hours", HOT),
+    ("recorder.max_total_mb", HOT),
+    ("recorder.", RESTART),
+    ("metrics.", HOT),
+    ("loop_monitor.", HOT),
+    ("tracing.", HOT),
+    ("logging.", HOT),
+    ("diag.", HOT),
+    ("ws.", HOT),
+]
+
+
+def classify(key: str) -> str:
+    for prefix, kind in _RULES:
+        if key == prefix or (prefix.endswith(".") and key.startswith(prefix)):
+            return kind
+    return RESTART
+
+
+def _flatten(d: Any, prefix: str = "", out: Dict[str, Any] = None) -> Dict[str, Any]:
+    out = {} if out is None else out
+    if isinstance(d, dict):
+        for k, v in d.items():
+            key = f"{prefix}{k}"
+            if isinstance(v, dict) and v:
+                _flatten(v, key + ".", out)
+            else:
+                out[key] = v
+    return out
+
+
+@dataclass
+class ConfigPlan:
+    changes: Dict[str, Tuple[Any, Any]] = field(default_factory=dict)
+    hot: List[str] = field(default_factory=list)
+    reconnect: List[str] = field(default_factory=list)
+    restart: List[str] = field(default_factory=list)
+
+    @property
+    def symbol_changed(self) -> bool:
+        return "strategy.symbol" in self.changes or "strategy.symbols" in self.changes
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"hot": self.hot, "reconnect": self.reconnect, "restart_required": self.restart}
+
+
+def diff_cfg(old: Dict[str, Any], new: Dict[str, Any]) -> ConfigPlan:
+    """Плоский дифф двух конфигов по dotted-ключам с классификацией изменений."""
+    a = _flatten(old or {})
+    b = _flatten(new or {})
+    plan = ConfigPlan()
+    for key in sorted(set(a) | set(b)):
+        va, vb = a.get(key), b.get(key)
+        if va == vb:
+            continue
+        plan.changes[key] = (va, vb)
+        getattr(plan, classify(key)).append(key)
+    return plan
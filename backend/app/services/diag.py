@@ -0,0 +1,207 @@
+"""
+Канал diag: человекочитаемые сообщения движка для UI с уровнями, дедупом и бюджетом.
+
+Каждое сообщение попадает в кольцо (diag.keep) — его отдаёт /api/logs постранично с фильтрами.
+В /ws уходит не всё:
+  * уровень ниже diag.live_level (по умолчанию info — так ордерные строки MarketMaker'а, debug,
+    остаются только в кольце);
+  * повтор того же сообщения (уровень + символ + текст) в течение diag.dedup_sec не публикуется и
+    не занимает место в кольце — растёт count записи; по закрытии окна в /ws уходит одна строка
+    «текст (×N in last 10s)»;
+  * сверх diag.budget_per_sec в секунду — только в кольцо; в следующую секунду одна сводка
+    «N diag messages held back».
+Трейсбек идёт одной записью: текст — последняя строка, целиком — в поле detail (только в кольце).
+
+Окна дедупа и сводку бюджета закрывает собственный таймер (call_later в event loop), пока есть
+что закрывать, — бот для этого не нужен. Вне event loop (реплей, потоки) — при emit/query.
+"""
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from ..core.config_schema import DIAG_LEVELS, DiagConfig
+
+_MAX_RECENT = 10000
+_FLUSH_SEC = 1.0
+_LEVEL_NAMES = {v: k for k, v in DIAG_LEVELS.items()}
+
+
+def level_no(level: Any) -> int:
+    if isinstance(level, int):
+        return level
+    name = str(level or "info").lower()
+    return DIAG_LEVELS.get("warning" if name == "warn" else name, DIAG_LEVELS["info"])
+
+
+class DiagLog:
+    def __init__(self, conf: DiagConfig, publish: Callable[[Dict[str, Any]], None]) -> None:
+        self.conf = conf
+        self._publish = publish
+        self._live_no = level_no(conf.live_level)
+        self.ring: Deque[Dict[str, Any]] = deque(maxlen=conf.keep)
+        self._seq = 0
+        self._recent: Dict[Tuple[int, Any, str], Dict[str, Any]] = {}   # ключ дедупа -> запись в кольце
+
+        self._budget_sec = 0
+        self._budget_used = 0
+        self._held = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._last_flush = 0.0
+
+        self.total: Dict[str, int] = {name: 0 for name in DIAG_LEVELS}
+        self.deduped_total = 0
+        self.held_total = 0
+
+    def apply(self, conf: DiagConfig) -> None:
+        self.conf = conf
+        self._live_no = level_no(conf.live_level)
+        if self.ring.maxlen != conf.keep:
+            self.ring = deque(self.ring, maxlen=conf.keep)
+
+    # ---------------- приём ----------------
+    def emit(self, text: str, level: Any = "info", symbol: Optional[str] = None, source: Optional[str] = None,
+             detail: Optional[str] = None) -> None:
+        lvl = level_no(level)
+        name = _LEVEL_NAMES.get(lvl, "info")
+        self.total[name] = self.total.get(name, 0) + 1
+        now = time.time()
+        text = str(text)
+        if self._recent and now - self._last_flush >= _FLUSH_SEC:
+            self.flush()
+
+        if self.conf.dedup_sec > 0:
+            key = (lvl, symbol, text)
+            e = self._recent.get(key)
+            if e is not None:
+                if now - e["ts"] < self.conf.dedup_sec:
+                    e["count"] += 1
+                    e["last_ts"] = now
+                    self.deduped_total += 1
+                    self._arm()
+                    return
+                self._close(key, e)
+
+        self._seq += 1
+        entry: Dict[str, Any] = {"id": self._seq, "ts": now, "level": name, "text": text, "count": 1}
+        if symbol:
+            entry["symbol"] = symbol
+        if source:
+            entry["source"] = source
+        if detail:
+            entry["detail"] = detail
+        self.ring.append(entry)
+        if self.conf.dedup_sec > 0:
+            if len(self._recent) >= _MAX_RECENT:
+                self._close(*next(iter(self._recent.items())))
+            self._recent[key] = entry
+        if lvl >= self._live_no:
+            self._live(entry, now)
+
+    def emit_event(self, evt: Dict[str, Any]) -> None:
+        """diag-событие от MarketMaker'а / воркера шарда: {'type':'diag','text',...,'level','symbol','detail'}."""
+        self.emit(evt.get("text") or evt.get("msg") or "", evt.get("level") or "info", symbol=evt.get("symbol"),
+                  source=evt.get("source"), detail=evt.get("detail"))
+
+    # ---------------- публикация ----------------
+    def _payload(self, entry: Dict[str, Any], text: str) -> Dict[str, Any]:
+        out = {"type": "diag", "id": entry["id"], "ts": entry["ts"], "level": entry["level"], "text": text}
+        if "symbol" in entry:
+            out["symbol"] = entry["symbol"]
+        return out
+
+    def _live(self, entry: Dict[str, Any], now: float, text: Optional[str] = None) -> None:
+        budget = self.conf.budget_per_sec
+        if budget > 0:
+            sec = int(now)
+            if sec != self._budget_sec:
+                self._flush_held()
+                self._budget_sec = sec
+                self._budget_used = 0
+            if self._budget_used >= budget:
+                self._held += 1
+                self.held_total += 1
+                self._arm()
+                return
+            self._budget_used += 1
+        self._publish(self._payload(entry, entry["text"] if text is None else text))
+
+    def _flush_held(self) -> None:
+        if self._held:
+            n, self._held = self._held, 0
+            self._publish({"type": "diag", "level": "warning", "ts": time.time(),
+                           "text": f"DIAG: {n} messages held back by the {self.conf.budget_per_sec}/s budget "
+                                   f"(see /api/logs)"})
+
+    def _close(self, key: Tuple[int, Any, str], e: Dict[str, Any]) -> None:
+        self._recent.pop(key, None)
+        if e["count"] > 1 and level_no(e["level"]) >= self._live_no:
+            self._live(e, time.time(), f"{e['text']} (×{e['count']} in last {self.conf.dedup_sec:g}s)")
+
+    def _arm(self) -> None:
+        """Таймер flush: ставится, когда появилось что закрывать, и держится, пока оно есть."""
+        if self._timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return   # вне event loop — закроется при следующем emit/query
+        self._timer = loop.call_later(_FLUSH_SEC, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self.flush()
+        if self._held or self._recent:
+            self._arm()
+
+    def flush(self) -> None:
+        """Закрыть истёкшие окна дедупа и отдать сводку бюджета (таймер; emit/query вне event loop)."""
+        now = time.time()
+        self._last_flush = now
+        if self._recent:
+            horizon = now - self.conf.dedup_sec
+            for key, e in list(self._recent.items()):
+                if e["ts"] < horizon:
+                    self._close(key, e)
+        if self._held and int(now) != self._budget_sec:
+            self._budget_sec = int(now)
+            self._budget_used = 0
+            self._flush_held()
+
+    # ---------------- чтение ----------------
+    def query(self, limit: int = 100, before: Optional[int] = None, level: Optional[str] = None,
+              q: Optional[str] = None, symbol: Optional[str] = None, source: Optional[str] = None,
+              since: Optional[float] = None) -> Dict[str, Any]:
+        """Новые первыми; следующая страница — before=<next>."""
+        self.flush()
+        min_no = level_no(level) if level else 0
+        needle = q.lower() if q else None
+        sym = symbol.upper() if symbol else None
+        items: List[Dict[str, Any]] = []
+        more = False
+        for e in reversed(self.ring):
+            if before is not None and e["id"] >= before:
+                continue
+            if since is not None and e.get("last_ts", e["ts"]) < since:
+                continue
+            if min_no and level_no(e["level"]) < min_no:
+                continue
+            if sym is not None and str(e.get("symbol") or "").upper() != sym:
+                continue
+            if source is not None and e.get("source") != source:
+                continue
+            if needle is not None and needle not in e["text"].lower():
+                continue
+            if len(items) >= limit:
+                more = True
+                break
+            items.append(dict(e))
+        return {"items": items, "next": items[-1]["id"] if more else None}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ring": len(self.ring), "keep": self.ring.maxlen, "total": dict(self.total),
+                "deduped": self.deduped_total, "held_back": self.held_total}
+
+
+__all__ = ["DiagLog", "level_no"]
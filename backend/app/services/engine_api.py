@@ -0,0 +1,303 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class LocalEngine:
+    """
+    API движка поверх AppState в этом же процессе: dev-режим (uvicorn + бот вместе)
+    и сам процесс движка (через EngineServer эти же методы вызываются по RPC).
+    Все методы async и возвращают JSON-совместимые данные.
+    """
+
+    def __init__(self, state: Any) -> None:
+        self.state = state
+
+    # ---------------- бот ----------------
+    async def status(self, full: bool = False) -> Dict[str, Any]:
+        st = self.state.status()
+        out = st.model_dump(exclude_none=True)
+        if full:
+            out["cfg"] = self.state.cfg
+        return out
+
+    async def start(self) -> Dict[str, Any]:
+        await self.state.start_bot()
+        return await self.status()
+
+    async def stop(self) -> Dict[str, Any]:
+        await self.state.stop_bot()
+        return await self.status()
+
+    async def symbols(self) -> Dict[str, Any]:
+        st = self.state
+        owner = st.shards if st.shards is not None else st.supervisor
+        return {
+            "running": st.is_running(),
+            "configured": list(st.conf.strategy.symbols),
+            "symbols": owner.metrics() if owner is not None else {},
+        }
+
+    async def start_symbol(self, symbol: str) -> bool:
+        return self.state.start_symbol(symbol)
+
+    async def stop_symbol(self, symbol: str) -> bool:
+        return self.state.stop_symbol(symbol)
+
+    # ---------------- конфиг ----------------
+    async def get_cfg(self) -> Dict[str, Any]:
+        return {"cfg": self.state.cfg, "version": self.state.conf.version}
+
+    async def set_cfg(self, cfg: Dict[str, Any]) -> Dict[str, Any]:
+        plan = self.state.set_cfg(cfg)
+        return {"cfg": self.state.cfg, "version": self.state.conf.version, "applied": plan.as_dict()}
+
+    # ---------------- риск ----------------
+    def _risk_manager(self) -> Any:
+        self.state._ensure_risk()  # с восстановлением из снапшота
+        return self.state.risk_manager
+
+    async def risk_status(self) -> Dict[str, Any]:
+        return _safe_dump_state(self._risk_manager())
+
+    async def risk_unlock(self) -> Dict[str, Any]:
+        return _unlock(self._risk_manager())
+
+    # ---------------- история (запись — только у владельца HistoryStore) ----------------
+    def history_store(self) -> Any:
+        if getattr(self.state, "history", None) is None:
+            from .history import HistoryStore
+            self.state.history = HistoryStore.from_cfg(self.state.cfg or {})
+        return self.state.history
+
+    async def history_maintenance(self) -> Dict[str, Any]:
+        from .history_retention import HistoryMaintainer, RetentionPolicy
+        store = self.history_store()
+        m = getattr(self.state, "history_maintainer", None)
+        if m is None or m.store is not store:
+            m = HistoryMaintainer(store, RetentionPolicy.from_cfg(self.state.cfg or {}))
+        return await m.run_once()
+
+    async def history_clear(self, kind: str = "all") -> Dict[str, Any]:
+        return await self.history_store().clear(kind)
+
+    # ---------------- сканер ----------------
+    async def scan(self, cfg: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        try:
+            from .pair_scanner import scan_best_symbol
+        except ImportError as e:
+            raise RuntimeError(f"scanner unavailable: {e}") from None
+        st = self.state
+        if not st.binance or not st.binance.client:
+            raise RuntimeError("Binance client not initialized. Start the bot first.")
+        return await scan_best_symbol(cfg or st.cfg, st.binance.client)
+
+    # ---------------- метрики ----------------
+    async def metrics(self) -> str:
+        """Текст /metrics: метрики процесса + последние снимки воркеров шардов."""
+        from ..core import metrics
+        shards = self.state.shards
+        return metrics.render(shards.metric_snapshots() if shards is not None else ())
+
+    async def loop_health(self) -> Dict[str, Any]:
+        """Lag event loop и последние медленные колбэки (со стеком), очередь лога; по шардам — сводка."""
+        from ..core import logging as log_setup
+        st = self.state
+        mon = st.loop_monitor
+        out: Dict[str, Any] = mon.report() if mon is not None else {"enabled": False}
+        out["logging"] = log_setup.stats()
+        if st.shards is not None:
+            out["shards"] = st.shards.loop_summaries()
+        return out
+
+    async def traces(self) -> Dict[str, Any]:
+        """Тик → ордер: p50/p99 по стадиям, смещение часов биржи, выбросы и выборка трасс."""
+        from . import tracing
+        out = tracing.TRACER.report()
+        shards = self.state.shards
+        if shards is not None:
+            out["shard_clocks"] = shards.clocks()
+        return out
+
+    async def logs(self, limit: int = 100, before: Optional[int] = None, level: Optional[str] = None,
+                   q: Optional[str] = None, symbol: Optional[str] = None, source: Optional[str] = None,
+                   since: Optional[float] = None) -> Dict[str, Any]:
+        """Кольцо diag: новые первыми, страница — before=<next> из предыдущего ответа."""
+        diag = self.state.diag
+        out = diag.query(limit=limit, before=before, level=level, q=q, symbol=symbol, source=source, since=since)
+        out["stats"] = diag.stats()
+        return out
+
+    # ---------------- профайлер ----------------
+    async def profile(self, seconds: float = 10.0, interval_ms: float = 10.0, fmt: str = "speedscope",
+                      memory: bool = False, shard: Optional[int] = None) -> Dict[str, Any]:
+        """Сэмплирующий профиль процесса движка или воркера шарда (shard=N)."""
+        from . import profiler
+        st = self.state
+        params = {"seconds": seconds, "interval_ms": interval_ms, "fmt": fmt, "memory": memory}
+        if shard is not None:
+            if st.shards is None:
+                raise ValueError("shard profiling needs engine.mode=sharded and a running bot")
+            return await st.shards.profile(int(shard), **params)
+        return await profiler.profile(**params, name="engine",
+                                      sizes=lambda: profiler.structure_sizes(st.supervisor, ws_clients=len(st._clients)))
+
+    # ---------------- события ----------------
+    def subscribe(self, q: asyncio.Queue) -> Callable[[], None]:
+        return self.state.ws_subscribe(q)
+
+    async def hello(self) -> Dict[str, Any]:
+        """Первичный статус для нового /ws клиента."""
+        st = self.state
+        return {
+            "type": "status",
+            "running": bool(st.is_running()),
+            "equity": getattr(st, "equity", None),
+            "symbol": st.conf.strategy.symbol,
+            "cfg_version": st.conf.version,
+        }
+
+    async def ws_snapshot(self) -> Dict[str, Any]:
+        """Снапшот для нового /ws клиента: рынок по символам, открытые ордера, последние сделки, риск, статус."""
+        st = self.state
+        return st.journal.snapshot(status=await self.hello(), risk=_safe_dump_state(self._risk_manager()))
+
+    async def ws_resume(self, since: int, epoch: Optional[str] = None) -> Dict[str, Any]:
+        """Пропущенные после since сообщения (как были разосланы) или снапшот, если resume невозможен."""
+        journal = self.state.journal
+        items = journal.resume(int(since), epoch)
+        if items is None:
+            return {"ok": False, "snapshot": await self.ws_snapshot()}
+        return {"ok": True, "epoch": journal.epoch, "seq": journal.seq, "items": items}
+
+
+# методы, доступные по RPC (EngineServer вызывает только их)
+RPC_METHODS = (
+    "status", "start", "stop", "symbols", "start_symbol", "stop_symbol",
+    "get_cfg", "set_cfg", "risk_status", "risk_unlock",
+    "history_maintenance", "history_clear", "scan", "hello", "metrics",
+    "loop_health", "traces", "profile", "logs", "ws_snapshot", "ws_resume",
+)
+
+
+def _safe_dump_state(rm: Any) -> Dict[str, Any]:
+    """
+    Статус риска:
+    1) rm.dump_state(), если он есть и возвращает dict;
+    2) иначе собираем из известных полей, чтобы фронт не падал.
+    """
+    try:
+        if hasattr(rm, "dump_state"):
+            data = rm.dump_state()
+            if isinstance(data, dict):
+                return data
+    except Exception:
+        pass
+
+    now = time.time()
+    locked_until = float(getattr(rm, "_locked_until", 0.0) or 0.0)
+    cooldown_left = max(0, int(locked_until - now))
+    return {
+        "locked": bool(getattr(rm, "locked", False)) or (cooldown_left > 0),
+        "cooldown_left_sec": cooldown_left,
+        "max_drawdown_pct": getattr(rm, "max_drawdown_pct", None),
+        "min_trades_for_dd": getattr(rm, "min_trades_for_dd", None),
+        "manager": type(rm).__name__,
+    }
+
+
+def _unlock(rm: Any) -> Dict[str, Any]:
+    """Сброс всех блокировок: unlock_all(), а если его нет или он упал — вручную по гуардам."""
+    if hasattr(rm, "unlock_all"):
+        try:
+            rm.unlock_all()
+            return {"ok": True, "mode": "unlock_all()"}
+        except Exception:
+            pass
+
+    unlocked = 0
+    for g in getattr(rm, "guards", None) or []:
+        try:
+            if hasattr(g, "unlock"):
+                g.unlock()
+                unlocked += 1
+            if hasattr(g, "_locked_until"):
+                setattr(g, "_locked_until", 0.0)
+                unlocked += 1
+            if hasattr(g, "_pair_locked_until"):
+                getattr(g, "_pair_locked_until").clear()
+                unlocked += 1
+        except Exception:
+            continue
+    for attr, val in (("_locked_until", 0.0), ("locked", False)):
+        if hasattr(rm, attr):
+            try:
+                setattr(rm, attr, val)
+            except Exception:
+                pass
+    return {"ok": True, "unlocked": unlocked}
+
+
+class RemoteEngine:
+    """
+    Тот же API, но движок — отдельный процесс: вызовы уходят по RPC (EngineClient),
+    события приходят одним pub/sub потоком и раздаются локальным /ws клиентам.
+    """
+
+    def __init__(self, client: Any) -> None:
+        self.client = client
+        self._clients: Set[asyncio.Queue] = set()
+        client.on_publish = self._fanout
+
+    def _fanout(self, items) -> None:
+        for q in list(self._clients):
+            try:
+                for data in items:
+                    q.put_nowait(data)
+            except asyncio.QueueFull:
+                self._clients.discard(q)
+
+    def subscribe(self, q: asyncio.Queue) -> Callable[[], None]:
+        self._clients.add(q)
+        logger.info("WS connected (gateway). total=%d", len(self._clients))
+
+        def _unsub() -> None:
+            self._clients.discard(q)
+            logger.info("WS disconnected (gateway). total=%d", len(self._clients))
+        return _unsub
+
+    async def profile(self, seconds: float = 10.0, **kwargs: Any) -> Dict[str, Any]:
+        # профиль длится seconds — ждём ответа дольше обычного таймаута RPC
+        return await self.client.call("profile", seconds=seconds, _timeout=float(seconds) + 30.0, **kwargs)
+
+    def __getattr__(self, name: str):
+        if name not in RPC_METHODS:
+            raise AttributeError(name)
+
+        async def _call(*args: Any, **kwargs: Any) -> Any:
+            return await self.client.call(name, *args, **kwargs)
+        return _call
+
+
+# --- выбранный движок процесса (local по умолчанию) ---
+_engine: Optional[Any] = None
+
+
+def get_engine() -> Any:
+    global _engine
+    if _engine is None:
+        from .state import get_state
+        _engine = LocalEngine(get_state())
+    return _engine
+
+
+def set_engine(engine: Any) -> None:
+    global _engine
+    _engine = engine
+
+
+__all__ = ["LocalEngine", "RemoteEngine", "RPC_METHODS", "get_engine", "set_engine"]
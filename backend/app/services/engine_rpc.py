@@ -0,0 +1,235 @@
+from __future__ import annotations
+import asyncio
+import itertools
+import logging
+import os
+import tempfile
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from . import ipc
+from .engine_api import RPC_METHODS
+from .profiler import ProfilerBusy
+
+logger = logging.getLogger(__name__)
+
+# исключения, которые переносим через RPC как есть (остальные → RuntimeError)
+_ERRORS = {"ValueError": ValueError, "RuntimeError": RuntimeError, "KeyError": KeyError, "ProfilerBusy": ProfilerBusy}
+
+_PUB_QUEUE = 10_000
+_PUB_BATCH = 512
+
+
+def default_address() -> ipc.Address:
+    """Адрес без APP_ENGINE_ADDRESS: unix-сокет во временной папке ОС (TMPDIR и т.п.), иначе 127.0.0.1:8765."""
+    if ipc.unix_sockets_available():
+        return os.path.join(tempfile.gettempdir(), "amadeus-engine.sock")
+    return ("127.0.0.1", 8765)
+
+
+def parse_address(raw: Optional[str]) -> ipc.Address:
+    """'unix:/path.sock' | '/path.sock' | 'tcp://host:port' | 'host:port'; пусто — default_address()."""
+    if not raw:
+        return default_address()
+    raw = raw.strip()
+    if raw.startswith("unix:"):
+        return raw[5:]
+    if raw.startswith("tcp://"):
+        raw = raw[6:]
+    elif raw.startswith("/"):
+        return raw
+    host, _, port = raw.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+class EngineServer:
+    """
+    RPC + pub/sub движка. Клиент (gateway) шлёт {"op":"call",...} и {"op":"subscribe"};
+    ответы и события идут пачками по тому же соединению. Подписчик — обычная очередь
+    AppState, как у /ws, поэтому движок не знает, сколько за gateway'ем UI-клиентов.
+    """
+
+    def __init__(self, engine: Any, address: ipc.Address) -> None:
+        self.engine = engine
+        self.address = address
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._conns: Set[asyncio.Task] = set()
+        self.calls_total = 0
+
+    async def start(self) -> ipc.Address:
+        self._server, self.address = await ipc.start_server(self.address, self._on_client)
+        logger.info("engine RPC listening on %s", self.address)
+        return self.address
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for t in list(self._conns):
+            t.cancel()
+        if isinstance(self.address, str):
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
+
+    async def _on_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        me = asyncio.current_task()
+        if me is not None:
+            self._conns.add(me)
+        out = ipc.BatchWriter(writer, flush_ms=5.0)
+        out.start()
+        pump: Optional[asyncio.Task] = None
+        try:
+            while True:
+                for msg in await ipc.read_frame(reader):
+                    op = msg.get("op")
+                    if op == "call":
+                        asyncio.create_task(self._call(out, msg))
+                    elif op == "subscribe" and pump is None:
+                        pump = asyncio.create_task(self._pump(out))
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            if pump is not None:
+                pump.cancel()
+            await out.close()
+            if me is not None:
+                self._conns.discard(me)
+
+    async def _call(self, out: ipc.BatchWriter, msg: Dict[str, Any]) -> None:
+        self.calls_total += 1
+        rid = msg.get("id")
+        method = str(msg.get("method") or "")
+        try:
+            if method not in RPC_METHODS:
+                raise RuntimeError(f"unknown method: {method}")
+            result = await getattr(self.engine, method)(*(msg.get("args") or []), **(msg.get("kwargs") or {}))
+            reply = {"op": "result", "id": rid, "result": result}
+        except Exception as e:
+            if not isinstance(e, tuple(_ERRORS.values())):
+                logger.exception("engine RPC %s failed", method)
+            reply = {"op": "error", "id": rid, "type": type(e).__name__, "message": str(e)}
+        # ответ — сразу, не дожидаясь пачки событий (иначе +flush_ms к каждому вызову)
+        try:
+            await out.send_now(reply)
+        except ConnectionError:
+            pass
+
+    async def _pump(self, out: ipc.BatchWriter) -> None:
+        """Поток событий AppState → gateway; если нас выкинули за переполнение — подписываемся заново."""
+        while True:
+            q: asyncio.Queue = asyncio.Queue(maxsize=_PUB_QUEUE)
+            unsub = self.engine.subscribe(q)
+            try:
+                while True:
+                    try:
+                        first = await asyncio.wait_for(q.get(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        if q not in getattr(self.engine.state, "_clients", (q,)):
+                            break
+                        continue
+                    items: List[str] = [first]
+                    while len(items) < _PUB_BATCH and not q.empty():
+                        items.append(q.get_nowait())
+                    out.put({"op": "pub", "items": items})
+            finally:
+                unsub()
+            out.put({"op": "pub", "items": ['{"type":"diag","text":"gateway: event stream overflow, resubscribed"}']})
+
+
+class EngineClient:
+    """Соединение gateway → движок: call() с ответом по id, события — в on_publish(items)."""
+
+    def __init__(self, address: ipc.Address, timeout: float = 10.0, reconnect_delay: float = 1.0) -> None:
+        self.address = address
+        self.timeout = float(timeout)
+        self.reconnect_delay = float(reconnect_delay)
+        self.on_publish: Callable[[List[str]], None] = lambda items: None
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connected = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        warned = False
+        while True:
+            try:
+                reader, writer = await ipc.connect(self.address)
+            except OSError as e:
+                if not warned:
+                    logger.warning("engine %s unreachable (%s), retrying", self.address, e)
+                    warned = True
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+            warned = False
+            self._writer = writer
+            writer.write(ipc.encode_frame([{"op": "subscribe"}]))
+            self._connected.set()
+            logger.info("connected to engine %s", self.address)
+            try:
+                while True:
+                    for msg in await ipc.read_frame(reader):
+                        self._dispatch(msg)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                logger.warning("engine connection lost")
+            finally:
+                self._connected.clear()
+                self._writer = None
+                for fut in self._pending.values():
+                    if not fut.done():
+                        fut.set_exception(ConnectionError("engine connection lost"))
+                self._pending.clear()
+                try:
+                    writer.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _dispatch(self, msg: Dict[str, Any]) -> None:
+        op = msg.get("op")
+        if op == "pub":
+            self.on_publish(msg.get("items") or [])
+            return
+        fut = self._pending.pop(msg.get("id"), None)
+        if fut is None or fut.done():
+            return
+        if op == "result":
+            fut.set_result(msg.get("result"))
+        else:
+            exc = _ERRORS.get(str(msg.get("type")), RuntimeError)
+            fut.set_exception(exc(msg.get("message") or "engine error"))
+
+    async def call(self, method: str, *args: Any, _timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """Вызов метода движка; _timeout — для долгих вызовов (профиль), иначе self.timeout."""
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionError(f"engine {self.address} not connected") from None
+        rid = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[rid] = fut
+        self._writer.write(ipc.encode_frame([{"op": "call", "id": rid, "method": method,
+                                              "args": list(args), "kwargs": kwargs}]))
+        try:
+            return await asyncio.wait_for(fut, timeout=_timeout or self.timeout)
+        finally:
+            self._pending.pop(rid, None)
@@ -0,0 +1,605 @@
+"""
+Офлайн-биржа для нагрузочных прогонов: имитация Binance Spot на localhost.
+
+REST: /api/v3/ping, /time, /exchangeInfo, /ticker/24hr, /ticker/bookTicker, /klines.
+WS:   /ws/<stream>[/<stream>...] — голые кадры; /stream?streams=a/b — combined {"stream","data"};
+      SUBSCRIBE / UNSUBSCRIBE / LIST_SUBSCRIPTIONS по живому соединению, как у Binance.
+Потоки: <sym>@bookTicker, !bookTicker, <sym>@aggTrade, <sym>@depth[5|10|20][@100ms].
+
+Данные — синтетические (случайное блуждание mid, спред в тиках, сделки) с частотой `rate` обновлений
+bookTicker в секунду на символ, либо запись (services/recording.py) в темпе оригинала × `speed`.
+Бот направляется сюда через api.rest_base / api.ws_base. Каждое сообщение сериализуется один раз
+на поток; очередь клиента ограничена — переполнение считается в dropped, а не копится в памяти.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from fastapi import FastAPI, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+QUOTES = ("USDT", "FDUSD", "USDC", "BUSD", "BTC", "ETH", "BNB")
+DEPTH_LEVELS = (5, 10, 20)
+KLINE_HISTORY = 1500            # минутных баров в памяти: хватает на /klines?limit=1000 и 24h-тикер
+DAY_QUOTE_VOLUME = 50_000_000.0  # суточный оборот в котируемой валюте — проходит фильтры сканера
+_PRICES = {"BTCUSDT": 65000.0, "ETHUSDT": 3000.0, "BNBUSDT": 600.0, "SOLUSDT": 150.0, "XRPUSDT": 0.5}
+_INTERVALS = {"1m": 1, "3m": 3, "5m": 5, "15m": 15, "30m": 30, "1h": 60, "2h": 120, "4h": 240, "1d": 1440}
+
+
+def _split_symbol(sym: str) -> tuple[str, str]:
+    for q in QUOTES:
+        if sym.endswith(q) and len(sym) > len(q):
+            return sym[: -len(q)], q
+    return sym, ""
+
+
+class SymbolSim:
+    """Состояние одного символа: лучшие цены, минутные бары, id сделок/обновлений."""
+
+    def __init__(self, symbol: str, price: float, rnd: random.Random, rate: float, trade_ratio: float = 0.3,
+                 vol_bps_sec: float = 1.0, now_ms: Optional[int] = None) -> None:
+        self.symbol = symbol
+        self.stream = symbol.lower()
+        self.base, self.quote = _split_symbol(symbol)
+        e = math.floor(math.log10(price))
+        self.tick = 10.0 ** max(-8, e - 4)
+        self.step = 10.0 ** -min(8, max(0, e + 1))
+        self._pdec = max(0, -round(math.log10(self.tick)))
+        self._qdec = max(0, -round(math.log10(self.step)))
+        self.rnd = rnd
+        self.sigma = vol_bps_sec * 1e-4 / math.sqrt(max(rate, 1e-9))
+        self.mid = price
+        self.bid = self.ask = price
+        self.bid_qty = self.ask_qty = 1.0
+        self.update_id = 1
+        self.trade_id = 1
+        # размер сделки — так, чтобы суточный оборот не зависел от частоты генерации
+        self.mean_trade_qty = DAY_QUOTE_VOLUME / 86400.0 / max(rate * trade_ratio, 1e-9) / price
+        self._quote_book(spread_ticks=1)
+        self.bars: deque = deque(maxlen=KLINE_HISTORY)  # [open_ms, o, h, l, c, vol, quote_vol, trades]
+        self._seed_bars(now_ms if now_ms is not None else int(time.time() * 1000), vol_bps_sec)
+
+    def _seed_bars(self, now_ms: int, vol_bps_sec: float) -> None:
+        # история назад от текущей цены: те же бары отдаёт /klines, по ним же считается 24h-тикер
+        start = now_ms - now_ms % 60_000
+        sig = vol_bps_sec * 1e-4 * math.sqrt(60.0)
+        vol = DAY_QUOTE_VOLUME / 1440.0 / self.mid
+        close = self.mid
+        bars = []
+        for i in range(KLINE_HISTORY):
+            open_ = close * math.exp(-self.rnd.gauss(0.0, sig))
+            hi = max(open_, close) * (1 + abs(self.rnd.gauss(0.0, sig / 2)))
+            lo = min(open_, close) * (1 - abs(self.rnd.gauss(0.0, sig / 2)))
+            v = vol * (0.5 + self.rnd.random())
+            bars.append([start - i * 60_000, open_, hi, lo, close, v, v * close, 60])
+            close = open_
+        bars.reverse()
+        bars[-1][5] = bars[-1][6] = bars[-1][7] = 0  # текущий бар копится живыми сделками
+        bars[-1][1] = bars[-1][2] = bars[-1][3] = bars[-1][4] = self.mid
+        self.bars.extend(bars)
+
+    # ---------------- цены ----------------
+    def px(self, x: float) -> str:
+        return f"{x:.{self._pdec}f}"
+
+    def qty(self, x: float) -> str:
+        return f"{x:.{self._qdec}f}"
+
+    def _quote_book(self, spread_ticks: int) -> None:
+        t = self.tick
+        self.bid = max(t, math.floor((self.mid - spread_ticks * t / 2) / t) * t)
+        self.ask = self.bid + spread_ticks * t
+
+    def _bar(self, ts_ms: int) -> list:
+        bar = self.bars[-1]
+        open_ms = ts_ms - ts_ms % 60_000
+        if open_ms > bar[0]:
+            c = bar[4]
+            bar = [open_ms, c, c, c, c, 0.0, 0.0, 0]
+            self.bars.append(bar)
+        return bar
+
+    def step_book(self, ts_ms: int) -> Dict[str, Any]:
+        rnd = self.rnd
+        self.mid *= math.exp(rnd.gauss(0.0, self.sigma))
+        self._quote_book(spread_ticks=1 + int(rnd.random() * rnd.random() * 5))
+        self.bid_qty = self.mean_trade_qty * (1 + 20 * rnd.random())
+        self.ask_qty = self.mean_trade_qty * (1 + 20 * rnd.random())
+        bar = self._bar(ts_ms)
+        if self.mid > bar[2]:
+            bar[2] = self.mid
+        if self.mid < bar[3]:
+            bar[3] = self.mid
+        bar[4] = self.mid
+        return self.book_ticker()
+
+    def observe_book(self, data: Dict[str, Any], ts_ms: int) -> None:
+        """Реплей: состояние для REST берётся из проигранного bookTicker."""
+        try:
+            self.bid, self.ask = float(data["b"]), float(data["a"])
+            self.bid_qty, self.ask_qty = float(data.get("B") or 0), float(data.get("A") or 0)
+        except (KeyError, TypeError, ValueError):
+            return
+        self.mid = (self.bid + self.ask) / 2
+        self.update_id = int(data.get("u") or self.update_id)
+        bar = self._bar(ts_ms)
+        bar[2], bar[3], bar[4] = max(bar[2], self.mid), min(bar[3], self.mid), self.mid
+
+    def observe_trade(self, data: Dict[str, Any], ts_ms: int) -> None:
+        try:
+            p, q = float(data["p"]), float(data["q"])
+        except (KeyError, TypeError, ValueError):
+            return
+        bar = self._bar(ts_ms)
+        bar[5] += q
+        bar[6] += p * q
+        bar[7] += 1
+
+    def book_ticker(self) -> Dict[str, Any]:
+        self.update_id += 1
+        return {"u": self.update_id, "s": self.symbol, "b": self.px(self.bid), "B": self.qty(self.bid_qty),
+                "a": self.px(self.ask), "A": self.qty(self.ask_qty)}
+
+    def trade(self, ts_ms: int) -> Dict[str, Any]:
+        rnd = self.rnd
+        buyer_maker = rnd.random() < 0.5
+        p = self.bid if buyer_maker else self.ask
+        q = max(self.step, round(rnd.expovariate(1.0) * self.mean_trade_qty / self.step) * self.step)
+        tid = self.trade_id
+        self.trade_id += 1
+        data = {"e": "aggTrade", "E": ts_ms, "s": self.symbol, "a": tid, "p": self.px(p), "q": self.qty(q),
+                "f": tid, "l": tid, "T": ts_ms, "m": buyer_maker, "M": True}
+        self.observe_trade(data, ts_ms)
+        return data
+
+    def levels(self, n: int) -> tuple[list, list]:
+        t = self.tick
+        q = self.mean_trade_qty
+        bids = [[self.px(self.bid - i * t), self.qty(q * (1 + i) * (1 + self.rnd.random()))] for i in range(n)]
+        asks = [[self.px(self.ask + i * t), self.qty(q * (1 + i) * (1 + self.rnd.random()))] for i in range(n)]
+        return bids, asks
+
+    def depth_partial(self, n: int) -> Dict[str, Any]:
+        bids, asks = self.levels(n)
+        return {"lastUpdateId": self.update_id, "bids": bids, "asks": asks}
+
+    def depth_diff(self, ts_ms: int, first_id: int) -> Dict[str, Any]:
+        bids, asks = self.levels(DEPTH_LEVELS[-1])
+        return {"e": "depthUpdate", "E": ts_ms, "s": self.symbol, "U": first_id, "u": self.update_id,
+                "b": bids, "a": asks}
+
+    # ---------------- REST-представления ----------------
+    def exchange_info(self) -> Dict[str, Any]:
+        return {
+            "symbol": self.symbol, "status": "TRADING", "baseAsset": self.base, "quoteAsset": self.quote,
+            "baseAssetPrecision": 8, "quotePrecision": 8, "isSpotTradingAllowed": True,
+            "orderTypes": ["LIMIT", "LIMIT_MAKER", "MARKET"],
+            "filters": [
+                {"filterType": "PRICE_FILTER", "minPrice": self.px(self.tick), "maxPrice": "1000000.00000000",
+                 "tickSize": self.px(self.tick)},
+                {"filterType": "LOT_SIZE", "minQty": self.qty(self.step), "maxQty": "9000000.00000000",
+                 "stepSize": self.qty(self.step)},
+                {"filterType": "MIN_NOTIONAL", "minNotional": "5.00000000", "applyToMarket": True},
+            ],
+        }
+
+    def ticker_24h(self, now_ms: int) -> Dict[str, Any]:
+        bars = list(self.bars)[-1440:]
+        o = bars[0][1]
+        hi = max(b[2] for b in bars)
+        lo = min(b[3] for b in bars)
+        vol = sum(b[5] for b in bars)
+        qvol = sum(b[6] for b in bars)
+        last = self.mid
+        return {
+            "symbol": self.symbol, "priceChange": self.px(last - o),
+            "priceChangePercent": f"{(last - o) / o * 100:.3f}", "weightedAvgPrice": self.px(qvol / vol if vol else last),
+            "lastPrice": self.px(last), "bidPrice": self.px(self.bid), "bidQty": self.qty(self.bid_qty),
+            "askPrice": self.px(self.ask), "askQty": self.qty(self.ask_qty), "openPrice": self.px(o),
+            "highPrice": self.px(hi), "lowPrice": self.px(lo), "volume": f"{vol:.8f}", "quoteVolume": f"{qvol:.8f}",
+            "openTime": now_ms - 86_400_000, "closeTime": now_ms, "count": int(sum(b[7] for b in bars)),
+        }
+
+    def book_ticker_rest(self) -> Dict[str, Any]:
+        return {"symbol": self.symbol, "bidPrice": self.px(self.bid), "bidQty": self.qty(self.bid_qty),
+                "askPrice": self.px(self.ask), "askQty": self.qty(self.ask_qty)}
+
+    def klines(self, interval: str, limit: int) -> List[list]:
+        minutes = _INTERVALS.get(interval)
+        if minutes is None:
+            raise ValueError(f"Invalid interval {interval!r}")
+        ms = minutes * 60_000
+        out: List[list] = []
+        for b in self.bars:
+            open_ms = b[0] - b[0] % ms
+            if out and out[-1][0] == open_ms:
+                k = out[-1]
+                k[2], k[3], k[4] = max(k[2], b[2]), min(k[3], b[3]), b[4]
+                k[5] += b[5]
+                k[7] += b[6]
+                k[8] += b[7]
+            else:
+                out.append([open_ms, b[1], b[2], b[3], b[4], b[5], open_ms + ms - 1, b[6], b[7]])
+        return [[k[0], self.px(k[1]), self.px(k[2]), self.px(k[3]), self.px(k[4]), f"{k[5]:.8f}", k[6],
+                 f"{k[7]:.8f}", k[8], "0", "0", "0"] for k in out[-limit:]]
+
+
+class _Conn:
+    """Одно WS-соединение: подписки и ограниченная очередь готовых кадров."""
+    __slots__ = ("combined", "streams", "queue", "dropped", "sent")
+
+    def __init__(self, combined: bool, max_queue: int) -> None:
+        self.combined = combined
+        self.streams: Set[str] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.sent = 0
+
+
+class FakeExchange:
+    def __init__(self, symbols: Sequence[str] = ("BNBUSDT",), rate: float = 20.0, trade_ratio: float = 0.3,
+                 vol_bps_sec: float = 1.0, replay: Optional[Sequence[str]] = None, speed: float = 1.0,
+                 loop: bool = False, seed: Optional[int] = None, max_queue: int = 10_000) -> None:
+        if rate <= 0 or speed <= 0:
+            raise ValueError("rate and speed must be > 0")
+        self.rate = float(rate)
+        self.trade_ratio = float(trade_ratio)
+        self.vol_bps_sec = float(vol_bps_sec)
+        self.replay = list(replay or [])
+        self.speed = float(speed)
+        self.loop = loop
+        self.max_queue = max_queue
+        self.rnd = random.Random(seed)
+        self.sims: Dict[str, SymbolSim] = {}
+        for sym in symbols:
+            self._sim(sym.upper(), _PRICES.get(sym.upper(), 100.0))
+        self._subs: Dict[str, Set[_Conn]] = {}
+        self._conns: Set[_Conn] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.started_at = 0.0
+        self.messages_total = 0     # опубликовано событий (до раздачи по соединениям)
+        self.frames_total = 0       # кадров поставлено в очереди клиентов
+        self.dropped_total = 0      # не влезло в очередь клиента
+        self.connects_total = 0
+
+    def _sim(self, symbol: str, price: float) -> SymbolSim:
+        sim = self.sims.get(symbol)
+        if sim is None:
+            sim = self.sims[symbol] = SymbolSim(symbol, price, self.rnd, self.rate, self.trade_ratio,
+                                                self.vol_bps_sec)
+        return sim
+
+    # ---------------- подписки ----------------
+    def connect(self, combined: bool, streams: Sequence[str] = ()) -> _Conn:
+        conn = _Conn(combined, self.max_queue)
+        self._conns.add(conn)
+        self.connects_total += 1
+        self.subscribe(conn, streams)
+        return conn
+
+    def disconnect(self, conn: _Conn) -> None:
+        self.unsubscribe(conn, list(conn.streams))
+        self._conns.discard(conn)
+
+    def subscribe(self, conn: _Conn, streams: Sequence[str]) -> None:
+        for s in streams:
+            s = _normalize(s)
+            conn.streams.add(s)
+            self._subs.setdefault(s, set()).add(conn)
+
+    def unsubscribe(self, conn: _Conn, streams: Sequence[str]) -> None:
+        for s in streams:
+            s = _normalize(s)
+            conn.streams.discard(s)
+            subs = self._subs.get(s)
+            if subs is not None:
+                subs.discard(conn)
+                if not subs:
+                    del self._subs[s]
+
+    def control(self, conn: _Conn, raw: str) -> Optional[str]:
+        """SUBSCRIBE/UNSUBSCRIBE/LIST_SUBSCRIPTIONS → ответ {"result", "id"} (или ошибка, как у Binance)."""
+        try:
+            msg = json.loads(raw)
+            method = msg["method"]
+            params = msg.get("params") or []
+        except (ValueError, KeyError, TypeError):
+            return json.dumps({"error": {"code": 2, "msg": "Invalid request"}, "id": None})
+        result: Any = None
+        if method == "SUBSCRIBE":
+            self.subscribe(conn, params)
+        elif method == "UNSUBSCRIBE":
+            self.unsubscribe(conn, params)
+        elif method == "LIST_SUBSCRIPTIONS":
+            result = sorted(conn.streams)
+        else:
+            return json.dumps({"error": {"code": 1, "msg": f"Unknown method {method!r}"}, "id": msg.get("id")})
+        return json.dumps({"result": result, "id": msg.get("id")})
+
+    def publish(self, stream: str, data: Dict[str, Any]) -> None:
+        subs = self._subs.get(stream)
+        if not subs:
+            return
+        self.messages_total += 1
+        raw = comb = None
+        for c in subs:
+            if c.combined:
+                if comb is None:
+                    comb = json.dumps({"stream": stream, "data": data}, separators=(",", ":"))
+                frame = comb
+            else:
+                if raw is None:
+                    raw = json.dumps(data, separators=(",", ":"))
+                frame = raw
+            try:
+                c.queue.put_nowait(frame)
+                self.frames_total += 1
+            except asyncio.QueueFull:
+                c.dropped += 1
+                self.dropped_total += 1
+
+    def _publish_book(self, sim: SymbolSim, data: Dict[str, Any]) -> None:
+        self.publish(f"{sim.stream}@bookTicker", data)
+        self.publish("!bookTicker", data)
+
+    def _publish_depth(self, sim: SymbolSim, ts_ms: int, fast: bool, first_id: Dict[str, int]) -> None:
+        sfx = "@100ms" if fast else ""
+        subs = self._subs
+        name = f"{sim.stream}@depth{sfx}"
+        if name in subs:
+            self.publish(name, sim.depth_diff(ts_ms, first_id.get(name, sim.update_id)))
+            first_id[name] = sim.update_id + 1
+        for n in DEPTH_LEVELS:
+            name = f"{sim.stream}@depth{n}{sfx}"
+            if name in subs:
+                self.publish(name, sim.depth_partial(n))
+
+    # ---------------- генерация ----------------
+    async def _run_synthetic(self) -> None:
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        period = 1.0 / self.rate
+        emitted = 0
+        next_fast = next_slow = t0
+        first_id: Dict[str, int] = {}
+        sims = list(self.sims.values())
+        while True:
+            await asyncio.sleep(max(0.001, period))
+            now = loop.time()
+            due = int((now - t0) * self.rate) - emitted
+            if due > self.rate:     # цикл не успевает: пропускаем отставание, а не догоняем пачкой
+                emitted += due - int(self.rate)
+                due = int(self.rate)
+            ts_ms = int(time.time() * 1000)
+            rnd = self.rnd
+            for _ in range(due):
+                for sim in sims:
+                    self._publish_book(sim, sim.step_book(ts_ms))
+                    if rnd.random() < self.trade_ratio:
+                        self.publish(f"{sim.stream}@aggTrade", sim.trade(ts_ms))
+            emitted += due
+            if now >= next_fast:
+                next_fast = now + 0.1
+                slow = now >= next_slow
+                if slow:
+                    next_slow = now + 1.0
+                for sim in sims:
+                    self._publish_depth(sim, ts_ms, True, first_id)
+                    if slow:
+                        self._publish_depth(sim, ts_ms, False, first_id)
+
+    async def _run_replay(self) -> None:
+        from .recording import merge_records
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = rec_t0 = None
+            for rec in merge_records(self.replay):
+                ts = int(rec["ts"])
+                if t0 is None:
+                    t0, rec_t0 = loop.time(), ts
+                delay = t0 + (ts - rec_t0) / 1000.0 / self.speed - loop.time()
+                if delay > 0.001:
+                    await asyncio.sleep(delay)
+                self._replay_record(rec, int(time.time() * 1000))
+            if not self.loop:
+                logger.info("fake exchange: replay finished")
+                return
+            await asyncio.sleep(0)
+
+    def _replay_record(self, rec: Dict[str, Any], now_ms: int) -> None:
+        data, kind = rec["data"], rec["stream"]
+        sym = str(rec.get("symbol") or data.get("s") or "").upper()
+        if not sym:
+            return
+        if kind == "bookTicker":
+            sim = self.sims.get(sym)
+            if sim is None:
+                try:
+                    sim = self._sim(sym, (float(data["b"]) + float(data["a"])) / 2)
+                except (KeyError, TypeError, ValueError):
+                    return
+            sim.observe_book(data, now_ms)
+            self._publish_book(sim, data)
+            return
+        sim = self.sims.get(sym)
+        if sim is None:
+            return  # до первого bookTicker символ неизвестен
+        if kind == "aggTrade":
+            sim.observe_trade(data, now_ms)
+            self.publish(f"{sim.stream}@aggTrade", data)
+        elif kind == "depth":
+            if data.get("e") == "depthUpdate":
+                for sfx in ("", "@100ms"):
+                    self.publish(f"{sim.stream}@depth{sfx}", data)
+            else:
+                for n in DEPTH_LEVELS:
+                    part = {"lastUpdateId": data.get("lastUpdateId"), "bids": (data.get("bids") or [])[:n],
+                            "asks": (data.get("asks") or [])[:n]}
+                    for sfx in ("", "@100ms"):
+                        self.publish(f"{sim.stream}@depth{n}{sfx}", part)
+
+    # ---------------- жизненный цикл ----------------
+    def start(self) -> None:
+        if self._task is None:
+            self.started_at = time.time()
+            run = self._run_replay() if self.replay else self._run_synthetic()
+            self._task = asyncio.create_task(run)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        up = max(1e-9, time.time() - self.started_at) if self.started_at else 0.0
+        return {
+            "mode": "replay" if self.replay else "synthetic",
+            "symbols": sorted(self.sims),
+            "rate": self.rate if not self.replay else None,
+            "speed": self.speed if self.replay else None,
+            "uptime_sec": round(up, 3),
+            "connections": len(self._conns),
+            "connects_total": self.connects_total,
+            "streams": {s: len(c) for s, c in sorted(self._subs.items())},
+            "messages_total": self.messages_total,
+            "messages_per_sec": round(self.messages_total / up, 1) if up else 0.0,
+            "frames_total": self.frames_total,
+            "dropped_total": self.dropped_total,
+            "queued": sum(c.queue.qsize() for c in self._conns),
+        }
+
+
+def _normalize(stream: str) -> str:
+    # символ — в нижнем регистре, имя потока как есть (bookTicker/aggTrade чувствительны к регистру)
+    sym, sep, rest = str(stream).partition("@")
+    return f"{sym.lower()}{sep}{rest}"
+
+
+def create_app(ex: FakeExchange) -> FastAPI:
+    """FastAPI-приложение поверх FakeExchange; генерация стартует вместе с сервером."""
+    @asynccontextmanager
+    async def lifespan(_app):
+        ex.start()
+        try:
+            yield
+        finally:
+            await ex.stop()
+
+    app = FastAPI(title="Fake Binance", lifespan=lifespan)
+
+    def _err(code: int, msg: str, status: int = 400) -> JSONResponse:
+        return JSONResponse({"code": code, "msg": msg}, status_code=status)
+
+    def _pick(symbol: Optional[str], symbols: Optional[str]):
+        if symbol:
+            sim = ex.sims.get(symbol.upper())
+            return [sim] if sim else None
+        if symbols:
+            try:
+                names = json.loads(symbols)
+            except ValueError:
+                return None
+            sims = [ex.sims.get(str(s).upper()) for s in names]
+            return None if None in sims else sims
+        return list(ex.sims.values())
+
+    @app.get("/api/v3/ping")
+    async def ping():
+        return {}
+
+    @app.get("/api/v3/time")
+    async def server_time():
+        return {"serverTime": int(time.time() * 1000)}
+
+    @app.get("/api/v3/exchangeInfo")
+    async def exchange_info(symbol: Optional[str] = None, symbols: Optional[str] = None):
+        sims = _pick(symbol, symbols)
+        if sims is None:
+            return _err(-1121, "Invalid symbol.")
+        return {"timezone": "UTC", "serverTime": int(time.time() * 1000), "rateLimits": [],
+                "symbols": [s.exchange_info() for s in sims]}
+
+    @app.get("/api/v3/ticker/24hr")
+    async def ticker_24h(symbol: Optional[str] = None, symbols: Optional[str] = None):
+        sims = _pick(symbol, symbols)
+        if sims is None:
+            return _err(-1121, "Invalid symbol.")
+        now = int(time.time() * 1000)
+        out = [s.ticker_24h(now) for s in sims]
+        return out[0] if symbol else out
+
+    @app.get("/api/v3/ticker/bookTicker")
+    async def book_ticker(symbol: Optional[str] = None, symbols: Optional[str] = None):
+        sims = _pick(symbol, symbols)
+        if sims is None:
+            return _err(-1121, "Invalid symbol.")
+        out = [s.book_ticker_rest() for s in sims]
+        return out[0] if symbol else out
+
+    @app.get("/api/v3/klines")
+    async def klines(symbol: str, interval: str, limit: int = Query(500, ge=1, le=1000)):
+        sim = ex.sims.get(symbol.upper())
+        if sim is None:
+            return _err(-1121, "Invalid symbol.")
+        try:
+            return sim.klines(interval, limit)
+        except ValueError as e:
+            return _err(-1120, str(e))
+
+    @app.get("/fake/stats")
+    async def fake_stats():
+        return ex.stats()
+
+    async def _serve(ws: WebSocket, combined: bool, streams: List[str]) -> None:
+        await ws.accept()
+        conn = ex.connect(combined, streams)
+
+        async def _sender() -> None:
+            q = conn.queue
+            while True:
+                frame = await q.get()
+                await ws.send_text(frame)
+                conn.sent += 1
+
+        sender = asyncio.create_task(_sender())
+        try:
+            while True:
+                reply = ex.control(conn, await ws.receive_text())
+                if reply is not None:
+                    await ws.send_text(reply)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sender.cancel()
+            ex.disconnect(conn)
+
+    @app.websocket("/ws")
+    async def ws_bare(ws: WebSocket):
+        await _serve(ws, False, [])
+
+    @app.websocket("/ws/{streams:path}")
+    async def ws_raw(ws: WebSocket, streams: str):
+        await _serve(ws, False, [s for s in streams.split("/") if s])
+
+    @app.websocket("/stream")
+    async def ws_combined(ws: WebSocket):
+        raw = ws.query_params.get("streams") or ""
+        await _serve(ws, True, [s for s in raw.split("/") if s])
+
+    return app
+
+
+__all__ = ["FakeExchange", "SymbolSim", "create_app"]
@@ -0,0 +1,328 @@
+"""
+Векторный симулятор котирования для быстрого отсева параметров (нужен numpy).
+
+Моделирует ту же логику, что и MarketMaker в реплее, но массивами по всей записи bookTicker:
+- шаги стратегии — сетка t0 + k*loop_sleep, на шаге видны тики строго раньше шага (как в ReplayEngine);
+- переустановка раз в max(0.3, reorder_interval): цены по краям спреда или mid ± offset (_reseed_quotes);
+- ордер, стоящий по той же цене, не трогается; иначе отмена и новый;
+- исполнение касанием по цене ордера (_try_fill_by_touch), затем отмена по cancel_timeout.
+
+Проверки касания и поиск первого филла — векторно по всем шагам; линейный проход остаётся
+только по моментам переустановки (их в loop_sleep/reorder_interval раз меньше, чем шагов).
+Риск на стратегию в реплее не влияет и здесь не моделируется.
+Стоп по позиции (strategy.stop_loss_pct) не моделируется: simulate() с ним — ValueError.
+Сверка с событийным движком: python -m benchmarks.fastsim.
+"""
+from __future__ import annotations
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # необязательная зависимость: без неё работает только событийный реплей
+    np = None
+
+from ..core.config_schema import StrategyConfig
+from .ledger import PositionLedger
+from .recording import merge_records
+
+_PRICE_STEP = 1e-2  # как MarketMaker._price_step / _qty_step
+_QTY_STEP = 1e-6
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("numpy is required for the vectorized simulator (pip install numpy)")
+
+
+@dataclass
+class BookSeries:
+    """bookTicker одного символа: время приёма (с), лучшие bid/ask."""
+    symbol: str
+    ts: Any
+    bid: Any
+    ask: Any
+
+
+@dataclass
+class MarketData:
+    """Серии по символам + общий отрезок записи (t0/t_end — по всем потокам, как у ReplayEngine)."""
+    series: Dict[str, BookSeries]
+    t0: float
+    t_end: float
+
+
+def load_market(paths: Iterable[str], symbols: Optional[Iterable[str]] = None,
+                start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> MarketData:
+    """Один проход по записям → массивы; дальше любое число симуляций без парсинга."""
+    _require_numpy()
+    want = {s.upper() for s in symbols} if symbols else None
+    cols: Dict[str, Tuple[List[float], List[float], List[float]]] = {}
+    t0: Optional[float] = None
+    t_end = 0.0
+    for rec in merge_records(paths, start_ms, end_ms):
+        t = float(rec["ts"]) / 1000.0
+        if t0 is None:
+            t0 = t
+        t_end = t
+        if rec.get("stream") != "bookTicker":
+            continue
+        sym = str(rec.get("symbol") or "").upper()
+        if want is not None and sym not in want:
+            continue
+        data = rec.get("data") or {}
+        try:
+            b, a = float(data["b"]), float(data["a"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        c = cols.get(sym)
+        if c is None:
+            c = cols[sym] = ([], [], [])
+        c[0].append(t)
+        c[1].append(b)
+        c[2].append(a)
+    series = {sym: BookSeries(sym, np.asarray(c[0]), np.asarray(c[1]), np.asarray(c[2])) for sym, c in cols.items()}
+    return MarketData(series, t0 if t0 is not None else 0.0, t_end)
+
+
+@dataclass
+class SymbolResult:
+    symbol: str
+    fills: Any                  # структурный массив: step, ts, side (+1 BUY / -1 SELL), price, qty, fee
+    orders: int
+    cancels: int
+    step_ts: Any                # время шагов (с)
+    inventory: Any              # позиция после каждого шага
+    cash_delta: Any             # изменение кэша после каждого шага (с комиссиями)
+    mark: Any                   # mid на каждом шаге
+    final_mark: Optional[float]
+    realized: float = 0.0       # gross realized PnL по филлам (учёт ledger.method, как в реплее)
+
+    @property
+    def pnl(self) -> Any:
+        """Кривая mark-to-market PnL по шагам (за вычетом комиссий)."""
+        return self.cash_delta + self.inventory * self.mark
+
+    def final_pnl(self) -> float:
+        if not len(self.step_ts):
+            return 0.0
+        mark = self.final_mark if self.final_mark is not None else float(self.mark[-1])
+        return float(self.cash_delta[-1] + self.inventory[-1] * mark)
+
+
+@dataclass
+class SimResult:
+    symbols: Dict[str, SymbolResult] = field(default_factory=dict)
+    start_cash: float = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        fills = sum(len(r.fills) for r in self.symbols.values())
+        orders = sum(r.orders for r in self.symbols.values())
+        cancels = sum(r.cancels for r in self.symbols.values())
+        fees = sum(float(r.fills["fee"].sum()) for r in self.symbols.values())
+        volume = sum(float((r.fills["price"] * r.fills["qty"]).sum()) for r in self.symbols.values())
+        pnl = sum(r.final_pnl() for r in self.symbols.values())
+        return {
+            "pnl": round(pnl, 8),
+            "realized": round(sum(r.realized for r in self.symbols.values()), 8),
+            "fees": round(fees, 8),
+            "equity": round(self.start_cash + pnl, 8),
+            "max_drawdown": round(self.max_drawdown(), 6),
+            "fills": fills,
+            "orders": orders,
+            "messages": orders + cancels,
+            "volume": round(volume, 8),
+            "symbols": {s: {"fills": len(r.fills), "orders": r.orders, "cancels": r.cancels,
+                            "position": float(r.inventory[-1]) if len(r.inventory) else 0.0,
+                            "pnl": round(r.final_pnl(), 8)} for s, r in self.symbols.items()},
+        }
+
+    def equity_curve(self) -> Tuple[Any, Any]:
+        """(время, equity) по объединённой сетке шагов всех символов."""
+        _require_numpy()
+        res = [r for r in self.symbols.values() if len(r.step_ts)]
+        if not res:
+            return np.empty(0), np.empty(0)
+        ts = np.unique(np.concatenate([r.step_ts for r in res]))
+        eq = np.full(len(ts), self.start_cash)
+        for r in res:
+            i = np.searchsorted(r.step_ts, ts, side="right") - 1
+            ok = i >= 0
+            eq[ok] += r.pnl[i[ok]]
+        return ts, eq
+
+    def max_drawdown(self) -> float:
+        _, eq = self.equity_curve()
+        if not len(eq):
+            return 0.0
+        peak = np.maximum.accumulate(eq)
+        dd = np.where(peak > 0, (peak - eq) / np.where(peak > 0, peak, 1.0), 0.0)
+        return float(dd.max())
+
+
+def _round_down(x: Any, step: float) -> Any:
+    return np.floor(x / step) * step
+
+
+def _reseed_lattice(g: List[float], first: int, period: float, step: float) -> List[int]:
+    """Шаги переустановки: первый шаг с котировками, затем первый шаг с now - last >= period."""
+    n = len(g)
+    m = max(1, int(math.ceil(period / step)))
+    out: List[int] = []
+    k = first
+    while k < n:
+        out.append(k)
+        last = g[k]
+        j = k + m
+        while j - 1 > k and j - 1 < n and g[j - 1] - last >= period:
+            j -= 1
+        while j < n and g[j] - last < period:
+            j += 1
+        k = j
+    return out
+
+
+def _quotes(bid: Any, ask: Any, p: StrategyConfig) -> Tuple[Any, Any, Any, Any]:
+    """MarketMaker._reseed_quotes массивами: цены и количества BUY/SELL на моментах переустановки."""
+    mid = 0.5 * (bid + ask)
+    spread_pct = np.where(mid > 0, 100.0 * (ask - bid) / np.where(mid > 0, mid, 1.0), 0.0)
+    edge = spread_pct < max(0.001, p.min_spread_pct)
+    offset = np.maximum(1, np.floor_divide(spread_pct / 2.0, 0.01).astype(np.int64)) * _PRICE_STEP
+    px_buy = np.where(edge, _round_down(bid, _PRICE_STEP), _round_down(mid - offset, _PRICE_STEP))
+    px_sell = np.where(edge, _round_down(ask, _PRICE_STEP), _round_down(mid + offset, _PRICE_STEP))
+    qty_buy = _round_down(p.quote_size / np.maximum(px_buy, 1e-9), _QTY_STEP)
+    qty_sell = _round_down(p.quote_size / np.maximum(px_sell, 1e-9), _QTY_STEP)
+    return px_buy, px_sell, qty_buy, qty_sell
+
+
+def _ffill(v: Any, qty: Any) -> Any:
+    """Параметры стоящего ордера: на переустановках с qty == 0 — от последней с qty > 0."""
+    last = np.maximum.accumulate(np.where(qty > 0, np.arange(len(qty)), 0))
+    return v[last]
+
+
+def _next_in(sorted_vals: Any, keys: Any, default: int, side: str = "left") -> Any:
+    """Для каждого ключа — первое значение sorted_vals >= ключа (> при side="right"), иначе default."""
+    if not len(sorted_vals):
+        return np.full(len(keys), default)
+    pos = np.searchsorted(sorted_vals, keys, side=side)
+    return np.where(pos < len(sorted_vals), sorted_vals[np.minimum(pos, len(sorted_vals) - 1)], default)
+
+
+def _side_orders(r: Any, px: Any, qty: Any, hit: Any, expiry: Any, nsteps: int) -> Tuple[Any, Any, int, int]:
+    """
+    Ордера одной стороны. Ордер, поставленный на переустановке j, живёт до первого из:
+    касания (hit — шаги с касанием цены стоящего ордера), отмены по таймауту (expiry[j]) или
+    переустановки с другой ценой. Следующий ордер — на первой переустановке после его конца,
+    т.е. next[j] считается векторно, а линейный проход идёт только по поставленным ордерам.
+    px/qty — котировки стороны на переустановках (при qty == 0 MarketMaker сторону не трогает).
+    → (номера переустановок с филлами, шаги филлов, ордеров, отмен)
+    """
+    J = len(r)
+    end = nsteps  # «после конца записи»
+    ok = qty > 0
+    px = _ffill(px, qty)
+    change = np.flatnonzero(ok[1:] & (np.abs(np.diff(px)) >= 1e-9)) + 1
+    nc = _next_in(change, np.arange(J), J, side="right")
+    rc = np.where(nc < J, r[np.minimum(nc, J - 1)], end)
+
+    f = _next_in(hit, r + 1, end)
+    e = np.minimum(expiry, end)
+    filled = (f < end) & (f <= np.minimum(e, rc))
+    expired = ~filled & (e < end) & (e <= rc)
+    nxt = np.where(filled, np.searchsorted(r, f, side="left"),
+                   np.where(expired, np.searchsorted(r, e, side="left"), nc))
+    # новый ордер — только на переустановке с qty > 0
+    valid_at = np.minimum.accumulate(np.where(np.append(ok, True), np.arange(J + 1), J)[::-1])[::-1]
+    nxt = valid_at[np.minimum(nxt, J)]
+
+    chain: List[int] = []
+    nxt_l = nxt.tolist()
+    j = int(valid_at[0])
+    while j < J:
+        chain.append(j)
+        j = nxt_l[j]
+    js = np.asarray(chain, dtype=np.int64)
+    if not len(js):
+        return js, js, 0, 0
+    fj = js[filled[js]]
+    cancels = int(np.count_nonzero(~filled[js] & (expired[js] | (rc[js] < end))))
+    return fj, f[fj], len(js), cancels
+
+
+def simulate_symbol(s: BookSeries, p: StrategyConfig, t0: float, t_end: float) -> SymbolResult:
+    _require_numpy()
+    step = max(1e-3, p.loop_sleep)
+    n = int(math.floor((t_end - t0) / step)) + 2
+    g = t0 + np.arange(1, n + 1) * step
+    g = g[g <= t_end]
+    idx = np.searchsorted(s.ts, g, side="left") - 1  # тики строго раньше шага
+    valid = np.flatnonzero(idx >= 0)
+    final_mark = float(0.5 * (s.bid[-1] + s.ask[-1])) if len(s.ts) else None
+    if not len(valid):
+        z = np.zeros(len(g))
+        return SymbolResult(s.symbol, np.zeros(0, dtype=_FILL_DTYPE), 0, 0, g, z, z.copy(), z.copy(), final_mark)
+
+    first = int(valid[0])
+    g, idx = g[first:], idx[first:]
+    B, A = s.bid[idx], s.ask[idx]
+    mark = 0.5 * (B + A)
+    nsteps = len(g)
+    r = _reseed_lattice(g.tolist(), 0, max(0.3, p.reorder_interval), step)
+    r_arr = np.asarray(r)
+    pb, ps, qb, qs = _quotes(B[r_arr], A[r_arr], p)
+    expiry = np.searchsorted(g, g[r_arr] + p.cancel_timeout, side="left")
+    expiry = np.maximum(expiry, r_arr + 1)
+
+    # на шаге s проверяется ордер последней переустановки строго раньше s (филл идёт до переустановки)
+    owner = np.searchsorted(r_arr, np.arange(nsteps), side="left") - 1
+    has = owner >= 0
+    own = np.maximum(owner, 0)
+    bj, bs, ob, cb = _side_orders(r_arr, pb, qb, np.flatnonzero(has & (A <= _ffill(pb, qb)[own])), expiry, nsteps)
+    sj, ss, os_, cs = _side_orders(r_arr, ps, qs, np.flatnonzero(has & (B >= _ffill(ps, qs)[own])), expiry, nsteps)
+
+    # филлы по шагам; на одном шаге BUY раньше SELL
+    steps = np.concatenate((bs, ss))
+    order = np.lexsort((np.concatenate((np.zeros(len(bs)), np.ones(len(ss)))), steps))
+    fills = np.zeros(len(steps), dtype=_FILL_DTYPE)
+    fills["step"] = steps[order]
+    fills["ts"] = g[fills["step"]]
+    fills["side"] = np.concatenate((np.ones(len(bs)), -np.ones(len(ss))))[order]
+    fills["price"] = np.concatenate((_ffill(pb, qb)[bj], _ffill(ps, qs)[sj]))[order]
+    fills["qty"] = np.concatenate((_ffill(qb, qb)[bj], _ffill(qs, qs)[sj]))[order]
+    fills["fee"] = fills["price"] * fills["qty"] * p.maker_fee_pct / 100.0
+
+    signed = fills["side"] * fills["qty"]
+    d_inv = np.zeros(nsteps)
+    d_cash = np.zeros(nsteps)
+    np.add.at(d_inv, fills["step"], signed)
+    np.add.at(d_cash, fills["step"], -(signed * fills["price"] + fills["fee"]))
+    return SymbolResult(s.symbol, fills, ob + os_, cb + cs, g, np.cumsum(d_inv), np.cumsum(d_cash), mark,
+                        final_mark)
+
+
+_FILL_DTYPE = [("step", "i8"), ("ts", "f8"), ("side", "i1"), ("price", "f8"), ("qty", "f8"), ("fee", "f8")]
+
+
+def simulate(market: MarketData, cfg: Dict[str, Any], symbols: Optional[Iterable[str]] = None) -> SimResult:
+    """Все символы стратегии (или symbols) на одних данных; ConfigError на мусоре в cfg."""
+    _require_numpy()
+    p = StrategyConfig.from_dict(cfg or {})
+    if p.stop_loss_pct > 0:
+        raise ValueError("strategy.stop_loss_pct is not modelled by the vectorized simulator; use engine=replay")
+    syms = [s.upper() for s in symbols] if symbols else list(p.symbols)
+    out = SimResult(start_cash=p.paper_cash)
+    # realized — тем же PositionLedger, что и в реплее: филлов на порядки меньше, чем тиков
+    ledger = PositionLedger(cfg or {})
+    for sym in syms:
+        s = market.series.get(sym)
+        if s is not None:
+            r = out.symbols[sym] = simulate_symbol(s, p, market.t0, market.t_end)
+            for _, _, side, price, qty, _ in r.fills.tolist():
+                ledger.on_fill(sym, "BUY" if side > 0 else "SELL", price, qty)
+            r.realized = ledger.position(sym).realized
+    return out
+
+
+__all__ = ["BookSeries", "MarketData", "SymbolResult", "SimResult", "load_market", "simulate", "simulate_symbol"]
@@ -1,140 +1,431 @@
 from __future__ import annotations
 import json
-import os
+import shutil
+import time
+import zlib
 from pathlib import Path
-from typing import Any, Dict, Iterable, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import aiosqlite
 from starlette.concurrency import iterate_in_threadpool
 
-DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+from ..core import metrics
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+DATA_DIR = BACKEND_DIR / "data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH = DATA_DIR / "history.db"
 
+# отдельной очереди записи нет: каждая запись — своё соединение + commit; «очередь» — записи в полёте
+_WRITES_INFLIGHT = metrics.gauge("amadeus_history_writes_inflight", "History writes awaiting commit").labels()
+_WRITE_TIME = metrics.histogram("amadeus_history_write_seconds", "History write time (connect + insert + commit)",
+                                ("kind",))
+_WRITE_ORDER = _WRITE_TIME.labels(kind="order")
+_WRITE_TRADE = _WRITE_TIME.labels(kind="trade")
+_WRITE_BATCH = _WRITE_TIME.labels(kind="batch")
+
+
+def _write_begin() -> int:
+    if not metrics.enabled:
+        return 0
+    _WRITES_INFLIGHT.inc()
+    return metrics.now_ns()
+
+
+def _write_end(t0: int, hist: Any) -> None:
+    if t0:
+        _WRITES_INFLIGHT.dec()
+        hist.observe_since(t0)
+
+# ts пишется как пришёл: MarketMaker шлёт миллисекунды, другие источники — секунды
+_TS_SEC = "(CASE WHEN ts > 100000000000 THEN ts / 1000.0 ELSE ts END)"
+
+_ROLLUP_ORDERS = f"""
+    INSERT INTO main.orders_1m(minute, symbol, event, side, n, qty)
+    SELECT CAST({_TS_SEC} / 60 AS INTEGER) * 60, COALESCE(symbol, ''), COALESCE(event, ''), COALESCE(side, ''),
+           COUNT(*), COALESCE(SUM(qty), 0)
+    FROM {{src}}.orders WHERE {{where}}
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT(minute, symbol, event, side) DO UPDATE SET
+        n = n + excluded.n,
+        qty = qty + excluded.qty
+"""
+
+_ROLLUP_TRADES = f"""
+    INSERT INTO main.trades_1m(minute, symbol, side, n, qty, notional, pnl, price_min, price_max)
+    SELECT CAST({_TS_SEC} / 60 AS INTEGER) * 60, COALESCE(symbol, ''), COALESCE(side, ''),
+           COUNT(*), COALESCE(SUM(qty), 0), COALESCE(SUM(price * qty), 0), COALESCE(SUM(pnl), 0),
+           MIN(price), MAX(price)
+    FROM {{src}}.trades WHERE {{where}}
+    GROUP BY 1, 2, 3
+    ON CONFLICT(minute, symbol, side) DO UPDATE SET
+        n = n + excluded.n,
+        qty = qty + excluded.qty,
+        notional = notional + excluded.notional,
+        pnl = pnl + excluded.pnl,
+        price_min = MIN(COALESCE(price_min, excluded.price_min), COALESCE(excluded.price_min, price_min)),
+        price_max = MAX(COALESCE(price_max, excluded.price_max), COALESCE(excluded.price_max, price_max))
+"""
+
+_ROLLUP_SQL = {"orders": _ROLLUP_ORDERS, "trades": _ROLLUP_TRADES}
+
 
 class HistoryStore:
-    def __init__(self, db_path: Path = DB_PATH) -> None:
+    """
+    Журнал ордеров/сделок в SQLite.
+
+    partition_by_day=True — сырые строки пишутся в суточные файлы `history-YYYYMMDD.db`
+    рядом с основным; старый день архивируется переносом файла, без гигантских DELETE.
+    Минутные агрегаты (orders_1m / trades_1m) всегда живут в основном файле.
+    """
+
+    def __init__(self, db_path: Path = DB_PATH, partition_by_day: bool = False,
+                 archive_dir: Optional[Path] = None) -> None:
         self.db_path = Path(db_path)
+        self.partition_by_day = bool(partition_by_day)
+        # относительный путь — от папки backend, как у рекордера, а не от cwd процесса
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        if self.archive_dir is not None and not self.archive_dir.is_absolute():
+            self.archive_dir = BACKEND_DIR / self.archive_dir
         self._inited = False
+        self._parts_inited: set[str] = set()
+        # курсоры компактации raw: (path, table) -> последний обработанный id
+        self._raw_cursor: Dict[Tuple[str, str], int] = {}
+
+    @classmethod
+    def from_cfg(cls, cfg: Dict[str, Any]) -> "HistoryStore":
+        h = (cfg or {}).get("history") or {}
+        return cls(partition_by_day=str(h.get("partition") or "").lower() == "day",
+                   archive_dir=h.get("archive_dir") or None)
 
     async def init(self) -> None:
         if self._inited:
             return
         async with aiosqlite.connect(self.db_path.as_posix()) as db:
+            await _create_schema(db)
             await db.execute("""
-                             CREATE TABLE IF NOT EXISTS orders (
-                                                                   id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                                                   ts REAL,
-                                                                   event TEXT,
+                             CREATE TABLE IF NOT EXISTS orders_1m (
+                                                                   minute INTEGER,
                                                                    symbol TEXT,
+                                                                   event TEXT,
                                                                    side TEXT,
-                                                                   type TEXT,
-                                                                   price REAL,
+                                                                   n INTEGER,
                                                                    qty REAL,
-                                                                   status TEXT,
-                                                                   raw TEXT
+                                                                   PRIMARY KEY (minute, symbol, event, side)
                              );
                              """)
             await db.execute("""
-                             CREATE TABLE IF NOT EXISTS trades (
-                                                                   id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                                                   ts REAL,
-                                                                   type TEXT,
+                             CREATE TABLE IF NOT EXISTS trades_1m (
+                                                                   minute INTEGER,
                                                                    symbol TEXT,
                                                                    side TEXT,
-                                                                   price REAL,
+                                                                   n INTEGER,
                                                                    qty REAL,
+                                                                   notional REAL,
                                                                    pnl REAL,
-                                                                   raw TEXT
+                                                                   price_min REAL,
+                                                                   price_max REAL,
+                                                                   PRIMARY KEY (minute, symbol, side)
                              );
                              """)
             await db.commit()
         self._inited = True
 
+    # ---------- partitions ----------
+    def _part_path(self, day: str) -> Path:
+        return self.db_path.with_name(f"{self.db_path.stem}-{day}{self.db_path.suffix}")
+
+    def partitions(self) -> List[Tuple[str, Path]]:
+        """Суточные файлы [(YYYYMMDD, path)], от новых к старым."""
+        prefix = f"{self.db_path.stem}-"
+        out: List[Tuple[str, Path]] = []
+        for p in self.db_path.parent.glob(f"{prefix}*{self.db_path.suffix}"):
+            day = p.stem[len(prefix):]
+            if len(day) == 8 and day.isdigit():
+                out.append((day, p))
+        out.sort(reverse=True)
+        return out
+
+    async def _write_path(self) -> Path:
+        await self.init()
+        if not self.partition_by_day:
+            return self.db_path
+        path = self._part_path(time.strftime("%Y%m%d", time.gmtime()))
+        key = path.as_posix()
+        if key not in self._parts_inited or not path.exists():
+            async with aiosqlite.connect(key) as db:
+                await _create_schema(db)
+                await db.commit()
+            self._parts_inited.add(key)
+        return path
+
+    def _read_paths(self) -> List[Path]:
+        # свежие партиции → основной файл (в нём строки, записанные до включения партиций)
+        return [p for _, p in self.partitions()] + [self.db_path]
+
     # ---------- append ----------
     async def log_order_event(self, evt: Dict[str, Any]) -> None:
         """
         evt: {type:'order_event', event:'NEW'|'FILL'|..., order:{symbol,side,type,price,qty,status,...}, ts?}
+        или плоский вариант MarketMaker: {type:'order_event', evt:'NEW', symbol, side, price, qty, ts}
         """
-        await self.init()
-        o = evt.get("order") or {}
-        ts = float(evt.get("ts") or evt.get("time") or evt.get("T") or 0.0)
-        event = str(evt.get("event") or "")
-        symbol = str(o.get("symbol") or "")
-        side = (o.get("side") or "").upper() or None
-        typ = (o.get("type") or "").upper() or None
-        price = _to_float(o.get("price"))
-        qty = _to_float(o.get("qty") or o.get("quantity"))
-        status = (o.get("status") or "").upper() or None
-        raw = json.dumps(evt, ensure_ascii=False)
-        async with aiosqlite.connect(self.db_path.as_posix()) as db:
-            await db.execute(
-                "INSERT INTO orders(ts, event, symbol, side, type, price, qty, status, raw) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                (ts, event, symbol, side, typ, price, qty, status, raw),
-            )
-            await db.commit()
+        t0 = _write_begin()
+        try:
+            path = await self._write_path()
+            async with aiosqlite.connect(path.as_posix()) as db:
+                await db.execute(_INSERT_ORDER, _order_row(evt))
+                await db.commit()
+        finally:
+            _write_end(t0, _WRITE_ORDER)
 
     async def log_trade(self, evt: Dict[str, Any]) -> None:
         """
         evt: {type:'trade'|'fill', symbol, side?, price, qty, pnl?, ts?}
         """
-        await self.init()
-        ts = float(evt.get("ts") or evt.get("time") or evt.get("T") or 0.0)
-        typ = str(evt.get("type") or "")
-        symbol = str(evt.get("symbol") or evt.get("s") or "")
-        side = (evt.get("side") or evt.get("S") or "").upper() or None
-        price = _to_float(evt.get("price") or evt.get("p"))
-        qty = _to_float(evt.get("qty") or evt.get("q"))
-        pnl = _to_float(evt.get("pnl"))
-        raw = json.dumps(evt, ensure_ascii=False)
-        async with aiosqlite.connect(self.db_path.as_posix()) as db:
-            await db.execute(
-                "INSERT INTO trades(ts, type, symbol, side, price, qty, pnl, raw) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                (ts, typ, symbol, side, price, qty, pnl, raw),
-            )
-            await db.commit()
+        t0 = _write_begin()
+        try:
+            path = await self._write_path()
+            async with aiosqlite.connect(path.as_posix()) as db:
+                await db.execute(_INSERT_TRADE, _trade_row(evt))
+                await db.commit()
+        finally:
+            _write_end(t0, _WRITE_TRADE)
+
+    async def log_many(self, events: List[Dict[str, Any]]) -> None:
+        """Пачка order_event/trade одной транзакцией (реплей: тысячи событий без commit на каждое)."""
+        orders = [_order_row(e) for e in events if e.get("type") == "order_event"]
+        trades = [_trade_row(e) for e in events if e.get("type") in {"trade", "fill"}]
+        if not orders and not trades:
+            return
+        t0 = _write_begin()
+        try:
+            path = await self._write_path()
+            async with aiosqlite.connect(path.as_posix()) as db:
+                if orders:
+                    await db.executemany(_INSERT_ORDER, orders)
+                if trades:
+                    await db.executemany(_INSERT_TRADE, trades)
+                await db.commit()
+        finally:
+            _write_end(t0, _WRITE_BATCH)
 
     # ---------- read ----------
-    async def list_orders(self, limit: int = 200, offset: int = 0):
+    async def _list(self, table: str, limit: int, offset: int):
         await self.init()
-        async with aiosqlite.connect(self.db_path.as_posix()) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute(
-                    "SELECT * FROM orders ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset)
-            ) as cur:
-                rows = await cur.fetchall()
-        return [dict(r) for r in rows]
+        items: List[Dict[str, Any]] = []
+        for path in self._read_paths():
+            if not path.exists():
+                continue
+            async with aiosqlite.connect(path.as_posix()) as db:
+                db.row_factory = aiosqlite.Row
+                if offset:
+                    async with db.execute(f"SELECT COUNT(*) FROM {table}") as cur:
+                        cnt = int((await cur.fetchone())[0])
+                    if offset >= cnt:
+                        offset -= cnt
+                        continue
+                async with db.execute(
+                        f"SELECT * FROM {table} ORDER BY id DESC LIMIT ? OFFSET ?", (limit - len(items), offset)
+                ) as cur:
+                    rows = await cur.fetchall()
+            offset = 0
+            items.extend(_row_out(r) for r in rows)
+            if len(items) >= limit:
+                break
+        return items
+
+    async def list_orders(self, limit: int = 200, offset: int = 0):
+        return await self._list("orders", limit, offset)
 
     async def list_trades(self, limit: int = 200, offset: int = 0):
+        return await self._list("trades", limit, offset)
+
+    async def list_rollup(self, kind: str, limit: int = 200, offset: int = 0):
+        """Минутные агрегаты: kind = 'orders' | 'trades'."""
         await self.init()
+        table = "orders_1m" if kind == "orders" else "trades_1m"
         async with aiosqlite.connect(self.db_path.as_posix()) as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
-                    "SELECT * FROM trades ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset)
+                    f"SELECT * FROM {table} ORDER BY minute DESC LIMIT ? OFFSET ?", (limit, offset)
             ) as cur:
                 rows = await cur.fetchall()
         return [dict(r) for r in rows]
 
     async def stats(self) -> Dict[str, int]:
         await self.init()
+        o = t = 0
+        for path in self._read_paths():
+            if not path.exists():
+                continue
+            async with aiosqlite.connect(path.as_posix()) as db:
+                async with db.execute("SELECT COUNT(*) FROM orders") as c1, db.execute("SELECT COUNT(*) FROM trades") as c2:
+                    o += (await c1.fetchone())[0]
+                    t += (await c2.fetchone())[0]
         async with aiosqlite.connect(self.db_path.as_posix()) as db:
-            async with db.execute("SELECT COUNT(*) FROM orders") as c1, db.execute("SELECT COUNT(*) FROM trades") as c2:
-                o = (await c1.fetchone())[0]
-                t = (await c2.fetchone())[0]
-        return {"orders": int(o), "trades": int(t)}
+            async with db.execute("SELECT COUNT(*) FROM orders_1m") as c1, db.execute("SELECT COUNT(*) FROM trades_1m") as c2:
+                o1 = (await c1.fetchone())[0]
+                t1 = (await c2.fetchone())[0]
+        return {"orders": int(o), "trades": int(t), "orders_1m": int(o1), "trades_1m": int(t1),
+                "partitions": len(self.partitions())}
 
     async def clear(self, kind: str) -> Dict[str, int]:
         await self.init()
+        tables = ["orders"] if kind == "orders" else ["trades"] if kind == "trades" else ["orders", "trades"]
+        if kind not in ("orders", "trades"):
+            # полная очистка партиций — просто удаляем файлы
+            for _, path in self.partitions():
+                path.unlink(missing_ok=True)
+            self._parts_inited.clear()
+        for path in self._read_paths():
+            async with aiosqlite.connect(path.as_posix()) as db:
+                for t in tables:
+                    await db.execute(f"DELETE FROM {t}")
+                    if path == self.db_path:
+                        await db.execute(f"DELETE FROM {t}_1m")
+                await db.commit()
+        self._raw_cursor.clear()
+        return await self.stats()
+
+    # ---------- retention ----------
+    async def compact_raw(self, before_ts: float, mode: str = "compress", batch: int = 5000) -> int:
+        """
+        raw старше before_ts (сек): 'compress' — zlib в BLOB, 'drop' — NULL.
+        Идём батчами по id, чтобы не держать длинную транзакцию.
+        """
+        await self.init()
+        if mode not in ("compress", "drop"):
+            return 0
+        cutoff_day = time.strftime("%Y%m%d", time.gmtime(before_ts))
+        paths = [p for d, p in self.partitions() if d <= cutoff_day] + [self.db_path]
+        done = 0
+        for path in paths:
+            async with aiosqlite.connect(path.as_posix()) as db:
+                for table in ("orders", "trades"):
+                    key = (path.as_posix(), table)
+                    last_id = self._raw_cursor.get(key, 0)
+                    while True:
+                        async with db.execute(
+                                f"SELECT id, raw FROM {table} WHERE id > ? AND {_TS_SEC} < ? "
+                                f"ORDER BY id LIMIT ?", (last_id, before_ts, batch)
+                        ) as cur:
+                            rows = await cur.fetchall()
+                        if not rows:
+                            break
+                        last_id = rows[-1][0]
+                        if mode == "compress":
+                            upd = [(zlib.compress(r.encode("utf-8"), 6), i) for i, r in rows if isinstance(r, str)]
+                        else:
+                            upd = [(None, i) for i, r in rows if r is not None]
+                        if upd:
+                            await db.executemany(f"UPDATE {table} SET raw = ? WHERE id = ?", upd)
+                            await db.commit()
+                            done += len(upd)
+                        if len(rows) < batch:
+                            break
+                    self._raw_cursor[key] = last_id
+        return done
+
+    async def rollup(self, before_ts: float, batch: int = 5000) -> Dict[str, int]:
+        """Свернуть строки основного файла старше before_ts в минутные агрегаты и удалить их."""
+        await self.init()
+        moved = {"orders": 0, "trades": 0}
         async with aiosqlite.connect(self.db_path.as_posix()) as db:
-            if kind == "orders":
-                await db.execute("DELETE FROM orders")
-            elif kind == "trades":
-                await db.execute("DELETE FROM trades")
+            for table in ("orders", "trades"):
+                while True:
+                    async with db.execute(
+                            f"SELECT MAX(id), COUNT(*) FROM (SELECT id FROM {table} WHERE {_TS_SEC} < ? ORDER BY id LIMIT ?)",
+                            (before_ts, batch),
+                    ) as cur:
+                        max_id, n = await cur.fetchone()
+                    if not n:
+                        break
+                    where = f"id <= ? AND {_TS_SEC} < ?"
+                    await db.execute(_ROLLUP_SQL[table].format(src="main", where=where), (max_id, before_ts))
+                    await db.execute(f"DELETE FROM {table} WHERE {where}", (max_id, before_ts))
+                    await db.commit()
+                    moved[table] += int(n)
+                    if n < batch:
+                        break
+        return moved
+
+    async def archive_partitions(self, before_ts: float) -> List[str]:
+        """
+        Суточные файлы целиком старше before_ts: агрегаты → основной файл,
+        сам файл переносится в archive_dir (или удаляется, если архив не задан).
+        """
+        await self.init()
+        cutoff_day = time.strftime("%Y%m%d", time.gmtime(before_ts))
+        archived: List[str] = []
+        for day, path in self.partitions():
+            if day >= cutoff_day:
+                continue
+            async with aiosqlite.connect(self.db_path.as_posix()) as db:
+                await db.execute("ATTACH DATABASE ? AS part", (path.as_posix(),))
+                try:
+                    for table in ("orders", "trades"):
+                        await db.execute(_ROLLUP_SQL[table].format(src="part", where="1"))
+                    await db.commit()
+                finally:
+                    await db.execute("DETACH DATABASE part")
+            if self.archive_dir:
+                self.archive_dir.mkdir(parents=True, exist_ok=True)
+                # архив может лежать на другом разделе — os.replace там падает с EXDEV
+                shutil.move(path.as_posix(), (self.archive_dir / path.name).as_posix())
             else:
-                await db.execute("DELETE FROM orders")
-                await db.execute("DELETE FROM trades")
+                path.unlink(missing_ok=True)
+            self._parts_inited.discard(path.as_posix())
+            for key in [k for k in self._raw_cursor if k[0] == path.as_posix()]:
+                self._raw_cursor.pop(key, None)
+            archived.append(day)
+        return archived
+
+    async def purge_rollups(self, before_ts: float) -> int:
+        await self.init()
+        async with aiosqlite.connect(self.db_path.as_posix()) as db:
+            n = 0
+            for table in ("orders_1m", "trades_1m"):
+                cur = await db.execute(f"DELETE FROM {table} WHERE minute < ?", (before_ts,))
+                n += cur.rowcount or 0
             await db.commit()
-        return await self.stats()
+        return n
+
+    async def incremental_vacuum(self, pages: int = 512) -> int:
+        """Вернуть ОС до `pages` свободных страниц в каждом файле (нужен auto_vacuum=INCREMENTAL)."""
+        await self.init()
+        freed = 0
+        for path in self._read_paths():
+            if not path.exists():
+                continue
+            async with aiosqlite.connect(path.as_posix()) as db:
+                async with db.execute("PRAGMA auto_vacuum") as cur:
+                    mode = (await cur.fetchone())[0]
+                if mode != 2:
+                    continue
+                async with db.execute("PRAGMA freelist_count") as cur:
+                    before = (await cur.fetchone())[0]
+                if not before:
+                    continue
+                await db.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+                await db.commit()
+                async with db.execute("PRAGMA freelist_count") as cur:
+                    after = (await cur.fetchone())[0]
+                freed += max(0, before - after)
+        return freed
+
+    async def enable_incremental_vacuum(self) -> bool:
+        """
+        Перевести основной файл в auto_vacuum=INCREMENTAL. Для уже заполненной базы
+        это требует разового полного VACUUM — вызывать осознанно.
+        """
+        await self.init()
+        async with aiosqlite.connect(self.db_path.as_posix()) as db:
+            async with db.execute("PRAGMA auto_vacuum") as cur:
+                if (await cur.fetchone())[0] == 2:
+                    return False
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
+        return True
 
     # ---------- export ----------
     async def export_csv_iter(self, kind: str) -> Iterable[bytes]:
@@ -153,11 +444,90 @@ class HistoryStore:
 
         yield (",".join(header) + "\n").encode("utf-8")
 
-        async with aiosqlite.connect(self.db_path.as_posix()) as db:
-            async with db.execute(query) as cur:
-                async for row in cur:
-                    line = ",".join(_csv_cell(v) for v in row) + "\n"
-                    yield line.encode("utf-8")
+        for path in self._read_paths():
+            if not path.exists():
+                continue
+            async with aiosqlite.connect(path.as_posix()) as db:
+                async with db.execute(query) as cur:
+                    async for row in cur:
+                        line = ",".join(_csv_cell(v) for v in row) + "\n"
+                        yield line.encode("utf-8")
+
+
+async def _create_schema(db: aiosqlite.Connection) -> None:
+    # для новых файлов — сразу инкрементальный vacuum (на существующие таблицы не влияет)
+    await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    await db.execute("""
+                     CREATE TABLE IF NOT EXISTS orders (
+                                                           id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                                           ts REAL,
+                                                           event TEXT,
+                                                           symbol TEXT,
+                                                           side TEXT,
+                                                           type TEXT,
+                                                           price REAL,
+                                                           qty REAL,
+                                                           status TEXT,
+                                                           raw TEXT
+                     );
+                     """)
+    await db.execute("""
+                     CREATE TABLE IF NOT EXISTS trades (
+                                                           id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                                           ts REAL,
+                                                           type TEXT,
+                                                           symbol TEXT,
+                                                           side TEXT,
+                                                           price REAL,
+                                                           qty REAL,
+                                                           pnl REAL,
+                                                           raw TEXT
+                     );
+                     """)
+
+
+_INSERT_ORDER = "INSERT INTO orders(ts, event, symbol, side, type, price, qty, status, raw) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_INSERT_TRADE = "INSERT INTO trades(ts, type, symbol, side, price, qty, pnl, raw) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+def _order_row(evt: Dict[str, Any]) -> Tuple[Any, ...]:
+    o = evt.get("order")
+    if not isinstance(o, dict):
+        # плоский формат MarketMaker: поля ордера лежат в самом событии
+        o = {k: v for k, v in evt.items() if k != "type"}
+    ts = float(evt.get("ts") or evt.get("time") or evt.get("T") or 0.0)
+    event = str(evt.get("event") or evt.get("evt") or "")
+    symbol = str(o.get("symbol") or "")
+    side = (o.get("side") or "").upper() or None
+    typ = (o.get("type") or "").upper() or None
+    price = _to_float(o.get("price"))
+    qty = _to_float(o.get("qty") or o.get("quantity"))
+    status = (o.get("status") or "").upper() or None
+    raw = json.dumps(evt, ensure_ascii=False)
+    return (ts, event, symbol, side, typ, price, qty, status, raw)
+
+
+def _trade_row(evt: Dict[str, Any]) -> Tuple[Any, ...]:
+    ts = float(evt.get("ts") or evt.get("time") or evt.get("T") or 0.0)
+    typ = str(evt.get("type") or "")
+    symbol = str(evt.get("symbol") or evt.get("s") or "")
+    side = (evt.get("side") or evt.get("S") or "").upper() or None
+    price = _to_float(evt.get("price") or evt.get("p"))
+    qty = _to_float(evt.get("qty") or evt.get("q"))
+    pnl = _to_float(evt.get("pnl"))
+    raw = json.dumps(evt, ensure_ascii=False)
+    return (ts, typ, symbol, side, price, qty, pnl, raw)
+
+
+def _row_out(r: Any) -> Dict[str, Any]:
+    d = dict(r)
+    raw = d.get("raw")
+    if isinstance(raw, (bytes, bytearray)):
+        try:
+            d["raw"] = zlib.decompress(raw).decode("utf-8")
+        except Exception:
+            d["raw"] = None
+    return d
 
 
 def _to_float(v: Any) -> Optional[float]:
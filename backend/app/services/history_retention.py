@@ -0,0 +1,111 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from .history import HistoryStore
+
+log = logging.getLogger(__name__)
+
+_DAY = 86400.0
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    Политика хранения history.db (секция `history` конфига):
+      raw_compact_after_days — raw JSON сжимается/удаляется (raw_mode: compress | drop | keep)
+      raw_retention_days     — детальные строки сворачиваются в минутные агрегаты
+      retention_days         — агрегаты старше удаляются
+    Обслуживание удаляет данные, поэтому по умолчанию выключено (history.maintenance: true — включить).
+    """
+    enabled: bool = False
+    retention_days: float = 365.0
+    raw_retention_days: float = 30.0
+    raw_compact_after_days: float = 3.0
+    raw_mode: str = "compress"
+    interval_sec: float = 600.0
+    vacuum_pages: int = 512
+    batch_rows: int = 5000
+
+    def describe(self) -> str:
+        """Что будет удаляться — для предупреждения при включении."""
+        parts = []
+        if self.raw_retention_days > 0:
+            parts.append(f"rows older than {self.raw_retention_days:g}d are rolled up into 1m aggregates and deleted")
+        if self.raw_mode in ("compress", "drop") and self.raw_compact_after_days > 0:
+            parts.append(f"raw JSON older than {self.raw_compact_after_days:g}d: {self.raw_mode}")
+        if self.retention_days > 0:
+            parts.append(f"aggregates older than {self.retention_days:g}d are deleted")
+        return "; ".join(parts) or "nothing is deleted"
+
+    @classmethod
+    def from_cfg(cls, cfg: Dict[str, Any]) -> "RetentionPolicy":
+        h = (cfg or {}).get("history") or {}
+        d = cls()
+        return cls(
+            enabled=bool(h.get("maintenance", d.enabled)),
+            retention_days=float(h.get("retention_days", d.retention_days)),
+            raw_retention_days=float(h.get("raw_retention_days", d.raw_retention_days)),
+            raw_compact_after_days=float(h.get("raw_compact_after_days", d.raw_compact_after_days)),
+            raw_mode=str(h.get("raw_mode", d.raw_mode)).lower(),
+            interval_sec=max(10.0, float(h.get("maintenance_interval_sec", d.interval_sec))),
+            vacuum_pages=int(h.get("vacuum_pages", d.vacuum_pages)),
+            batch_rows=max(100, int(h.get("batch_rows", d.batch_rows))),
+        )
+
+
+class HistoryMaintainer:
+    """
+    Фоновое обслуживание history.db: rollup в 1m → архив партиций → компактация raw →
+    чистка старых агрегатов → incremental vacuum. Вся работа идёт в потоке aiosqlite
+    небольшими батчами, event loop не блокируется.
+    """
+
+    def __init__(self, store: HistoryStore, policy: RetentionPolicy) -> None:
+        self.store = store
+        self.policy = policy
+        self.last_run_ts: Optional[float] = None
+        self.last_result: Dict[str, Any] = {}
+
+    async def run_once(self, now: Optional[float] = None) -> Dict[str, Any]:
+        p = self.policy
+        now = float(now if now is not None else time.time())
+        t0 = time.perf_counter()
+        res: Dict[str, Any] = {}
+
+        if p.raw_retention_days > 0:
+            cutoff = now - p.raw_retention_days * _DAY
+            res["rolled_up"] = await self.store.rollup(cutoff, batch=p.batch_rows)
+            res["archived"] = await self.store.archive_partitions(cutoff)
+
+        if p.raw_mode in ("compress", "drop") and p.raw_compact_after_days > 0:
+            res["raw_compacted"] = await self.store.compact_raw(
+                now - p.raw_compact_after_days * _DAY, mode=p.raw_mode, batch=p.batch_rows)
+
+        if p.retention_days > 0:
+            res["rollups_purged"] = await self.store.purge_rollups(now - p.retention_days * _DAY)
+
+        if p.vacuum_pages > 0:
+            res["vacuum_pages"] = await self.store.incremental_vacuum(p.vacuum_pages)
+
+        res["took_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+        self.last_run_ts = now
+        self.last_result = res
+        return res
+
+    async def run(self) -> None:
+        # первый проход — с небольшой задержкой, чтобы не мешать старту бота
+        await asyncio.sleep(min(30.0, self.policy.interval_sec))
+        while True:
+            try:
+                if self.policy.enabled:   # history.maintenance выключают на лету
+                    res = await self.run_once()
+                    log.info("history maintenance: %s", res)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("history maintenance failed")
+            await asyncio.sleep(self.policy.interval_sec)
@@ -0,0 +1,130 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+import struct
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+log = logging.getLogger(__name__)
+
+# кадр: u32 LE длина | JSON (компактный); в одном кадре — пачка сообщений (list)
+_LEN = struct.Struct("<I")
+MAX_FRAME = 16 * 1024 * 1024
+
+Address = Union[str, Tuple[str, int]]
+
+
+def unix_sockets_available() -> bool:
+    return hasattr(asyncio, "start_unix_server") and sys.platform != "win32"
+
+
+def default_address(name: str) -> Address:
+    """unix-сокет во временной папке, где он есть; иначе loopback TCP на свободном порту."""
+    if unix_sockets_available():
+        return os.path.join(tempfile.gettempdir(), f"{name}-{os.getpid()}.sock")
+    return ("127.0.0.1", 0)
+
+
+def encode_frame(obj: Any) -> bytes:
+    b = json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+    return _LEN.pack(len(b)) + b
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Any:
+    hdr = await reader.readexactly(_LEN.size)
+    (n,) = _LEN.unpack(hdr)
+    if n > MAX_FRAME:
+        raise ValueError(f"ipc frame too large: {n}")
+    return json.loads(await reader.readexactly(n))
+
+
+async def start_server(address: Address, on_client) -> Tuple[asyncio.AbstractServer, Address]:
+    """Возвращает сервер и фактический адрес (для TCP — с выданным портом)."""
+    if isinstance(address, str):
+        try:
+            os.unlink(address)
+        except FileNotFoundError:
+            pass
+        server = await asyncio.start_unix_server(on_client, path=address)
+        return server, address
+    server = await asyncio.start_server(on_client, host=address[0], port=address[1])
+    host, port = server.sockets[0].getsockname()[:2]
+    return server, (host, port)
+
+
+async def connect(address: Address) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if isinstance(address, str):
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection(address[0], address[1])
+
+
+class BatchWriter:
+    """
+    Копит сообщения и пишет их пачкой раз в flush_ms (или сразу при max_batch):
+    один syscall и один json.dumps на пачку вместо каждого события.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, flush_ms: float = 20.0, max_batch: int = 512) -> None:
+        self._writer = writer
+        self._flush_sec = max(0.001, float(flush_ms) / 1000.0)
+        self._max_batch = int(max_batch)
+        self._buf: List[Any] = []
+        self._kick = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.frames_total = 0
+        self.messages_total = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def put(self, obj: Any) -> None:
+        self._buf.append(obj)
+        if len(self._buf) >= self._max_batch:
+            self._kick.set()
+
+    async def send_now(self, obj: Any) -> None:
+        """Управляющие сообщения — без ожидания пачки."""
+        self._writer.write(encode_frame([obj]))
+        await self._writer.drain()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._kick.wait(), timeout=self._flush_sec)
+            except asyncio.TimeoutError:
+                pass
+            self._kick.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._buf:
+            return
+        batch, self._buf = self._buf, []
+        self._writer.write(encode_frame(batch))
+        self.frames_total += 1
+        self.messages_total += len(batch)
+        await self._writer.drain()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            pass
+        try:
+            self._writer.close()
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        return {"frames_total": self.frames_total, "messages_total": self.messages_total, "pending": len(self._buf)}
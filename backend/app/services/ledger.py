@@ -0,0 +1,198 @@
+from __future__ import annotations
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Tuple
+
+
+@dataclass
+class Position:
+    symbol: str
+    qty: float = 0.0            # со знаком: >0 long, <0 short
+    cost: float = 0.0           # Σ qty*price открытых лотов (со знаком qty)
+    realized: float = 0.0       # gross, без комиссий
+    fees: float = 0.0
+    volume: float = 0.0         # оборот в котируемой валюте
+    mark: Optional[float] = None
+    lots: Deque[Tuple[float, float]] = field(default_factory=deque)  # FIFO: (qty со знаком, price)
+
+    @property
+    def avg_price(self) -> float:
+        return self.cost / self.qty if self.qty else 0.0
+
+    @property
+    def unrealized(self) -> float:
+        if not self.qty or self.mark is None:
+            return 0.0
+        return self.qty * self.mark - self.cost
+
+
+@dataclass
+class FillResult:
+    realized: float     # gross PnL, закрытый этим филлом
+    fee: float
+    closing: bool       # филл уменьшил позицию
+    position_qty: float
+
+
+class PositionLedger:
+    """
+    Инвентарь, средняя цена, realized/unrealized PnL и комиссии по филлам.
+
+    - method='avg'  — средняя цена позиции; 'fifo' — лоты закрываются по очереди
+      (каждый лот снимается один раз, т.е. амортизированно O(1) на филл);
+    - mark() — только запоминает mid (O(1) на тик), equity считается по запросу;
+    - комиссии — maker_fee_pct / taker_fee_pct из strategy, в котируемой валюте.
+    """
+
+    def __init__(self, cfg: Dict[str, Any]) -> None:
+        cfg = cfg or {}
+        strat = cfg.get("strategy") or {}
+        led = cfg.get("ledger") or {}
+        self.method: str = str(led.get("method", "avg")).lower()
+        self.maker_fee_pct: float = float(strat.get("maker_fee_pct", 0.1))
+        self.taker_fee_pct: float = float(strat.get("taker_fee_pct", 0.1))
+        self.publish_interval_sec: float = float(led.get("mark_interval_sec", 1.0))
+
+        self.start_cash: float = float(strat.get("paper_cash", 1000.0))
+        self.cash: float = self.start_cash
+        self.positions: Dict[str, Position] = {}
+        self.fills_total: int = 0
+        self._last_publish: float = 0.0
+        # Σ по всем позициям — чтобы equity не бегал по словарю
+        self._realized: float = 0.0
+        self._fees: float = 0.0
+
+    def apply_cfg(self, cfg: Dict[str, Any]) -> None:
+        """Горячие параметры: комиссии и частота публикации (метод учёта меняется только рестартом)."""
+        strat = (cfg or {}).get("strategy") or {}
+        led = (cfg or {}).get("ledger") or {}
+        maker = float(strat.get("maker_fee_pct", 0.1))
+        taker = float(strat.get("taker_fee_pct", 0.1))
+        interval = float(led.get("mark_interval_sec", 1.0))
+        self.maker_fee_pct, self.taker_fee_pct, self.publish_interval_sec = maker, taker, interval
+
+    def position(self, symbol: str) -> Position:
+        p = self.positions.get(symbol)
+        if p is None:
+            p = self.positions[symbol] = Position(symbol=symbol)
+        return p
+
+    # ---------------- fills ----------------
+    def on_fill(self, symbol: str, side: str, price: float, qty: float, liquidity: str = "MAKER") -> FillResult:
+        p = self.position(symbol)
+        price = float(price)
+        qty = float(qty)
+        signed = qty if side.upper() == "BUY" else -qty
+        notional = price * qty
+        fee = notional * (self.maker_fee_pct if liquidity.upper() == "MAKER" else self.taker_fee_pct) / 100.0
+
+        self.cash -= signed * price + fee
+        p.fees += fee
+        p.volume += notional
+        self._fees += fee
+        self.fills_total += 1
+
+        realized = 0.0
+        closing = p.qty != 0.0 and (p.qty > 0) != (signed > 0)
+        if not closing:
+            p.qty += signed
+            p.cost += signed * price
+            if self.method == "fifo":
+                p.lots.append((signed, price))
+        elif self.method == "fifo":
+            realized = self._close_fifo(p, signed, price)
+        else:
+            realized = self._close_avg(p, signed, price)
+
+        p.realized += realized
+        self._realized += realized
+        return FillResult(realized=realized, fee=fee, closing=closing, position_qty=p.qty)
+
+    @staticmethod
+    def _close_avg(p: Position, signed: float, price: float) -> float:
+        avg = p.avg_price
+        close = min(abs(signed), abs(p.qty))
+        sign = 1.0 if p.qty > 0 else -1.0
+        realized = close * (price - avg) * sign
+        rest = abs(signed) - close
+        p.qty -= sign * close
+        p.cost = p.qty * avg
+        if abs(p.qty) < 1e-12:
+            p.qty = 0.0
+            p.cost = 0.0
+        if rest > 1e-12:
+            # переворот позиции — остаток открывает новую по цене филла
+            p.qty = -sign * rest
+            p.cost = p.qty * price
+        return realized
+
+    @staticmethod
+    def _close_fifo(p: Position, signed: float, price: float) -> float:
+        remain = abs(signed)
+        realized = 0.0
+        while remain > 1e-12 and p.lots:
+            lq, lpx = p.lots[0]
+            take = min(remain, abs(lq))
+            sign = 1.0 if lq > 0 else -1.0
+            realized += take * (price - lpx) * sign
+            p.qty -= sign * take
+            p.cost -= sign * take * lpx
+            remain -= take
+            if take >= abs(lq) - 1e-12:
+                p.lots.popleft()
+            else:
+                p.lots[0] = (lq - sign * take, lpx)
+        if not p.lots:
+            p.qty = 0.0
+            p.cost = 0.0
+        if remain > 1e-12:
+            s = 1.0 if signed > 0 else -1.0
+            p.lots.append((s * remain, price))
+            p.qty = s * remain
+            p.cost = s * remain * price
+        return realized
+
+    # ---------------- marks ----------------
+    def mark(self, symbol: str, bid: Optional[float], ask: Optional[float]) -> None:
+        if bid is None or ask is None:
+            return
+        p = self.positions.get(symbol)
+        if p is None:
+            p = self.position(symbol)
+        p.mark = 0.5 * (bid + ask)
+
+    def equity(self) -> float:
+        eq = self.cash
+        for p in self.positions.values():
+            if p.qty:
+                eq += p.qty * (p.mark if p.mark is not None else p.avg_price)
+        return eq
+
+    def due(self, now: Optional[float] = None) -> bool:
+        """Пора ли публиковать bank/equity (троттлинг mark-to-market)."""
+        now = time.time() if now is None else now
+        if now - self._last_publish < self.publish_interval_sec:
+            return False
+        self._last_publish = now
+        return True
+
+    def next_due(self) -> float:
+        """Когда due() снова станет True (реплей пропускает шаги до этого момента)."""
+        return self._last_publish + self.publish_interval_sec
+
+    def snapshot(self) -> Dict[str, Any]:
+        unreal = sum(p.unrealized for p in self.positions.values())
+        return {
+            "equity": round(self.equity(), 8),
+            "cash": round(self.cash, 8),
+            "realized": round(self._realized, 8),
+            "unrealized": round(unreal, 8),
+            "fees": round(self._fees, 8),
+            "pnl": round(self._realized + unreal - self._fees, 8),
+            "positions": {
+                s: {"qty": p.qty, "avg": p.avg_price, "mark": p.mark,
+                    "upnl": round(p.unrealized, 8), "realized": round(p.realized, 8)}
+                for s, p in self.positions.items() if p.qty or p.realized or p.fees
+            },
+        }
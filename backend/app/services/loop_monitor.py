@@ -0,0 +1,233 @@
+"""
+Здоровье event loop: задержка планирования и медленные колбэки.
+
+Пульс — задача, которая спит interval_ms и меряет, насколько позже срока проснулась (lag).
+Пока loop занят синхронным кодом, пульс не просыпается; сторожевой поток видит просроченный
+пульс дольше slow_ms и снимает стек потока loop (sys._current_frames) и текущую задачу —
+то есть место, где loop стоит прямо сейчас. Когда пульс проснётся, событие закрывается
+с фактической длительностью и уходит в лог, в кольцо последних событий и в diag.
+
+Окно lag (window_sec) даёт p50/p99 для /ws stats и статуса; p99 выше lag_alert_ms — diag-алерт.
+Алерты не чаще alert_repeat_sec, пропущенные считаются.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from ..core import metrics
+from ..core.config_schema import LoopMonitorConfig
+
+logger = logging.getLogger(__name__)
+
+_LAG = metrics.histogram("amadeus_loop_lag_seconds", "Event loop scheduling lag (heartbeat wake-up delay)").labels()
+_SLOW = metrics.counter("amadeus_loop_slow_callbacks_total", "Loop stalls longer than loop_monitor.slow_ms").labels()
+
+_STACK_DEPTH = 12
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _short_path(path: str) -> str:
+    if path.startswith(_APP_ROOT):
+        return "app" + path[len(_APP_ROOT):]
+    parts = path.replace("\\", "/").split("/")
+    return "/".join(parts[-2:])
+
+
+def _format_stack(frame: Any) -> List[str]:
+    """Кадры колбэка (без обвязки asyncio над ним), от внешнего к внутреннему: 'app/x.py:12 in f: code'."""
+    frames = traceback.extract_stack(frame)
+    for i in range(len(frames) - 1, -1, -1):
+        if frames[i].name == "_run" and frames[i].filename.endswith(os.path.join("asyncio", "events.py")):
+            frames = frames[i + 1:]
+            break
+    out = []
+    for fs in frames[-_STACK_DEPTH:]:
+        line = f"{_short_path(fs.filename)}:{fs.lineno} in {fs.name}"
+        if fs.line:
+            line += f": {fs.line.strip()[:120]}"
+        out.append(line)
+    return out
+
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+class LoopMonitor:
+    def __init__(self, conf: LoopMonitorConfig, on_alert: Optional[Callable[[str], None]] = None,
+                 name: str = "api") -> None:
+        self.conf = conf
+        self.name = name
+        self._on_alert = on_alert
+        self._lags: Deque[tuple] = deque()     # (monotonic ts, lag sec)
+        self.slow: Deque[Dict[str, Any]] = deque(maxlen=50)
+        self.slow_total = 0
+        self.max_lag_sec = 0.0
+
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+
+        # состояние пульса для сторожа: номер и срок ожидаемого пробуждения (perf_counter)
+        self._beat_seq = 0
+        self._beat_due = 0.0
+        self._stall: Optional[Dict[str, Any]] = None   # снимок сторожа для текущего _beat_seq
+
+        self._last_alert = float("-inf")
+        self._suppressed = 0
+        self._summary_cache: Dict[str, Any] = {}
+        self._summary_ts = 0.0
+
+    # ---------------- жизненный цикл ----------------
+    def start(self) -> None:
+        if self._task is not None or not self.conf.enabled:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat_due = time.perf_counter() + self.conf.interval_ms / 1000.0
+        self._stop = threading.Event()   # свой на каждый запуск: старый сторож не оживает после stop/start
+        self._task = asyncio.create_task(self._heartbeat(), name=f"loop-monitor-{self.name}")
+        self._thread = threading.Thread(target=self._watchdog, args=(self._stop,),
+                                        name=f"loop-watchdog-{self.name}", daemon=True)
+        self._thread.start()
+        logger.info("loop monitor [%s]: interval=%sms slow=%sms lag_alert=%sms", self.name,
+                    self.conf.interval_ms, self.conf.slow_ms, self.conf.lag_alert_ms)
+
+    def stop(self) -> None:
+        self._stop.set()
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+        self._thread = None
+
+    def apply(self, conf: LoopMonitorConfig) -> None:
+        """Горячая смена порогов; enabled=False останавливает пульс и сторожа."""
+        self.conf = conf
+        if not conf.enabled:
+            self.stop()
+        elif self._task is None and self._loop is not None:
+            self.start()
+
+    # ---------------- пульс (в loop) ----------------
+    async def _heartbeat(self) -> None:
+        perf = time.perf_counter
+        while True:
+            interval = self.conf.interval_ms / 1000.0
+            self._beat_seq += 1
+            self._beat_due = perf() + interval
+            await asyncio.sleep(interval)
+            lag = max(0.0, perf() - self._beat_due)
+            self._record(lag)
+
+    def _record(self, lag: float) -> None:
+        now = time.monotonic()
+        lags = self._lags
+        lags.append((now, lag))
+        horizon = now - self.conf.window_sec
+        while lags and lags[0][0] < horizon:
+            lags.popleft()
+        if lag > self.max_lag_sec:
+            self.max_lag_sec = lag
+        if metrics.enabled:
+            _LAG.observe(lag)
+
+        stall, self._stall = self._stall, None
+        if lag * 1000.0 >= self.conf.slow_ms:
+            self._on_slow(lag, stall if stall is not None and stall["seq"] == self._beat_seq else None)
+
+        if now - self._summary_ts >= 1.0:
+            s = self.summary()
+            if s["lag_p99_ms"] >= self.conf.lag_alert_ms and len(lags) >= 20:
+                self._alert(f"LOOP LAG [{self.name}]: p99 {s['lag_p99_ms']} ms, p50 {s['lag_p50_ms']} ms, "
+                            f"max {s['lag_max_ms']} ms over {int(self.conf.window_sec)}s")
+
+    def _on_slow(self, lag: float, stall: Optional[Dict[str, Any]]) -> None:
+        self.slow_total += 1
+        if metrics.enabled:
+            _SLOW.inc()
+        ev = {
+            "ts": time.time(),
+            "duration_ms": round(lag * 1000.0, 1),
+            "task": stall["task"] if stall else None,
+            "stack": stall["stack"] if stall else [],
+        }
+        self.slow.append(ev)
+        where = ev["stack"][-1] if ev["stack"] else "not sampled (stall ended before the watchdog saw it)"
+        logger.warning("loop [%s] blocked %.1f ms, task=%s at %s%s", self.name, ev["duration_ms"], ev["task"],
+                       where, "".join("\n    " + s for s in ev["stack"][:-1]))
+        self._alert(f"LOOP STALL [{self.name}]: {ev['duration_ms']} ms, task={ev['task'] or '?'} at {where}")
+
+    def _alert(self, text: str) -> None:
+        now = time.monotonic()
+        if now - self._last_alert < self.conf.alert_repeat_sec:
+            self._suppressed += 1
+            return
+        if self._suppressed:
+            text += f" (+{self._suppressed} suppressed)"
+        self._last_alert = now
+        self._suppressed = 0
+        if self._on_alert is not None:
+            try:
+                self._on_alert(text)
+            except Exception:
+                logger.exception("loop monitor alert callback failed")
+
+    # ---------------- сторож (отдельный поток) ----------------
+    def _watchdog(self, stop: threading.Event) -> None:
+        perf = time.perf_counter
+        while not stop.wait(max(0.005, self.conf.slow_ms / 4000.0)):
+            seq = self._beat_seq
+            overdue = perf() - self._beat_due
+            if overdue * 1000.0 < self.conf.slow_ms or (self._stall is not None and self._stall["seq"] == seq):
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            task = asyncio.current_task(self._loop)
+            stack = _format_stack(frame)
+            del frame
+            if seq != self._beat_seq:
+                continue  # loop уже ожил — стек относится к другому колбэку
+            self._stall = {"seq": seq, "task": task.get_name() if task is not None else None, "stack": stack}
+
+    # ---------------- отчёт ----------------
+    def summary(self) -> Dict[str, Any]:
+        """p50/p99/max lag за окно (мс) и число медленных колбэков; кешируется на секунду."""
+        now = time.monotonic()
+        if now - self._summary_ts < 1.0 and self._summary_cache:
+            return self._summary_cache
+        vals = sorted(v for _, v in self._lags)
+        self._summary_cache = {
+            "lag_p50_ms": round(_percentile(vals, 0.50) * 1000.0, 2),
+            "lag_p99_ms": round(_percentile(vals, 0.99) * 1000.0, 2),
+            "lag_max_ms": round((vals[-1] if vals else 0.0) * 1000.0, 2),
+            "slow_callbacks": self.slow_total,
+        }
+        self._summary_ts = now
+        return self._summary_cache
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "enabled": self._task is not None,
+            "interval_ms": self.conf.interval_ms,
+            "slow_ms": self.conf.slow_ms,
+            "lag_alert_ms": self.conf.lag_alert_ms,
+            **self.summary(),
+            "lag_max_total_ms": round(self.max_lag_sec * 1000.0, 2),
+            "slow": list(self.slow),
+        }
+
+
+__all__ = ["LoopMonitor"]
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class _FeedStream:
+    """
+    Подписка на bookTicker одного символа поверх общего соединения.
+    Интерфейс как у _WSContext: async with hub.book_ticker_socket(sym) as s: msg = await s.recv()
+    """
+
+    __slots__ = ("_hub", "symbol", "_q")
+
+    def __init__(self, hub: "BookTickerHub", symbol: str, maxsize: int) -> None:
+        self._hub = hub
+        self.symbol = symbol
+        self._q: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    async def __aenter__(self) -> "_FeedStream":
+        self._hub._add(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._hub._remove(self)
+
+    async def recv(self) -> Any:
+        return await self._q.get()
+
+    def _push(self, msg: Dict[str, Any]) -> None:
+        # лучшие цены — важна только свежая: при переполнении выкидываем самую старую
+        if self._q.full():
+            try:
+                self._q.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            self._hub.dropped_total += 1
+        self._q.put_nowait(msg)
+
+
+class BookTickerHub:
+    """
+    Один combined-stream сокет bookTicker на все символы процесса.
+
+    Подписчики (MarketMaker'ы, виджет рынка) берут book_ticker_socket(sym) как у bm;
+    новые символы добавляются SUBSCRIBE в живое соединение, при обрыве соединение
+    поднимается заново сразу со всеми текущими символами. Число сокетов не растёт
+    с числом символов.
+    """
+
+    def __init__(self, bm: Any, queue_size: int = 64, reconnect_delay: float = 1.0) -> None:
+        self._bm = bm
+        self._queue_size = int(queue_size)
+        self._reconnect_delay = float(reconnect_delay)
+        self._subs: Dict[str, Set[_FeedStream]] = {}
+        self._ws: Any = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._req_id = 0
+
+        # метрики
+        self.messages_total = 0
+        self.connects_total = 0
+        self.dropped_total = 0
+
+    @staticmethod
+    def _stream(symbol: str) -> str:
+        return f"{symbol.lower()}@bookTicker"
+
+    def book_ticker_socket(self, symbol: str) -> _FeedStream:
+        return _FeedStream(self, str(symbol).upper(), self._queue_size)
+
+    def symbols(self) -> list:
+        return sorted(self._subs)
+
+    # ---------------- подписки ----------------
+    def _add(self, s: _FeedStream) -> None:
+        subs = self._subs.get(s.symbol)
+        if subs is None:
+            subs = self._subs[s.symbol] = set()
+            self._control("SUBSCRIBE", s.symbol)
+        subs.add(s)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wake.set()
+
+    def _remove(self, s: _FeedStream) -> None:
+        subs = self._subs.get(s.symbol)
+        if subs is None:
+            return
+        subs.discard(s)
+        if not subs:
+            del self._subs[s.symbol]
+            self._control("UNSUBSCRIBE", s.symbol)
+
+    def _control(self, method: str, symbol: str) -> None:
+        ws = self._ws
+        if ws is None:
+            return  # при (пере)подключении список потоков берётся из _subs
+        self._req_id += 1
+        msg = {"method": method, "params": [self._stream(symbol)], "id": self._req_id}
+
+        async def _send() -> None:
+            try:
+                await ws.send(msg)
+            except Exception as e:
+                logger.warning("bookTicker hub %s %s failed: %s", method, symbol, e)
+
+        asyncio.create_task(_send())
+
+    # ---------------- соединение ----------------
+    async def _run(self) -> None:
+        while True:
+            if not self._subs:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            streams = [self._stream(sym) for sym in self._subs]
+            try:
+                async with self._bm.multiplex_socket(streams) as ws:
+                    self._ws = ws
+                    self.connects_total += 1
+                    logger.info("bookTicker hub connected: %d symbols", len(streams))
+                    while True:
+                        msg = await ws.recv()
+                        if not isinstance(msg, dict):
+                            continue
+                        data = msg.get("data", msg)
+                        if not isinstance(data, dict):
+                            continue
+                        subs = self._subs.get(str(data.get("s") or "").upper())
+                        if not subs:
+                            continue  # ответ на SUBSCRIBE или уже отписанный символ
+                        self.messages_total += 1
+                        for s in subs:
+                            s._push(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("bookTicker hub error: %s", e)
+                await asyncio.sleep(self._reconnect_delay)
+            finally:
+                self._ws = None
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "symbols": len(self._subs),
+            "connects_total": self.connects_total,
+            "messages_total": self.messages_total,
+            "dropped_total": self.dropped_total,
+        }
@@ -1,11 +1,22 @@
 from __future__ import annotations
 import asyncio
-import time
 import math
 import random
 from dataclasses import dataclass
 from typing import Any, Dict, Optional, List
 
+from ..core import metrics
+from ..core.clock import WALL_CLOCK
+from ..core.config_schema import StrategyConfig
+from . import tracing
+from .ledger import PositionLedger
+
+_TICK_TO_QUOTE = metrics.histogram("amadeus_tick_to_quote_seconds",
+                                   "Last bookTicker receive to new quote placement").labels()
+_ORDER_MSGS = metrics.counter("amadeus_order_messages_total", "Order messages sent (new/cancel)", ("type",))
+_ORDER_NEW = _ORDER_MSGS.labels(type="new")
+_ORDER_CANCEL = _ORDER_MSGS.labels(type="cancel")
+
 
 @dataclass
 class PaperOrder:
@@ -26,35 +37,44 @@ class MarketMaker:
     - держит две LIM-лимитки по краям спреда (bid/ask),
     - переустанавливает при смещении цены,
     - отменяет по таймауту,
-    - симулирует исполнение при касании лучшими ценами.
+    - симулирует исполнение при касании лучшими ценами,
+    - закрывает позицию по рынку, если убыток от средней цены дошёл до stop_loss_pct
+      (сделка помечается stoploss_hit — по ним считает StoplossGuard).
 
     Все события отсылает через events_cb:
       - {'type':'order_event', ...}
       - {'type':'trade', ...}
-      - {'type':'diag', 'text': '...'}
+      - {'type':'bank', 'equity': ...} (троттлинг mark-to-market по ledger)
+      - {'type':'diag', 'text': '...', 'level': 'debug|info|warning|error', 'symbol': ...}
       - {'type':'market', ...} (если надо ретрансляция)
     """
 
-    def __init__(self, cfg: Dict[str, Any], client_wrapper: Any, events_cb):
+    def __init__(self, cfg: Dict[str, Any], client_wrapper: Any, events_cb, ledger: Optional[PositionLedger] = None,
+                 feed: Any = None, clock: Any = None):
         self.cfg = cfg or {}
+        # часы: реальные в бою, VirtualClock в реплее (services/replay.py)
+        self.clock = clock if clock is not None else WALL_CLOCK
+        self._now = self.clock.time
         self.client_wrap = client_wrapper
         self.events_cb = events_cb
+        # общий bookTicker-фид (BookTickerHub) — иначе свой сокет через client_wrap.bm
+        self.feed = feed
+        # инвентарь/PnL/equity — общий на приложение, либо свой
+        self.ledger: PositionLedger = ledger if ledger is not None else PositionLedger(self.cfg)
 
-        strat = (self.cfg.get("strategy") or {})
-        self.symbol: str = str(strat.get("symbol") or "BNBUSDT").upper()
-        self.loop_sleep: float = float(strat.get("loop_sleep", 0.2))
-
-        # Параметры стратегии
-        self.quote_size: float     = float(strat.get("quote_size", 10.0))   # USDT на сделку
-        self.min_spread_pct: float = float(strat.get("min_spread_pct", 0.0))
-        self.cancel_timeout: float = float(strat.get("cancel_timeout", 10.0))
-        self.post_only: bool       = bool(strat.get("post_only", True))
-        self.reorder_interval: float = float(strat.get("reorder_interval", 1.0))
+        # Параметры стратегии — меняются на лету через apply_cfg
+        params = self.parse_params(self.cfg)
+        self.symbol: str = params.symbol
+        self._set_params(params)
 
         # runtime
+        self._ticker_task: Optional[asyncio.Task] = None
         self.best_bid: Optional[float] = None
         self.best_ask: Optional[float] = None
         self._last_reorder_ts: float = 0.0
+        self._tick_ns = 0   # perf_counter_ns последнего тика (только при metrics.enabled)
+        self._stamp = None  # tracing.Stamp последнего тика (при tracing.enabled)
+        self._decide_ns = 0  # начало текущего _reseed_quotes, пока ставятся его ордера
 
         # бумажные ордера в shadow
         self.orders: Dict[str, PaperOrder] = {}
@@ -66,42 +86,65 @@ class MarketMaker:
         self.orders_active = 0
         self.orders_filled = 0
         self.orders_expired = 0
+        self.stops_total = 0
 
         # границы точности (на глаз, чтобы без обмена exchangeInfo)
         self._qty_step = 1e-6
         self._price_step = 1e-2  # 0.01$ для USDT-пар по умолчанию
 
+    @staticmethod
+    def parse_params(cfg: Dict[str, Any]) -> StrategyConfig:
+        """Параметры, которые можно менять без перезапуска. Бросает ConfigError на мусоре."""
+        return StrategyConfig.from_dict(cfg or {})
+
+    def _set_params(self, p: StrategyConfig) -> None:
+        self.loop_sleep: float = p.loop_sleep
+        self.quote_size: float = p.quote_size   # USDT на сделку
+        self.min_spread_pct: float = p.min_spread_pct
+        self.cancel_timeout: float = p.cancel_timeout
+        self.post_only: bool = p.post_only
+        self.reorder_interval: float = p.reorder_interval
+        self.stop_loss_pct: float = p.stop_loss_pct
+
+    def apply_cfg(self, cfg: Dict[str, Any]) -> None:
+        """Горячее применение: все параметры разбираются заранее и подменяются разом."""
+        params = self.parse_params(cfg)
+        self.cfg = cfg or {}
+        self._set_params(params)
+        # следующий шаг сразу переставит котировки с новыми параметрами
+        self._last_reorder_ts = 0.0
+
+    def cancel_all(self, reason: str = "cancel") -> None:
+        """Снять все активные бумажные ордера (остановка символа)."""
+        for po in list(self.orders.values()):
+            self._cancel(po, reason=reason)
+        self.orders.clear()
+        self.orders_active = 0
+
     # ----------------- публичный цикл -----------------
     async def run(self):
         self._log(f"MM start for {self.symbol} (shadow={getattr(self.client_wrap, 'shadow', False)})")
-        await asyncio.gather(
-            self._book_ticker_loop(),
-            self._mm_loop()
-        )
+        self._ticker_task = asyncio.create_task(self._book_ticker_loop())
+        try:
+            await self._mm_loop()
+        finally:
+            if self._ticker_task is not None:
+                self._ticker_task.cancel()
 
     # ----------------- утилиты -----------------
-    def _now(self) -> float:
-        return time.time()
-
-    def _log(self, msg: str):
-        # человекочитаемые логи в UI
-        self._emit({"type": "diag", "text": f"MM: {msg}"})
+    def _log(self, msg: str, level: str = "info"):
+        # человекочитаемые логи в UI; debug — только в кольцо diag (/api/logs), не в /ws
+        self._emit({"type": "diag", "text": f"MM: {msg}", "level": level, "symbol": self.symbol})
 
     def _emit(self, evt: Dict[str, Any]):
-        # единая точка публикации
+        # единая точка публикации: async-колбэк (AppState.on_event) — задачей,
+        # sync-колбэк (реплей) — сразу и ровно один раз
         try:
-            cb = self.events_cb
-            if asyncio.iscoroutinefunction(cb):
-                asyncio.create_task(cb(evt))
-            else:
-                # on_event в state умеет и sync dict
-                asyncio.create_task(self.events_cb(evt))  # type: ignore
+            res = self.events_cb(evt)
+            if asyncio.iscoroutine(res):
+                asyncio.create_task(res)
         except Exception:
-            # бэкап: не падать, хотя бы синхронно
-            try:
-                self.events_cb(evt)
-            except Exception:
-                pass
+            pass
 
     # округление под шаги
     def _round_price(self, p: float) -> float:
@@ -119,38 +162,47 @@ class MarketMaker:
     # ----------------- источники рынка -----------------
     async def _book_ticker_loop(self):
         """
-        Подписка на лучшую цену. Требует, чтобы client_wrap имел .bm с book_ticker_socket.
+        Подписка на лучшую цену: через общий фид, если он есть, иначе client_wrap.bm.book_ticker_socket.
         """
         sym = self.symbol
         # ожидать появления bm
-        while not getattr(self.client_wrap, "bm", None):
+        while self.feed is None and not getattr(self.client_wrap, "bm", None):
             await asyncio.sleep(0.2)
 
-        self._log(f"subscribe bookTicker {sym}")
-        try:
-            async with self.client_wrap.bm.book_ticker_socket(sym) as stream:
-                while True:
-                    msg = await stream.recv()
-                    if not isinstance(msg, dict):
-                        continue
-                    b = msg.get("b")
-                    a = msg.get("a")
-                    if b is not None:
-                        try: self.best_bid = float(b)
-                        except: pass
-                    if a is not None:
-                        try: self.best_ask = float(a)
-                        except: pass
-                    self.ticks_total += 1
-                    # ретранслируем в UI (не обязательно, но полезно)
-                    self._emit({"type": "market", "symbol": sym, "bestBid": self.best_bid, "bestAsk": self.best_ask, "ts": msg.get("E") or int(self._now()*1000)})
-        except asyncio.CancelledError:
-            self._log("bookTicker cancelled")
-            raise
-        except Exception as e:
-            self._log(f"bookTicker error: {e!s}")
-            await asyncio.sleep(1.0)
-            asyncio.create_task(self._book_ticker_loop())
+        while True:
+            self._log(f"subscribe bookTicker {sym}")
+            source = self.feed if self.feed is not None else self.client_wrap.bm
+            try:
+                async with source.book_ticker_socket(sym) as stream:
+                    while True:
+                        msg = await stream.recv()
+                        if isinstance(msg, dict):
+                            self.on_book_ticker(msg)
+            except asyncio.CancelledError:
+                self._log(f"bookTicker {sym} cancelled", "debug")
+                raise
+            except Exception as e:
+                self._log(f"bookTicker error: {e!s}", "warning")
+                await asyncio.sleep(1.0)
+
+    def on_book_ticker(self, msg: Dict[str, Any]) -> None:
+        """Тик лучшей цены (живой сокет или запись в реплее)."""
+        b = msg.get("b")
+        a = msg.get("a")
+        if b is not None:
+            try: self.best_bid = float(b)
+            except: pass
+        if a is not None:
+            try: self.best_ask = float(a)
+            except: pass
+        self.ticks_total += 1
+        if metrics.enabled:
+            self._tick_ns = metrics.now_ns()
+        if tracing.enabled:
+            self._stamp = msg.get("_trace")
+        self.ledger.mark(self.symbol, self.best_bid, self.best_ask)
+        # ретранслируем в UI (не обязательно, но полезно)
+        self._emit({"type": "market", "symbol": self.symbol, "bestBid": self.best_bid, "bestAsk": self.best_ask, "ts": msg.get("E") or int(self._now()*1000)})
 
     # ----------------- основной цикл ММ -----------------
     async def _mm_loop(self):
@@ -158,7 +210,7 @@ class MarketMaker:
             try:
                 await self._step_once()
             except Exception as e:
-                self._log(f"step error: {e!s}")
+                self._log(f"step error: {e!s}", "error")
                 await asyncio.sleep(0.3)
             await asyncio.sleep(self.loop_sleep)
 
@@ -170,6 +222,10 @@ class MarketMaker:
         # симулируем исполнение открытых ордеров по лучшим ценам
         self._try_fill_by_touch()
 
+        # стоп по позиции — до переустановки котировок
+        if self.stop_loss_pct > 0:
+            self._check_stop()
+
         # отменить протухшие
         self._cancel_expired()
 
@@ -182,8 +238,13 @@ class MarketMaker:
         # обновить метрики
         self.orders_active = sum(1 for o in self.orders.values() if o.status == "NEW")
 
+        # mark-to-market → bank/equity (equity дальше уходит в RiskManager)
+        if self.ledger.due(now):
+            self._emit({"type": "bank", **self.ledger.snapshot(), "ts": int(now * 1000)})
+
     # ----------------- логика котирования -----------------
     def _reseed_quotes(self):
+        self._decide_ns = tracing.now_ns() if tracing.enabled and self._stamp is not None else 0
         bid = float(self.best_bid or 0.0)
         ask = float(self.best_ask or 0.0)
         if bid <= 0.0 or ask <= 0.0:
@@ -208,6 +269,7 @@ class MarketMaker:
         # обновим/создадим по одной лимитке с каждой стороны
         self._upsert_one(side="BUY", price=px_buy, qty=qty_buy)
         self._upsert_one(side="SELL", price=px_sell, qty=qty_sell)
+        self._decide_ns = 0
 
     def _find_open(self, side: str) -> Optional[PaperOrder]:
         # выбираем «самый свежий» активный ордер нужной стороны
@@ -241,19 +303,31 @@ class MarketMaker:
         )
         self.orders[oid] = po
         self.orders_total += 1
+        if metrics.enabled:
+            _ORDER_NEW.inc()
+            if self._tick_ns:
+                _TICK_TO_QUOTE.observe_since(self._tick_ns)
 
-        self._emit({
+        evt = {
             "type": "order_event", "evt": "NEW",
             "id": oid, "symbol": self.symbol,
             "side": side, "price": po.price, "qty": po.qty,
             "ts": int(now * 1000)
-        })
-        self._log(f"new {side} {po.qty} @ {po.price}")
+        }
+        if self._decide_ns:
+            # метки тика и решения; AppState.on_event снимает их и закрывает трассу
+            st = self._stamp
+            evt["trace"] = {"rx": st.rx_ns, "dec": self._decide_ns, "snd": tracing.now_ns(), "xr": st.exch_ms}
+        self._emit(evt)
+        self._log(f"new {side} {po.qty} @ {po.price}", "debug")
 
     def _cancel(self, po: PaperOrder, reason: str = "cancel"):
         if po.status != "NEW":
             return
         po.status = "CANCELED"
+        self.orders.pop(po.id, None)  # в orders — только активные (иначе шаг растёт O(всех ордеров))
+        if metrics.enabled:
+            _ORDER_CANCEL.inc()
         now = self._now()
         self._emit({
             "type": "order_event", "evt": "CANCELED",
@@ -261,7 +335,7 @@ class MarketMaker:
             "side": po.side, "price": po.price, "qty": po.qty,
             "reason": reason, "ts": int(now * 1000)
         })
-        self._log(f"cancel {po.side} {po.qty} @ {po.price} ({reason})")
+        self._log(f"cancel {po.side} {po.qty} @ {po.price} ({reason})", "debug")
 
     def _cancel_expired(self):
         now = self._now()
@@ -289,10 +363,41 @@ class MarketMaker:
             elif po.side == "SELL" and b >= po.price:
                 self._fill(po, px=po.price, ts=now)
 
-    def _fill(self, po: PaperOrder, px: float, ts: float):
+    def _check_stop(self):
+        """Убыток позиции от средней цены >= stop_loss_pct → снять котировки и закрыть её по рынку."""
+        p = self.ledger.positions.get(self.symbol)
+        if p is None or not p.qty:
+            return
+        avg = p.avg_price
+        lim = self.stop_loss_pct / 100.0
+        if p.qty > 0 and self.best_bid <= avg * (1.0 - lim):
+            side, px = "SELL", float(self.best_bid)
+        elif p.qty < 0 and self.best_ask >= avg * (1.0 + lim):
+            side, px = "BUY", float(self.best_ask)
+        else:
+            return
+        self.cancel_all(reason="stoploss")
+        now = self._now()
+        po = PaperOrder(id=self._gen_id(), side=side, price=px, qty=abs(p.qty), ts_new=now, expires_at=now)
+        self.orders_total += 1
+        self.stops_total += 1
+        if metrics.enabled:
+            _ORDER_NEW.inc()
+        self._emit({
+            "type": "order_event", "evt": "NEW",
+            "id": po.id, "symbol": self.symbol,
+            "side": side, "price": px, "qty": po.qty,
+            "reason": "stoploss", "ts": int(now * 1000)
+        })
+        self._fill(po, px=px, ts=now, liquidity="TAKER", stoploss_hit=True)
+        self._log(f"stop-loss: {side} {po.qty} @ {px} (avg {avg:.8g}, limit {self.stop_loss_pct:g}%)", "warning")
+
+    def _fill(self, po: PaperOrder, px: float, ts: float, liquidity: str = "MAKER", stoploss_hit: bool = False):
         po.status = "FILLED"
         po.filled_qty = po.qty
+        self.orders.pop(po.id, None)
         self.orders_filled += 1
+        res = self.ledger.on_fill(self.symbol, po.side, px, po.qty, liquidity=liquidity)
 
         # ордер-событие
         self._emit({
@@ -302,15 +407,21 @@ class MarketMaker:
             "ts": int(ts * 1000)
         })
 
-        # сделка (P&L считаем нулевым — без инвентаря)
-        self._emit({
+        # сделка: pnl = закрытый этим филлом результат минус комиссия
+        trade = {
             "type": "trade",
             "id": f"T{po.id}",
             "symbol": self.symbol,
             "side": po.side,
             "price": px, "qty": po.qty,
-            "pnl": 0.0,
+            "pnl": res.realized - res.fee,
+            "fee": res.fee,
+            "closing": res.closing,
+            "position": res.position_qty,
             "ts": int(ts * 1000)
-        })
+        }
+        if stoploss_hit:
+            trade["stoploss_hit"] = True
+        self._emit(trade)
 
-        self._log(f"filled {po.side} {po.qty} @ {px}")
+        self._log(f"filled {po.side} {po.qty} @ {px}", "debug")
@@ -0,0 +1,213 @@
+"""
+Сэмплирующий профайлер по запросу (POST /api/admin/profile): без внешних инструментов, на живом процессе.
+
+Отдельный поток раз в interval_ms читает sys._current_frames() и считает стеки всех потоков
+процесса (поток event loop, пул to_thread, рекордер, сторож loop_monitor), кроме себя. Стек —
+на уровне функций (файл + первая строка), так одинаковые пути складываются в одну запись.
+Это wall-clock профиль: простаивающий loop виден как select в base_events._run_once.
+
+Цена: на каждый сэмпл поток берёт GIL на обход кадров (десятки мкс при сотне кадров),
+то есть при 10 мс ~0.5% времени loop. Длительность ограничена MAX_SECONDS, профиль один на процесс.
+
+memory=True добавляет tracemalloc: снимок в начале и в конце, разница по строкам (рост за окно).
+tracemalloc замедляет аллокации в разы — только на время окна, и только если он не был включён заранее.
+"""
+from __future__ import annotations
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MAX_SECONDS = 120.0
+FORMATS = ("speedscope", "collapsed")
+_MAX_DEPTH = 128
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_busy = False
+
+Frame = Tuple[str, str, int]   # (файл, функция, первая строка)
+
+
+class ProfilerBusy(RuntimeError):
+    """Профиль уже снимается в этом процессе."""
+
+
+def _short(path: str) -> str:
+    if path.startswith(_APP_ROOT):
+        return "app" + path[len(_APP_ROOT):]
+    parts = path.replace("\\", "/").split("/")
+    return "/".join(parts[-2:])
+
+
+class StackSampler:
+    def __init__(self, interval_ms: float = 10.0) -> None:
+        self.interval = max(1.0, float(interval_ms)) / 1000.0
+        self.counts: Counter = Counter()     # (thread ident, (Frame, ...)) -> сэмплы
+        self.thread_names: Dict[int, str] = {}
+        self.samples = 0
+        self.started = 0.0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        counts = self.counts
+        while not self._stop.wait(self.interval):
+            if self.samples % 100 == 0:
+                self.thread_names.update({t.ident: t.name for t in threading.enumerate() if t.ident})
+            frames = sys._current_frames()
+            for tid, f in frames.items():
+                if tid == me:
+                    continue
+                stack: List[Frame] = []
+                while f is not None and len(stack) < _MAX_DEPTH:
+                    code = f.f_code
+                    stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+                    f = f.f_back
+                stack.reverse()
+                counts[(tid, tuple(stack))] += 1
+            frames = f = None  # не держим кадры потоков между сэмплами
+            self.samples += 1
+
+    # ---------------- вывод ----------------
+    def _thread_name(self, tid: int) -> str:
+        return self.thread_names.get(tid) or f"thread-{tid}"
+
+    def collapsed(self) -> str:
+        """Формат flamegraph.pl / speedscope: `поток;внешняя;...;внутренняя N` — по убыванию N."""
+        lines = []
+        for (tid, stack), n in self.counts.most_common():
+            names = [self._thread_name(tid).replace(";", ":")]
+            names += [f"{name} ({_short(file)}:{line})".replace(";", ":") for file, name, line in stack]
+            lines.append(f"{';'.join(names)} {n}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def speedscope(self, name: str = "amadeus") -> Dict[str, Any]:
+        """speedscope file format: профиль `sampled` на поток, одинаковые стеки — один сэмпл с весом."""
+        frame_idx: Dict[Frame, int] = {}
+        frames: List[Dict[str, Any]] = []
+        per_thread: Dict[int, Tuple[List[List[int]], List[float]]] = {}
+        step_ms = self.interval * 1000.0
+        for (tid, stack), n in self.counts.items():
+            idx = []
+            for fr in stack:
+                i = frame_idx.get(fr)
+                if i is None:
+                    i = frame_idx[fr] = len(frames)
+                    frames.append({"name": fr[1], "file": _short(fr[0]), "line": fr[2]})
+                idx.append(i)
+            samples, weights = per_thread.setdefault(tid, ([], []))
+            samples.append(idx)
+            weights.append(round(n * step_ms, 3))
+        end = round(self.elapsed * 1000.0, 3)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "amadeus-profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [
+                {"type": "sampled", "name": self._thread_name(tid), "unit": "milliseconds",
+                 "startValue": 0, "endValue": end, "samples": samples, "weights": weights}
+                for tid, (samples, weights) in sorted(per_thread.items(), key=lambda kv: -sum(kv[1][1]))
+            ],
+        }
+
+
+def _memory_diff(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, top: int) -> List[Dict[str, Any]]:
+    flt = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__),
+           tracemalloc.Filter(False, "<frozen importlib._bootstrap>"), tracemalloc.Filter(False, "<unknown>"))
+    stats = after.filter_traces(flt).compare_to(before.filter_traces(flt), "lineno")
+    out = []
+    for st in stats[:top]:
+        fr = st.traceback[0]
+        out.append({"where": f"{_short(fr.filename)}:{fr.lineno}",
+                    "size_diff_kb": round(st.size_diff / 1024, 1), "size_kb": round(st.size / 1024, 1),
+                    "count_diff": st.count_diff, "count": st.count})
+    return out
+
+
+def structure_sizes(supervisor: Any = None, **extra: int) -> Dict[str, int]:
+    """Размеры структур, которые могут расти без предела: активные ордера по символам и т. п."""
+    out = dict(extra)
+    for sym, mm in (getattr(supervisor, "mms", None) or {}).items():
+        out[f"MarketMaker.orders[{sym}]"] = len(mm.orders)
+    return out
+
+
+async def profile(seconds: float = 10.0, interval_ms: float = 10.0, fmt: str = "speedscope", memory: bool = False,
+                  top: int = 30, sizes: Optional[Callable[[], Dict[str, int]]] = None,
+                  name: str = "amadeus") -> Dict[str, Any]:
+    """Снять профиль текущего процесса за `seconds`; loop всё это время работает как обычно."""
+    global _busy
+    if fmt not in FORMATS:
+        raise ValueError(f"format: expected one of {FORMATS}, got {fmt!r}")
+    seconds = float(seconds)
+    if not 0 < seconds <= MAX_SECONDS:
+        raise ValueError(f"seconds: expected 0 < seconds <= {MAX_SECONDS:g}")
+    if _busy:
+        raise ProfilerBusy("profiler is already running in this process")
+    _busy = True
+    started_tm = False
+    try:
+        before = None
+        sizes_before = sizes() if sizes is not None else None
+        if memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(1)
+                started_tm = True
+            before = await asyncio.to_thread(tracemalloc.take_snapshot)
+
+        sampler = StackSampler(interval_ms)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+
+        out: Dict[str, Any] = {
+            "format": fmt,
+            "pid": os.getpid(),
+            "duration_sec": round(sampler.elapsed, 3),
+            "interval_ms": sampler.interval * 1000.0,
+            "samples": sampler.samples,
+            "threads": sorted({sampler._thread_name(tid) for tid, _ in sampler.counts}),
+        }
+        if fmt == "collapsed":
+            out["profile"] = await asyncio.to_thread(sampler.collapsed)
+        else:
+            out["profile"] = await asyncio.to_thread(sampler.speedscope, name)
+
+        if memory:
+            after = await asyncio.to_thread(tracemalloc.take_snapshot)
+            out["memory"] = {
+                "top": await asyncio.to_thread(_memory_diff, before, after, int(top)),
+                "traced_kb": round(tracemalloc.get_traced_memory()[0] / 1024, 1),
+            }
+        if sizes is not None:
+            out["sizes"] = {"before": sizes_before, "after": sizes()}
+        return out
+    finally:
+        if started_tm:
+            tracemalloc.stop()
+        _busy = False
+
+
+__all__ = ["StackSampler", "ProfilerBusy", "profile", "structure_sizes", "FORMATS", "MAX_SECONDS"]
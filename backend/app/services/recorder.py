@@ -0,0 +1,394 @@
+"""
+Запись сырых WS-кадров биржи с локальным временем приёма.
+
+Сегмент `md-YYYYMMDD-HHMMSS-NNNN.seg` — append-only последовательность сжатых блоков:
+    заголовок блока  <4s I I I q q>  magic, comp_len, raw_len, n, t_first_us, t_last_us
+    zlib(payload)    u16 число потоков, [u16 len, имя]..., затем записи <q H I> ts_us, stream_id, len + кадр
+Блок самодостаточен (своя таблица потоков), поэтому читается по смещению из mmap без соседей.
+Рядом `*.seg.idx` — JSON lines по блоку: {"off","len","n","t0","t1","streams"} — для seek по времени/потоку;
+если индекса нет (упали посреди записи), читатель восстанавливает его по заголовкам.
+"""
+from __future__ import annotations
+import asyncio
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+_MAGIC = b"MDB1"
+_BLK = struct.Struct("<4sIIIqq")
+_REC = struct.Struct("<qHI")
+_U16 = struct.Struct("<H")
+SEG_SUFFIX = ".seg"
+IDX_SUFFIX = ".seg.idx"
+
+
+class _Block:
+    """Копилка записей текущего блока (живёт только в потоке записи)."""
+
+    __slots__ = ("streams", "names", "parts", "raw_len", "n", "t0", "t1", "opened")
+
+    def __init__(self) -> None:
+        self.streams: Dict[str, int] = {}
+        self.names: List[bytes] = []
+        self.parts: List[bytes] = []
+        self.raw_len = 0
+        self.n = 0
+        self.t0 = 0
+        self.t1 = 0
+        self.opened = 0.0
+
+    def add(self, ts_us: int, stream: str, raw: Any) -> None:
+        sid = self.streams.get(stream)
+        if sid is None:
+            sid = self.streams[stream] = len(self.names)
+            self.names.append(stream.encode("utf-8"))
+        b = raw.encode("utf-8") if isinstance(raw, str) else bytes(raw)
+        self.parts.append(_REC.pack(ts_us, sid, len(b)))
+        self.parts.append(b)
+        self.raw_len += _REC.size + len(b)
+        if not self.n:
+            self.t0 = ts_us
+            self.opened = time.monotonic()
+        self.t1 = ts_us
+        self.n += 1
+
+    def encode(self, level: int) -> Tuple[bytes, Dict[str, Any]]:
+        table = [_U16.pack(len(self.names))]
+        for nb in self.names:
+            table.append(_U16.pack(len(nb)))
+            table.append(nb)
+        payload = b"".join(table) + b"".join(self.parts)
+        comp = zlib.compress(payload, level)
+        head = _BLK.pack(_MAGIC, len(comp), len(payload), self.n, self.t0, self.t1)
+        meta = {"len": len(head) + len(comp), "n": self.n, "t0": self.t0, "t1": self.t1,
+                "streams": list(self.streams)}
+        return head + comp, meta
+
+
+class MarketRecorder:
+    """
+    Пишет кадры, полученные _WSContext.recv, в сегменты (см. описание формата выше).
+
+    На event loop — только put(): метка времени и append в deque (без syscalls и сжатия).
+    Сжатие, запись, ротация и ретеншн — в отдельном потоке. Очередь ограничена max_pending:
+    если диск не успевает, новые кадры отбрасываются и считаются в dropped (loop не ждёт).
+    """
+
+    def __init__(self, directory: Path, segment_mb: float = 64.0, segment_minutes: float = 60.0,
+                 block_kb: float = 256.0, block_ms: float = 1000.0, retention_hours: float = 72.0,
+                 max_total_mb: float = 0.0, level: int = 1, max_pending: int = 200_000) -> None:
+        self.dir = Path(directory)
+        self.segment_bytes = int(segment_mb * 1024 * 1024)
+        self.segment_sec = float(segment_minutes) * 60.0
+        self.block_bytes = int(block_kb * 1024)
+        self.block_sec = max(0.01, float(block_ms) / 1000.0)
+        self.retention_hours = float(retention_hours)
+        self.max_total_bytes = int(max_total_mb * 1024 * 1024)
+        self.level = int(level)
+        self.max_pending = int(max_pending)
+
+        self._q: Deque[Tuple[int, str, Any]] = deque()
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+
+        self._seq = 0
+        self._seg = None            # type: ignore  # файл текущего сегмента
+        self._idx = None            # type: ignore
+        self._seg_path: Optional[Path] = None
+        self._seg_size = 0
+        self._seg_opened = 0.0
+
+        self.received = 0
+        self.dropped = 0
+        self.blocks_total = 0
+        self.bytes_raw = 0
+        self.bytes_written = 0
+        self.segments_deleted = 0
+        self.errors = 0
+
+    @classmethod
+    def from_config(cls, rc: Any, subdir: Optional[str] = None) -> "MarketRecorder":
+        """rc — RecorderConfig (core/config_schema.py); subdir — своя папка (шард-воркер)."""
+        d = Path(rc.dir)
+        if not d.is_absolute():
+            d = BACKEND_DIR / d
+        if subdir:
+            d = d / subdir
+        return cls(d, segment_mb=rc.segment_mb, segment_minutes=rc.segment_minutes, block_kb=rc.block_kb,
+                   block_ms=rc.block_ms, retention_hours=rc.retention_hours, max_total_mb=rc.max_total_mb,
+                   level=rc.level)
+
+    def apply_retention(self, rc: Any) -> None:
+        self.retention_hours = float(rc.retention_hours)
+        self.max_total_bytes = int(rc.max_total_mb * 1024 * 1024)
+
+    # ---------------- горячий путь (event loop) ----------------
+    def put(self, stream: str, raw: Any) -> None:
+        if len(self._q) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._q.append((time.time_ns() // 1000, stream, raw))
+        self.received += 1
+
+    # ---------------- жизненный цикл ----------------
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="md-recorder", daemon=True)
+        self._thread.start()
+        logger.info("market recorder → %s", self.dir)
+
+    def close(self) -> None:
+        """Дописать хвост и закрыть сегмент (блокирует; из async-кода — aclose())."""
+        if self._thread is None:
+            return
+        self._stop = True
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self.close)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "dir": str(self.dir),
+            "segment": self._seg_path.name if self._seg_path else None,
+            "received": self.received,
+            "dropped": self.dropped,
+            "pending": len(self._q),
+            "blocks": self.blocks_total,
+            "bytes_raw": self.bytes_raw,
+            "bytes_written": self.bytes_written,
+            "segments_deleted": self.segments_deleted,
+            "errors": self.errors,
+        }
+
+    # ---------------- поток записи ----------------
+    def _run(self) -> None:
+        block = _Block()
+        tick = min(0.2, self.block_sec / 2.0)
+        try:
+            self._apply_retention()  # хвосты прошлых запусков
+        except Exception:
+            logger.exception("market recorder retention failed")
+        while True:
+            self._wake.wait(tick)
+            self._wake.clear()
+            stop = self._stop
+            try:
+                q = self._q
+                while q:
+                    ts, stream, raw = q.popleft()
+                    block.add(ts, stream, raw)
+                    if block.raw_len >= self.block_bytes:
+                        self._write_block(block)
+                        block = _Block()
+                if block.n and (stop or time.monotonic() - block.opened >= self.block_sec):
+                    self._write_block(block)
+                    block = _Block()
+                if self._seg is not None and time.monotonic() - self._seg_opened >= self.segment_sec:
+                    self._rotate()
+            except Exception:
+                self.errors += 1
+                logger.exception("market recorder write failed")
+                block = _Block()
+            if stop:
+                break
+        self._close_segment()
+
+    def _open_segment(self) -> None:
+        self._seq += 1
+        name = f"md-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{self._seq:04d}"
+        self._seg_path = self.dir / (name + SEG_SUFFIX)
+        self._seg = open(self._seg_path, "ab")
+        self._idx = open(self.dir / (name + IDX_SUFFIX), "a", encoding="utf-8")
+        self._seg_size = self._seg.tell()
+        self._seg_opened = time.monotonic()
+
+    def _close_segment(self) -> None:
+        for f in (self._seg, self._idx):
+            if f is not None:
+                try:
+                    f.close()
+                except Exception:
+                    pass
+        self._seg = None
+        self._idx = None
+
+    def _rotate(self) -> None:
+        self._close_segment()
+        self._apply_retention()
+
+    def _write_block(self, block: _Block) -> None:
+        if self._seg is None:
+            self._open_segment()
+        data, meta = block.encode(self.level)
+        meta["off"] = self._seg_size
+        self._seg.write(data)
+        self._seg.flush()
+        self._idx.write(json.dumps(meta, separators=(",", ":")) + "\n")
+        self._idx.flush()
+        self._seg_size += len(data)
+        self.blocks_total += 1
+        self.bytes_raw += block.raw_len
+        self.bytes_written += len(data)
+        if self._seg_size >= self.segment_bytes:
+            self._rotate()
+
+    def _apply_retention(self) -> None:
+        segs = sorted(self.dir.glob("md-*" + SEG_SUFFIX))
+        if not segs:
+            return
+        cutoff = time.time() - self.retention_hours * 3600.0 if self.retention_hours > 0 else None
+        sizes = {p: p.stat().st_size for p in segs}
+        total = sum(sizes.values())
+        for p in segs:
+            if p == self._seg_path and self._seg is not None:
+                continue
+            old = cutoff is not None and p.stat().st_mtime < cutoff
+            over = self.max_total_bytes > 0 and total > self.max_total_bytes
+            if not (old or over):
+                continue
+            total -= sizes[p]
+            for f in (p, p.with_name(p.name[: -len(SEG_SUFFIX)] + IDX_SUFFIX)):
+                try:
+                    f.unlink()
+                except FileNotFoundError:
+                    pass
+            self.segments_deleted += 1
+
+
+# ---------------- чтение ----------------
+@dataclass(frozen=True)
+class BlockInfo:
+    off: int
+    length: int
+    n: int
+    t0: int
+    t1: int
+    streams: Optional[Tuple[str, ...]] = None  # из индекса; без индекса — неизвестно
+
+
+class SegmentReader:
+    """
+    Сегмент через mmap: блоки находятся по индексу (или по заголовкам), распаковывается
+    только нужный блок. records(start_us, end_us, streams) — seek бинпоиском по t_last.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self._f = open(self.path, "rb")
+        self.size = os.fstat(self._f.fileno()).st_size
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.blocks: List[BlockInfo] = self._load_index() or self._scan()
+        self._t1 = [b.t1 for b in self.blocks]
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._f.close()
+
+    def __enter__(self) -> "SegmentReader":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _load_index(self) -> List[BlockInfo]:
+        idx = self.path.with_name(self.path.name[: -len(SEG_SUFFIX)] + IDX_SUFFIX)
+        if not idx.exists():
+            return []
+        out: List[BlockInfo] = []
+        try:
+            with open(idx, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    m = json.loads(line)
+                    b = BlockInfo(int(m["off"]), int(m["len"]), int(m["n"]), int(m["t0"]), int(m["t1"]),
+                                  tuple(m.get("streams") or ()))
+                    if b.off + b.length > self.size:
+                        break  # индекс опередил данные (чтение во время записи)
+                    out.append(b)
+        except (ValueError, KeyError):
+            return []
+        return out
+
+    def _scan(self) -> List[BlockInfo]:
+        out: List[BlockInfo] = []
+        mm = self._mm
+        off = 0
+        while mm is not None and off + _BLK.size <= self.size:
+            magic, clen, _raw, n, t0, t1 = _BLK.unpack_from(mm, off)
+            if magic != _MAGIC or off + _BLK.size + clen > self.size:
+                break  # хвост недописан
+            out.append(BlockInfo(off, _BLK.size + clen, n, t0, t1))
+            off += _BLK.size + clen
+        return out
+
+    @property
+    def t_first(self) -> Optional[int]:
+        return self.blocks[0].t0 if self.blocks else None
+
+    @property
+    def t_last(self) -> Optional[int]:
+        return self.blocks[-1].t1 if self.blocks else None
+
+    def block_records(self, i: int) -> Iterator[Tuple[int, str, bytes]]:
+        b = self.blocks[i]
+        payload = zlib.decompress(self._mm[b.off + _BLK.size: b.off + b.length])
+        (ns,) = _U16.unpack_from(payload, 0)
+        pos = _U16.size
+        names: List[str] = []
+        for _ in range(ns):
+            (ln,) = _U16.unpack_from(payload, pos)
+            pos += _U16.size
+            names.append(payload[pos: pos + ln].decode("utf-8"))
+            pos += ln
+        end = len(payload)
+        while pos < end:
+            ts, sid, ln = _REC.unpack_from(payload, pos)
+            pos += _REC.size
+            yield ts, names[sid], payload[pos: pos + ln]
+            pos += ln
+
+    def records(self, start_us: Optional[int] = None, end_us: Optional[int] = None,
+                streams: Optional[List[str]] = None) -> Iterator[Tuple[int, str, bytes]]:
+        i = bisect.bisect_left(self._t1, start_us) if start_us is not None else 0
+        want = set(streams) if streams else None
+        for j in range(i, len(self.blocks)):
+            b = self.blocks[j]
+            if end_us is not None and b.t0 > end_us:
+                return
+            if want is not None and b.streams is not None and not want.intersection(b.streams):
+                continue
+            for ts, stream, raw in self.block_records(j):
+                if start_us is not None and ts < start_us:
+                    continue
+                if end_us is not None and ts > end_us:
+                    return
+                if want is not None and stream not in want:
+                    continue
+                yield ts, stream, raw
+
+
+__all__ = ["MarketRecorder", "SegmentReader", "BlockInfo", "SEG_SUFFIX"]
@@ -0,0 +1,114 @@
+"""
+Формат записи рыночных потоков для реплея/бэктеста.
+
+Одна запись — одна строка JSON:
+    {"ts": 1700000000123, "stream": "bookTicker", "symbol": "BTCUSDT", "data": {...сырое сообщение Binance...}}
+ts — локальное время приёма (мс): по нему реплей двигает виртуальные часы.
+Файлы — *.jsonl или *.jsonl.gz; несколько файлов (символов) сливаются по ts.
+Сегменты рекордера (*.seg, services/recorder.py) читаются через mmap и приводятся к тому же виду.
+"""
+from __future__ import annotations
+import gzip
+import heapq
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+STREAMS = ("bookTicker", "depth", "aggTrade")
+_SUFFIXES = (".jsonl", ".jsonl.gz", ".seg")
+
+
+def make_record(stream: str, symbol: str, data: Dict[str, Any], ts_ms: int) -> Dict[str, Any]:
+    return {"ts": int(ts_ms), "stream": stream, "symbol": str(symbol).upper(), "data": data}
+
+
+def parse_ts_ms(v: Any) -> Optional[int]:
+    """Граница диапазона: мс/с эпохи или ISO-время (без зоны — UTC)."""
+    if v is None or v == "":
+        return None
+    if isinstance(v, (int, float)) or str(v).lstrip("-").isdigit():
+        x = int(v)
+        return x if x > 100_000_000_000 else x * 1000
+    from datetime import datetime, timezone
+    dt = datetime.fromisoformat(str(v))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def expand_paths(paths: Iterable[str]) -> List[str]:
+    """Файлы как есть, папки — все *.jsonl[.gz] / *.seg внутри, включая подпапки шардов (по имени)."""
+    out: List[str] = []
+    for p in paths:
+        if os.path.isdir(p):
+            for root, dirs, files in os.walk(p):
+                dirs.sort()
+                out.extend(os.path.join(root, n) for n in sorted(files) if n.endswith(_SUFFIXES))
+        else:
+            out.append(p)
+    return out
+
+
+def _stream_kind(name: str) -> str:
+    kind = name.partition("@")[2]
+    for k in STREAMS:
+        if kind.startswith(k):
+            return k
+    return kind
+
+
+def frame_to_record(ts_us: int, stream: str, raw: bytes) -> Optional[Dict[str, Any]]:
+    """Сырой кадр рекордера → запись; combined-кадр {"stream","data"} разворачивается, ответы на SUBSCRIBE — None."""
+    try:
+        msg = json.loads(raw)
+    except ValueError:
+        return None
+    if isinstance(msg, dict) and "stream" in msg and "data" in msg:
+        stream, msg = str(msg["stream"]), msg["data"]
+    if not isinstance(msg, dict) or stream == "*":
+        return None
+    symbol = msg.get("s") or stream.partition("@")[0]
+    return make_record(_stream_kind(stream), symbol, msg, ts_us // 1000)
+
+
+def _read_segment(path: str, start_ms: Optional[int], end_ms: Optional[int]) -> Iterator[Dict[str, Any]]:
+    from .recorder import SegmentReader
+    start_us = start_ms * 1000 if start_ms is not None else None
+    end_us = end_ms * 1000 + 999 if end_ms is not None else None
+    with SegmentReader(path) as seg:
+        for ts_us, stream, raw in seg.records(start_us, end_us):
+            rec = frame_to_record(ts_us, stream, raw)
+            if rec is not None:
+                yield rec
+
+
+def read_records(path: str, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Записи файла в диапазоне [start_ms, end_ms]; сегмент ищет начало по индексу, jsonl — читается подряд."""
+    if path.endswith(".seg"):
+        yield from _read_segment(path, start_ms, end_ms)
+        return
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            if isinstance(rec, dict) and "ts" in rec and "data" in rec:
+                if start_ms is not None and rec["ts"] < start_ms:
+                    continue
+                if end_ms is not None and rec["ts"] > end_ms:
+                    return
+                yield rec
+
+
+def merge_records(paths: Iterable[str], start_ms: Optional[int] = None,
+                  end_ms: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Слияние по ts; при равных ts порядок — как в списке файлов (детерминированно)."""
+    files = expand_paths(paths)
+    if len(files) == 1:
+        return read_records(files[0], start_ms, end_ms)
+    return heapq.merge(*(read_records(p, start_ms, end_ms) for p in files), key=lambda r: r["ts"])
+
+
+__all__ = ["STREAMS", "make_record", "frame_to_record", "parse_ts_ms", "expand_paths", "read_records", "merge_records"]
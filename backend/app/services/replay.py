@@ -0,0 +1,239 @@
+from __future__ import annotations
+import heapq
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..core.clock import VirtualClock
+from ..core.config_schema import compile_cfg
+from .ledger import PositionLedger
+from .market_maker import MarketMaker
+from .recording import merge_records
+from .risk.manager import RiskManager
+from .supervisor import StrategySupervisor
+
+logger = logging.getLogger(__name__)
+
+_INF = float("inf")
+
+
+class ReplaySink:
+    """
+    events_cb стратегий в реплее — то, что AppState.on_event делает с событиями
+    (equity и закрытые сделки → RiskManager, ордера/сделки → история), без WS.
+    Синхронный: события обрабатываются в порядке эмиссии; запись в историю — flush().
+    """
+
+    def __init__(self, risk: RiskManager, history: Any = None, curve_interval_sec: float = 60.0) -> None:
+        self.risk = risk
+        self.history = history
+        self.curve_interval_sec = float(curve_interval_sec)
+        self.counts: Dict[str, int] = {}
+        self.equity_curve: List[Tuple[int, float]] = []
+        self._pending: List[Dict[str, Any]] = []
+        self._last_curve_ts = -_INF
+        self.equity_peak = 0.0
+        self.max_drawdown = 0.0  # доля от пика
+
+    def __call__(self, evt: Dict[str, Any]) -> None:
+        t = evt.get("type")
+        self.counts[t] = self.counts.get(t, 0) + 1
+        if t == "bank":
+            eq = float(evt["equity"])
+            ts = evt.get("ts")
+            self.risk.on_equity(eq, ts=ts / 1000.0 if ts is not None else None)
+            if eq > self.equity_peak:
+                self.equity_peak = eq
+            elif self.equity_peak > 0:
+                dd = (self.equity_peak - eq) / self.equity_peak
+                if dd > self.max_drawdown:
+                    self.max_drawdown = dd
+            if ts is not None and ts / 1000.0 - self._last_curve_ts >= self.curve_interval_sec:
+                self._last_curve_ts = ts / 1000.0
+                self.equity_curve.append((int(ts), eq))
+        elif t == "trade":
+            if evt.get("closing", True):
+                ts = evt.get("ts")
+                self.risk.on_trade_closed(pnl=float(evt.get("pnl") or 0.0), pair=evt.get("symbol") or None,
+                                          ts=ts / 1000.0 if ts is not None else None,
+                                          stoploss_hit=bool(evt.get("stoploss_hit")))
+            if self.history is not None:
+                self._pending.append(evt)
+        elif t == "order_event" and self.history is not None:
+            self._pending.append(evt)
+
+    async def flush(self, min_batch: int = 1) -> None:
+        if not self._pending or len(self._pending) < min_batch:
+            return
+        batch, self._pending = self._pending, []
+        await self.history.log_many(batch)
+
+
+@dataclass
+class _Sched:
+    mm: MarketMaker
+    next_k: int = -1        # номер следующего шага на сетке t0 + k*step (-1 — не запланирован)
+    orders_total: int = 0   # для «после постановки — шаг на следующем тике сетки»
+
+
+class ReplayEngine:
+    """
+    Детерминированный прогон записанных потоков (services/recording.py) через ту же
+    стратегию (MarketMaker), леджер и RiskManager на VirtualClock.
+
+    Исполнение — как в бою: MarketMaker сам исполняет бумажные ордера касанием лучших цен,
+    поэтому из записи нужен только bookTicker (или верх стакана depth, если bookTicker не писали);
+    aggTrade и прочее считается в skipped.
+
+    Шаги стратегии идут по той же сетке, что и в бою (loop_sleep), но пустые шаги
+    пропускаются: шаг нужен только после изменения рынка/постановки ордера, либо когда
+    наступает переустановка котировок, таймаут ордера или публикация equity. Результат
+    совпадает с прогоном каждого шага сетки, а сутки данных проходят за секунды.
+    """
+
+    def __init__(self, cfg: Dict[str, Any], paths: Iterable[str], symbols: Optional[List[str]] = None,
+                 history: Any = None, curve_interval_sec: float = 60.0,
+                 start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> None:
+        self.cfg = cfg or {}
+        self.conf = compile_cfg(self.cfg)  # ConfigError на мусоре — до прогона
+        self.paths = list(paths)
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.clock = VirtualClock()
+
+        self.ledger = PositionLedger(self.cfg)
+        self.risk = RiskManager(self.cfg, clock=self.clock)
+        self.sink = ReplaySink(self.risk, history=history, curve_interval_sec=curve_interval_sec)
+        self.supervisor = StrategySupervisor(self.cfg, client_wrapper=None, events_cb=self.sink,
+                                             ledger=self.ledger, symbols=symbols, clock=self.clock)
+        self._sched: Dict[str, _Sched] = {}
+        for sym in self.supervisor.symbols:
+            self._sched[sym] = _Sched(self.supervisor.ensure_mm(sym))
+
+        self._heap: List[Tuple[float, int, str, int]] = []
+        self._order = {sym: i for i, sym in enumerate(self._sched)}
+        self._book_ticker: set = set()  # символы с записанным bookTicker (иначе верх стакана — из depth)
+        self._t0: Optional[float] = None
+        self._step = max(1e-3, self.conf.strategy.loop_sleep)
+
+        self.records = 0
+        self.skipped = 0
+        self.steps = 0
+
+    # ---------------- сетка шагов ----------------
+    def _grid(self, k: int) -> float:
+        return self._t0 + k * self._step
+
+    def _schedule(self, sym: str, k: int) -> None:
+        st = self._sched[sym]
+        if st.next_k != -1 and st.next_k <= k:
+            return
+        st.next_k = k
+        heapq.heappush(self._heap, (self._grid(k), self._order[sym], sym, k))
+
+    def _after_tick(self, sym: str, t: float) -> None:
+        # изменился рынок → ближайший шаг сетки строго после t
+        self._schedule(sym, int(math.floor((t - self._t0) / self._step)) + 1)
+
+    def _wake(self, st: _Sched, k: int) -> None:
+        """Следующий шаг, который что-то сделает без новых тиков."""
+        mm = st.mm
+        st.next_k = -1
+        if mm.orders_total != st.orders_total:
+            st.orders_total = mm.orders_total
+            self._schedule(mm.symbol, k + 1)
+            return
+        if mm.best_bid is None or mm.best_ask is None:
+            return
+        wake = min(mm._last_reorder_ts + max(0.3, mm.reorder_interval), self.ledger.next_due())
+        for po in mm.orders.values():
+            if po.status == "NEW" and po.expires_at < wake:
+                wake = po.expires_at
+        # с допуском: шаг «на границе» лучше сделать лишний раз (он пустой), чем пропустить
+        self._schedule(mm.symbol, max(k + 1, int(math.ceil((wake - self._t0) / self._step - 1e-6))))
+
+    async def _advance(self, until: float) -> None:
+        heap = self._heap
+        while heap and heap[0][0] <= until:
+            ts, _, sym, k = heapq.heappop(heap)
+            st = self._sched[sym]
+            if st.next_k != k:
+                continue  # перепланирован раньше
+            self.clock.set(ts)
+            await st.mm._step_once()
+            self.steps += 1
+            self._wake(st, k)
+        await self.sink.flush(min_batch=5000)
+
+    # ---------------- записи ----------------
+    async def _apply(self, rec: Dict[str, Any]) -> None:
+        sym = str(rec.get("symbol") or "").upper()
+        stream = rec.get("stream")
+        data = rec.get("data") or {}
+        st = self._sched.get(sym)
+        if stream == "bookTicker":
+            if st is None:
+                self.skipped += 1
+                return
+            self._book_ticker.add(sym)
+            st.mm.on_book_ticker(data)
+            self._after_tick(sym, self.clock.time())
+        elif stream == "depth" and st is not None and sym not in self._book_ticker and "bids" in data:
+            # частичный стакан (depth5/10/20) без bookTicker — верх стакана как лучшие цены
+            bids = data.get("bids") or []
+            asks = data.get("asks") or []
+            if bids and asks:
+                st.mm.on_book_ticker({"b": bids[0][0], "a": asks[0][0]})
+                self._after_tick(sym, self.clock.time())
+        else:
+            self.skipped += 1
+
+    async def run(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        first_ts: Optional[float] = None
+        last_ts: Optional[float] = None
+        for rec in merge_records(self.paths, self.start_ms, self.end_ms):
+            t = float(rec["ts"]) / 1000.0
+            if self._t0 is None:
+                self._t0 = first_ts = t
+                self.clock.set(t)
+            await self._advance(t)
+            self.clock.set(t)
+            last_ts = t
+            self.records += 1
+            await self._apply(rec)
+        if last_ts is not None:
+            await self._advance(last_ts)
+        await self.sink.flush()
+        wall = time.perf_counter() - started
+        span = (last_ts - first_ts) if last_ts is not None else 0.0
+        logger.info("replay: %d records, %d steps, %.1fs of data in %.2fs", self.records, self.steps, span, wall)
+        return self.result(span, wall)
+
+    def result(self, span: float, wall: float) -> Dict[str, Any]:
+        return {
+            "records": self.records,
+            "skipped": self.skipped,
+            "steps": self.steps,
+            "span_sec": round(span, 3),
+            "wall_sec": round(wall, 3),
+            "speedup": round(span / wall, 1) if wall > 0 else None,
+            "cfg_version": self.conf.version,
+            "symbols": self.supervisor.metrics(),
+            "totals": self.supervisor.totals(),
+            "ledger": self.ledger.snapshot(),
+            "fills_total": self.ledger.fills_total,
+            "max_drawdown": round(self.sink.max_drawdown, 6),
+            "risk": self.risk.dump_state(),
+            "events": dict(self.sink.counts),
+            "equity_curve": list(self.sink.equity_curve),
+        }
+
+
+async def run_replay(cfg: Dict[str, Any], paths: Iterable[str], **kwargs: Any) -> Dict[str, Any]:
+    return await ReplayEngine(cfg, paths, **kwargs).run()
+
+
+__all__ = ["ReplayEngine", "ReplaySink", "run_replay"]
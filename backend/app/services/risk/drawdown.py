@@ -0,0 +1,147 @@
+from __future__ import annotations
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# агрегат отрезка окна: (max, min, max_dd_pct внутри отрезка)
+_Agg = Tuple[float, float, float]
+
+
+def _leaf(v: float) -> _Agg:
+    return (v, v, 0.0)
+
+
+def _combine(left: _Agg, right: _Agg) -> _Agg:
+    """left — более ранний отрезок, right — более поздний."""
+    lmax, lmin, lbest = left
+    rmax, rmin, rbest = right
+    best = lbest if lbest > rbest else rbest
+    if lmax > 0:
+        # просадка от пика левого отрезка до минимума правого
+        cross = 100.0 * (lmax - rmin) / lmax
+        if cross > best:
+            best = cross
+    return (lmax if lmax > rmax else rmax, lmin if lmin < rmin else rmin, best)
+
+
+class SlidingDrawdown:
+    """
+    Потоковый MDD в скользящем окне за амортизированное O(1) на точку.
+
+    Очередь на двух стеках: «задний» стек копит один агрегат всех новых точек,
+    «передний» хранит для каждой точки агрегат от неё до конца переднего стека.
+    Пик окна, текущая просадка и максимальная просадка окна берутся из склейки
+    двух агрегатов, без прохода по точкам. Значения совпадают с полным пересчётом
+    (running peak → max dd) для положительного equity.
+    """
+
+    __slots__ = ("_front", "_back", "_back_agg")
+
+    def __init__(self) -> None:
+        self._front: List[Tuple[float, float, _Agg]] = []  # вершина (конец списка) — самая старая точка
+        self._back: List[Tuple[float, float]] = []
+        self._back_agg: Optional[_Agg] = None
+
+    def __len__(self) -> int:
+        return len(self._front) + len(self._back)
+
+    def __bool__(self) -> bool:
+        return bool(self._front) or bool(self._back)
+
+    def points(self) -> Iterator[Tuple[float, float]]:
+        """(ts, equity) от старых к новым."""
+        for ts, v, _ in reversed(self._front):
+            yield ts, v
+        yield from self._back
+
+    def copy_points(self) -> "PointsSnapshot":
+        """Дешёвая копия (копируются только списки ссылок) — для сериализации вне event loop."""
+        return PointsSnapshot(self._front[:], self._back[:])
+
+    def extend(self, flat: Iterable[float]) -> None:
+        """Догрузить точки из плоской последовательности ts0, v0, ts1, v1, ..."""
+        it = iter(flat)
+        for ts in it:
+            self.push(ts, next(it))
+
+    def push(self, ts: float, value: float) -> None:
+        self._back.append((ts, value))
+        leaf = _leaf(value)
+        self._back_agg = leaf if self._back_agg is None else _combine(self._back_agg, leaf)
+
+    def trim(self, cutoff: float) -> None:
+        """Выбросить точки с ts < cutoff."""
+        while True:
+            if not self._front:
+                if not self._back or self._back[0][0] >= cutoff:
+                    return
+                self._flip()
+            if self._front[-1][0] >= cutoff:
+                return
+            self._front.pop()
+
+    def clear(self) -> None:
+        self._front.clear()
+        self._back.clear()
+        self._back_agg = None
+
+    def _flip(self) -> None:
+        agg: Optional[_Agg] = None
+        front = self._front
+        for ts, v in reversed(self._back):
+            leaf = _leaf(v)
+            agg = leaf if agg is None else _combine(leaf, agg)
+            front.append((ts, v, agg))
+        self._back.clear()
+        self._back_agg = None
+
+    def _aggregate(self) -> Optional[_Agg]:
+        f = self._front[-1][2] if self._front else None
+        b = self._back_agg
+        if f is None:
+            return b
+        if b is None:
+            return f
+        return _combine(f, b)
+
+    @property
+    def last(self) -> Optional[float]:
+        if self._back:
+            return self._back[-1][1]
+        if self._front:
+            return self._front[0][1]
+        return None
+
+    @property
+    def peak(self) -> Optional[float]:
+        agg = self._aggregate()
+        return agg[0] if agg is not None else None
+
+    def current_pct(self) -> float:
+        """Просадка последней точки от пика окна, %."""
+        agg = self._aggregate()
+        if agg is None:
+            return 0.0
+        peak = agg[0]
+        return 0.0 if peak <= 0 else 100.0 * (peak - self.last) / peak
+
+    def max_pct(self) -> float:
+        """Максимальная просадка внутри окна, %."""
+        agg = self._aggregate()
+        return agg[2] if agg is not None else 0.0
+
+
+class PointsSnapshot:
+    """Снимок окна SlidingDrawdown: итерируется как (ts, equity) от старых к новым."""
+
+    __slots__ = ("_front", "_back")
+
+    def __init__(self, front: List[Tuple[float, float, _Agg]], back: List[Tuple[float, float]]) -> None:
+        self._front = front
+        self._back = back
+
+    def __len__(self) -> int:
+        return len(self._front) + len(self._back)
+
+    def __iter__(self) -> Iterator[Tuple[float, float]]:
+        for ts, v, _ in reversed(self._front):
+            yield ts, v
+        yield from self._back
@@ -1,8 +1,16 @@
 from __future__ import annotations
+from collections import deque
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import logging
 import time
 
+from .drawdown import SlidingDrawdown
+
+log = logging.getLogger(__name__)
+
+_MAX_PAIR_WINDOW = 10000   # сделок на пару в окне LowProfitPairsGuard
+
 @dataclass
 class GuardResult:
     allowed: bool
@@ -16,100 +24,220 @@ class TradeEvent:
     pnl: float          # pnl в тех же единицах, что твой учёт
     stoploss_hit: bool = False
 
-def _now() -> float:
-    return time.time()
-
 class BaseGuard:
+    """
+    Гуард со своим инкрементальным состоянием: события сделок/equity подаются
+    через on_trade/on_equity, а check() на каждый ордер стоит O(1) (амортизированно —
+    только вытеснение устаревших точек окна).
+    """
+    # часы подменяет RiskManager (VirtualClock в реплее); по умолчанию — реальное время
+    _now = staticmethod(time.time)
+
     def __init__(self, cfg: Dict):
         self.cfg = cfg
+        self._locked_until: float = 0.0
+
+    def on_trade(self, e: TradeEvent) -> None:
+        pass
 
-    def evaluate(self, history: List[TradeEvent], equity_curve: List[Tuple[float, float]]) -> GuardResult:
+    def on_equity(self, ts: float, value: float) -> None:
+        pass
+
+    def check(self, pair: Optional[str] = None, now: Optional[float] = None) -> GuardResult:
         return GuardResult(True)
 
+    def unlock(self) -> None:
+        self._locked_until = 0.0
+
+    def get_state(self) -> Dict[str, Any]:
+        """Состояние для снапшота (см. risk/persistence.py)."""
+        return {"locked_until": self._locked_until}
+
+    def set_state(self, st: Dict[str, Any]) -> None:
+        self._locked_until = float(st.get("locked_until") or 0.0)
+
+    def _lock(self, now: float, reason: str) -> GuardResult:
+        stop_dur = int(self.cfg.get("stop_duration_minutes", 60))
+        self._locked_until = now + stop_dur * 60
+        return GuardResult(False, reason=reason, until_ts=self._locked_until)
+
 class StoplossGuard(BaseGuard):
     def __init__(self, cfg: Dict):
         super().__init__(cfg)
-        self._locked_until: float = 0.0
+        self._sl_ts: Deque[float] = deque()
+
+    def _trim(self, now: float) -> None:
+        since = now - int(self.cfg.get("window_minutes", 60)) * 60
+        while self._sl_ts and self._sl_ts[0] < since:
+            self._sl_ts.popleft()
+
+    def on_trade(self, e: TradeEvent) -> None:
+        if e.stoploss_hit:
+            self._sl_ts.append(e.ts)
+
+    def get_state(self) -> Dict[str, Any]:
+        return {**super().get_state(), "sl": list(self._sl_ts)}
+
+    def set_state(self, st: Dict[str, Any]) -> None:
+        super().set_state(st)
+        self._sl_ts = deque(float(x) for x in st.get("sl") or [])
 
-    def evaluate(self, history: List[TradeEvent], equity_curve: List[Tuple[float, float]]) -> GuardResult:
-        now = _now()
+    def check(self, pair: Optional[str] = None, now: Optional[float] = None) -> GuardResult:
+        now = self._now() if now is None else now
         if now < self._locked_until:
             return GuardResult(False, reason="StoplossGuard: cooldown", until_ts=self._locked_until)
 
-        win = int(self.cfg.get("window_minutes", 60))
-        max_sl = int(self.cfg.get("max_stoploss_count", 3))
-        stop_dur = int(self.cfg.get("stop_duration_minutes", 60))
-
-        since = now - win * 60
-        count = sum(1 for e in history if e.ts >= since and e.stoploss_hit)
-        if count >= max_sl:
-            self._locked_until = now + stop_dur * 60
-            return GuardResult(False, reason=f"StoplossGuard: {count} SL in {win}m", until_ts=self._locked_until)
+        self._trim(now)
+        count = len(self._sl_ts)
+        if count >= int(self.cfg.get("max_stoploss_count", 3)):
+            win = int(self.cfg.get("window_minutes", 60))
+            return self._lock(now, f"StoplossGuard: {count} SL in {win}m")
         return GuardResult(True)
 
 class MaxDrawdownGuard(BaseGuard):
     def __init__(self, cfg: Dict):
         super().__init__(cfg)
-        self._locked_until: float = 0.0
+        self._dd = SlidingDrawdown()
+
+    def _lookback_sec(self) -> float:
+        return int(self.cfg.get("lookback_minutes", 60)) * 60
+
+    def on_equity(self, ts: float, value: float) -> None:
+        self._dd.push(ts, value)
+        self._dd.trim(ts - self._lookback_sec())
 
-    def evaluate(self, history: List[TradeEvent], equity_curve: List[Tuple[float, float]]) -> GuardResult:
-        now = _now()
+    def get_state(self) -> Dict[str, Any]:
+        return {**super().get_state(), "eq": self._dd.copy_points()}
+
+    def set_state(self, st: Dict[str, Any]) -> None:
+        super().set_state(st)
+        self._dd.clear()
+        self._dd.extend(st.get("eq") or ())
+
+    def check(self, pair: Optional[str] = None, now: Optional[float] = None) -> GuardResult:
+        now = self._now() if now is None else now
         if now < self._locked_until:
             return GuardResult(False, reason="MaxDrawdown: cooldown", until_ts=self._locked_until)
 
-        lookback = int(self.cfg.get("lookback_minutes", 60))
-        max_dd = float(self.cfg.get("max_allowed_drawdown", 0.1))
-        stop_dur = int(self.cfg.get("stop_duration_minutes", 60))
-
-        since = now - lookback * 60
-        window = [(ts, v) for (ts, v) in equity_curve if ts >= since]
-        if len(window) >= 2:
-            peak = window[0][1]
-            max_draw = 0.0
-            for _, v in window:
-                if v > peak:
-                    peak = v
-                dd = 0.0 if peak == 0 else (peak - v) / peak
-                if dd > max_draw:
-                    max_draw = dd
-            if max_draw >= max_dd:
-                self._locked_until = now + stop_dur * 60
-                return GuardResult(False, reason=f"MaxDrawdown: {round(max_draw*100,2)}%", until_ts=self._locked_until)
+        self._dd.trim(now - self._lookback_sec())
+        if len(self._dd) >= 2:
+            max_draw = self._dd.max_pct() / 100.0
+            if max_draw >= float(self.cfg.get("max_allowed_drawdown", 0.1)):
+                return self._lock(now, f"MaxDrawdown: {round(max_draw*100,2)}%")
         return GuardResult(True)
 
 class CooldownGuard(BaseGuard):
-    def __init__(self, cfg: Dict):
-        super().__init__(cfg)
-        self._locked_until: float = 0.0
+    def on_trade(self, e: TradeEvent) -> None:
+        self.mark_trade_closed(e.ts)
 
-    def mark_trade_closed(self):
+    def mark_trade_closed(self, ts: Optional[float] = None):
         stop_dur = int(self.cfg.get("stop_duration_minutes", 15))
-        self._locked_until = _now() + stop_dur * 60
+        self._locked_until = (self._now() if ts is None else ts) + stop_dur * 60
 
-    def evaluate(self, history: List[TradeEvent], equity_curve: List[Tuple[float, float]]) -> GuardResult:
-        if _now() < self._locked_until:
+    def check(self, pair: Optional[str] = None, now: Optional[float] = None) -> GuardResult:
+        if (self._now() if now is None else now) < self._locked_until:
             return GuardResult(False, reason="Cooldown", until_ts=self._locked_until)
         return GuardResult(True)
 
 class LowProfitPairsGuard(BaseGuard):
+    """
+    Средний PnL по паре: бегущие сумма и счётчик по всей истории и по окну последних сделок.
+    Окно ведётся всегда (до _MAX_PAIR_WINDOW сделок на пару), lookback_minutes применяется при
+    чтении: 0 — вся история, иначе — окно с вытеснением старых сделок. Так lookback можно
+    включить на лету, и окно уже заполнено.
+    """
     def __init__(self, cfg: Dict):
         super().__init__(cfg)
         self._pair_locked_until: Dict[str, float] = {}
-
-    def evaluate_pair(self, pair: str, history: List[TradeEvent]) -> GuardResult:
-        now = _now()
+        # pair -> (окно, [sum, count по всей истории, sum, count по окну])
+        self._pairs: Dict[str, Tuple[Deque[Tuple[float, float]], List[float]]] = {}
+
+    def unlock(self) -> None:
+        super().unlock()
+        self._pair_locked_until.clear()
+
+    def get_state(self) -> Dict[str, Any]:
+        return {
+            **super().get_state(),
+            "pair_locked": dict(self._pair_locked_until),
+            "pairs": {p: {"sum": acc[0], "n": acc[1], "win": [list(x) for x in win]}
+                      for p, (win, acc) in self._pairs.items()},
+        }
+
+    def set_state(self, st: Dict[str, Any]) -> None:
+        super().set_state(st)
+        self._pair_locked_until = {str(k): float(v) for k, v in (st.get("pair_locked") or {}).items()}
+        self._pairs = {}
+        for p, d in (st.get("pairs") or {}).items():
+            win = deque((float(t), float(x)) for t, x in (d.get("win") or [])[-_MAX_PAIR_WINDOW:])
+            self._pairs[str(p)] = (win, [float(d.get("sum", 0.0)), int(d.get("n", 0)),
+                                         sum(x for _, x in win), len(win)])
+
+    def on_trade(self, e: TradeEvent) -> None:
+        if not e.pair:
+            return
+        win, acc = self._pairs.setdefault(e.pair, (deque(), [0.0, 0, 0.0, 0]))
+        acc[0] += e.pnl
+        acc[1] += 1
+        if len(win) >= _MAX_PAIR_WINDOW:
+            _, pnl = win.popleft()
+            acc[2] -= pnl
+            acc[3] -= 1
+        win.append((e.ts, e.pnl))
+        acc[2] += e.pnl
+        acc[3] += 1
+
+    def check(self, pair: Optional[str] = None, now: Optional[float] = None) -> GuardResult:
+        if not pair:
+            return GuardResult(True)
+        now = self._now() if now is None else now
         until = self._pair_locked_until.get(pair, 0.0)
         if now < until:
             return GuardResult(False, reason=f"LowProfitPairs[{pair}]: cooldown", until_ts=until)
 
-        min_trades = int(self.cfg.get("min_trades", 5))
-        min_avg = float(self.cfg.get("min_avg_pnl", 0.0))
-        stop_dur = int(self.cfg.get("stop_duration_minutes", 60))
+        st = self._pairs.get(pair)
+        if st is None:
+            return GuardResult(True)
+        win, acc = st
+        lookback = int(self.cfg.get("lookback_minutes", 0))
+        if lookback > 0:
+            since = now - lookback * 60
+            while win and win[0][0] < since:
+                _, pnl = win.popleft()
+                acc[2] -= pnl
+                acc[3] -= 1
+            total, n = acc[2], acc[3]
+        else:
+            total, n = acc[0], acc[1]
 
-        trades = [e for e in history if e.pair == pair]
-        if len(trades) >= min_trades:
-            avg = sum(t.pnl for t in trades) / len(trades)
-            if avg < min_avg:
+        min_trades = int(self.cfg.get("min_trades", 5))
+        if n >= min_trades:
+            avg = total / n
+            if avg < float(self.cfg.get("min_avg_pnl", 0.0)):
+                stop_dur = int(self.cfg.get("stop_duration_minutes", 60))
                 self._pair_locked_until[pair] = now + stop_dur * 60
                 return GuardResult(False, reason=f"LowProfitPairs[{pair}]: avg={avg:.4f}", until_ts=self._pair_locked_until[pair])
         return GuardResult(True)
+
+
+GUARDS = {
+    "StoplossGuard": StoplossGuard,
+    "MaxDrawdownGuard": MaxDrawdownGuard,
+    "CooldownGuard": CooldownGuard,
+    "LowProfitPairsGuard": LowProfitPairsGuard,
+}
+
+def build_guards(items: Optional[List[Dict[str, Any]]]) -> List[BaseGuard]:
+    """risk.guards: [{"method": "StoplossGuard", "window_minutes": 60, ...}, ...] — порядок = порядок проверки."""
+    out: List[BaseGuard] = []
+    for item in items or []:
+        if not isinstance(item, dict):
+            continue
+        cls = GUARDS.get(str(item.get("method") or ""))
+        if cls is None:
+            log.warning("Unknown risk guard: %s", item.get("method"))
+            continue
+        if item.get("enabled", True) is False:
+            continue
+        out.append(cls(item))
+    return out
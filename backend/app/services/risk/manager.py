@@ -1,8 +1,10 @@
 from __future__ import annotations
-import time
-from collections import deque
-from dataclasses import dataclass
-from typing import Deque, Dict, Optional, Tuple, Any
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple, Any
+
+from ...core.clock import WALL_CLOCK
+from .drawdown import SlidingDrawdown
+from .guards import BaseGuard, TradeEvent, build_guards
 
 
 @dataclass
@@ -18,6 +20,23 @@ class RiskStatus:
     threshold_pct: float
     stop_until: Optional[float]
     cooldown_until: Optional[float]
+    guards: List[Dict[str, Any]] = field(default_factory=list)
+    epoch: int = 0
+    decisions: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class RiskDecision:
+    """
+    Закэшированное решение по паре. Действительно, пока epoch совпадает с
+    RiskManager.epoch и now < valid_until; key — стабильный код причины (для дедупа).
+    """
+    allowed: bool
+    reason: Optional[str]
+    until_ts: Optional[float]
+    valid_until: float
+    epoch: int
+    key: Optional[str] = None
 
 
 class RiskManager:
@@ -26,10 +45,33 @@ class RiskManager:
     - MaxDrawdown по equity в скользящем окне (window_sec).
     - Stop duration при превышении порога MDD.
     - Cooldown после закрытия сделки.
+    - Цепочка гуардов risk.guards (StoplossGuard, MaxDrawdownGuard, CooldownGuard,
+      LowProfitPairsGuard) — каждый со своим инкрементальным оконным состоянием.
     """
 
-    def __init__(self, cfg: Dict[str, Any]) -> None:
-        risk = (cfg or {}).get("risk", {}) or {}
+    def __init__(self, cfg: Dict[str, Any], clock: Any = None) -> None:
+        # часы: реальные в бою, VirtualClock в реплее — общие с гуардами
+        self._clock = (clock if clock is not None else WALL_CLOCK).time
+        self.guards: List[BaseGuard] = []
+        self._load_params(cfg)
+
+        # ---- состояние ----
+        self._eq = SlidingDrawdown()  # (ts_sec, equity) + инкрементальный MDD
+        self._stop_until_ts: Optional[float] = None
+        self._cooldown_until_ts: Optional[float] = None
+        self._closed_trades: int = 0
+
+        # кэшируем значения
+        self._dd_current_pct: float = 0.0
+        self._dd_max_window_pct: float = 0.0
+
+        # кэш решений: сбрасывается сменой epoch (equity / сделка / unlock / конфиг)
+        self.epoch: int = 0
+        self._decisions: Dict[Optional[str], RiskDecision] = {}
+
+    def _load_params(self, cfg: Dict[str, Any]) -> None:
+        cfg = cfg or {}
+        risk = cfg.get("risk", {}) or {}
 
         # ---- параметры из конфига ----
         self.enabled: bool = bool((cfg.get("features") or {}).get("risk_protections", True))
@@ -42,25 +84,75 @@ class RiskManager:
         self.cooldown_sec: int = int(risk.get("cooldown_sec", 30 * 60))
         # минимум сделок, после которых MDD имеет смысл применять (опционально)
         self.min_trades_for_dd: int = int(risk.get("min_trades_for_dd", 0))
+        # сколько живёт закэшированное «разрешено» без событий (страховка от временных эффектов окон)
+        self.decision_ttl_sec: float = float(risk.get("decision_ttl_sec", 1.0))
 
-        # ---- состояние ----
-        self._eq: Deque[Tuple[float, float]] = deque()  # (ts_sec, equity)
-        self._stop_until_ts: Optional[float] = None
-        self._cooldown_until_ts: Optional[float] = None
-        self._closed_trades: int = 0
+        # конвейер гуардов — проверяются по порядку после встроенных протекций;
+        # гуард того же типа переживает смену конфига вместе со своим состоянием
+        old = list(self.guards)
+        guards: List[BaseGuard] = []
+        for g in build_guards(risk.get("guards")):
+            prev = next((o for o in old if type(o) is type(g)), None)
+            if prev is not None:
+                old.remove(prev)
+                prev.cfg = g.cfg
+                g = prev
+            elif hasattr(self, "_eq"):
+                # новый гуард догоняет уже накопленное окно equity
+                for ts, v in self._eq.points():
+                    g.on_equity(ts, v)
+            g._now = self._clock
+            guards.append(g)
+        self.guards = guards
 
-        # кэшируем значения
-        self._dd_current_pct: float = 0.0
-        self._dd_max_window_pct: float = 0.0
+    # ---------------- config / persistence ----------------
+    def apply_cfg(self, cfg: Dict[str, Any], now: Optional[float] = None) -> None:
+        """Применить новые параметры к живому состоянию (окно equity, блокировки, гуарды сохраняются)."""
+        self._load_params(cfg)
+        self._trim_old(float(now if now is not None else self._clock()))
+        self._recalc_dd()
+        self.epoch += 1
+        self._decisions.clear()
+
+    def get_state(self) -> Dict[str, Any]:
+        """Снимок состояния; тяжёлые окна отдаются как PointsSnapshot без прохода по точкам."""
+        return {
+            "eq": self._eq.copy_points(),
+            "stop_until": self._stop_until_ts,
+            "cooldown_until": self._cooldown_until_ts,
+            "closed_trades": self._closed_trades,
+            "guards": [{"method": type(g).__name__, "state": g.get_state()} for g in self.guards],
+        }
+
+    def set_state(self, st: Dict[str, Any], now: Optional[float] = None) -> None:
+        now = float(now if now is not None else self._clock())
+        self._eq.clear()
+        self._eq.extend(st.get("eq") or ())
+        self._trim_old(now)
+        self._recalc_dd()
+        self._stop_until_ts = st.get("stop_until")
+        self._cooldown_until_ts = st.get("cooldown_until")
+        self._closed_trades = int(st.get("closed_trades") or 0)
+        saved = list(st.get("guards") or [])
+        for g in self.guards:
+            item = next((x for x in saved if x.get("method") == type(g).__name__), None)
+            if item is not None:
+                saved.remove(item)
+                g.set_state(item.get("state") or {})
+        self.epoch += 1
+        self._decisions.clear()
 
     # ---------------- public API ----------------
     def on_equity(self, equity_value: float, ts: Optional[float] = None) -> None:
         """Прокидывать текущее equity (в абсолютных единицах)."""
         if not self.enabled:
             return
-        now = float(ts if ts is not None else time.time())
-        self._eq.append((now, float(equity_value)))
+        now = float(ts if ts is not None else self._clock())
+        self.epoch += 1
+        self._eq.push(now, float(equity_value))
         self._trim_old(now)
+        for g in self.guards:
+            g.on_equity(now, float(equity_value))
         self._recalc_dd()
 
         # Триггер блокировки по MDD
@@ -68,49 +160,91 @@ class RiskManager:
             if self._dd_max_window_pct >= self.threshold_pct or self._dd_current_pct >= self.threshold_pct:
                 self._stop_until_ts = now + self.stop_duration_sec
 
-    def on_trade_closed(self, pnl: float, ts: Optional[float] = None) -> None:
-        """Вызывать при закрытии сделки (для cooldown)."""
+    def on_trade_closed(self, pnl: float, ts: Optional[float] = None,
+                        pair: Optional[str] = None, stoploss_hit: bool = False) -> None:
+        """Вызывать при закрытии сделки (для cooldown и гуардов)."""
         if not self.enabled:
             return
-        now = float(ts if ts is not None else time.time())
+        now = float(ts if ts is not None else self._clock())
+        self.epoch += 1
         self._closed_trades += 1
         if self.cooldown_sec > 0:
             self._cooldown_until_ts = now + self.cooldown_sec
+        if self.guards:
+            e = TradeEvent(ts=now, pair=pair or "", pnl=float(pnl), stoploss_hit=bool(stoploss_hit))
+            for g in self.guards:
+                g.on_trade(e)
 
     def can_enter(self, pair: Optional[str] = None) -> Tuple[bool, Optional[str]]:
         """Разрешено ли входить в новую позицию сейчас."""
+        d = self.decide(pair)
+        return d.allowed, d.reason
+
+    def decide(self, pair: Optional[str] = None, now: Optional[float] = None) -> RiskDecision:
+        """
+        Горячий путь: решение из кэша, если не было событий (epoch) и не истёк срок —
+        два сравнения. Иначе полный прогон протекций и гуардов.
+        """
+        now = self._clock() if now is None else now
+        d = self._decisions.get(pair)
+        if d is not None and d.epoch == self.epoch and now < d.valid_until:
+            return d
+        d = self._evaluate(pair, now)
+        self._decisions[pair] = d
+        return d
+
+    def _evaluate(self, pair: Optional[str], now: float) -> RiskDecision:
+        ep = self.epoch
+
+        def _block(reason: str, until: Optional[float], key: str) -> RiskDecision:
+            valid = until if until is not None else now + self.decision_ttl_sec
+            return RiskDecision(False, reason, until, valid, ep, key)
+
         if not self.enabled:
-            return True, None
+            return RiskDecision(True, None, None, float("inf"), ep)
 
-        now = time.time()
         # активная блокировка по MDD?
         if self._stop_until_ts and now < self._stop_until_ts:
             left = int(self._stop_until_ts - now)
-            return False, f"MaxDrawdown lock ({left}s left)"
+            return _block(f"MaxDrawdown lock ({left}s left)", self._stop_until_ts, "mdd_lock")
 
         # cooldown после сделки?
         if self._cooldown_until_ts and now < self._cooldown_until_ts:
             left = int(self._cooldown_until_ts - now)
-            return False, f"Cooldown active ({left}s left)"
+            return _block(f"Cooldown active ({left}s left)", self._cooldown_until_ts, "cooldown")
 
-        # если окно пустое — не блокируем
-        if not self._eq:
-            return True, None
+        for g in self.guards:
+            res = g.check(pair, now)
+            if not res.allowed:
+                return _block(res.reason or type(g).__name__, res.until_ts, type(g).__name__)
 
         # если MDD уже превышен — можно инициировать блокировку (будет поставлена on_equity)
-        if self._can_trigger_mdd_lock():
+        if self._eq and self._can_trigger_mdd_lock():
             if self._dd_current_pct >= self.threshold_pct:
-                return False, f"MaxDrawdown {self._dd_current_pct:.2f}% >= {self.threshold_pct:.2f}%"
+                return _block(f"MaxDrawdown {self._dd_current_pct:.2f}% >= {self.threshold_pct:.2f}%", None, "mdd")
 
-        return True, None
+        return RiskDecision(True, None, None, now + self.decision_ttl_sec, ep)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Опубликованные решения по парам (pair=None → '*')."""
+        return {
+            (p or "*"): {"allowed": d.allowed, "reason": d.reason, "until": d.until_ts, "epoch": d.epoch}
+            for p, d in self._decisions.items()
+        }
 
     def unlock(self) -> None:
         """Снять блокировку MDD и cooldown принудительно."""
+        self.epoch += 1
         self._stop_until_ts = None
         self._cooldown_until_ts = None
+        for g in self.guards:
+            g.unlock()
+
+    def unlock_all(self) -> None:
+        self.unlock()
 
     def status(self) -> RiskStatus:
-        now = time.time()
+        now = self._clock()
         allowed, reason = self.can_enter(None)
         return RiskStatus(
             enabled=self.enabled,
@@ -124,35 +258,26 @@ class RiskManager:
             threshold_pct=self.threshold_pct,
             stop_until=self._stop_until_ts,
             cooldown_until=self._cooldown_until_ts,
+            guards=[
+                {"method": type(g).__name__, "locked_until": (g._locked_until or None)}
+                for g in self.guards
+            ],
+            epoch=self.epoch,
+            decisions=self.snapshot(),
         )
 
+    def dump_state(self) -> Dict[str, Any]:
+        """Для /api/risk/status."""
+        return asdict(self.status())
+
     # ---------------- internals ----------------
     def _trim_old(self, now: float) -> None:
-        cutoff = now - self.window_sec
-        while self._eq and self._eq[0][0] < cutoff:
-            self._eq.popleft()
+        self._eq.trim(now - self.window_sec)
 
     def _recalc_dd(self) -> None:
-        if not self._eq:
-            self._dd_current_pct = 0.0
-            self._dd_max_window_pct = 0.0
-            return
-
-        # текущий mdd — от исторического пика до текущего значения
-        peak = max(v for _, v in self._eq)
-        current = self._eq[-1][1]
-        self._dd_current_pct = 0.0 if peak <= 0 else 100.0 * (peak - current) / peak
-
-        # max mdd внутри окна — бежим по точкам и считаем просадку от текущего «наилучшего пика»
-        best = float('-inf')
-        maxdd = 0.0
-        for _, v in self._eq:
-            best = max(best, v)
-            if best > 0:
-                dd = 100.0 * (best - v) / best
-                if dd > maxdd:
-                    maxdd = dd
-        self._dd_max_window_pct = maxdd
+        # O(1): пик окна и MDD берутся из агрегатов SlidingDrawdown
+        self._dd_current_pct = self._eq.current_pct()
+        self._dd_max_window_pct = self._eq.max_pct()
 
     def _can_trigger_mdd_lock(self) -> bool:
         if not self.enabled:
@@ -0,0 +1,154 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+import struct
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .drawdown import PointsSnapshot
+
+log = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parents[3] / "data"
+STATE_PATH = DATA_DIR / "risk_state.bin"
+
+# формат: MAGIC | u16 version | u32 len(meta) | meta JSON | float64 LE блобы подряд
+_MAGIC = b"AMRS"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHI")
+
+
+def state_path(cfg: Dict[str, Any]) -> Path:
+    p = ((cfg or {}).get("risk") or {}).get("state_file")
+    if not p:
+        return STATE_PATH
+    p = Path(p)
+    return p if p.is_absolute() else DATA_DIR.parent / p
+
+
+def encode_state(state: Dict[str, Any]) -> bytes:
+    """
+    Окна equity (PointsSnapshot) уходят в бинарные блобы float64 (ts, v, ts, v, ...),
+    остальное — компактный JSON. Вызывать вне event loop: проход по окну — O(n).
+    """
+    blobs: List[array] = []
+
+    def walk(x: Any) -> Any:
+        if isinstance(x, PointsSnapshot):
+            a = array("d")
+            for ts, v in x:
+                a.append(ts)
+                a.append(v)
+            blobs.append(a)
+            return {"$blob": len(blobs) - 1}
+        if isinstance(x, dict):
+            return {k: walk(v) for k, v in x.items()}
+        if isinstance(x, (list, tuple)):
+            return [walk(v) for v in x]
+        return x
+
+    meta = walk(state)
+    meta_b = json.dumps({"state": meta, "blobs": [len(a) for a in blobs], "saved_at": time.time()},
+                        separators=(",", ":")).encode("utf-8")
+    parts = [_HEADER.pack(_MAGIC, _VERSION, len(meta_b)), meta_b]
+    for a in blobs:
+        if sys.byteorder != "little":
+            a.byteswap()
+        parts.append(a.tobytes())
+    return b"".join(parts)
+
+
+def decode_state(data: bytes) -> Dict[str, Any]:
+    magic, version, meta_len = _HEADER.unpack_from(data, 0)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f"unsupported risk snapshot: {magic!r} v{version}")
+    off = _HEADER.size
+    meta = json.loads(data[off:off + meta_len].decode("utf-8"))
+    off += meta_len
+    blobs: List[array] = []
+    for n in meta.get("blobs") or []:
+        a = array("d")
+        a.frombytes(data[off:off + 8 * n])
+        if sys.byteorder != "little":
+            a.byteswap()
+        blobs.append(a)
+        off += 8 * n
+
+    def walk(x: Any) -> Any:
+        if isinstance(x, dict):
+            if set(x) == {"$blob"}:
+                return blobs[int(x["$blob"])]
+            return {k: walk(v) for k, v in x.items()}
+        if isinstance(x, list):
+            return [walk(v) for v in x]
+        return x
+
+    st = walk(meta.get("state") or {})
+    st["saved_at"] = meta.get("saved_at")
+    return st
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+async def save_snapshot(rm: Any, path: Path) -> int:
+    """Снимок берётся на loop'е (копии списков), кодирование и запись — в потоке."""
+    state = rm.get_state()
+
+    def _job() -> int:
+        data = encode_state(state)
+        _write_atomic(path, data)
+        return len(data)
+
+    return await asyncio.to_thread(_job)
+
+
+def load_snapshot(rm: Any, path: Path) -> bool:
+    if not path.exists():
+        return False
+    try:
+        st = decode_state(path.read_bytes())
+    except Exception:
+        log.exception("risk snapshot %s unreadable — starting empty", path)
+        return False
+    rm.set_state(st)
+    log.info("risk state restored from %s (saved_at=%s, points=%d)", path, st.get("saved_at"), len(rm._eq))
+    return True
+
+
+class RiskSnapshotter:
+    """Периодически сохраняет состояние RiskManager, если с прошлого раза были события (epoch)."""
+
+    def __init__(self, get_rm, path: Path, interval_sec: float = 30.0) -> None:
+        self._get_rm = get_rm
+        self.path = path
+        self.interval_sec = max(1.0, float(interval_sec))
+        self._saved_epoch: Optional[int] = None
+
+    async def save_now(self) -> None:
+        rm = self._get_rm()
+        if rm is None or rm.epoch == self._saved_epoch:
+            return
+        epoch = rm.epoch
+        await save_snapshot(rm, self.path)
+        self._saved_epoch = epoch
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_sec)
+            try:
+                await self.save_now()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("risk snapshot failed")
@@ -1,11 +1,12 @@
 from __future__ import annotations
 import asyncio
 import itertools
-import time
 from dataclasses import dataclass
 from decimal import Decimal
 from typing import Dict, Any, Optional, Tuple
 
+from ..core.clock import WALL_CLOCK
+
 @dataclass
 class ShadowConfig:
     alpha: float = 0.85
@@ -18,6 +19,10 @@ class ShadowConfig:
 
 class ShadowExecutor:
     def __init__(self, **opts):
+        # clock — реальные часы или VirtualClock реплея: и метки времени, и задержки
+        clock = opts.pop("clock", None) or WALL_CLOCK
+        self._now = clock.time
+        self._sleep = clock.sleep
         cfg = ShadowConfig(**{
             k: opts.get(k, getattr(ShadowConfig, k))
             for k in ShadowConfig().__dict__.keys()
@@ -36,10 +41,6 @@ class ShadowExecutor:
     def _dec(x) -> Decimal:
         return Decimal(str(x))
 
-    @staticmethod
-    def _now() -> float:
-        return time.time()
-
     def _best_of(self, symbol: str) -> Tuple[Optional[float], Optional[float]]:
         return self._best.get(symbol, (None, None))
 
@@ -96,7 +97,7 @@ class ShadowExecutor:
         otype = params["type"].upper()
         tif = params.get("timeInForce") or "GTC"
         qty = float(params["quantity"]); price = float(params.get("price") or 0.0)
-        await asyncio.sleep(self.cfg.latency_ms / 1000.0)
+        await self._sleep(self.cfg.latency_ms / 1000.0)
 
         async with self._lock:
             bid, ask = self._best.get(symbol, (None, None))
@@ -116,7 +117,7 @@ class ShadowExecutor:
             if otype == "MARKET" and self.cfg.simulate_market_fills and bid and ask:
                 slip = self.cfg.market_slippage_bps / 10000.0
                 exec_px = (ask * (1.0 + slip)) if side == "BUY" else (bid * (1.0 - slip))
-                await asyncio.sleep(self.cfg.market_latency_ms / 1000.0)
+                await self._sleep(self.cfg.market_latency_ms / 1000.0)
                 return _exec_taker(exec_px)
 
             if otype == "LIMIT_MAKER" and self._crosses(side, price, bid, ask) and self.cfg.post_only_reject:
@@ -132,7 +133,7 @@ class ShadowExecutor:
             if otype == "LIMIT" and self.cfg.simulate_market_fills and bid and ask and self._crosses(side, price, bid, ask):
                 slip = self.cfg.market_slippage_bps / 10000.0
                 exec_px = (ask * (1.0 + slip)) if side == "BUY" else (bid * (1.0 - slip))
-                await asyncio.sleep(self.cfg.market_latency_ms / 1000.0)
+                await self._sleep(self.cfg.market_latency_ms / 1000.0)
                 return _exec_taker(exec_px)
 
             oid = next(self._oid)
@@ -145,7 +146,7 @@ class ShadowExecutor:
             return o
 
     async def get_order(self, *, symbol, orderId):
-        await asyncio.sleep(self.cfg.latency_ms / 1000.0)
+        await self._sleep(self.cfg.latency_ms / 1000.0)
         oid = int(orderId); o = self._orders.get(oid)
         if not o:
             return {"symbol": symbol, "orderId": oid, "status": "EXPIRED",
@@ -155,7 +156,7 @@ class ShadowExecutor:
         return dict(o)
 
     async def cancel_order(self, *, symbol, orderId):
-        await asyncio.sleep(self.cfg.latency_ms / 1000.0)
+        await self._sleep(self.cfg.latency_ms / 1000.0)
         oid = int(orderId); o = self._orders.get(oid)
         if not o:
             return {"symbol": symbol, "orderId": oid, "status": "CANCELED"}
@@ -0,0 +1,458 @@
+from __future__ import annotations
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from ..core import logging as log_setup
+from ..core import metrics
+from ..core.config_schema import compile_cfg
+from . import ipc, tracing
+from .profiler import ProfilerBusy
+
+logger = logging.getLogger(__name__)
+
+_STATS_INTERVAL_SEC = 1.0
+# ошибки профиля воркера, которые доходят до API своим типом (занят → 409, параметры → 400)
+_PROFILE_ERRORS = {"ProfilerBusy": ProfilerBusy, "ValueError": ValueError}
+
+
+def assign_groups(symbols: List[str], groups: List[List[str]]) -> List[List[str]]:
+    """
+    Раскладка символов по шардам: уже назначенные остаются на месте (их стратегии
+    не перезапускаются), пропавшие убираются, новые идут в самый короткий шард.
+    """
+    wanted = set(symbols)
+    out = [[s for s in g if s in wanted] for g in groups]
+    placed = {s for g in out for s in g}
+    for s in symbols:
+        if s not in placed:
+            min(out, key=len).append(s)
+            placed.add(s)
+    return out
+
+
+def _shard_cfg(cfg: Dict[str, Any], group: List[str], n_shards: int) -> Dict[str, Any]:
+    """Конфиг воркера: свои символы и своя доля paper_cash (сумма equity шардов = общий банк)."""
+    strat = dict(cfg.get("strategy") or {})
+    strat["paper_cash"] = float(strat.get("paper_cash", 1000.0)) / max(1, n_shards)
+    strat.pop("symbols", None)
+    if group:
+        strat["symbol"] = group[0]
+    return {**cfg, "strategy": strat}
+
+
+# =============================== воркер ===============================
+
+class _RiskView:
+    """Воркер своего RiskManager не держит: решение агрегированного риска присылает API-процесс."""
+
+    def __init__(self) -> None:
+        self.allowed = True
+        self.reason: Optional[str] = None
+
+    def check_risk(self, symbol: Optional[str]) -> Tuple[bool, Optional[str]]:
+        return self.allowed, self.reason
+
+
+class _EventSink:
+    """events_cb стратегий воркера: market-события схлопываются до последнего на символ, остальное — в пачку."""
+
+    def __init__(self, out: ipc.BatchWriter) -> None:
+        self._out = out
+        self._market: Dict[str, Dict[str, Any]] = {}
+
+    async def __call__(self, evt: Dict[str, Any]) -> None:
+        if evt.get("type") == "market":
+            self._market[str(evt.get("symbol") or "")] = evt
+            return
+        self._out.put(evt)
+
+    def flush_market(self) -> None:
+        if self._market:
+            for evt in self._market.values():
+                self._out.put(evt)
+            self._market.clear()
+
+
+async def _worker_async(shard: int, cfg: Dict[str, Any], symbols: List[str], address: ipc.Address) -> None:
+    from ..core.config import settings
+    from .binance_client import BinanceAsync
+    from .ledger import PositionLedger
+    from .market_feed import BookTickerHub
+    from .supervisor import StrategySupervisor
+
+    conf = compile_cfg(cfg)
+    metrics.set_enabled(conf.metrics.enabled)
+    tracing.configure(conf.tracing)
+    log_setup.configure(conf.logging)
+    reader, writer = await ipc.connect(address)
+    out = ipc.BatchWriter(writer, flush_ms=conf.engine.flush_ms)
+    out.start()
+    await out.send_now({"op": "hello", "shard": shard, "pid": os.getpid()})
+
+    sink = _EventSink(out)
+    risk = _RiskView()
+    binance = BinanceAsync(
+        api_key=getattr(settings, "binance_api_key", None),
+        api_secret=getattr(settings, "binance_api_secret", None),
+        paper=conf.api.paper,
+        shadow=conf.api.shadow,
+        rest_base=conf.api.rest_base,
+        ws_base=conf.api.ws_base,
+        shadow_opts=cfg.get("shadow") or {},
+        events_cb=sink,
+        state=risk,
+    )
+    recorder = None
+    if conf.recorder.enabled:
+        from .recorder import MarketRecorder
+        recorder = MarketRecorder.from_config(conf.recorder, subdir=f"shard-{shard}")
+        recorder.start()
+        binance.bm.recorder = recorder
+    clock_sync = tracing.ClockSync(binance.client)
+    clock_sync.start()
+    feed = BookTickerHub(binance.bm)
+    ledger = PositionLedger(cfg)
+    sup = StrategySupervisor(cfg, client_wrapper=binance, events_cb=sink, ledger=ledger, feed=feed, symbols=symbols)
+    sup.start_all()
+    from .loop_monitor import LoopMonitor
+    loop_mon = LoopMonitor(conf.loop_monitor, name=f"shard{shard}",
+                           on_alert=lambda text: out.put({"type": "diag", "level": "warning", "text": text}))
+    loop_mon.start()
+
+    async def _ticker() -> None:
+        throttle = max(0.001, conf.engine.market_throttle_ms / 1000.0)
+        next_stats = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(throttle)
+            sink.flush_market()
+            now = loop.time()
+            if now >= next_stats:
+                next_stats = now + _STATS_INTERVAL_SEC
+                out.put({"type": "shard_stats", "shard": shard, "pid": os.getpid(),
+                         "symbols": sup.metrics(), "totals": sup.totals(), "fills_total": ledger.fills_total,
+                         "feed": feed.stats(), "ipc": out.stats(),
+                         "recorder": recorder.stats() if recorder is not None else None,
+                         "loop": loop_mon.summary(), "clock": tracing.CLOCK.state(),
+                         "metrics": metrics.snapshot() if metrics.enabled else None})
+
+    async def _profile(msg: Dict[str, Any]) -> None:
+        from . import profiler
+        reply: Dict[str, Any] = {"type": "shard_profile", "id": msg.get("id"), "shard": shard}
+        try:
+            reply["result"] = await profiler.profile(**msg.get("params", {}), name=f"shard{shard}",
+                                                     sizes=lambda: profiler.structure_sizes(sup))
+        except Exception as e:
+            reply["error"] = f"{type(e).__name__}: {e}"
+            reply["error_type"] = type(e).__name__
+        out.put(reply)
+
+    ticker = asyncio.create_task(_ticker())
+    try:
+        while True:
+            for msg in await ipc.read_frame(reader):
+                op = msg.get("op")
+                if op == "cfg":
+                    sup.apply_cfg(msg["cfg"], symbols=msg.get("symbols"))
+                    ledger.apply_cfg(msg["cfg"])
+                    new_conf = compile_cfg(msg["cfg"])
+                    metrics.set_enabled(new_conf.metrics.enabled)
+                    loop_mon.apply(new_conf.loop_monitor)
+                    tracing.configure(new_conf.tracing)
+                    log_setup.configure(new_conf.logging)
+                    if recorder is not None:
+                        recorder.apply_retention(new_conf.recorder)
+                elif op == "start_symbol":
+                    sup.start_symbol(msg["symbol"])
+                elif op == "stop_symbol":
+                    sup.stop_symbol(msg["symbol"])
+                elif op == "risk":
+                    risk.allowed = bool(msg.get("allowed", True))
+                    risk.reason = msg.get("reason")
+                elif op == "profile":
+                    asyncio.create_task(_profile(msg))
+                elif op == "stop":
+                    return
+    except (asyncio.IncompleteReadError, ConnectionError):
+        logger.warning("shard %d: API process gone, exiting", shard)
+    finally:
+        ticker.cancel()
+        loop_mon.stop()
+        await clock_sync.stop()
+        await sup.stop_all()
+        await feed.close()
+        await binance.close()
+        if recorder is not None:
+            await recorder.aclose()
+        sink.flush_market()
+        await out.close()
+
+
+def worker_main(shard: int, cfg: Dict[str, Any], symbols: List[str], address: ipc.Address) -> None:
+    """Точка входа процесса-шарда (spawn): свой event loop, свои WS/REST/стратегии/леджер."""
+    # только stderr: файл лога пишет API-процесс
+    log_setup.setup_logging(path=None, to_console=True, fmt=f"%(asctime)s %(levelname)s shard{shard} %(name)s: %(message)s")
+    try:
+        asyncio.run(_worker_async(shard, cfg, symbols, address))
+    except KeyboardInterrupt:
+        pass
+
+
+# =============================== API-процесс ===============================
+
+def _sum_fields(items: Any) -> Dict[str, Any]:
+    """Поэлементная сумма числовых полей словарей (статистика шардов); прочие поля пропускаются."""
+    out: Dict[str, Any] = {}
+    for d in items:
+        for k, v in (d or {}).items():
+            if v is None:
+                v = 0
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                out[k] = out.get(k, 0) + v
+    return out
+
+
+class ShardManager:
+    """
+    Группы символов по процессам-воркерам. Воркеры шлют пачки событий по локальному
+    IPC (unix-сокет, на Windows — loopback TCP); здесь они уходят в AppState.on_event
+    (история, риск, /ws), а API-процесс остаётся владельцем агрегированного риска:
+    его решение рассылается воркерам при каждом изменении.
+    """
+
+    def __init__(self, cfg: Dict[str, Any], on_event: Callable[[Dict[str, Any]], Awaitable[None]],
+                 risk_gate: Callable[[], Tuple[bool, Optional[str]]], workers: int = 0,
+                 address: Optional[ipc.Address] = None, start_timeout: float = 15.0) -> None:
+        self.cfg = cfg
+        self._on_event = on_event
+        self._risk_gate = risk_gate
+        symbols = list(compile_cfg(cfg).strategy.symbols)
+        n = int(workers) or (os.cpu_count() or 1)
+        self.n = max(1, min(n, len(symbols)))
+        self.groups: List[List[str]] = assign_groups(symbols, [[] for _ in range(self.n)])
+        self._address = address or ipc.default_address("amadeus-shards")
+        self._start_timeout = float(start_timeout)
+
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._procs: List[mp.Process] = []
+        self._writers: Dict[int, asyncio.StreamWriter] = {}
+        self._ready = asyncio.Event()
+        self._stats: Dict[int, Dict[str, Any]] = {}
+        self._equity: Dict[int, float] = {}
+        # шарды, приславшие equity после своего (пере)подключения
+        self._fresh: Set[int] = set()
+        self._risk: Tuple[bool, Optional[str]] = (True, None)
+        self.events_total = 0
+        self._profiles: Dict[int, asyncio.Future] = {}
+        self._profile_ids = 0
+
+    # ---------------- жизненный цикл ----------------
+    async def start(self) -> None:
+        self._server, addr = await ipc.start_server(self._address, self._on_client)
+        self._address = addr
+        ctx = mp.get_context("spawn")
+        for i, group in enumerate(self.groups):
+            p = ctx.Process(target=worker_main, name=f"amadeus-shard-{i}",
+                            args=(i, _shard_cfg(self.cfg, group, self.n), group, addr), daemon=True)
+            p.start()
+            self._procs.append(p)
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=self._start_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("shards: only %d/%d workers connected", len(self._writers), self.n)
+        logger.info("shards started: %d workers, groups=%s", self.n, [len(g) for g in self.groups])
+
+    async def stop(self) -> None:
+        self._send_all({"op": "stop"})
+        for p in self._procs:
+            await asyncio.to_thread(p.join, 5.0)
+            if p.is_alive():
+                p.terminate()
+        self._procs.clear()
+        for w in self._writers.values():
+            try:
+                w.close()
+            except Exception:
+                pass
+        self._writers.clear()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if isinstance(self._address, str):
+            try:
+                os.unlink(self._address)
+            except OSError:
+                pass
+
+    # ---------------- приём событий ----------------
+    async def _on_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        shard = -1
+        try:
+            hello = (await ipc.read_frame(reader))[0]
+            shard = int(hello["shard"])
+            self._writers[shard] = writer
+            self._fresh.discard(shard)
+            logger.info("shard %d connected (pid=%s)", shard, hello.get("pid"))
+            if len(self._writers) >= self.n:
+                self._ready.set()
+            self._send(shard, {"op": "risk", "allowed": self._risk[0], "reason": self._risk[1]})
+            while True:
+                for evt in await ipc.read_frame(reader):
+                    await self._handle(shard, evt)
+                self.sync_risk()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            logger.exception("shard %d: bad frame", shard)
+        finally:
+            if self._writers.get(shard) is writer:
+                del self._writers[shard]
+                # последняя equity остаётся в сумме как устаревшая: выпавшая доля банка
+                # выглядела бы для MaxDrawdown как реальная просадка
+                self._fresh.discard(shard)
+                await self._on_event({"type": "diag", "level": "error", "source": f"shard{shard}",
+                                      "text": f"SHARD {shard} disconnected"})
+
+    async def _handle(self, shard: int, evt: Dict[str, Any]) -> None:
+        self.events_total += 1
+        t = evt.get("type")
+        if t == "shard_stats":
+            self._stats[shard] = evt
+            return
+        if t == "shard_profile":
+            fut = self._profiles.pop(evt.get("id"), None)
+            if fut is not None and not fut.done():
+                if evt.get("error"):
+                    exc = _PROFILE_ERRORS.get(str(evt.get("error_type")), RuntimeError)
+                    fut.set_exception(exc(f"shard {shard}: {evt['error']}"))
+                else:
+                    fut.set_result(evt.get("result"))
+            return
+        if t == "diag" and "source" not in evt:
+            evt["source"] = f"shard{shard}"
+        if t == "bank" and evt.get("equity") is not None:
+            self._equity[shard] = float(evt["equity"])
+            self._fresh.add(shard)
+            evt = {**evt, "shard": shard}
+            if self.equity_complete():
+                # equity шарда → общий банк: риск и UI видят сумму по всем воркерам
+                evt["equity"] = round(sum(self._equity.values()), 8)
+                stale = self.stale_shards()
+                if stale:
+                    evt["stale"] = stale
+            else:
+                # частичная сумма (старт, переподключение) — не equity банка, в риск не идёт
+                evt["shard_equity"] = evt.pop("equity")
+        await self._on_event(evt)
+
+    # ---------------- управление ----------------
+    def _send(self, shard: int, msg: Dict[str, Any]) -> bool:
+        w = self._writers.get(shard)
+        if w is None:
+            return False
+        w.write(ipc.encode_frame([msg]))
+        return True
+
+    def _send_all(self, msg: Dict[str, Any]) -> None:
+        for shard in list(self._writers):
+            self._send(shard, msg)
+
+    def sync_risk(self) -> None:
+        """Рассылаем решение риска только при изменении (сам decide закеширован по epoch)."""
+        decision = self._risk_gate()
+        if decision != self._risk:
+            self._risk = decision
+            self._send_all({"op": "risk", "allowed": decision[0], "reason": decision[1]})
+
+    def shard_of(self, symbol: str) -> Optional[int]:
+        for i, g in enumerate(self.groups):
+            if symbol in g:
+                return i
+        return None
+
+    def start_symbol(self, symbol: str) -> bool:
+        shard = self.shard_of(symbol)
+        if shard is None:
+            self.groups = assign_groups([s for g in self.groups for s in g] + [symbol], self.groups)
+            shard = self.shard_of(symbol)
+        return self._send(shard, {"op": "start_symbol", "symbol": symbol})
+
+    def stop_symbol(self, symbol: str) -> bool:
+        shard = self.shard_of(symbol)
+        return shard is not None and self._send(shard, {"op": "stop_symbol", "symbol": symbol})
+
+    async def profile(self, shard: int, **params: Any) -> Dict[str, Any]:
+        """Профиль процесса-воркера: параметры как у profiler.profile, ответ — событием shard_profile."""
+        self._profile_ids += 1
+        rid = self._profile_ids
+        fut = asyncio.get_running_loop().create_future()
+        self._profiles[rid] = fut
+        try:
+            if not self._send(shard, {"op": "profile", "id": rid, "params": params}):
+                raise ValueError(f"shard {shard} is not connected")
+            return await asyncio.wait_for(fut, timeout=float(params.get("seconds", 10.0)) + 30.0)
+        finally:
+            self._profiles.pop(rid, None)
+
+    def apply_cfg(self, cfg: Dict[str, Any]) -> None:
+        """Горячие параметры — во все воркеры; новые символы — в самые короткие шарды (число воркеров не меняется)."""
+        self.cfg = cfg
+        self.groups = assign_groups(list(compile_cfg(cfg).strategy.symbols), self.groups)
+        for i, group in enumerate(self.groups):
+            self._send(i, {"op": "cfg", "cfg": _shard_cfg(cfg, group, self.n), "symbols": group})
+
+    # ---------------- метрики ----------------
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        for shard, st in self._stats.items():
+            for sym, m in (st.get("symbols") or {}).items():
+                out[sym] = {**m, "shard": shard}
+        return out
+
+    def totals(self) -> Dict[str, Any]:
+        return _sum_fields(st.get("totals") for st in self._stats.values())
+
+    def fills_total(self) -> int:
+        return sum(int(st.get("fills_total") or 0) for st in self._stats.values())
+
+    def feed_stats(self) -> Dict[str, Any]:
+        """Счётчики фидов всех шардов суммой — те же поля, что у BookTickerHub.stats() в inprocess."""
+        return _sum_fields(st.get("feed") for st in self._stats.values())
+
+    def recorder_stats(self) -> Optional[Dict[str, Any]]:
+        """Счётчики рекордеров шардов суммой (папки/сегменты у каждого свои — в stats().shards)."""
+        recs = [st["recorder"] for st in self._stats.values() if st.get("recorder")]
+        return _sum_fields(recs) if recs else None
+
+    def metric_snapshots(self) -> List[Tuple[Dict[str, str], List[Dict[str, Any]]]]:
+        """Последние снимки метрик воркеров для /metrics (метка shard)."""
+        return [({"shard": str(i)}, st["metrics"]) for i, st in sorted(self._stats.items()) if st.get("metrics")]
+
+    def clocks(self) -> Dict[int, Dict[str, Any]]:
+        return {i: st["clock"] for i, st in sorted(self._stats.items()) if st.get("clock")}
+
+    def loop_summaries(self) -> Dict[int, Dict[str, Any]]:
+        return {i: st["loop"] for i, st in sorted(self._stats.items()) if st.get("loop")}
+
+    def equity_complete(self) -> bool:
+        """Есть equity от всех шардов, и каждый подключённый прислал её после (пере)подключения."""
+        return len(self._equity) >= self.n and all(s in self._fresh for s in self._writers)
+
+    def stale_shards(self) -> List[int]:
+        return sorted(s for s in self._equity if s not in self._fresh)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.n,
+            "connected": len(self._writers),
+            "equity_stale": self.stale_shards(),
+            "events_total": self.events_total,
+            "shards": {i: {"pid": st.get("pid"), "symbols": self.groups[i] if i < len(self.groups) else [],
+                           "feed": st.get("feed"), "recorder": st.get("recorder"), "ipc": st.get("ipc"),
+                           "loop": st.get("loop")}
+                       for i, st in sorted(self._stats.items())},
+        }
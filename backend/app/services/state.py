@@ -3,7 +3,6 @@ import asyncio
 import json
 import logging
 import time
-import traceback
 from dataclasses import asdict, is_dataclass
 from typing import Any, Dict, Optional, Set
 from collections.abc import Mapping
@@ -11,11 +10,22 @@ from collections.abc import Mapping
 import yaml
 import httpx  # ⬅️ REST-fallback для маркет-потока
 
+from ..core import logging as log_setup
+from ..core import metrics
 from ..core.config import settings
+from ..core.config_schema import CompiledConfig, ConfigError, compile_cfg
 from ..models.schemas import BotStatus
+from . import tracing
+from .diag import DiagLog
+from .ws_journal import WsJournal
 
 logger = logging.getLogger(__name__)
 
+_FANOUT = metrics.histogram("amadeus_ws_fanout_seconds", "Broadcast to /ws clients: serialize + enqueue",
+                            buckets=metrics.LATENCY_FAST).labels()
+_RISK_CHECK = metrics.histogram("amadeus_risk_check_seconds", "Pre-order risk check time",
+                                buckets=metrics.LATENCY_FAST).labels()
+
 
 class AppState:
     """
@@ -25,11 +35,25 @@ class AppState:
 
     def __init__(self) -> None:
         self.cfg: Dict[str, Any] = self._coerce_cfg(getattr(settings, "runtime_cfg", None))
+        try:
+            self.conf: CompiledConfig = compile_cfg(self.cfg)
+        except ConfigError as e:
+            logger.error("startup cfg rejected (%s) — using defaults for typed snapshot", e)
+            self.conf = compile_cfg({})
+        metrics.set_enabled(self.conf.metrics.enabled)
+        tracing.configure(self.conf.tracing)
+        log_setup.configure(self.conf.logging)
 
         # внешние сервисы/модули (лениво создаются при старте бота)
-        self.binance = None   # type: ignore
-        self.mm = None        # type: ignore
+        self.binance = None     # type: ignore
+        self.feed = None        # type: ignore  # общий bookTicker-фид
+        self.supervisor = None  # type: ignore  # MarketMaker'ы по символам
+        self.shards = None      # type: ignore  # engine.mode=sharded: символы по процессам-воркерам
+        self.ledger = None      # type: ignore
         self.history = None   # type: ignore
+        self.recorder = None    # type: ignore  # запись сырых WS-кадров (recorder.enabled)
+        self.clock_sync = None  # type: ignore  # смещение часов биржи для трассировки
+        self.loop_monitor = None  # type: ignore  # lag/медленные колбэки event loop (живёт дольше бота)
 
         # риск
         self.risk_manager = None  # type: ignore
@@ -37,15 +61,27 @@ class AppState:
         # фоновые таски
         self._task: Optional[asyncio.Task] = None
         self._market_task: Optional[asyncio.Task] = None
+        self._history_task: Optional[asyncio.Task] = None
+        self._risk_task: Optional[asyncio.Task] = None
+        self._risk_snapshotter = None  # type: ignore
+        self.history_maintainer = None  # type: ignore
 
         # WS клиенты — кладём ровно те очереди, которые слушает /ws
         self._clients: Set[asyncio.Queue[str]] = set()
         self._sent_counter = 0
         self._sent_last_ts = time.time()
+        self.ws_dropped_total = 0   # клиентов выкинуто из рассылки по переполнению очереди
+        # seq на каждую рассылку, кольца по темам: снапшот и resume для /ws без запросов в БД
+        self.journal = WsJournal(self.conf.ws)
+        # diag: уровни, дедуп, бюджет /ws, кольцо для /api/logs
+        self.diag = DiagLog(self.conf.diag, self._broadcast_obj)
 
         # метрики/эквити
         self.equity: Optional[float] = None
 
+        # дедуп diag по блокировкам входа: symbol -> [key, last_emit_ts, suppressed]
+        self._risk_blocks: Dict[str, list] = {}
+
         logger.info("Loaded cfg type=%s keys=%s", type(self.cfg).__name__, list(self.cfg.keys())[:8])
 
     # --------------- Config helpers ---------------
@@ -68,28 +104,122 @@ class AppState:
                 return {"_raw": raw}
         return {}
 
-    def set_cfg(self, new_cfg: Any) -> None:
-        self.cfg = self._coerce_cfg(new_cfg)
-        logger.info("Config updated. keys=%s", list(self.cfg.keys())[:8])
+    def set_cfg(self, new_cfg: Any):
+        """
+        Применить конфиг к работающему боту без рестарта: дифф → валидация → горячие ключи
+        в стратегию/риск/леджер/обслуживание истории разом. Ключи, требующие рестарта,
+        только сообщаются. Возвращает ConfigPlan; на невалидном конфиге — ValueError, ничего не меняя.
+        """
+        from .config_diff import diff_cfg
+        cfg = self._coerce_cfg(new_cfg)
+        plan = diff_cfg(self.cfg, cfg)
+        conf = self._validate_cfg(cfg)
+
+        self.cfg = cfg
+        self.conf = conf
+        metrics.set_enabled(conf.metrics.enabled)
+        tracing.configure(conf.tracing)
+        log_setup.configure(conf.logging)
+        self.diag.apply(conf.diag)
+        self.journal.apply(conf.ws)
+        logger.info("Config %s: hot=%s reconnect=%s restart=%s", conf.version, plan.hot, plan.reconnect, plan.restart)
         if self.risk_manager is not None:
-            from .risk.manager import RiskManager
-            self.risk_manager = RiskManager(self.cfg or {})
+            # не пересоздаём: окно equity, блокировки и счётчики гуардов сохраняются
+            self.risk_manager.apply_cfg(cfg)
+        if self.ledger is not None:
+            self.ledger.apply_cfg(cfg)
+        from .history_retention import RetentionPolicy
+        policy = RetentionPolicy.from_cfg(cfg)
+        if self.history_maintainer is not None:
+            self.history_maintainer.policy = policy
+        if policy.enabled and self._history_task is None and self.history is not None and self.is_running():
+            self._start_history_maintenance(policy)
+        if self.recorder is not None:
+            self.recorder.apply_retention(conf.recorder)
+        if self.loop_monitor is not None:
+            self.loop_monitor.apply(conf.loop_monitor)
+        if self.shards is not None:
+            self.shards.apply_cfg(cfg)
+        if self.supervisor is not None:
+            # параметры — во все MarketMaker'ы; новые символы стартуют, убранные — останавливаются
+            self.supervisor.apply_cfg(cfg)
+            if plan.symbol_changed and self._market_task is not None:
+                self._market_task.cancel()
+                self._market_task = asyncio.create_task(self._market_widget_loop(conf.strategy.symbol))
+        if plan.restart and self.is_running():
+            self.diag.emit(f"CONFIG: restart required for {', '.join(plan.restart)}", "warning")
+
         # уведомим UI о новом статусе/символе
         try:
             self.broadcast_status()
         except Exception:
             pass
+        return plan
+
+    def _start_history_maintenance(self, policy) -> None:
+        from .history_retention import HistoryMaintainer
+        logger.warning("history maintenance is on: %s", policy.describe())
+        self.history_maintainer = HistoryMaintainer(self.history, policy)
+        self._history_task = asyncio.create_task(self.history_maintainer.run())
+
+    @staticmethod
+    def _validate_cfg(cfg: Dict[str, Any]) -> CompiledConfig:
+        """Типизированный снимок + разбор параметров всех живых компонентов до того, как что-то менять."""
+        from .risk.manager import RiskManager
+        from .ledger import PositionLedger
+        from .history_retention import RetentionPolicy
+        try:
+            conf = compile_cfg(cfg)
+            RiskManager(cfg)
+            PositionLedger(cfg)
+            RetentionPolicy.from_cfg(cfg)
+        except (TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f"invalid config: {e}") from e
+        return conf
+
+    # --------------- Event loop ---------------
+    def start_loop_monitor(self) -> None:
+        """Пульс event loop процесса: на старте приложения/движка, независимо от бота."""
+        if self.loop_monitor is None:
+            from .loop_monitor import LoopMonitor
+            self.loop_monitor = LoopMonitor(self.conf.loop_monitor,
+                                            on_alert=lambda text: self.diag.emit(text, "warning", source="loop"))
+        self.loop_monitor.start()
+
+    def stop_loop_monitor(self) -> None:
+        if self.loop_monitor is not None:
+            self.loop_monitor.stop()
+
+    def loop_stats(self) -> Dict[str, Any]:
+        """Поля для /ws stats: lag своего loop, худший p99 по шардам, p50/p99 стадий тик → ордер."""
+        out: Dict[str, Any] = {}
+        if self.loop_monitor is not None:
+            s = self.loop_monitor.summary()
+            out = {"loop_lag_p50_ms": s["lag_p50_ms"], "loop_lag_p99_ms": s["lag_p99_ms"],
+                   "loop_slow": s["slow_callbacks"]}
+        if self.shards is not None:
+            p99 = [lp["lag_p99_ms"] for lp in self.shards.loop_summaries().values()]
+            if p99:
+                out["shard_loop_lag_p99_ms"] = max(p99)
+        if tracing.enabled:
+            latency = tracing.TRACER.summary()
+            if latency:
+                out["latency"] = latency
+        return out
+
+    @property
+    def mm(self):
+        """Основной MarketMaker (первый символ) — для кода, которому нужен один."""
+        return self.supervisor.primary if self.supervisor is not None else None
 
     # --------------- Feature toggles ---------------
     @property
     def risk_enabled(self) -> bool:
-        features = (self.cfg or {}).get("features") or {}
-        return bool(features.get("risk_protections", True))
+        return self.conf.features.risk_protections
 
     @property
     def market_widget_feed_enabled(self) -> bool:
-        features = (self.cfg or {}).get("features") or {}
-        return bool(features.get("market_widget_feed", True))
+        return self.conf.features.market_widget_feed
 
     # --------------- WS helpers ---------------
     def register_ws(self) -> asyncio.Queue[str]:
@@ -119,6 +249,7 @@ class AppState:
         return _unsub
 
     def _broadcast_obj(self, obj: Any) -> None:
+        t0 = metrics.now_ns() if metrics.enabled else 0
         try:
             if isinstance(obj, dict):
                 data = json.dumps(obj, ensure_ascii=False)
@@ -138,6 +269,7 @@ class AppState:
         except Exception:
             logger.exception("Failed to serialize broadcast obj, sending as text")
             data = str(obj)
+        data = self.journal.record(obj, data)
 
         for q in list(self._clients):
             try:
@@ -145,6 +277,22 @@ class AppState:
                 self._sent_counter += 1
             except asyncio.QueueFull:
                 self._clients.discard(q)
+                self.ws_dropped_total += 1
+                logger.warning("WS client dropped: queue full (dropped_total=%d)", self.ws_dropped_total)
+        if t0:
+            _FANOUT.observe_since(t0)
+
+    def collect_metrics(self):
+        """Коллектор /metrics: то, что дешевле прочитать при скрейпе, чем считать на каждом событии."""
+        yield "amadeus_ws_clients", "gauge", "Connected /ws clients", (), [((), len(self._clients))]
+        yield ("amadeus_ws_client_queue_depth", "gauge", "Pending messages per /ws client queue", ("client",),
+               [((f"{id(q):x}",), q.qsize()) for q in list(self._clients)])
+        yield ("amadeus_ws_dropped_total", "counter", "/ws clients dropped on queue overflow", (),
+               [((), self.ws_dropped_total)])
+        yield ("amadeus_diag_messages_total", "counter", "diag messages by level", ("level",),
+               [((k,), v) for k, v in self.diag.total.items()])
+        yield ("amadeus_diag_suppressed_total", "counter", "diag messages kept off /ws", ("reason",),
+               [(("dedup",), self.diag.deduped_total), (("budget",), self.diag.held_total)])
 
     def broadcast(self, type_: str, **payload: Any) -> None:
         self._broadcast_obj({"type": type_, **payload})
@@ -152,13 +300,13 @@ class AppState:
     def broadcast_status(self) -> None:
         m = self.status()
         try:
-            payload = m.model_dump()  # pydantic v2
+            payload = m.model_dump(exclude_none=True)  # pydantic v2
         except Exception:
             payload = {
                 "running": m.running,
                 "symbol": m.symbol,
                 "metrics": m.metrics,
-                "cfg": m.cfg,
+                "cfg_version": m.cfg_version,
             }
         payload["type"] = "status"
         self._broadcast_obj(payload)
@@ -167,22 +315,80 @@ class AppState:
     def _ensure_risk(self):
         if self.risk_manager is None:
             from .risk.manager import RiskManager
+            from .risk.persistence import load_snapshot, state_path
             self.risk_manager = RiskManager(self.cfg or {})
+            # тёплый старт: окно equity, блокировки и гуарды из последнего снапшота
+            load_snapshot(self.risk_manager, state_path(self.cfg or {}))
+
+    async def save_risk_state(self) -> None:
+        if self._risk_snapshotter is not None:
+            await self._risk_snapshotter.save_now()
 
     def check_risk(self, symbol: Optional[str]) -> tuple[bool, Optional[str]]:
+        if not self.risk_enabled:
+            return True, None
+        t0 = metrics.now_ns() if metrics.enabled else 0
+        self._ensure_risk()
+        d = self.risk_manager.decide(symbol or None)
+        if t0:
+            _RISK_CHECK.observe_since(t0)
+        if not d.allowed:
+            self._report_block(symbol or "", d.key or d.reason or "", d.reason)
+        elif self._risk_blocks:
+            self._risk_blocks.pop(symbol or "", None)
+        return d.allowed, d.reason
+
+    def _report_block(self, symbol: str, key: str, reason: Optional[str], repeat_sec: float = 30.0) -> None:
+        """Одинаковые причины блокировки не шлём на каждый ордер: новая причина — сразу, повтор — раз в repeat_sec с ×N."""
+        now = time.time()
+        st = self._risk_blocks.get(symbol)
+        if st is not None and st[0] == key:
+            st[2] += 1
+            if now - st[1] < repeat_sec:
+                return
+            text = f"ENTRY BLOCKED [{symbol}]: {reason} (×{st[2]})"
+            st[1] = now
+            st[2] = 0
+        else:
+            self._risk_blocks[symbol] = [key, now, 0]
+            text = f"ENTRY BLOCKED [{symbol}]: {reason}"
+            logger.warning("Order blocked by risk: %s (%s)", symbol, reason)
+        self.diag.emit(text, "warning", symbol=symbol or None)
+
+    # --------------- Per-symbol control ---------------
+    def start_symbol(self, symbol: str) -> bool:
+        if not self.is_running():
+            raise RuntimeError("bot is not running")
+        owner = self.shards if self.shards is not None else self.supervisor
+        ok = owner.start_symbol(symbol)
+        if ok:
+            self.diag.emit(f"STARTED {symbol.upper()}", symbol=symbol.upper())
+            self.broadcast_status()
+        return ok
+
+    def stop_symbol(self, symbol: str) -> bool:
+        owner = self.shards if self.shards is not None else self.supervisor
+        if owner is None:
+            return False
+        ok = owner.stop_symbol(symbol)
+        if ok:
+            self.diag.emit(f"STOPPED {symbol.upper()}", symbol=symbol.upper())
+            self.broadcast_status()
+        return ok
+
+    def risk_gate(self) -> tuple[bool, Optional[str]]:
+        """Общее (не по паре) решение риска — без diag; для воркеров-шардов."""
         if not self.risk_enabled:
             return True, None
         self._ensure_risk()
-        allowed, reason = self.risk_manager.can_enter(pair=symbol or None)
-        if not allowed and reason:
-            self.broadcast("diag", text=f"ENTRY BLOCKED: {reason}")
-        return allowed, reason
+        d = self.risk_manager.decide(None)
+        return d.allowed, d.reason
 
     def on_trade_closed(self, pair: str, pnl: float, stoploss_hit: bool = False):
         if not self.risk_enabled:
             return
         self._ensure_risk()
-        self.risk_manager.on_trade_closed(pnl=pnl)
+        self.risk_manager.on_trade_closed(pnl=pnl, pair=pair or None, stoploss_hit=stoploss_hit)
 
     def on_equity(self, equity_value: float):
         if not self.risk_enabled:
@@ -206,39 +412,74 @@ class AppState:
             return
 
         from .binance_client import BinanceAsync
-        from .market_maker import MarketMaker
+        from .market_feed import BookTickerHub
+        from .supervisor import StrategySupervisor
+        from .ledger import PositionLedger
         from .history import HistoryStore
+        from .history_retention import RetentionPolicy
 
         cfg = self.cfg
-        api = (cfg.get("api") or {})
-        strategy = (cfg.get("strategy") or {})
+        conf = self.conf
         shadow_cfg = (cfg.get("shadow") or {})
 
-        paper = bool(api.get("paper", True))
-        shadow_en = bool(api.get("shadow", True))
-
         self._ensure_risk()
-        self.history = HistoryStore()
+        from .risk.persistence import RiskSnapshotter, state_path
+        self._risk_snapshotter = RiskSnapshotter(
+            lambda: self.risk_manager, state_path(cfg),
+            interval_sec=conf.risk.snapshot_interval_sec,
+        )
+        self._risk_task = asyncio.create_task(self._risk_snapshotter.run())
+
+        self.history = HistoryStore.from_cfg(cfg)
         await self.history.init()
+        policy = RetentionPolicy.from_cfg(cfg)
+        if policy.enabled:
+            self._start_history_maintenance(policy)
+
+        if conf.engine.mode == "sharded":
+            # рынок/стратегии/shadow — в процессах-воркерах; здесь только /ws, /api, история и риск
+            from .sharding import ShardManager
+            self.shards = ShardManager(cfg, on_event=self.on_event, risk_gate=self.risk_gate,
+                                       workers=conf.engine.workers)
+            await self.shards.start()
+            self._task = asyncio.create_task(self._run_loop())
+            self.diag.emit(f"STARTED ({self.shards.n} shards)")
+            self.broadcast_status()
+            logger.info("bot started: %d shards", self.shards.n)
+            return
 
         self.binance = BinanceAsync(
             api_key=getattr(settings, "binance_api_key", None),
             api_secret=getattr(settings, "binance_api_secret", None),
-            paper=paper,
-            shadow=shadow_en,
+            paper=conf.api.paper,
+            shadow=conf.api.shadow,
+            rest_base=conf.api.rest_base,
+            ws_base=conf.api.ws_base,
             shadow_opts=shadow_cfg,
             events_cb=self.on_event,
             state=self,
         )
 
-        self.mm = MarketMaker(cfg, client_wrapper=self.binance, events_cb=self.on_event)
+        if conf.recorder.enabled:
+            from .recorder import MarketRecorder
+            self.recorder = MarketRecorder.from_config(conf.recorder)
+            self.recorder.start()
+            self.binance.bm.recorder = self.recorder
+        self.clock_sync = tracing.ClockSync(self.binance.client)
+        self.clock_sync.start()
+
+        # один сокет bookTicker, один REST-клиент, один леджер/история/риск на все символы
+        self.feed = BookTickerHub(self.binance.bm)
+        self.ledger = PositionLedger(cfg)
+        self.supervisor = StrategySupervisor(cfg, client_wrapper=self.binance, events_cb=self.on_event,
+                                             ledger=self.ledger, feed=self.feed)
 
         if self.market_widget_feed_enabled:
-            sym = str(strategy.get("symbol") or "BTCUSDT")
+            sym = conf.strategy.symbol
             self._market_task = asyncio.create_task(self._market_widget_loop(sym))
 
         self._task = asyncio.create_task(self._run_loop())
-        self.broadcast("diag", text="STARTED")
+        self.diag.emit("STARTED")
         self.broadcast_status()
         logger.info("bot started")
 
@@ -263,39 +504,53 @@ class AppState:
             finally:
                 self._market_task = None
 
+        if self._history_task:
+            self._history_task.cancel()
+            try:
+                await self._history_task
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self._history_task = None
+
+        if self._risk_task:
+            self._risk_task.cancel()
+            try:
+                await self._risk_task
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self._risk_task = None
+        try:
+            await self.save_risk_state()
+        except Exception:
+            logger.exception("risk snapshot on stop failed")
+
+        if self.clock_sync is not None:
+            await self.clock_sync.stop()
+            self.clock_sync = None
         await self._close_binance()
-        self.mm = None
-        self.broadcast("diag", text="STOPPED")
+        if self.recorder is not None:
+            await self.recorder.aclose()
+            self.recorder = None
+        self.supervisor = None
+        self.feed = None
+        self.shards = None
+        self.diag.emit("STOPPED")
         self.broadcast_status()
         logger.info("bot stopped")
 
     async def _run_loop(self) -> None:
-        cfg = self.cfg
-        loop_sleep = float((cfg.get("strategy") or {}).get("loop_sleep", 0.2))
         stats_interval = 1.0
         last_stats = time.time()
 
-        self.broadcast("stats", ws_clients=len(self._clients), ws_rate=0.0)
+        self.broadcast("stats", ws_clients=len(self._clients), ws_rate=0.0, **self.loop_stats())
 
+        # стратегии крутятся задачами супервизора (ошибки — в diag, с перезапуском символа)
+        if self.supervisor is not None:
+            self.supervisor.start_all()
         try:
             while True:
-                try:
-                    if hasattr(self.mm, "step"):
-                        await self.mm.step()
-                    elif hasattr(self.mm, "run"):
-                        await self.mm.run()
-                    else:
-                        await asyncio.sleep(loop_sleep)
-                except Exception as e:
-                    self.broadcast("diag", text=f"ERROR: {e!s}")
-                    tb = traceback.format_exc()
-                    if tb and len(tb) > 5000:
-                        tb = tb[-5000:]
-                    for line in tb.splitlines():
-                        self.broadcast("diag", text=line)
-                    logger.exception("mm loop error: %s", e)
-                    await asyncio.sleep(0.5)
-
                 now = time.time()
                 if now - last_stats >= stats_interval:
                     elapsed = now - self._sent_last_ts
@@ -303,10 +558,20 @@ class AppState:
                     self._sent_counter = 0
                     self._sent_last_ts = now
                     last_stats = now
-                    self.broadcast("stats", ws_clients=len(self._clients), ws_rate=round(rate, 2))
+                    self.broadcast("stats", ws_clients=len(self._clients), ws_rate=round(rate, 2),
+                                   **self.loop_stats())
+                    if self.shards is not None:
+                        # блокировки риска истекают по времени, без событий
+                        self.shards.sync_risk()
 
-                await asyncio.sleep(loop_sleep)
+                await asyncio.sleep(self.conf.strategy.loop_sleep)
         finally:
+            if self.supervisor is not None:
+                await self.supervisor.stop_all()
+            if self.shards is not None:
+                await self.shards.stop()
+            if self.feed is not None:
+                await self.feed.close()
             await self._close_binance()
 
     async def _market_widget_loop(self, symbol: str):
@@ -318,26 +583,22 @@ class AppState:
         await asyncio.sleep(0)
         sym = (symbol or "BTCUSDT").upper()
 
-        # базовый REST-хост: из конфига shadow.rest_base или официальный
-        rest_base = "https://api.binance.com"
-        try:
-            rest_cfg = ((self.cfg.get("shadow") or {}).get("rest_base") or "").strip()
-            if rest_cfg:
-                rest_base = rest_cfg
-        except Exception:
-            pass
+        from .binance_client import observe_rest_response
+        # базовый REST-хост: shadow.rest_base или официальный (проверен в compile_cfg)
+        rest_base = self.conf.shadow.rest_base
 
-        self.broadcast("diag", text=f"MarketBridge start: {sym}")
+        self.diag.emit(f"MarketBridge start: {sym}", source="market")
 
         last_diag = 0.0
 
         while True:
             # 1) Попытка через WS
             try:
-                if self.binance and getattr(self.binance, "bm", None):
-                    async with self.binance.bm.book_ticker_socket(sym) as stream:
+                source = self.feed if self.feed is not None else getattr(self.binance, "bm", None)
+                if source is not None:
+                    async with source.book_ticker_socket(sym) as stream:
                         if time.time() - last_diag > 15:
-                            self.broadcast("diag", text=f"MarketBridge WS connected: {sym}")
+                            self.diag.emit(f"MarketBridge WS connected: {sym}", source="market")
                             last_diag = time.time()
                         while True:
                             msg = await stream.recv()
@@ -353,17 +614,18 @@ class AppState:
                     # нет bm — падаем на REST-фолбэк
                     raise RuntimeError("WS bridge not ready (bm is None)")
             except asyncio.CancelledError:
-                self.broadcast("diag", text="MarketBridge: cancelled")
+                self.diag.emit("MarketBridge: cancelled", "debug", source="market")
                 break
             except Exception as e:
                 # 2) REST fallback
                 msg = str(e)
                 if time.time() - last_diag > 5:
-                    self.broadcast("diag", text=f"MarketBridge WS error → REST: {msg}")
+                    self.diag.emit(f"MarketBridge WS error → REST: {msg}", "warning", source="market")
                     last_diag = time.time()
 
                 try:
-                    async with httpx.AsyncClient(timeout=3.0) as http:
+                    async with httpx.AsyncClient(timeout=3.0,
+                                                 event_hooks={"response": [observe_rest_response]}) as http:
                         while True:
                             # bookTicker — bid/ask
                             r = await http.get(f"{rest_base}/api/v3/ticker/bookTicker", params={"symbol": sym})
@@ -376,15 +638,15 @@ class AppState:
                                 self.broadcast("market", symbol=s, bestBid=b, bestAsk=a, ts=ts)
                             else:
                                 if time.time() - last_diag > 10:
-                                    self.broadcast("diag", text=f"REST bookTicker {r.status_code}: {r.text[:160]}")
+                                    self.diag.emit(f"REST bookTicker {r.status_code}: {r.text[:160]}", "warning", source="market")
                                     last_diag = time.time()
                             await asyncio.sleep(1.0)
                 except asyncio.CancelledError:
-                    self.broadcast("diag", text="MarketBridge (REST): cancelled")
+                    self.diag.emit("MarketBridge (REST): cancelled", "debug", source="market")
                     break
                 except Exception as e2:
                     if time.time() - last_diag > 5:
-                        self.broadcast("diag", text=f"MarketBridge REST error: {e2!s}")
+                        self.diag.emit(f"MarketBridge REST error: {e2!s}", "warning", source="market")
                         last_diag = time.time()
                     await asyncio.sleep(1.5)
 
@@ -396,10 +658,10 @@ class AppState:
                     if isinstance(parsed, dict):
                         evt = parsed
                     else:
-                        self.broadcast("diag", text=str(evt))
+                        self.diag.emit(str(evt))
                         return
                 except Exception:
-                    self.broadcast("diag", text=str(evt))
+                    self.diag.emit(str(evt))
                     return
             elif not isinstance(evt, dict):
                 try:
@@ -412,10 +674,10 @@ class AppState:
                     elif isinstance(evt, Mapping):
                         evt = dict(evt)
                     else:
-                        self.broadcast("diag", text=str(evt))
+                        self.diag.emit(str(evt))
                         return
                 except Exception:
-                    self.broadcast("diag", text=str(evt))
+                    self.diag.emit(str(evt))
                     return
 
             # equity → RiskManager
@@ -425,12 +687,19 @@ class AppState:
                 if t_tmp == "equity" and eq_val is None:
                     eq_val = evt.get("value", None)
                 if eq_val is not None:
-                    self.on_equity(float(eq_val))
+                    self.equity = float(eq_val)
+                    self.on_equity(self.equity)
             except Exception:
                 pass
 
             t = evt.get("type")
 
+            # трасса тик → ордер: ack — здесь; в историю и UI метки не идут
+            if t == "order_event" and "trace" in evt:
+                tr = evt.pop("trace")
+                if tracing.enabled:
+                    tracing.TRACER.complete(evt, tr)
+
             # история
             try:
                 if t == "order_event" and getattr(self, "history", None):
@@ -438,12 +707,18 @@ class AppState:
                 elif t in {"trade", "fill"} and getattr(self, "history", None):
                     await self.history.log_trade(evt)
                     pnl = float(evt.get("pnl") or 0.0) if isinstance(evt.get("pnl"), (int, float, str)) else 0.0
-                    self.on_trade_closed(pair=str(evt.get("symbol") or ""), pnl=pnl)
+                    # филл, открывающий/наращивающий позицию (closing=False), сделку не закрывает
+                    if evt.get("closing", True):
+                        self.on_trade_closed(pair=str(evt.get("symbol") or ""), pnl=pnl,
+                                             stoploss_hit=bool(evt.get("stoploss_hit")))
             except Exception:
                 logger.exception("history log failed")
 
             # прямая трансляция + статус
-            if t in {"market", "bank", "trade", "fill", "order_event", "stats", "diag", "plan", "status"}:
+            if t == "diag":
+                self.diag.emit_event(evt)
+                return
+            if t in {"market", "bank", "trade", "fill", "order_event", "stats", "plan", "status"}:
                 self._broadcast_obj(evt)
                 return
 
@@ -474,7 +749,7 @@ class AppState:
                     return
 
             if not t:
-                self.broadcast("diag", text=json.dumps(evt, ensure_ascii=False))
+                self.diag.emit(json.dumps(evt, ensure_ascii=False), "debug")
                 return
 
             # прочее
@@ -483,26 +758,49 @@ class AppState:
             elif t in {"balance", "pnl", "equity"}:
                 self.broadcast("bank", **{k: v for k, v in evt.items() if k != "type"})
             elif t in {"log", "debug"}:
-                self.broadcast("diag", text=str(evt.get("msg") or evt.get("text") or ""))
+                self.diag.emit(str(evt.get("msg") or evt.get("text") or ""), "debug" if t == "debug" else evt.get("level") or "info")
             else:
                 self._broadcast_obj(evt)
 
         except Exception:
             logger.exception("on_event failed")
             try:
-                self.broadcast("diag", text="on_event: internal exception")
+                self.diag.emit("on_event: internal exception", "error")
             except Exception:
                 pass
 
     def status(self) -> BotStatus:
-        m: Dict[str, Any] = {"ws_clients": len(self._clients)}
-        if self.mm is not None:
-            for key in ("ticks_total", "orders_total", "orders_active", "orders_filled", "orders_expired"):
-                val = getattr(self.mm, key, None)
-                if val is not None:
-                    m[key] = val
-        sym = getattr(self.mm, "symbol", None) if self.mm else (self.cfg.get("strategy") or {}).get("symbol")
-        return BotStatus(running=self.is_running(), symbol=sym, metrics=m, cfg=self.cfg)
+        m: Dict[str, Any] = {"ws_clients": len(self._clients), "ws_dropped": self.ws_dropped_total}
+        if self.supervisor is not None:
+            # суммарно по всем символам + разбивка по символам
+            m.update(self.supervisor.totals())
+            m["symbols"] = self.supervisor.metrics()
+        if self.feed is not None:
+            m["feed"] = self.feed.stats()
+        if self.recorder is not None:
+            m["recorder"] = self.recorder.stats()
+        if self.loop_monitor is not None:
+            m["loop"] = self.loop_monitor.summary()
+        if tracing.enabled:
+            m["latency"] = tracing.TRACER.summary()
+        if self.shards is not None:
+            m.update(self.shards.totals())
+            m["symbols"] = self.shards.metrics()
+            m["shards"] = self.shards.stats()
+            # те же поля, что и в inprocess: feed / recorder / fills_total — суммой по шардам
+            m["feed"] = self.shards.feed_stats()
+            rec = self.shards.recorder_stats()
+            if rec is not None:
+                m["recorder"] = rec
+            m["fills_total"] = self.shards.fills_total()
+            if self.equity is not None:
+                m["equity"] = self.equity
+        if self.ledger is not None:
+            m["equity"] = round(self.ledger.equity(), 8)
+            m["fills_total"] = self.ledger.fills_total
+        sym = getattr(self.mm, "symbol", None) if self.mm else self.conf.strategy.symbol
+        # полный конфиг — по запросу (GET /config), в статусе только версия
+        return BotStatus(running=self.is_running(), symbol=sym, metrics=m, cfg_version=self.conf.version)
 
 
 # --- синглтон ---
@@ -512,6 +810,7 @@ def get_state() -> AppState:
     global _state
     if _state is None:
         _state = AppState()
+        metrics.add_collector(_state.collect_metrics)
     return _state
 
 __all__ = ["AppState", "get_state"]
\ No newline at end of file
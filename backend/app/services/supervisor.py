@@ -0,0 +1,163 @@
+from __future__ import annotations
+import asyncio
+import logging
+import traceback
+from typing import Any, Dict, List, Optional
+
+from ..core.config_schema import StrategyConfig
+from .ledger import PositionLedger
+from .market_maker import MarketMaker
+
+logger = logging.getLogger(__name__)
+
+_MM_METRICS = ("ticks_total", "orders_total", "orders_active", "orders_filled", "orders_expired",
+               "stops_total")
+
+
+class StrategySupervisor:
+    """
+    N MarketMaker'ов (по одному на символ) в одном event loop.
+
+    Общие на всех: REST/WS-клиент (client_wrapper), bookTicker-фид (один сокет),
+    леджер, история и риск-менеджер (через events_cb → AppState.on_event).
+    На символ приходится только свой MarketMaker и одна задача.
+    """
+
+    def __init__(self, cfg: Dict[str, Any], client_wrapper: Any, events_cb, ledger: PositionLedger,
+                 feed: Any = None, restart_delay: float = 0.5, symbols: Optional[List[str]] = None,
+                 clock: Any = None) -> None:
+        self.cfg = cfg or {}
+        self.client_wrap = client_wrapper
+        self.events_cb = events_cb
+        self.ledger = ledger
+        self.feed = feed
+        self.restart_delay = float(restart_delay)
+        self.clock = clock
+
+        # symbols — явный список (шард воркера), иначе из конфига
+        self.symbols: List[str] = list(symbols) if symbols is not None else list(StrategyConfig.from_dict(self.cfg).symbols)
+        self.mms: Dict[str, MarketMaker] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    # ---------------- символы ----------------
+    def _symbol_cfg(self, symbol: str) -> Dict[str, Any]:
+        strat = dict(self.cfg.get("strategy") or {})
+        strat["symbol"] = symbol
+        strat.pop("symbols", None)
+        return {**self.cfg, "strategy": strat}
+
+    def is_running(self, symbol: str) -> bool:
+        t = self._tasks.get(symbol)
+        return t is not None and not t.done()
+
+    def start_all(self) -> None:
+        for sym in self.symbols:
+            self.start_symbol(sym)
+
+    def ensure_mm(self, symbol: str) -> MarketMaker:
+        """MarketMaker символа без запуска задачи (реплей шагает им сам)."""
+        symbol = str(symbol).upper()
+        mm = self.mms.get(symbol)
+        if mm is None:
+            mm = MarketMaker(self._symbol_cfg(symbol), client_wrapper=self.client_wrap,
+                             events_cb=self.events_cb, ledger=self.ledger, feed=self.feed, clock=self.clock)
+            self.mms[symbol] = mm
+        return mm
+
+    def start_symbol(self, symbol: str) -> bool:
+        symbol = str(symbol).upper()
+        if self.is_running(symbol):
+            return False
+        mm = self.ensure_mm(symbol)
+        self._tasks[symbol] = asyncio.create_task(self._run_one(mm))
+        logger.info("supervisor: %s started (%d running)", symbol, len(self.running()))
+        return True
+
+    def stop_symbol(self, symbol: str) -> bool:
+        """Задача отменяется, бумажные ордера снимаются сразу; метрики символа остаются до рестарта бота."""
+        symbol = str(symbol).upper()
+        t = self._tasks.pop(symbol, None)
+        if t is None:
+            return False
+        t.cancel()
+        mm = self.mms.get(symbol)
+        if mm is not None:
+            mm.cancel_all(reason="stop")
+        logger.info("supervisor: %s stopped (%d running)", symbol, len(self.running()))
+        return True
+
+    async def stop_all(self) -> None:
+        tasks = list(self._tasks.values())
+        for sym in list(self._tasks):
+            self.stop_symbol(sym)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def running(self) -> List[str]:
+        return [s for s in self._tasks if self.is_running(s)]
+
+    async def _run_one(self, mm: MarketMaker) -> None:
+        # падение одной стратегии не трогает остальные: репорт в diag и перезапуск
+        while True:
+            try:
+                await mm.run()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("mm %s loop error: %s", mm.symbol, e)
+                # одной записью: трейсбек — в detail (кольцо diag, /api/logs), в /ws — только строка ошибки
+                mm._emit({"type": "diag", "level": "error", "symbol": mm.symbol, "text": f"ERROR [{mm.symbol}]: {e!s}",
+                          "detail": traceback.format_exc()[-5000:]})
+                await asyncio.sleep(self.restart_delay)
+
+    # ---------------- конфиг ----------------
+    def apply_cfg(self, cfg: Dict[str, Any], symbols: Optional[List[str]] = None) -> Dict[str, List[str]]:
+        """
+        Горячие параметры — во все MarketMaker'ы; символы, пропавшие из конфига, останавливаются,
+        новые — запускаются. Символы, остановленные вручную, конфиг сам не поднимает.
+        """
+        self.cfg = cfg or {}
+        new_symbols = list(symbols) if symbols is not None else list(StrategyConfig.from_dict(self.cfg).symbols)
+        added = [s for s in new_symbols if s not in self.symbols]
+        removed = [s for s in self.symbols if s not in new_symbols]
+        self.symbols = new_symbols
+
+        for sym in removed:
+            self.stop_symbol(sym)
+            self.mms.pop(sym, None)
+        for sym, mm in self.mms.items():
+            mm.apply_cfg(self._symbol_cfg(sym))
+        for sym in added:
+            self.start_symbol(sym)
+        return {"added": added, "removed": removed}
+
+    # ---------------- метрики ----------------
+    @property
+    def primary(self) -> Optional[MarketMaker]:
+        for sym in self.symbols:
+            mm = self.mms.get(sym)
+            if mm is not None:
+                return mm
+        return next(iter(self.mms.values()), None)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        for sym, mm in self.mms.items():
+            m: Dict[str, Any] = {"running": self.is_running(sym), "bid": mm.best_bid, "ask": mm.best_ask}
+            for key in _MM_METRICS:
+                m[key] = getattr(mm, key, 0)
+            pos = self.ledger.positions.get(sym)
+            if pos is not None:
+                m["position"] = pos.qty
+                m["realized"] = round(pos.realized, 8)
+            out[sym] = m
+        return out
+
+    def totals(self) -> Dict[str, Any]:
+        tot: Dict[str, Any] = {key: 0 for key in _MM_METRICS}
+        for mm in self.mms.values():
+            for key in _MM_METRICS:
+                tot[key] += getattr(mm, key, 0) or 0
+        tot["symbols_running"] = len(self.running())
+        return tot
@@ -0,0 +1,448 @@
+"""
+Перебор параметров на записанных данных: сетка или случайный поиск по пространству
+параметров, прогоны реплея (services/replay.py) параллельно в ProcessPoolExecutor.
+
+В воркеры уходят только пути и параметры: каждый процесс сам открывает те же файлы
+(сегменты рекордера — через mmap, страницы общие в page cache), записи не копируются
+и не пиклятся. Результаты прогонов пишутся в SQLite (data/sweeps.db) по мере готовности.
+
+Пространство параметров — {"секция.ключ": значения}:
+    [a, b, c]                               — дискретные значения
+    {"min": 0.5, "max": 5, "step": 0.5}     — диапазон (для сетки нужен step или num)
+    {"min": 1, "max": 100, "log": true}     — случайный поиск лог-равномерно; "int": true — целые
+"""
+from __future__ import annotations
+import asyncio
+import copy
+import itertools
+import json
+import logging
+import math
+import multiprocessing as mp
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import aiosqlite
+
+from ..core.config_schema import compile_cfg
+from .recording import expand_paths
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+DB_PATH = DATA_DIR / "sweeps.db"
+
+MAX_RUNS = 10_000
+
+# replay — событийный реплей (точно); fast — векторный симулятор services/fastsim.py (отсев, нужен numpy)
+ENGINES = ("replay", "fast")
+
+DEFAULT_SPACE: Dict[str, Any] = {
+    "strategy.quote_size": [5.0, 10.0, 20.0],
+    "strategy.min_spread_pct": [0.0, 0.02, 0.05],
+    "strategy.cancel_timeout": [5.0, 10.0, 30.0],
+    "strategy.reorder_interval": [0.5, 1.0, 2.0],
+}
+
+# колонки результата (и допустимые ключи сортировки)
+RESULT_COLUMNS = ("pnl", "realized", "fees", "equity", "max_drawdown", "fills", "orders", "messages",
+                  "records", "wall_sec")
+
+
+@dataclass(frozen=True)
+class Dimension:
+    key: str
+    values: Optional[tuple] = None      # дискретные значения
+    lo: float = 0.0
+    hi: float = 0.0
+    step: Optional[float] = None
+    num: Optional[int] = None
+    log: bool = False
+    integer: bool = False
+
+    @classmethod
+    def parse(cls, key: str, spec: Any) -> "Dimension":
+        section, _, name = key.partition(".")
+        if not section or not name:
+            raise ValueError(f"{key}: expected 'section.key'")
+        if section == "shadow":
+            # в реплее бумажные ордера исполняет сам MarketMaker — shadow.* на результат не влияет
+            raise ValueError(f"{key}: shadow.* has no effect on replay results")
+        if isinstance(spec, (list, tuple)):
+            if not spec:
+                raise ValueError(f"{key}: empty list")
+            return cls(key, values=tuple(spec))
+        if not isinstance(spec, dict):
+            return cls(key, values=(spec,))
+        try:
+            lo, hi = float(spec["min"]), float(spec["max"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{key}: range needs numeric min and max") from None
+        if hi < lo:
+            raise ValueError(f"{key}: max < min")
+        log = bool(spec.get("log", False))
+        if log and lo <= 0:
+            raise ValueError(f"{key}: log range needs min > 0")
+        step = float(spec["step"]) if spec.get("step") is not None else None
+        if step is not None and step <= 0:
+            raise ValueError(f"{key}: step must be > 0")
+        num = int(spec["num"]) if spec.get("num") is not None else None
+        if num is not None and num < 1:
+            raise ValueError(f"{key}: num must be >= 1")
+        return cls(key, lo=lo, hi=hi, step=step, num=num, log=log, integer=bool(spec.get("int", False)))
+
+    def _cast(self, x: float) -> Any:
+        return int(round(x)) if self.integer else round(x, 10)
+
+    def grid(self) -> List[Any]:
+        if self.values is not None:
+            return list(self.values)
+        if self.step is not None:
+            n = int(math.floor((self.hi - self.lo) / self.step + 1e-9)) + 1
+            pts = [self.lo + i * self.step for i in range(n)]
+        elif self.num is not None:
+            if self.num == 1:
+                pts = [self.lo]
+            elif self.log:
+                r = math.log(self.hi / self.lo)
+                pts = [self.lo * math.exp(r * i / (self.num - 1)) for i in range(self.num)]
+            else:
+                pts = [self.lo + (self.hi - self.lo) * i / (self.num - 1) for i in range(self.num)]
+        else:
+            raise ValueError(f"{self.key}: grid over a range needs step or num")
+        out: List[Any] = []
+        for x in pts:
+            v = self._cast(x)
+            if v not in out:
+                out.append(v)
+        return out
+
+    def sample(self, rnd: random.Random) -> Any:
+        if self.values is not None:
+            return rnd.choice(self.values)
+        if self.log:
+            return self._cast(math.exp(rnd.uniform(math.log(self.lo), math.log(self.hi))))
+        return self._cast(rnd.uniform(self.lo, self.hi))
+
+
+def parse_space(space: Optional[Dict[str, Any]]) -> List[Dimension]:
+    space = space if space else DEFAULT_SPACE
+    if not isinstance(space, dict):
+        raise ValueError("space must be a mapping of 'section.key' to values")
+    return [Dimension.parse(str(k), v) for k, v in space.items()]
+
+
+def grid_points(dims: Sequence[Dimension], max_runs: int = MAX_RUNS) -> List[Dict[str, Any]]:
+    axes = [d.grid() for d in dims]
+    total = math.prod(len(a) for a in axes)
+    if total > max_runs:
+        raise ValueError(f"grid has {total} points (max {max_runs}); use random search or a coarser grid")
+    return [dict(zip((d.key for d in dims), combo)) for combo in itertools.product(*axes)]
+
+
+def random_points(dims: Sequence[Dimension], n: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    if n < 1 or n > MAX_RUNS:
+        raise ValueError(f"n must be in 1..{MAX_RUNS}")
+    rnd = random.Random(seed)
+    return [{d.key: d.sample(rnd) for d in dims} for _ in range(n)]
+
+
+def make_points(space: Optional[Dict[str, Any]], mode: str = "grid", n: int = 50,
+                seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    dims = parse_space(space)
+    if mode == "grid":
+        return grid_points(dims)
+    if mode == "random":
+        return random_points(dims, n, seed)
+    raise ValueError(f"unknown mode: {mode} (grid|random)")
+
+
+def apply_params(cfg: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+    out = copy.deepcopy(cfg or {})
+    for key, value in params.items():
+        node = out
+        parts = key.split(".")
+        for p in parts[:-1]:
+            nxt = node.get(p)
+            if not isinstance(nxt, dict):
+                nxt = node[p] = {}
+            node = nxt
+        node[parts[-1]] = value
+    return out
+
+
+# ---------------- прогон (в процессе-воркере) ----------------
+def _init_worker() -> None:
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+# engine=fast: записи парсятся один раз на процесс пула, дальше — только симуляции
+_MARKETS: Dict[tuple, Any] = {}
+
+
+def _run_fast(job: Dict[str, Any], row: Dict[str, Any]) -> Dict[str, Any]:
+    from .fastsim import load_market, simulate
+    started = time.perf_counter()
+    key = (tuple(job["paths"]), tuple(job.get("symbols") or ()), job.get("start_ms"), job.get("end_ms"))
+    market = _MARKETS.get(key)
+    if market is None:
+        market = _MARKETS[key] = load_market(job["paths"], job.get("symbols"), job.get("start_ms"), job.get("end_ms"))
+    res = simulate(market, apply_params(job["cfg"], job["params"]), job.get("symbols")).summary()
+    row.update({k: res[k] for k in ("pnl", "realized", "fees", "equity", "max_drawdown", "fills", "orders",
+                                    "messages")})
+    row["records"] = sum(len(s.ts) for s in market.series.values())
+    row["wall_sec"] = round(time.perf_counter() - started, 3)
+    return row
+
+
+def run_one(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Один прогон (реплей или векторный симулятор) → строка таблицы результатов. Вызывается в процессе пула."""
+    from .replay import ReplayEngine
+    row: Dict[str, Any] = {"run": job["run"], "params": job["params"]}
+    if job.get("engine") == "fast":
+        try:
+            return _run_fast(job, row)
+        except Exception as e:
+            row["error"] = f"{type(e).__name__}: {e}"
+            return row
+    try:
+        engine = ReplayEngine(apply_params(job["cfg"], job["params"]), job["paths"], symbols=job.get("symbols"),
+                              start_ms=job.get("start_ms"), end_ms=job.get("end_ms"),
+                              curve_interval_sec=float("inf"))
+        res = asyncio.run(engine.run())
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+        return row
+    led, tot = res["ledger"], res["totals"]
+    cancels = max(0, tot["orders_total"] - tot["orders_filled"] - tot["orders_active"])
+    row.update({
+        "pnl": led["pnl"],
+        "realized": led["realized"],
+        "fees": led["fees"],
+        "equity": led["equity"],
+        "max_drawdown": res["max_drawdown"],
+        "fills": res["fills_total"],
+        "orders": tot["orders_total"],
+        "messages": tot["orders_total"] + cancels,  # NEW + CANCEL, отправленные бы на биржу
+        "records": res["records"],
+        "wall_sec": res["wall_sec"],
+    })
+    return row
+
+
+async def run_sweep(cfg: Dict[str, Any], paths: Iterable[str], points: List[Dict[str, Any]],
+                    symbols: Optional[List[str]] = None, start_ms: Optional[int] = None,
+                    end_ms: Optional[int] = None, workers: int = 0, engine: str = "replay",
+                    on_result: Optional[Callable[[Dict[str, Any]], Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Прогнать все точки в пуле процессов (spawn: воркеры не наследуют event loop/сокеты API).
+    on_result(row) — по мере готовности (sync или async); возвращает строки в порядке run.
+    """
+    files = expand_paths(paths)
+    if not files:
+        raise ValueError("no recordings found")
+    for p in points:
+        compile_cfg(apply_params(cfg, p))  # ConfigError до запуска пула, а не в каждом воркере
+    n = int(workers) or (os.cpu_count() or 1)
+    n = max(1, min(n, len(points)))
+    loop = asyncio.get_running_loop()
+    rows: List[Dict[str, Any]] = []
+    pool = ProcessPoolExecutor(max_workers=n, mp_context=mp.get_context("spawn"), initializer=_init_worker)
+    futs = [loop.run_in_executor(pool, run_one, {
+        "run": i, "params": p, "cfg": cfg, "paths": files, "symbols": symbols,
+        "start_ms": start_ms, "end_ms": end_ms, "engine": engine,
+    }) for i, p in enumerate(points)]
+    try:
+        for fut in asyncio.as_completed(futs):
+            row = await fut
+            rows.append(row)
+            if on_result is not None:
+                r = on_result(row)
+                if asyncio.iscoroutine(r):
+                    await r
+    except BaseException:
+        # отмена: очередь выбрасываем, идущие прогоны дорабатывают в фоне — loop не ждёт
+        for f in futs:
+            f.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    await asyncio.to_thread(pool.shutdown)
+    rows.sort(key=lambda r: r["run"])
+    return rows
+
+
+# ---------------- таблица результатов ----------------
+class SweepStore:
+    """sweeps — описание и статус перебора; sweep_results — строка на прогон."""
+
+    def __init__(self, db_path: Path = DB_PATH) -> None:
+        self.db_path = Path(db_path)
+        self._inited = False
+
+    async def init(self) -> None:
+        if self._inited:
+            return
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        async with aiosqlite.connect(self.db_path.as_posix()) as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS sweeps (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created REAL,
+                    finished REAL,
+                    status TEXT,
+                    mode TEXT,
+                    engine TEXT,
+                    paths TEXT,
+                    symbols TEXT,
+                    start_ms INTEGER,
+                    end_ms INTEGER,
+                    space TEXT,
+                    runs INTEGER,
+                    done INTEGER DEFAULT 0,
+                    error TEXT
+                )
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS sweep_results (
+                    sweep_id INTEGER,
+                    run INTEGER,
+                    params TEXT,
+                    pnl REAL,
+                    realized REAL,
+                    fees REAL,
+                    equity REAL,
+                    max_drawdown REAL,
+                    fills INTEGER,
+                    orders INTEGER,
+                    messages INTEGER,
+                    records INTEGER,
+                    wall_sec REAL,
+                    error TEXT,
+                    PRIMARY KEY (sweep_id, run)
+                )
+            """)
+            await db.commit()
+        self._inited = True
+
+    async def create(self, mode: str, paths: List[str], space: Dict[str, Any], runs: int,
+                     symbols: Optional[List[str]] = None, start_ms: Optional[int] = None,
+                     end_ms: Optional[int] = None, engine: str = "replay") -> int:
+        await self.init()
+        async with aiosqlite.connect(self.db_path.as_posix()) as db:
+            cur = await db.execute(
+                "INSERT INTO sweeps(created, status, mode, engine, paths, symbols, start_ms, end_ms, space, runs) "
+                "VALUES (?, 'running', ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), mode, engine, json.dumps(paths), json.dumps(symbols), start_ms, end_ms,
+                 json.dumps(space), runs))
+            await db.commit()
+            return int(cur.lastrowid)
+
+    async def add_result(self, sweep_id: int, row: Dict[str, Any]) -> None:
+        await self.init()
+        cols = ("sweep_id", "run", "params") + RESULT_COLUMNS + ("error",)
+        vals = (sweep_id, row["run"], json.dumps(row["params"])) + tuple(row.get(c) for c in RESULT_COLUMNS) \
+            + (row.get("error"),)
+        async with aiosqlite.connect(self.db_path.as_posix()) as db:
+            await db.execute(f"INSERT OR REPLACE INTO sweep_results({', '.join(cols)}) "
+                             f"VALUES ({', '.join('?' * len(cols))})", vals)
+            await db.execute("UPDATE sweeps SET done = done + 1 WHERE id = ?", (sweep_id,))
+            await db.commit()
+
+    async def finish(self, sweep_id: int, status: str = "done", error: Optional[str] = None) -> None:
+        await self.init()
+        async with aiosqlite.connect(self.db_path.as_posix()) as db:
+            await db.execute("UPDATE sweeps SET status = ?, error = ?, finished = ? WHERE id = ?",
+                             (status, error, time.time(), sweep_id))
+            await db.commit()
+
+    async def list_sweeps(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        await self.init()
+        async with aiosqlite.connect(self.db_path.as_posix()) as db:
+            db.row_factory = aiosqlite.Row
+            cur = await db.execute("SELECT * FROM sweeps ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset))
+            return [_sweep_out(r) for r in await cur.fetchall()]
+
+    async def get(self, sweep_id: int) -> Optional[Dict[str, Any]]:
+        await self.init()
+        async with aiosqlite.connect(self.db_path.as_posix()) as db:
+            db.row_factory = aiosqlite.Row
+            cur = await db.execute("SELECT * FROM sweeps WHERE id = ?", (sweep_id,))
+            r = await cur.fetchone()
+            return _sweep_out(r) if r is not None else None
+
+    async def results(self, sweep_id: int, sort: str = "pnl", desc: bool = True,
+                      limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        if sort not in RESULT_COLUMNS and sort != "run":
+            raise ValueError(f"unknown sort column: {sort}")
+        await self.init()
+        order = f"{sort} IS NULL, {sort} {'DESC' if desc else 'ASC'}, run"
+        async with aiosqlite.connect(self.db_path.as_posix()) as db:
+            db.row_factory = aiosqlite.Row
+            cur = await db.execute(f"SELECT * FROM sweep_results WHERE sweep_id = ? ORDER BY {order} "
+                                   f"LIMIT ? OFFSET ?", (sweep_id, limit, offset))
+            out = []
+            for r in await cur.fetchall():
+                d = dict(r)
+                d["params"] = json.loads(d["params"] or "{}")
+                out.append(d)
+            return out
+
+
+def _sweep_out(r: Any) -> Dict[str, Any]:
+    d = dict(r)
+    for k in ("paths", "symbols", "space"):
+        d[k] = json.loads(d[k]) if d.get(k) else None
+    return d
+
+
+async def sweep_to_store(store: SweepStore, cfg: Dict[str, Any], paths: List[str], space: Dict[str, Any],
+                         mode: str = "grid", n: int = 50, seed: Optional[int] = None,
+                         symbols: Optional[List[str]] = None, start_ms: Optional[int] = None,
+                         end_ms: Optional[int] = None, workers: int = 0,
+                         engine: str = "replay") -> tuple[int, asyncio.Future]:
+    """
+    Проверить вход, завести запись перебора и запустить его фоном.
+    → (sweep_id, задача); ValueError/ConfigError — сразу, до записи в таблицу.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine: {engine} ({'|'.join(ENGINES)})")
+    if engine == "fast":
+        from . import fastsim
+        if fastsim.np is None:
+            raise ValueError("engine=fast needs numpy (pip install numpy)")
+    points = make_points(space, mode, n, seed)
+    if not expand_paths(paths):
+        raise ValueError("no recordings found")
+    for p in points:
+        conf = compile_cfg(apply_params(cfg, p))
+        if engine == "fast" and conf.strategy.stop_loss_pct > 0:
+            raise ValueError("engine=fast does not model strategy.stop_loss_pct; use engine=replay")
+    sweep_id = await store.create(mode, list(paths), space or DEFAULT_SPACE, len(points), symbols, start_ms, end_ms,
+                                   engine)
+
+    async def _run() -> List[Dict[str, Any]]:
+        try:
+            rows = await run_sweep(cfg, paths, points, symbols=symbols, start_ms=start_ms, end_ms=end_ms,
+                                   workers=workers, engine=engine, on_result=lambda row: store.add_result(sweep_id, row))
+        except asyncio.CancelledError:
+            await store.finish(sweep_id, "cancelled")
+            raise
+        except Exception as e:
+            logger.exception("sweep %d failed", sweep_id)
+            await store.finish(sweep_id, "failed", f"{type(e).__name__}: {e}")
+            raise
+        await store.finish(sweep_id, "done")
+        return rows
+
+    return sweep_id, asyncio.ensure_future(_run())
+
+
+__all__ = [
+    "DEFAULT_SPACE", "ENGINES", "Dimension", "parse_space", "grid_points", "random_points", "make_points",
+    "apply_params", "run_one", "run_sweep", "SweepStore", "sweep_to_store",
+]
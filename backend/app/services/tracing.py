@@ -0,0 +1,243 @@
+"""
+Трассировка тик → ордер.
+
+Стадии (все локальные метки — perf_counter_ns, общий для процессов одной машины):
+  exchange_receive — время события биржи `E` → приём кадра (с поправкой на смещение часов биржи);
+  receive_decide   — приём тика, на котором основано решение → начало MarketMaker._reseed_quotes;
+  decide_send      — решение → отправка ордера (_place);
+  send_ack         — отправка → ордер-событие принято движком (AppState.on_event; в sharded — после IPC).
+
+Приём кадра вешает на разобранный dict метку `_trace` (Stamp); MarketMaker запоминает метку
+последнего тика и кладёт в order_event NEW поле `trace` с метками; AppState.on_event снимает его
+(в историю и UI оно не уходит) и закрывает трассу: гистограммы по стадиям, окно последних трасс
+для p50/p99 в /ws stats, медленные (> slow_ms) — в кольцо выбросов целиком, плюс каждая
+sample_every-я обычная для сравнения.
+
+Spot bookTicker не несёт `E`, поэтому exchange_receive считается по потокам, где он есть
+(aggTrade, depth diff), а в трассе ордера — только если тик его нёс.
+Смещение часов — по /api/v3/time: offset = serverTime − середина запроса, берётся выборка
+с минимальным RTT из последних; до первой синхронизации exchange_receive не пишется.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from ..core import metrics
+from ..core.config_schema import TracingConfig
+
+logger = logging.getLogger(__name__)
+
+enabled = False
+now_ns = metrics.now_ns
+
+_STAGES = ("exchange_receive", "receive_decide", "decide_send", "send_ack", "total")
+_STAGE = metrics.histogram("amadeus_tick_to_order_seconds", "Tick-to-order latency by stage", ("stage",))
+_EXCH_RX, _RX_DEC, _DEC_SEND, _SEND_ACK, _TOTAL = (_STAGE.labels(stage=s) for s in _STAGES)
+_OUTLIERS = metrics.counter("amadeus_trace_outliers_total", "Tick-to-order traces slower than tracing.slow_ms").labels()
+_OFFSET = metrics.gauge("amadeus_exchange_clock_offset_seconds", "Exchange server time minus local time").labels()
+_RTT = metrics.gauge("amadeus_exchange_clock_rtt_seconds", "RTT of the clock sync sample in use").labels()
+
+
+class Stamp:
+    """Метка приёма кадра: perf_counter_ns и exchange→receive, мс (None — без `E` или часы не сверены)."""
+    __slots__ = ("rx_ns", "exch_ms")
+
+    def __init__(self, rx_ns: int, exch_ms: Optional[float]) -> None:
+        self.rx_ns = rx_ns
+        self.exch_ms = exch_ms
+
+
+class ExchangeClock:
+    """Оценка смещения часов биржи: лучшая (минимальный RTT) из последних выборок."""
+
+    def __init__(self, keep: int = 8) -> None:
+        self.offset_ms = 0.0
+        self.rtt_ms: Optional[float] = None
+        self.synced = False
+        self.last_sync: Optional[float] = None
+        self._samples: Deque[tuple] = deque(maxlen=keep)   # (rtt_ms, offset_ms)
+
+    def add_sample(self, t0_ms: float, server_ms: float, t1_ms: float) -> None:
+        rtt = max(0.0, t1_ms - t0_ms)
+        self._samples.append((rtt, server_ms - 0.5 * (t0_ms + t1_ms)))
+        self.rtt_ms, self.offset_ms = min(self._samples)
+        self.synced = True
+        self.last_sync = time.time()
+        _OFFSET.set(self.offset_ms / 1000.0)
+        _RTT.set(self.rtt_ms / 1000.0)
+
+    def state(self) -> Dict[str, Any]:
+        return {"synced": self.synced, "offset_ms": round(self.offset_ms, 3),
+                "rtt_ms": round(self.rtt_ms, 3) if self.rtt_ms is not None else None,
+                "last_sync": self.last_sync, "samples": len(self._samples)}
+
+
+CLOCK = ExchangeClock()
+
+
+def stamp(d: Any, rx_ns: int, rx_wall: float) -> None:
+    """Метка на разобранный кадр (вызывается из приёма WS только при включённой трассировке)."""
+    if not isinstance(d, dict):
+        return
+    exch = None
+    e = d.get("E")
+    if e is not None and CLOCK.synced:
+        try:
+            exch = rx_wall * 1000.0 - (float(e) - CLOCK.offset_ms)
+        except (TypeError, ValueError):
+            exch = None
+        if exch is not None:
+            TRACER.exch_recent.append(exch)
+            if metrics.enabled:
+                _EXCH_RX.observe(max(0.0, exch) / 1000.0)
+    d["_trace"] = Stamp(rx_ns, exch)
+
+
+def _percentiles(vals: List[float]) -> List[float]:
+    if not vals:
+        return [0.0, 0.0]
+    vals = sorted(vals)
+    n = len(vals)
+    return [round(vals[min(n - 1, int(0.5 * n))], 3), round(vals[min(n - 1, int(0.99 * n))], 3)]
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.conf: TracingConfig = TracingConfig.from_dict({})
+        self.recent: Deque[tuple] = deque(maxlen=2048)       # (xr, rd, ds, sa, total) мс
+        self.exch_recent: Deque[float] = deque(maxlen=2048)  # exchange→receive по всем кадрам с `E`
+        self.outliers: Deque[Dict[str, Any]] = deque(maxlen=self.conf.keep)
+        self.samples: Deque[Dict[str, Any]] = deque(maxlen=self.conf.keep)
+        self.traces_total = 0
+        self.outliers_total = 0
+        self._summary: Dict[str, Any] = {}
+        self._summary_ts = 0.0
+
+    def configure(self, conf: TracingConfig) -> None:
+        global enabled
+        self.conf = conf
+        enabled = conf.enabled
+        if self.outliers.maxlen != conf.keep:
+            self.outliers = deque(self.outliers, maxlen=conf.keep)
+            self.samples = deque(self.samples, maxlen=conf.keep)
+
+    def complete(self, evt: Dict[str, Any], tr: Dict[str, Any]) -> None:
+        """Ордер-событие дошло до движка: закрыть трассу."""
+        ack = now_ns()
+        try:
+            rx, dec, snd = int(tr["rx"]), int(tr["dec"]), int(tr["snd"])
+        except (KeyError, TypeError, ValueError):
+            return
+        xr = tr.get("xr")
+        rd = (dec - rx) / 1e6
+        ds = (snd - dec) / 1e6
+        sa = (ack - snd) / 1e6
+        total = (ack - rx) / 1e6 + max(0.0, xr or 0.0)
+        self.traces_total += 1
+        self.recent.append((xr, rd, ds, sa, total))
+        if metrics.enabled:
+            _RX_DEC.observe(rd / 1000.0)
+            _DEC_SEND.observe(ds / 1000.0)
+            _SEND_ACK.observe(sa / 1000.0)
+            _TOTAL.observe(total / 1000.0)
+
+        slow = total >= self.conf.slow_ms
+        if not slow and not (self.conf.sample_every and self.traces_total % self.conf.sample_every == 0):
+            return
+        rec = {
+            "ts": evt.get("ts"), "symbol": evt.get("symbol"), "id": evt.get("id"), "side": evt.get("side"),
+            "price": evt.get("price"), "shard": evt.get("shard"),
+            "exchange_receive_ms": round(xr, 3) if xr is not None else None,
+            "receive_decide_ms": round(rd, 3), "decide_send_ms": round(ds, 3), "send_ack_ms": round(sa, 3),
+            "total_ms": round(total, 3), "clock_offset_ms": round(CLOCK.offset_ms, 3) if CLOCK.synced else None,
+        }
+        if slow:
+            self.outliers_total += 1
+            if metrics.enabled:
+                _OUTLIERS.inc()
+            self.outliers.append(rec)
+        else:
+            self.samples.append(rec)
+
+    def summary(self) -> Dict[str, List[float]]:
+        """{stage: [p50_ms, p99_ms]} по последним трассам; кешируется на секунду."""
+        now = time.monotonic()
+        if now - self._summary_ts < 1.0 and self._summary:
+            return self._summary
+        recent = list(self.recent)
+        exch = list(self.exch_recent) or [r[0] for r in recent if r[0] is not None]
+        out: Dict[str, List[float]] = {}
+        if exch:
+            out["exchange_receive"] = _percentiles(exch)
+        if recent:
+            for i, name in enumerate(_STAGES[1:], start=1):
+                out[name] = _percentiles([r[i] for r in recent])
+        self._summary = out
+        self._summary_ts = now
+        return out
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "enabled": enabled,
+            "slow_ms": self.conf.slow_ms,
+            "traces_total": self.traces_total,
+            "outliers_total": self.outliers_total,
+            "clock": CLOCK.state(),
+            "latency_ms": self.summary(),
+            "outliers": list(self.outliers),
+            "samples": list(self.samples),
+        }
+
+
+TRACER = Tracer()
+
+
+def configure(conf: TracingConfig) -> None:
+    TRACER.configure(conf)
+
+
+class ClockSync:
+    """Фоновая сверка часов с биржей через REST-клиент (get_server_time)."""
+
+    def __init__(self, client: Any) -> None:
+        self.client = client
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="clock-sync")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def sample(self) -> None:
+        t0 = time.time() * 1000.0
+        data = await self.client.get_server_time()
+        t1 = time.time() * 1000.0
+        CLOCK.add_sample(t0, float(data["serverTime"]), t1)
+
+    async def _run(self) -> None:
+        n = 0
+        while True:
+            if enabled:
+                try:
+                    await self.sample()
+                    n += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.debug("clock sync failed: %s", e)
+            # первые выборки — чаще, чтобы быстро найти запрос с малым RTT
+            await asyncio.sleep(1.0 if n < 4 else TRACER.conf.clock_sync_sec)
+
+
+__all__ = ["enabled", "Stamp", "ExchangeClock", "CLOCK", "Tracer", "TRACER", "ClockSync", "configure", "stamp"]
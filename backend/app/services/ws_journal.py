@@ -0,0 +1,146 @@
+"""
+Журнал /ws: номер последовательности на каждую рассылку, кольца по темам, снапшот и resume.
+
+AppState._broadcast_obj отдаёт сюда каждое сообщение после сериализации: журнал даёт seq
+(монотонный в пределах процесса движка, epoch — его «поколение») и вписывает его в JSON первым
+полем ('{"seq":N,...'), так /ws-клиент читает seq без разбора всего сообщения.
+
+Темы двух видов:
+  * дельты — order_event, trade/fill, diag, plan и прочее: кольцо последних ws.ring сообщений на тему,
+    resume отдаёт их как есть, по порядку seq;
+  * состояние — market (по символу), status, stats, bank: хранится только последнее, resume отдаёт
+    последнее значение, если оно новее since (пропущенные промежуточные тики клиенту не нужны).
+Кроме колец журнал ведёт открытые ордера (по order_event) и последние ws.trades сделок — для снапшота.
+
+Resume невозможен, если клиент пришёл от другого epoch (движок перезапущен) или нужная дельта
+уже вытеснена из кольца; тогда — снапшот. Ни одного запроса в БД ни в том, ни в другом случае.
+"""
+from __future__ import annotations
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from ..core.config_schema import WsConfig
+
+_STATE_TOPICS = ("status", "stats", "bank")
+_OPEN = ("NEW", "PARTIALLY_FILLED")
+_MAX_OPEN = 10000
+
+
+class WsJournal:
+    def __init__(self, conf: WsConfig) -> None:
+        self.conf = conf
+        self.epoch = f"{int(time.time() * 1000):x}"
+        self.seq = 0
+        self._rings: Dict[str, Deque[Tuple[int, str]]] = {}
+        self._evicted: Dict[str, int] = {}                       # тема -> seq последней вытесненной дельты
+        self._state: Dict[str, Tuple[int, str]] = {}             # status/stats/bank -> (seq, json)
+        self._market: Dict[str, Tuple[int, str]] = {}            # символ -> (seq, json)
+        self._open: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()   # id ордера -> (seq, json)
+        self._trades: Deque[Tuple[int, str]] = deque(maxlen=conf.trades)
+
+    def apply(self, conf: WsConfig) -> None:
+        self.conf = conf
+        for topic, ring in list(self._rings.items()):
+            if ring.maxlen != conf.ring:
+                if len(ring) > conf.ring:
+                    self._evicted[topic] = ring[len(ring) - conf.ring - 1][0]
+                self._rings[topic] = deque(ring, maxlen=conf.ring)
+        if self._trades.maxlen != conf.trades:
+            self._trades = deque(self._trades, maxlen=conf.trades)
+
+    # ---------------- запись (горячий путь) ----------------
+    def record(self, obj: Any, data: str) -> str:
+        """Присвоить seq, запомнить; возвращает JSON с seq для рассылки."""
+        if not isinstance(obj, dict) or len(data) < 3 or data[0] != "{":
+            return data
+        self.seq += 1
+        seq = self.seq
+        data = f'{{"seq":{seq},{data[1:]}'
+        t = obj.get("type")
+        if t == "market":
+            self._market[str(obj.get("symbol") or "")] = (seq, data)
+        elif t in _STATE_TOPICS:
+            self._state[t] = (seq, data)
+        else:
+            topic = t if isinstance(t, str) else "other"
+            ring = self._rings.get(topic)
+            if ring is None:
+                ring = self._rings[topic] = deque(maxlen=self.conf.ring)
+            elif len(ring) == ring.maxlen:
+                self._evicted[topic] = ring[0][0]
+            ring.append((seq, data))
+            if t == "order_event":
+                self._track_order(obj, seq, data)
+            elif t in ("trade", "fill"):
+                self._trades.append((seq, data))
+        return data
+
+    def _track_order(self, obj: Dict[str, Any], seq: int, data: str) -> None:
+        oid = obj.get("id")
+        if oid is None:
+            return
+        oid = str(oid)
+        if str(obj.get("evt") or obj.get("status") or "").upper() in _OPEN:
+            self._open[oid] = (seq, data)
+            self._open.move_to_end(oid)
+            if len(self._open) > _MAX_OPEN:
+                self._open.popitem(last=False)   # конец ордера потерялся — не копим вечно
+        else:
+            self._open.pop(oid, None)
+
+    # ---------------- снапшот / resume ----------------
+    def snapshot(self, **extra: Any) -> Dict[str, Any]:
+        """Состояние на текущий seq; живые сообщения с seq <= snapshot.seq клиенту уже не нужны."""
+        loads = json.loads
+        out: Dict[str, Any] = {
+            "type": "snapshot",
+            "epoch": self.epoch,
+            "seq": self.seq,
+            "markets": [loads(d) for _, d in self._market.values()],
+            "open_orders": [loads(d) for _, d in self._open.values()],
+            "trades": [loads(d) for _, d in self._trades],
+        }
+        for t in _STATE_TOPICS:
+            if t in self._state:
+                out[t] = loads(self._state[t][1])
+        out.update(extra)
+        return out
+
+    def resume(self, since: int, epoch: Optional[str]) -> Optional[List[str]]:
+        """Пропущенное после since (JSON-строки по порядку seq) или None, если без снапшота не обойтись."""
+        if epoch != self.epoch or since < 0 or since > self.seq:
+            return None
+        items: List[Tuple[int, str]] = []
+        for topic, ring in self._rings.items():
+            if self._evicted.get(topic, 0) > since:
+                return None   # кольцо темы уже вытеснило дельту после since
+            for seq, data in reversed(ring):
+                if seq <= since:
+                    break
+                items.append((seq, data))
+        for seq, data in list(self._market.values()) + list(self._state.values()):
+            if seq > since:
+                items.append((seq, data))
+        items.sort(key=lambda x: x[0])
+        return [d for _, d in items]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"epoch": self.epoch, "seq": self.seq, "rings": {t: len(r) for t, r in self._rings.items()},
+                "markets": len(self._market), "open_orders": len(self._open), "trades": len(self._trades)}
+
+
+def seq_of(data: Any) -> Optional[int]:
+    """seq из JSON, записанного журналом ('{"seq":N,...'), без разбора всего сообщения."""
+    if isinstance(data, str) and data.startswith('{"seq":'):
+        end = data.find(",", 7)
+        if end > 7:
+            try:
+                return int(data[7:end])
+            except ValueError:
+                return None
+    return None
+
+
+__all__ = ["WsJournal", "seq_of"]
@@ -0,0 +1,88 @@
+# backend/app/sweep.py — перебор параметров на записях: python -m app.sweep data/recordings --space space.yaml
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict
+
+import yaml
+
+from .core.config import settings
+from .services.recording import parse_ts_ms
+from .services.sweep import DB_PATH, ENGINES, RESULT_COLUMNS, SweepStore, sweep_to_store
+
+
+def _load_space(arg: str | None) -> Dict[str, Any]:
+    if not arg:
+        return {}
+    p = Path(arg)
+    text = p.read_text(encoding="utf-8") if p.exists() else arg
+    space = yaml.safe_load(text)  # YAML — надмножество JSON: и файл, и строка '{"strategy.quote_size": [5, 10]}'
+    if not isinstance(space, dict):
+        raise SystemExit("--space must be a mapping of 'section.key' to values")
+    return space
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.config:
+        settings.app_config_file = args.config
+        settings.load_yaml()
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()] if args.symbols else None
+    store = SweepStore(Path(args.db))
+    sweep_id, task = await sweep_to_store(
+        store, settings.runtime_cfg or {}, args.paths, _load_space(args.space), mode=args.mode, n=args.n,
+        seed=args.seed, symbols=symbols, start_ms=parse_ts_ms(args.start), end_ms=parse_ts_ms(args.end),
+        workers=args.workers, engine=args.engine)
+    await task
+    sweep = await store.get(sweep_id)
+    sweep["results"] = await store.results(sweep_id, sort=args.sort, desc=not args.asc, limit=args.top)
+    return sweep
+
+
+def _print_table(sweep: Dict[str, Any]) -> None:
+    cols = ("run",) + RESULT_COLUMNS[:-2]
+    print(f"sweep {sweep['id']}: {sweep['done']}/{sweep['runs']} runs, {sweep['status']}")
+    print("  ".join(f"{c:>12}" for c in cols) + "  params")
+    for r in sweep["results"]:
+        cells = [f"{r.get(c):>12.6g}" if isinstance(r.get(c), float) else f"{str(r.get(c)):>12}" for c in cols]
+        tail = r["error"] if r.get("error") else json.dumps(r["params"])
+        print("  ".join(cells) + "  " + tail)
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Parallel parameter sweep over recorded market data")
+    p.add_argument("paths", nargs="+", help="recording files (*.jsonl[.gz], *.seg) or directories")
+    p.add_argument("--space", help="parameter space: YAML/JSON file or inline JSON (default: built-in strategy grid)")
+    p.add_argument("--mode", choices=("grid", "random"), default="grid")
+    p.add_argument("--n", type=int, default=50, help="number of random points (--mode random)")
+    p.add_argument("--seed", type=int, help="random search seed")
+    p.add_argument("--engine", choices=ENGINES, default="replay",
+                   help="replay (exact, event-driven) or fast (vectorized screening, needs numpy)")
+    p.add_argument("--workers", type=int, default=0, help="worker processes (0 = CPU count)")
+    p.add_argument("--config", help="base config.yaml (default: APP_CONFIG_FILE / ./config.yaml)")
+    p.add_argument("--symbols", help="comma-separated symbols (default: strategy.symbols)")
+    p.add_argument("--start", help="skip records before this time (epoch ms/s or ISO, UTC)")
+    p.add_argument("--end", help="stop after this time (epoch ms/s or ISO, UTC)")
+    p.add_argument("--db", default=str(DB_PATH), help="results database (default: data/sweeps.db)")
+    p.add_argument("--sort", default="pnl", choices=("run",) + RESULT_COLUMNS)
+    p.add_argument("--asc", action="store_true", help="sort ascending")
+    p.add_argument("--top", type=int, default=20, help="rows to print")
+    p.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = p.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        sweep = asyncio.run(_run(args))
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+    if args.json:
+        print(json.dumps(sweep, ensure_ascii=False, indent=2))
+    else:
+        _print_table(sweep)
+
+
+if __name__ == "__main__":
+    main()
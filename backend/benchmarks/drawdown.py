@@ -0,0 +1,109 @@
+"""
+Сравнение инкрементального MDD (SlidingDrawdown) с прежним полным пересчётом.
+
+    cd backend && python -m benchmarks.drawdown [--hours 24] [--hz 10]
+
+1) Эквивалентность: на каждом тике сравниваем dd_current_pct / dd_max_window_pct
+   с эталоном на коротком окне (эталон O(n) на тик, на длинном окне неподъёмен).
+2) Скорость: прогон RiskManager.on_equity на 10 Гц за сутки (+1ч на вытеснение);
+   эталон меряется на заполненном суточном окне и экстраполируется.
+"""
+from __future__ import annotations
+import argparse
+import math
+import random
+import time
+from collections import deque
+from typing import Deque, List, Tuple
+
+from app.services.risk.drawdown import SlidingDrawdown
+from app.services.risk.manager import RiskManager
+
+
+def _reference(eq: Deque[Tuple[float, float]]) -> Tuple[float, float]:
+    """Прежний RiskManager._recalc_dd."""
+    if not eq:
+        return 0.0, 0.0
+    peak = max(v for _, v in eq)
+    current = eq[-1][1]
+    cur = 0.0 if peak <= 0 else 100.0 * (peak - current) / peak
+    best = float("-inf")
+    maxdd = 0.0
+    for _, v in eq:
+        best = max(best, v)
+        if best > 0:
+            dd = 100.0 * (best - v) / best
+            if dd > maxdd:
+                maxdd = dd
+    return cur, maxdd
+
+
+def _series(n: int, seed: int = 7) -> List[float]:
+    rnd = random.Random(seed)
+    x = 0.0
+    out = []
+    for _ in range(n):
+        x += rnd.gauss(0.0, 0.002)
+        out.append(1000.0 * math.exp(x))
+    return out
+
+
+def check_equivalence(ticks: int = 20_000, window_sec: float = 300.0, hz: float = 10.0) -> float:
+    vals = _series(ticks, seed=11)
+    ref: Deque[Tuple[float, float]] = deque()
+    sd = SlidingDrawdown()
+    worst = 0.0
+    for i, v in enumerate(vals):
+        ts = i / hz
+        ref.append((ts, v))
+        while ref and ref[0][0] < ts - window_sec:
+            ref.popleft()
+        sd.push(ts, v)
+        sd.trim(ts - window_sec)
+        rc, rm = _reference(ref)
+        err = max(abs(rc - sd.current_pct()), abs(rm - sd.max_pct()))
+        worst = max(worst, err)
+        if err > 1e-9:
+            raise AssertionError(f"mismatch at tick {i}: ref=({rc}, {rm}) new=({sd.current_pct()}, {sd.max_pct()})")
+    return worst
+
+
+def bench(hours: float = 24.0, hz: float = 10.0) -> None:
+    window = int(hours * 3600)
+    n = int((hours + 1.0) * 3600 * hz)
+    vals = _series(n)
+    cfg = {"risk": {"dd_window_sec": window, "max_drawdown_pct": 1e9}}
+
+    rm = RiskManager(cfg)
+    t0 = time.perf_counter()
+    for i, v in enumerate(vals):
+        rm.on_equity(v, ts=i / hz)
+    dt_new = time.perf_counter() - t0
+    per_new = dt_new / n * 1e6
+
+    # эталон: одна полная сумма на заполненном окне ≈ стоимость одного тика
+    full: Deque[Tuple[float, float]] = deque((i / hz, v) for i, v in enumerate(vals[: int(window * hz)]))
+    reps = 3
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        _reference(full)
+    per_ref = (time.perf_counter() - t0) / reps * 1e6
+
+    print(f"ticks={n} window={window}s points={len(rm._eq)}")
+    print(f"incremental: {per_new:.2f} us/tick  total {dt_new:.2f}s")
+    print(f"full recalc: {per_ref:.0f} us/tick on full window (≈{per_ref * n / 1e6 / 3600:.1f} h for the run)")
+    print(f"speedup ≈ {per_ref / per_new:.0f}x")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hours", type=float, default=24.0)
+    ap.add_argument("--hz", type=float, default=10.0)
+    args = ap.parse_args()
+    worst = check_equivalence()
+    print(f"equivalence ok (max abs diff {worst:.2e})")
+    bench(args.hours, args.hz)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Сверка векторного симулятора (services/fastsim.py) с событийным реплеем (services/replay.py).
+
+    cd backend && python -m benchmarks.fastsim [paths...] [--hours 2] [--points 6]
+
+Без путей генерирует синтетические сутки/часы bookTicker (+ aggTrade) для двух символов во временную папку.
+Для каждого набора параметров прогоняет оба движка на одних данных и сравнивает:
+число ордеров и филлов, отмены, позицию по символам — точно; PnL и realized — до 1e-6 от оборота.
+Затем меряет скорость: один парсинг записи + N симуляций против N реплеев.
+Код выхода 1 — есть расхождения.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import gzip
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from app.core.config import DEFAULT_YAML
+from app.services.fastsim import load_market, simulate
+from app.services.replay import ReplayEngine
+from app.services.sweep import apply_params, make_points
+
+SYMBOLS = ("BNBUSDT", "ETHUSDT")
+
+SPACE = {
+    "strategy.quote_size": [5.0, 25.0],
+    "strategy.min_spread_pct": [0.0, 0.03],
+    "strategy.cancel_timeout": [3.0, 10.0],
+    "strategy.reorder_interval": [0.5, 1.0, 2.5],
+}
+
+
+def _gen(path: str, sym: str, hours: float, hz: float, p0: float, seed: int, t0: int) -> None:
+    rnd = random.Random(seed)
+    x = 0.0
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for i in range(int(hours * 3600 * hz)):
+            ts = t0 + int(i * 1000 / hz) + rnd.randint(0, 50)
+            x += rnd.gauss(0, 0.0004)
+            mid = p0 * math.exp(x)
+            sp = p0 * 0.0002 * (1 + rnd.random() * 5)
+            b, a = round(mid - sp / 2, 2), round(mid + sp / 2, 2)
+            f.write(json.dumps({"ts": ts, "stream": "bookTicker", "symbol": sym,
+                                "data": {"u": i, "s": sym, "b": str(b), "B": "1", "a": str(a), "A": "1"}}) + "\n")
+            if i % 5 == 0:
+                f.write(json.dumps({"ts": ts + 1, "stream": "aggTrade", "symbol": sym,
+                                    "data": {"s": sym, "p": str(a), "q": "0.5", "m": False}}) + "\n")
+
+
+def synthetic(hours: float, out_dir: str) -> List[str]:
+    t0 = 1_700_000_000_000
+    paths = []
+    for i, (sym, p0) in enumerate(zip(SYMBOLS, (600.0, 3000.0))):
+        path = os.path.join(out_dir, f"{sym}.jsonl.gz")
+        _gen(path, sym, hours, 2.0, p0, seed=i + 1, t0=t0)
+        paths.append(path)
+    return paths
+
+
+def _replay(cfg: Dict[str, Any], paths: List[str], symbols: List[str]) -> Dict[str, Any]:
+    return asyncio.run(ReplayEngine(cfg, paths, symbols=symbols, curve_interval_sec=float("inf")).run())
+
+
+def compare(ev: Dict[str, Any], fs: Dict[str, Any]) -> List[str]:
+    errs = []
+    tot = ev["totals"]
+    cancels = tot["orders_total"] - tot["orders_filled"] - tot["orders_active"]
+    for name, a, b in (("orders", tot["orders_total"], fs["orders"]), ("fills", ev["fills_total"], fs["fills"]),
+                       ("messages", tot["orders_total"] + cancels, fs["messages"])):
+        if a != b:
+            errs.append(f"{name}: replay={a} fast={b}")
+    positions = ev["ledger"]["positions"]
+    for sym, s in fs["symbols"].items():
+        q = positions.get(sym, {}).get("qty", 0.0)
+        if abs(q - s["position"]) > 1e-9:
+            errs.append(f"{sym} position: replay={q} fast={s['position']}")
+    tol = max(1e-6, 1e-6 * fs["volume"])
+    if abs(ev["ledger"]["pnl"] - fs["pnl"]) > tol:
+        errs.append(f"pnl: replay={ev['ledger']['pnl']} fast={fs['pnl']}")
+    if abs(ev["ledger"]["realized"] - fs["realized"]) > tol:
+        errs.append(f"realized: replay={ev['ledger']['realized']} fast={fs['realized']}")
+    return errs
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("paths", nargs="*", help="recordings (default: synthetic data)")
+    ap.add_argument("--hours", type=float, default=2.0, help="synthetic data length")
+    ap.add_argument("--symbols", default=",".join(SYMBOLS))
+    ap.add_argument("--points", type=int, default=6, help="parameter sets to check against the replay")
+    ap.add_argument("--screen", type=int, default=200, help="parameter sets for the fast-only timing")
+    args = ap.parse_args()
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = args.paths or synthetic(args.hours, tmp)
+        base = {**DEFAULT_YAML, "strategy": {**DEFAULT_YAML["strategy"], "symbols": symbols}}
+        points = make_points(SPACE, "random", args.points, seed=3)
+
+        t = time.perf_counter()
+        market = load_market(paths, symbols)
+        t_load = time.perf_counter() - t
+        ticks = sum(len(s.ts) for s in market.series.values())
+        print(f"data: {ticks} bookTicker ticks, {market.t_end - market.t0:.0f}s; load {t_load:.2f}s")
+
+        failed = 0
+        t_ev = t_fs = 0.0
+        for i, params in enumerate(points):
+            cfg = apply_params(base, params)
+            t = time.perf_counter()
+            ev = _replay(cfg, paths, symbols)
+            t_ev += time.perf_counter() - t
+            t = time.perf_counter()
+            fs = simulate(market, cfg).summary()
+            t_fs += time.perf_counter() - t
+            errs = compare(ev, fs)
+            status = "ok" if not errs else "MISMATCH"
+            print(f"[{i}] {status} fills={fs['fills']} orders={fs['orders']} pnl={fs['pnl']:.6f} {json.dumps(params)}")
+            for e in errs:
+                print("     " + e)
+            failed += bool(errs)
+
+        n = len(points)
+        screen = make_points(SPACE, "random", args.screen, seed=4)
+        t = time.perf_counter()
+        for params in screen:
+            simulate(market, apply_params(base, params)).summary()
+        t_screen = (time.perf_counter() - t) / max(1, len(screen))
+        print(f"replay: {t_ev / n:.3f}s/run; fast: {t_fs / n:.4f}s/run (screen {t_screen:.4f}s/run over "
+              f"{len(screen)} sets); speedup ≈ {t_ev / max(t_fs, 1e-9):.0f}x")
+        print("equivalence ok" if not failed else f"{failed}/{n} parameter sets differ")
+        return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
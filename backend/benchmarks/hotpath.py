@@ -0,0 +1,413 @@
+"""
+Бенчмарки горячих путей с baseline и порогами регрессии.
+
+    cd backend && python -m benchmarks.hotpath [-k 'broadcast*'] [--quick]
+        [--out benchmarks/results.json] [--baseline benchmarks/baseline.json]
+        [--threshold 0.2] [--threshold-for 'history.*=0.5'] [--save-baseline]
+
+Каждый кейс — n операций подряд, повтор --repeat раз; в результат идёт медиана ns/op (и min/max).
+Результаты пишутся в JSON (--out). Если есть baseline, каждый кейс сравнивается с ним:
+рост медианы больше порога (доля, по умолчанию 0.2 = +20%) — регрессия, код выхода 1.
+--save-baseline — записать текущий прогон как baseline. Baseline снимать на той же машине, где сравнивать,
+поэтому в репозитории его нет: без файла по умолчанию сравнение пропускается с предупреждением,
+явный --baseline на несуществующий файл — ошибка (код 2).
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import fnmatch
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.clock import VirtualClock
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_OUT = HERE / "results.json"
+DEFAULT_BASELINE = HERE / "baseline.json"
+SCHEMA = 1
+
+# кейс: setup(n) → async/sync run(); run выполняет n операций, таймер — снаружи
+Runner = Callable[[], Any]
+
+
+@dataclass
+class Case:
+    name: str
+    n: int
+    setup: Callable[[int], Any]   # → Runner (или корутина, возвращающая Runner)
+    doc: str = ""
+
+
+CASES: List[Case] = []
+
+_TMP = tempfile.TemporaryDirectory(prefix="hotpath-")  # SQLite-файлы кейсов истории; удаляется при выходе
+
+
+def case(name: str, n: int, doc: str = "") -> Callable:
+    def deco(fn: Callable[[int], Any]) -> Callable[[int], Any]:
+        CASES.append(Case(name, n, fn, doc))
+        return fn
+    return deco
+
+
+# ---------------- AppState: on_event / _broadcast_obj ----------------
+def _state(clients: int):
+    from app.services.state import AppState
+    st = AppState()
+    queues = [asyncio.Queue() for _ in range(clients)]  # без maxsize: переполнение не выкидывает клиента
+    for q in queues:
+        st._clients.add(q)
+    return st, queues
+
+
+_MARKET = {"type": "market", "symbol": "BNBUSDT", "bestBid": 600.12, "bestAsk": 600.13, "ts": 1700000000000}
+_RAW_BOOK = {"e": "bookTicker", "u": 400900217, "s": "BNBUSDT", "b": "600.12000000", "B": "31.21000000",
+             "a": "600.13000000", "A": "40.66000000", "E": 1700000000000}
+
+
+@case("on_event.market", 20_000, "AppState.on_event: готовое market-событие → broadcast (1 клиент)")
+def _on_event_market(n: int) -> Runner:
+    st, _ = _state(1)
+
+    async def run() -> None:
+        for _ in range(n):
+            await st.on_event(_MARKET)
+    return run
+
+
+@case("on_event.raw_book_ticker", 20_000, "AppState.on_event: сырой bookTicker Binance → market (1 клиент)")
+def _on_event_raw(n: int) -> Runner:
+    st, _ = _state(1)
+
+    async def run() -> None:
+        for _ in range(n):
+            await st.on_event(_RAW_BOOK)
+    return run
+
+
+@case("on_event.order_event", 20_000, "AppState.on_event: order_event без истории (1 клиент)")
+def _on_event_order(n: int) -> Runner:
+    st, _ = _state(1)
+    evt = {"type": "order_event", "evt": "NEW", "id": "P00000001", "symbol": "BNBUSDT", "side": "BUY",
+           "price": 600.1, "qty": 0.016, "ts": 1700000000000}
+
+    async def run() -> None:
+        for _ in range(n):
+            await st.on_event(evt)
+    return run
+
+
+def _broadcast(clients: int) -> Callable[[int], Runner]:
+    def setup(n: int) -> Runner:
+        st, _ = _state(clients)
+
+        def run() -> None:
+            for _ in range(n):
+                st._broadcast_obj(_MARKET)
+        return run
+    return setup
+
+
+for _c in (1, 10, 100):
+    case(f"broadcast_obj.clients={_c}", 20_000 if _c < 100 else 5_000,
+         f"AppState._broadcast_obj: сериализация + {_c} очередей")(_broadcast(_c))
+
+
+# ---------------- _WSContext.recv ----------------
+class _FakeWS:
+    def __init__(self, frame: str) -> None:
+        self.frame = frame
+
+    async def recv(self) -> str:
+        return self.frame
+
+
+def _ws_recv(frame: str) -> Callable[[int], Runner]:
+    def setup(n: int) -> Runner:
+        from app.services.binance_client import SimpleBinanceSocketManager, _WSContext
+        ctx = _WSContext(SimpleBinanceSocketManager(), "wss://example.invalid/ws/bnbusdt@bookTicker")
+        ctx._ws = _FakeWS(frame)
+
+        async def run() -> None:
+            for _ in range(n):
+                await ctx.recv()
+        return run
+    return setup
+
+
+_DEPTH20 = json.dumps({"stream": "bnbusdt@depth20@100ms", "data": {
+    "lastUpdateId": 160,
+    "bids": [[f"{600 - i * 0.01:.8f}", "1.00000000"] for i in range(20)],
+    "asks": [[f"{600.01 + i * 0.01:.8f}", "1.00000000"] for i in range(20)]}})
+
+case("ws_recv.book_ticker", 50_000, "_WSContext.recv: кадр bookTicker → dict")(_ws_recv(json.dumps(_RAW_BOOK)))
+case("ws_recv.depth20_combined", 20_000, "_WSContext.recv: combined-кадр depth20 → dict")(_ws_recv(_DEPTH20))
+
+
+# ---------------- MarketMaker._step_once ----------------
+def _mm_step(resting: int) -> Callable[[int], Runner]:
+    def setup(n: int) -> Runner:
+        from app.services.market_maker import MarketMaker, PaperOrder
+        clock = VirtualClock(1_700_000_000.0)
+        mm = MarketMaker({"strategy": {"symbol": "BNBUSDT", "loop_sleep": 0.2}}, None, lambda evt: None,
+                         clock=clock)
+        mm.on_book_ticker({"b": "600.12", "a": "600.13"})
+        # «чужие» активные ордера далеко от рынка: не исполняются и не протухают
+        for i in range(resting):
+            side = "BUY" if i % 2 else "SELL"
+            px = 300.0 - i * 0.01 if side == "BUY" else 900.0 + i * 0.01
+            oid = f"R{i:08d}"
+            mm.orders[oid] = PaperOrder(id=oid, side=side, price=px, qty=0.01, ts_new=clock.time() - 1.0,
+                                        expires_at=clock.time() + 1e9)
+
+        async def run() -> None:
+            for _ in range(n):
+                clock.advance(0.2)
+                await mm._step_once()
+        return run
+    return setup
+
+
+for _r in (0, 100, 1000):
+    case(f"mm_step_once.orders={_r}", 20_000 if _r < 1000 else 2_000,
+         f"MarketMaker._step_once (переустановка раз в 1 с) при {_r} активных ордерах")(_mm_step(_r))
+
+
+# ---------------- ShadowExecutor.on_trade ----------------
+def _shadow_trade(resting: int) -> Callable[[int], Any]:
+    async def setup(n: int) -> Runner:
+        from app.services.shadow_executor import ShadowExecutor
+        sh = ShadowExecutor(clock=VirtualClock(1_700_000_000.0), latency_ms=0)
+        await sh.on_book_update("BNBUSDT", [["600.12", "1"]], [["600.13", "1"]])
+        for i in range(resting):
+            side = "BUY" if i % 2 else "SELL"
+            px = 500.0 - i * 0.01 if side == "BUY" else 700.0 + i * 0.01
+            await sh.create_order(symbol="BNBUSDT", side=side, type="LIMIT", quantity=0.01, price=px)
+
+        async def run() -> None:
+            for i in range(n):
+                await sh.on_trade("BNBUSDT", 600.12 + (i % 3) * 0.01, 0.5, bool(i % 2))
+        return run
+    return setup
+
+
+for _r in (10, 1000):
+    case(f"shadow_on_trade.resting={_r}", 20_000 if _r < 1000 else 1_000,
+         f"ShadowExecutor.on_trade без касания при {_r} стоящих лимитках")(_shadow_trade(_r))
+
+
+# ---------------- RiskManager.on_equity ----------------
+@case("risk_on_equity.window=24h", 50_000, "RiskManager.on_equity на заполненном суточном окне (1 Гц)")
+def _risk(n: int) -> Runner:
+    from app.services.risk.manager import RiskManager
+    window = 86_400
+    rm = RiskManager({"risk": {"dd_window_sec": window, "max_drawdown_pct": 1e9}})
+    ts = [0.0]
+
+    def push(k: int, step: float) -> None:
+        t = ts[0]
+        for i in range(k):
+            t += step
+            rm.on_equity(1000.0 + (i % 997) * 0.01 - (i % 89) * 0.02, ts=t)
+        ts[0] = t
+
+    push(window, 1.0)
+
+    def run() -> None:
+        push(n, 0.1)
+    return run
+
+
+# ---------------- HistoryStore ----------------
+def _order_evt(i: int) -> Dict[str, Any]:
+    return {"type": "order_event", "evt": "NEW", "id": f"P{i:08d}", "symbol": "BNBUSDT", "side": "BUY",
+            "price": 600.1, "qty": 0.016, "ts": 1_700_000_000_000 + i}
+
+
+def _history(batch: int) -> Callable[[int], Any]:
+    async def setup(n: int) -> Runner:
+        from app.services.history import HistoryStore
+        store = HistoryStore(db_path=Path(_TMP.name) / f"history-{time.monotonic_ns()}.db")
+        await store.init()
+        events = [_order_evt(i) for i in range(n)]
+
+        async def run() -> None:
+            if batch <= 1:
+                for e in events:
+                    await store.log_order_event(e)
+            else:
+                for i in range(0, n, batch):
+                    await store.log_many(events[i:i + batch])
+        return run
+    return setup
+
+
+case("history_insert.single", 300, "HistoryStore.log_order_event: соединение и commit на событие")(_history(1))
+case("history_insert.batch=500", 20_000, "HistoryStore.log_many пачками по 500, ns на событие")(_history(500))
+
+
+# ---------------- прогон ----------------
+async def _measure(c: Case, n: int, repeat: int) -> List[float]:
+    out = []
+    for _ in range(repeat):
+        run = c.setup(n)
+        if asyncio.iscoroutine(run):
+            run = await run
+        gc.collect()
+        gc.disable()
+        try:
+            t0 = time.perf_counter_ns()
+            res = run()
+            if asyncio.iscoroutine(res):
+                await res
+            dt = time.perf_counter_ns() - t0
+        finally:
+            gc.enable()
+        out.append(dt / n)
+    return out
+
+
+def run_cases(cases: List[Case], repeat: int, scale: float) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for c in cases:
+        n = max(1, int(c.n * scale))
+        runs = asyncio.run(_measure(c, n, repeat))
+        results[c.name] = {
+            "ns_per_op": round(statistics.median(runs), 1),
+            "min_ns": round(min(runs), 1),
+            "max_ns": round(max(runs), 1),
+            "n": n,
+            "repeat": repeat,
+        }
+        print(f"{c.name:<32} {results[c.name]['ns_per_op']:>14,.1f} ns/op  (min {min(runs):,.1f}, n={n}×{repeat})",
+              flush=True)
+    return results
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _meta() -> Dict[str, Any]:
+    return {
+        "schema": SCHEMA,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git": _git_rev(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _threshold_for(name: str, default: float, overrides: List[tuple]) -> float:
+    for pattern, value in overrides:  # последнее совпадение побеждает
+        if fnmatch.fnmatch(name, pattern):
+            default = value
+    return default
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float,
+            overrides: List[tuple]) -> List[Dict[str, Any]]:
+    rows = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("ns_per_op"):
+            rows.append({"case": name, "status": "new"})
+            continue
+        limit = _threshold_for(name, threshold, overrides)
+        change = cur["ns_per_op"] / base["ns_per_op"] - 1.0
+        status = "REGRESSION" if change > limit else ("faster" if change < -limit else "ok")
+        rows.append({"case": name, "status": status, "baseline_ns": base["ns_per_op"], "ns": cur["ns_per_op"],
+                     "change": round(change, 4), "threshold": limit})
+    return rows
+
+
+def _parse_override(s: str) -> tuple:
+    pattern, sep, value = s.rpartition("=")
+    if not sep or not pattern:
+        raise argparse.ArgumentTypeError(f"expected PATTERN=FRACTION, got {s!r}")
+    return pattern, float(value)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Hot-path micro-benchmarks with baseline comparison")
+    ap.add_argument("-k", "--filter", action="append", default=[],
+                    help="run only cases matching this glob (repeatable), e.g. 'broadcast*'")
+    ap.add_argument("--list", action="store_true", help="list cases and exit")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--quick", action="store_true", help="1/5 of the operations and 3 repeats (smoke run)")
+    ap.add_argument("--out", default=str(DEFAULT_OUT), help="results JSON (default: benchmarks/results.json)")
+    ap.add_argument("--baseline", default=None,
+                    help="baseline JSON to compare against; must exist unless --save-baseline "
+                         "(default: benchmarks/baseline.json, skipped with a warning if missing)")
+    ap.add_argument("--save-baseline", action="store_true", help="write this run to --baseline")
+    ap.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, fraction (0.2 = +20%%)")
+    ap.add_argument("--threshold-for", type=_parse_override, action="append", default=[],
+                    metavar="PATTERN=FRACTION", help="per-case threshold, glob pattern (repeatable)")
+    args = ap.parse_args()
+
+    cases = [c for c in CASES if not args.filter or any(fnmatch.fnmatch(c.name, f) for f in args.filter)]
+    if args.list:
+        for c in CASES:
+            print(f"{c.name:<32} n={c.n:<7} {c.doc}")
+        return 0
+    if not cases:
+        print("no cases match", file=sys.stderr)
+        return 2
+    baseline_path = Path(args.baseline) if args.baseline else DEFAULT_BASELINE
+    if args.baseline and not args.save_baseline and not baseline_path.exists():
+        print(f"baseline not found: {baseline_path} (record one with --save-baseline)", file=sys.stderr)
+        return 2
+
+    repeat, scale = (min(args.repeat, 3), 0.2) if args.quick else (args.repeat, 1.0)
+    results = run_cases(cases, repeat, scale)
+    doc = {"meta": _meta(), "results": results}
+
+    failed = False
+    if not baseline_path.exists() and not args.save_baseline:
+        print(f"\nWARNING: no baseline at {baseline_path}, regression check skipped "
+              f"(record one on this machine with --save-baseline)", file=sys.stderr)
+    elif not args.save_baseline:
+        base = json.loads(baseline_path.read_text(encoding="utf-8"))
+        rows = compare(results, base.get("results") or {}, args.threshold, args.threshold_for)
+        doc["comparison"] = {"baseline": str(baseline_path), "baseline_meta": base.get("meta"), "cases": rows}
+        print(f"\nvs {baseline_path} ({(base.get('meta') or {}).get('git')}):")
+        for r in rows:
+            if r["status"] == "new":
+                print(f"{r['case']:<32} new")
+                continue
+            print(f"{r['case']:<32} {r['baseline_ns']:>12,.1f} → {r['ns']:>12,.1f} ns/op  "
+                  f"{r['change']:+7.1%}  (limit +{r['threshold']:.0%})  {r['status']}")
+        failed = any(r["status"] == "REGRESSION" for r in rows)
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(doc, indent=2), encoding="utf-8")
+    print(f"\nresults → {out}")
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(doc, indent=2), encoding="utf-8")
+        print(f"baseline → {baseline_path}")
+    if failed:
+        print("performance regression", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
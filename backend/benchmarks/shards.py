@@ -0,0 +1,144 @@
+"""
+Проверка общего банка шардов: в MaxDrawdown не должна попадать частичная сумма equity.
+
+    cd backend && python -m benchmarks.shards [--workers 3]
+
+Воркеры подменены клиентами IPC (тот же протокол, без процессов), события
+ShardManager идут в RiskManager, как в AppState.on_event. Сценарии:
+1) тёплый рестарт: окно риска уже заполнено банком, шарды докладываются по одному;
+2) отключение воркера: один шард выпадает, остальные продолжают слать equity;
+3) переподключение: до первого отчёта вернувшегося шарда сумма в риск не идёт.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+from app.core.config import DEFAULT_YAML
+from app.services import ipc
+from app.services.risk.manager import RiskManager
+from app.services.sharding import ShardManager
+
+BANK = 1000.0
+
+
+class _Shard:
+    """Клиент IPC вместо процесса-воркера."""
+
+    def __init__(self, shard: int) -> None:
+        self.shard = shard
+        self._w: Any = None
+
+    async def connect(self, address: ipc.Address) -> None:
+        _, self._w = await ipc.connect(address)
+        self._w.write(ipc.encode_frame([{"shard": self.shard, "pid": os.getpid()}]))
+        await self._w.drain()
+
+    async def bank(self, equity: float) -> None:
+        self._w.write(ipc.encode_frame([{"type": "bank", "equity": equity}]))
+        await self._w.drain()
+
+    async def close(self) -> None:
+        self._w.close()
+        await self._w.wait_closed()
+
+
+async def _settle() -> None:
+    for _ in range(20):
+        await asyncio.sleep(0.005)
+
+
+async def _run(workers: int, tmp: str) -> List[str]:
+    cfg = {**DEFAULT_YAML, "strategy": {**DEFAULT_YAML["strategy"],
+                                        "symbols": [f"S{i}USDT" for i in range(workers)]}}
+    risk = RiskManager(cfg)
+    fed: List[Tuple[str, float]] = []
+    stage = ["warm"]
+
+    async def on_event(evt: Dict[str, Any]) -> None:
+        # как AppState.on_event: в риск идёт только поле equity
+        if evt.get("equity") is not None:
+            fed.append((stage[0], float(evt["equity"])))
+            risk.on_equity(equity_value=float(evt["equity"]))
+
+    # окно риска после прошлого запуска: банк стоял на BANK
+    for _ in range(10):
+        risk.on_equity(equity_value=BANK)
+
+    address: ipc.Address = os.path.join(tmp, "shards.sock") if ipc.unix_sockets_available() else ("127.0.0.1", 0)
+    mgr = ShardManager(cfg, on_event, lambda: (True, None), workers=workers, address=address)
+    server, mgr._address = await ipc.start_server(mgr._address, mgr._on_client)
+    share = BANK / mgr.n
+    shards = [_Shard(i) for i in range(mgr.n)]
+    errs: List[str] = []
+    try:
+        for s in shards:
+            await s.connect(mgr._address)
+        await _settle()
+        for s in shards:
+            await s.bank(share)
+            await _settle()
+        if [v for st, v in fed if st == "warm"] != [BANK]:
+            errs.append(f"warm restart: risk got {fed}, expected one full bank {BANK}")
+
+        stage[0] = "disconnect"
+        await shards[-1].close()
+        await _settle()
+        for s in shards[:-1]:
+            await s.bank(share)
+            await _settle()
+        got = [v for st, v in fed if st == "disconnect"]
+        if mgr.n > 1 and got != [BANK] * (mgr.n - 1):
+            errs.append(f"disconnect: risk got {got}, expected {mgr.n - 1}x{BANK}")
+        if mgr.stats().get("equity_stale") != [mgr.n - 1]:
+            errs.append(f"disconnect: stale shards {mgr.stats().get('equity_stale')}, expected [{mgr.n - 1}]")
+
+        stage[0] = "reconnect"
+        shards[-1] = _Shard(mgr.n - 1)
+        await shards[-1].connect(mgr._address)
+        await _settle()
+        if mgr.n > 1:
+            await shards[0].bank(share)
+            await _settle()
+            if [v for st, v in fed if st == "reconnect"]:
+                errs.append("reconnect: sum reached risk before the returning shard reported")
+        await shards[-1].bank(share)
+        await _settle()
+        if [v for st, v in fed if st == "reconnect"] != [BANK]:
+            errs.append(f"reconnect: risk got {[v for st, v in fed if st == 'reconnect']}, expected [{BANK}]")
+        if mgr.stats().get("equity_stale"):
+            errs.append(f"reconnect: stale shards left {mgr.stats().get('equity_stale')}")
+    finally:
+        for s in shards:
+            try:
+                await s.close()
+            except Exception:
+                pass
+        server.close()
+        await server.wait_closed()
+
+    st = risk.status()
+    print(f"shards={mgr.n} fed={len(fed)} dd_max_window={st.dd_max_window_pct:.4f}% "
+          f"allowed={st.allowed} reason={st.reason}")
+    if not st.allowed or st.dd_max_window_pct > 1e-9:
+        errs.append(f"risk locked: dd_max_window={st.dd_max_window_pct}% reason={st.reason}")
+    return errs
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=3)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        errs = asyncio.run(_run(max(1, args.workers), tmp))
+    for e in errs:
+        print("  " + e)
+    print("shard equity ok" if not errs else f"{len(errs)} check(s) failed")
+    return 1 if errs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
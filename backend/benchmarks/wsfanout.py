@@ -0,0 +1,336 @@
+"""
+Нагрузка на /ws: сколько UI-клиентов выдерживает рассылка и какая задержка тик → клиент.
+
+    cd backend && python -m benchmarks.wsfanout [--clients 1,10,100,500] [--rates 100,1000] [--seconds 5]
+        [--procs 4] [--pad 0] [--json out.json] [--url http://host:port]
+
+Сервер — отдельный процесс (`--serve`, uvicorn): настоящий роутер /ws над AppState плюс /bench/fire,
+который гонит синтетические market-события в AppState.on_event с заданной частотой; в событии —
+время отправки (bench_ts). Клиенты — websockets в --procs процессах, чтобы не мерить собственный
+парсинг вместо сервера. Для каждой пары (клиенты, частота): клиенты подключаются, сервер шлёт
+--seconds секунд, затем клиенты дочитывают хвост (--drain) и отдают гистограммы задержек.
+
+Задержка — от создания события до получения кадра клиентом (одни часы, один хост), лог-гистограмма
+с шагом ~12%. dropped — клиенты, выкинутые сервером по переполнению очереди (AppState.ws_dropped_total),
+short — клиенты, получившие не все события. CPU% и RSS — процесса сервера за окно рассылки;
+cli CPU% — самый загруженный клиентский процесс: около 100% — упёрлись в клиентов, а не в сервер.
+С --url сервер не поднимается: нужен уже запущенный `python -m benchmarks.wsfanout --serve`.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+BUCKETS_PER_DECADE = 20
+N_BUCKETS = 9 * BUCKETS_PER_DECADE      # 1 мкс … 1000 с
+
+
+def _bucket(lat_sec: float) -> int:
+    us = lat_sec * 1e6
+    if us <= 1.0:
+        return 0
+    return min(N_BUCKETS - 1, int(math.log10(us) * BUCKETS_PER_DECADE))
+
+
+def _percentile(hist: Sequence[int], q: float) -> Optional[float]:
+    """q-перцентиль по гистограмме, в миллисекундах (середина корзины)."""
+    total = sum(hist)
+    if not total:
+        return None
+    rank = q * total
+    acc = 0
+    for i, n in enumerate(hist):
+        acc += n
+        if acc >= rank:
+            return 10 ** ((i + 0.5) / BUCKETS_PER_DECADE) / 1000.0
+    return None
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # Linux: КБ
+    except ImportError:
+        return None
+
+
+# ---------------- сервер ----------------
+def _server_app():
+    from fastapi import FastAPI
+    from app.api.routers import ws as ws_router
+    from app.services.state import get_state
+
+    state = get_state()
+    app = FastAPI(title="ws fan-out bench")
+    app.include_router(ws_router.router)
+
+    @app.get("/bench/stats")
+    async def bench_stats():
+        return {"clients": len(state._clients), "ws_dropped": state.ws_dropped_total, "rss_mb": _rss_mb(),
+                "cpu_sec": time.process_time()}
+
+    @app.post("/bench/fire")
+    async def bench_fire(rate: float, seconds: float, pad: int = 0):
+        loop = asyncio.get_running_loop()
+        pad_s = "x" * pad
+        dropped0, cpu0, clients0 = state.ws_dropped_total, time.process_time(), len(state._clients)
+        burst = max(1, int(rate * 0.1))     # не больше 100 мс отставания за раз; остальное — в missed
+        t0 = loop.time()
+        sent = missed = 0
+        period = 1.0 / rate
+        while True:
+            now = loop.time()
+            if now - t0 >= seconds:
+                break
+            due = int((now - t0) * rate) - sent - missed
+            if due > burst:
+                missed += due - burst
+                due = burst
+            for _ in range(due):
+                await state.on_event({"type": "market", "symbol": "BNBUSDT", "bestBid": 600.12, "bestAsk": 600.13,
+                                      "ts": int(time.time() * 1000), "seq": sent, "bench_ts": time.time(),
+                                      "pad": pad_s})
+                sent += 1
+            await asyncio.sleep(max(0.001, period))
+        elapsed = loop.time() - t0
+        return {"sent": sent, "missed": missed, "elapsed": elapsed, "cpu_sec": time.process_time() - cpu0,
+                "dropped": state.ws_dropped_total - dropped0, "clients_before": clients0,
+                "clients_after": len(state._clients), "rss_mb": _rss_mb()}
+
+    return app
+
+
+def serve(host: str, port: int) -> None:
+    import logging
+    import uvicorn
+    logging.basicConfig(level=logging.WARNING)
+    uvicorn.run(_server_app(), host=host, port=port, log_level="warning")
+
+
+# ---------------- клиенты ----------------
+class _Client:
+    __slots__ = ("n", "hist", "hello")
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.hist = [0] * N_BUCKETS
+        self.hello: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+async def _recv_loop(ws: Any, c: _Client) -> None:
+    hist = c.hist
+    try:
+        async for msg in ws:
+            if '"bench_ts"' not in msg:
+                if not c.hello.done():
+                    c.hello.set_result(True)
+                continue
+            now = time.time()
+            hist[_bucket(now - json.loads(msg)["bench_ts"])] += 1
+            c.n += 1
+    except Exception:
+        pass
+    finally:
+        if not c.hello.done():
+            c.hello.set_result(False)
+
+
+async def _clients_main(url: str, n: int, cmd_q: Any, res_q: Any) -> None:
+    import websockets
+    clients = [_Client() for _ in range(n)]
+    conns: List[Any] = []
+    tasks: List[asyncio.Task] = []
+    for c in clients:
+        ws = await websockets.connect(url, max_size=None, ping_interval=None)
+        conns.append(ws)
+        tasks.append(asyncio.create_task(_recv_loop(ws, c)))
+    ok = sum(await asyncio.gather(*(c.hello for c in clients)))
+    res_q.put(("ready", ok))
+    cpu0, t0 = time.process_time(), time.monotonic()
+
+    cmd = await asyncio.to_thread(cmd_q.get)       # ("collect", sent, drain_sec)
+    deadline = time.monotonic() + cmd[2]
+    while time.monotonic() < deadline and any(c.n < cmd[1] for c in clients):
+        await asyncio.sleep(0.05)
+    cpu_pct = (time.process_time() - cpu0) / max(1e-9, time.monotonic() - t0) * 100.0
+    for ws in conns:
+        try:
+            await ws.close()
+        except Exception:
+            pass
+    for t in tasks:
+        t.cancel()
+    res_q.put(("result", [(c.n, c.hist) for c in clients], cpu_pct))
+
+
+def _client_proc(url: str, n: int, cmd_q: Any, res_q: Any) -> None:
+    try:
+        asyncio.run(_clients_main(url, n, cmd_q, res_q))
+    except Exception as e:
+        res_q.put(("error", repr(e)))
+
+
+# ---------------- прогон ----------------
+def _http(base: str):
+    import httpx
+    return httpx.Client(base_url=base, timeout=None)
+
+
+def run_point(http: Any, ws_url: str, clients: int, rate: float, seconds: float, procs: int, pad: int,
+              drain: float) -> Dict[str, Any]:
+    ctx = mp.get_context("spawn")
+    res_q = ctx.Queue()
+    procs = max(1, min(procs, clients))
+    split = [clients // procs + (1 if i < clients % procs else 0) for i in range(procs)]
+    cmd_qs = [ctx.Queue() for _ in split]
+    workers = [ctx.Process(target=_client_proc, args=(ws_url, k, q, res_q), daemon=True)
+               for k, q in zip(split, cmd_qs)]
+    for w in workers:
+        w.start()
+    try:
+        connected = 0
+        for _ in workers:
+            msg = res_q.get(timeout=120)
+            if msg[0] == "error":
+                raise RuntimeError(f"client process failed: {msg[1]}")
+            connected += msg[1]
+        fire = http.post("/bench/fire", params={"rate": rate, "seconds": seconds, "pad": pad}).json()
+        for q in cmd_qs:
+            q.put(("collect", fire["sent"], drain))
+        counts: List[int] = []
+        hist = [0] * N_BUCKETS
+        worst_p99 = 0.0
+        cli_cpu = 0.0
+        for _ in workers:
+            msg = res_q.get(timeout=drain + 120)
+            if msg[0] == "error":
+                raise RuntimeError(f"client process failed: {msg[1]}")
+            for n, h in msg[1]:
+                counts.append(n)
+                for i, x in enumerate(h):
+                    hist[i] += x
+                p99 = _percentile(h, 0.99)
+                if p99 is not None:
+                    worst_p99 = max(worst_p99, p99)
+            cli_cpu = max(cli_cpu, msg[2])
+    finally:
+        for w in workers:
+            w.join(timeout=10)
+            if w.is_alive():
+                w.terminate()
+
+    wall = max(fire["elapsed"], 1e-9)
+    received = sum(counts)
+    return {
+        "clients": clients, "rate": rate, "connected": connected,
+        "sent": fire["sent"], "missed": fire["missed"], "sent_per_sec": fire["sent"] / wall,
+        "recv_per_sec": received / wall, "received": received,
+        "p50_ms": _percentile(hist, 0.50), "p90_ms": _percentile(hist, 0.90), "p99_ms": _percentile(hist, 0.99),
+        "max_ms": _percentile(hist, 1.0), "worst_client_p99_ms": worst_p99 or None,
+        "dropped": fire["dropped"], "short": sum(1 for n in counts if n < fire["sent"]),
+        "server_cpu_pct": fire["cpu_sec"] / wall * 100.0, "server_rss_mb": fire["rss_mb"],
+        "client_cpu_pct": cli_cpu,
+    }
+
+
+def _fmt(v: Any, spec: str = ".2f") -> str:
+    return "-" if v is None else format(v, spec)
+
+
+def print_table(rows: List[Dict[str, Any]]) -> None:
+    head = (f"{'clients':>7} {'rate/s':>8} {'sent/s':>8} {'recv/s':>10} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+            f"{'max ms':>8} {'worst p99':>9} {'dropped':>7} {'short':>5} {'srv CPU%':>8} {'RSS MB':>7} {'cli CPU%':>8}")
+    print(head)
+    print("-" * len(head))
+    for r in rows:
+        print(f"{r['clients']:>7} {r['rate']:>8.0f} {r['sent_per_sec']:>8.0f} {r['recv_per_sec']:>10.0f} "
+              f"{_fmt(r['p50_ms']):>8} {_fmt(r['p90_ms']):>8} {_fmt(r['p99_ms']):>8} {_fmt(r['max_ms']):>8} "
+              f"{_fmt(r['worst_client_p99_ms']):>9} {r['dropped']:>7} {r['short']:>5} "
+              f"{r['server_cpu_pct']:>8.0f} {_fmt(r['server_rss_mb'], '.0f'):>7} {r['client_cpu_pct']:>8.0f}")
+
+
+def _ints(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def _wait_server(http: Any, proc: Optional[subprocess.Popen], timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode}")
+        try:
+            http.get("/bench/stats").raise_for_status()
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="/ws fan-out load generator")
+    ap.add_argument("--clients", default="1,10,100", help="comma-separated client counts")
+    ap.add_argument("--rates", default="100,1000", help="comma-separated event rates, per second")
+    ap.add_argument("--seconds", type=float, default=5.0, help="firehose duration per point")
+    ap.add_argument("--drain", type=float, default=3.0, help="max wait for clients to catch up after the firehose")
+    ap.add_argument("--procs", type=int, default=min(4, os.cpu_count() or 1), help="client processes")
+    ap.add_argument("--pad", type=int, default=0, help="extra payload bytes per event")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--url", help="use a running `--serve` instance (http://host:port) instead of starting one")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--serve", action="store_true", help="run the bench server (used internally)")
+    args = ap.parse_args()
+
+    if args.serve:
+        serve(args.host, args.port)
+        return 0
+
+    base = (args.url or f"http://{args.host}:{args.port}").rstrip("/")
+    ws_url = "ws" + base[len("http"):] + "/ws"
+    proc = None
+    if not args.url:
+        here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        proc = subprocess.Popen([sys.executable, "-m", "benchmarks.wsfanout", "--serve",
+                                 "--host", args.host, "--port", str(args.port)], cwd=here)
+    rows: List[Dict[str, Any]] = []
+    try:
+        with _http(base) as http:
+            _wait_server(http, proc)
+            for clients in _ints(args.clients):
+                for rate in _ints(args.rates):
+                    row = run_point(http, ws_url, clients, float(rate), args.seconds, args.procs, args.pad,
+                                    args.drain)
+                    rows.append(row)
+                    print(f"clients={clients} rate={rate}: p99={_fmt(row['p99_ms'])} ms, "
+                          f"dropped={row['dropped']}, srv CPU={row['server_cpu_pct']:.0f}%", file=sys.stderr)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "seconds": args.seconds, "pad": args.pad, "rows": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
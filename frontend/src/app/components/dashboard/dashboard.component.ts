@@ -6,7 +6,7 @@ import { WsService } from '../../services/ws.service';
 import { Subscription } from 'rxjs';
 import { EquitySparklineComponent } from '../equity-sparkline/equity-sparkline.component'; // ⬅️ импорт спарклайна
 
-interface WsStats { ws_clients: number; ws_rate: number; }
+interface WsStats { ws_clients: number; ws_rate: number; loop_p50?: number; loop_p99?: number; loop_slow?: number; }
 interface MarketSnap { symbol?: string; bid?: number; ask?: number; last?: number; ts?: number; raw?: any; }
 
 @Component({
@@ -21,10 +21,13 @@ export class DashboardComponent implements OnDestroy {
   symbol = '';
   metrics: any = {};
   cfg: any = {};
+  cfgVersion = '';
 
   ws: WsStats = { ws_clients: 0, ws_rate: 0 };
   lastDiag = '';
   market: MarketSnap = {};
+  // тик → ордер: стадия → [p50, p99] мс (из /ws stats)
+  latency: { stage: string; p50: number; p99: number }[] = [];
 
   private sub = new Subscription();
 
@@ -41,11 +44,18 @@ export class DashboardComponent implements OnDestroy {
         this.running = !!s?.running;
         this.symbol = s?.symbol || '';
         this.metrics = s?.metrics || {};
-        this.cfg = s?.cfg || {};
+        this.syncCfg(s?.cfg_version);
       }
     });
   }
 
+  /** В статусе приходит только версия конфига — полный конфиг тянем, когда она сменилась */
+  private syncCfg(version?: string) {
+    if (!version || version === this.cfgVersion) return;
+    this.cfgVersion = version;
+    this.api.getConfig().subscribe({ next: (res: any) => { this.cfg = res?.cfg || {}; } });
+  }
+
   private bindWs() {
     this.sub.add(
         this.wsSvc.messages$.subscribe((msg: any) => {
@@ -53,10 +63,19 @@ export class DashboardComponent implements OnDestroy {
 
           const t = typeof msg === 'object' && msg.type ? msg.type : null;
 
-          if (t === 'stats') {
+          if (t === 'status') {
+            this.running = !!msg.running;
+            this.symbol = msg.symbol || this.symbol;
+            this.syncCfg(msg.cfg_version);
+          } else if (t === 'stats') {
             const c = Number(msg.ws_clients ?? 0);
             const r = Number(msg.ws_rate ?? 0);
-            this.ws = { ws_clients: c, ws_rate: r };
+            this.ws = {
+              ws_clients: c, ws_rate: r,
+              loop_p50: msg.loop_lag_p50_ms, loop_p99: msg.loop_lag_p99_ms, loop_slow: msg.loop_slow,
+            };
+            const lat = msg.latency && typeof msg.latency === 'object' ? msg.latency : {};
+            this.latency = Object.keys(lat).map(stage => ({ stage, p50: Number(lat[stage][0]), p99: Number(lat[stage][1]) }));
           } else if (t === 'diag') {
             const text = String(msg.text ?? '');
             this.lastDiag = text;
@@ -2,11 +2,14 @@ import { Component, ElementRef, ViewChild, NgZone } from '@angular/core';
 import { CommonModule } from '@angular/common';
 import { AppMaterialModule } from '../../app.module';
 import { WsService } from '../../services/ws.service';
+import { ApiService } from '../../services/api.service';
 
 interface LogRow {
     ts: number;
     type: string;
     text: string;
+    level?: string;
+    id?: number;   // id записи diag в кольце движка (для склейки с /api/logs)
 }
 
 @Component({
@@ -22,7 +25,12 @@ export class LogsComponent {
     rows: LogRow[] = [];
     maxRows = 2000;
 
-    constructor(private ws: WsService, private zone: NgZone) {}
+    // история diag с сервера (/api/logs): в /ws уходят только info+ с дедупом и бюджетом
+    historyNext: number | null = null;
+    historyDone = false;
+    historyLoading = false;
+
+    constructor(private ws: WsService, private api: ApiService, private zone: NgZone) {}
 
     ngOnInit() {
         this.ws.connect();
@@ -47,9 +55,12 @@ export class LogsComponent {
                 break;
             case 'diag':
                 text = String(evt.text ?? JSON.stringify(evt));
-                break;
+                this.rows.push({ ts: evt.ts ? evt.ts * 1000 : t, type, text, level: evt.level, id: evt.id });
+                this.trim();
+                return;
             case 'stats':
-                text = `ws_clients=${evt.ws_clients} ws_rate=${evt.ws_rate}`;
+                text = `ws_clients=${evt.ws_clients} ws_rate=${evt.ws_rate}`
+                    + (evt.loop_lag_p99_ms != null ? ` loop_p50=${evt.loop_lag_p50_ms}ms loop_p99=${evt.loop_lag_p99_ms}ms` : '');
                 break;
             case 'order_event':
                 text = `ORDER ${evt.evt || evt.status} ${evt.side} @ ${evt.price} x ${evt.qty}`;
@@ -62,8 +73,41 @@ export class LogsComponent {
         }
 
         this.rows.push({ ts: t, type, text });
+        this.trim();
+    }
+
+    private trim() {
         if (this.rows.length > this.maxRows) this.rows.splice(0, this.rows.length - this.maxRows);
     }
 
-    clear() { this.rows = []; }
+    /** Следующая (более старая) страница diag из кольца движка — сверху таблицы. */
+    loadHistory() {
+        if (this.historyLoading || this.historyDone) return;
+        this.historyLoading = true;
+        this.api.logs({ limit: 200, before: this.historyNext }).subscribe({
+            next: (res: any) => {
+                const items: any[] = res?.items ?? [];
+                // первая страница пересекается с тем, что уже пришло по /ws, — такие id не дублируем
+                const seen = new Set(this.rows.filter(r => r.id != null).map(r => r.id));
+                const older: LogRow[] = items.filter(e => !seen.has(e.id)).reverse().map(e => ({
+                    ts: Number(e.ts) * 1000,
+                    type: 'diag',
+                    level: e.level,
+                    id: e.id,
+                    text: (e.count > 1 ? `${e.text} (×${e.count})` : e.text) + (e.detail ? `\n${e.detail}` : ''),
+                }));
+                this.rows = [...older, ...this.rows];
+                this.historyNext = res?.next ?? null;
+                this.historyDone = this.historyNext === null;
+                this.historyLoading = false;
+            },
+            error: () => { this.historyLoading = false; },
+        });
+    }
+
+    clear() {
+        this.rows = [];
+        this.historyNext = null;
+        this.historyDone = false;
+    }
 }
@@ -3,13 +3,14 @@ import { HttpClient } from '@angular/common/http';
 import { BehaviorSubject, Observable, of, timer } from 'rxjs';
 import { catchError, switchMap } from 'rxjs/operators';
 
-/** Статус бота: расширен под dashboard (metrics?, cfg?) */
+/** Статус бота: расширен под dashboard (metrics?, cfg_version?; cfg — только с ?full=1) */
 export interface BotStatus {
   running: boolean;
   symbol?: string;
   equity?: number;
   ts?: number;
   metrics?: any;
+  cfg_version?: string;
   cfg?: any;
 }
 
@@ -100,4 +101,14 @@ export class ApiService {
   historyExportUrl(kind: 'orders'|'trades' = 'orders'): string {
     return `${this.api}/history/export.csv?kind=${kind}`;
   }
+
+  // ------------ LOGS -----------
+  // кольцо diag движка: новые первыми, следующая страница — before=<next>
+  logs(params: { limit?: number; before?: number | null; level?: string; q?: string; symbol?: string } = {}): Observable<any> {
+    const qs = Object.entries(params)
+      .filter(([, v]) => v !== undefined && v !== null && v !== '')
+      .map(([k, v]) => `${k}=${encodeURIComponent(String(v))}`)
+      .join('&');
+    return this.http.get(`${this.api}/logs${qs ? '?' + qs : ''}`);
+  }
 }
\ No newline at end of file
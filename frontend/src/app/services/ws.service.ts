@@ -5,6 +5,11 @@ import { ApiService } from './api.service';
 /**
  * WS-клиент с авто-реконнектом.
  * Совместимость: оставляем stream$ и PUBLIC connect() — логи/компоненты зависят.
+ *
+ * Протокол: у каждого сообщения движка есть seq. Первое подключение получает snapshot — он
+ * раскладывается в stream$ обычными сообщениями (status, market по символам, ордера, сделки).
+ * Реконнект идёт с ?since=<последний seq>&epoch=<epoch> — сервер досылает пропущенное как было,
+ * либо (рестарт движка, дыра в кольце) снова присылает snapshot.
  */
 @Injectable({ providedIn: 'root' })
 export class WsService {
@@ -14,13 +19,15 @@ export class WsService {
     private ws?: WebSocket;
     private backoff = 500;
     private readonly maxBackoff = 8000;
+    private lastSeq: number | null = null;
+    private epoch: string | null = null;
 
     constructor(private zone: NgZone, private api: ApiService) {}
 
     public connect(url = this._resolveUrl()) {
         if (this.ws && (this.ws.readyState === WebSocket.OPEN || this.ws.readyState === WebSocket.CONNECTING)) return;
 
-        this.ws = new WebSocket(url);
+        this.ws = new WebSocket(this._withResume(url));
 
         this.ws.onopen = () => { this.backoff = 500; };
 
@@ -28,10 +35,15 @@ export class WsService {
             try {
                 const data = JSON.parse(evt.data as any);
                 this.zone.run(() => {
-                    if (data && data.type === 'status' && typeof data.running === 'boolean') {
-                        this.api.setRunning(!!data.running);
+                    if (data && typeof data.seq === 'number' && data.type !== 'snapshot' && data.type !== 'resumed') {
+                        this.lastSeq = data.seq;
                     }
-                    this.stream$.next(data);
+                    if (data && (data.type === 'snapshot' || data.type === 'resumed')) {
+                        this.epoch = data.epoch ?? null;
+                        this.lastSeq = data.seq ?? null;
+                        if (data.type === 'snapshot') { this._unpackSnapshot(data); return; }
+                    }
+                    this._emit(data);
                 });
             } catch { /* ignore non-JSON */ }
         };
@@ -44,6 +56,30 @@ export class WsService {
         };
     }
 
+    private _emit(data: any) {
+        if (data && data.type === 'status' && typeof data.running === 'boolean') {
+            this.api.setRunning(!!data.running);
+        }
+        this.stream$.next(data);
+    }
+
+    /** Снапшот → обычные сообщения: компонентам не нужно знать о протоколе. */
+    private _unpackSnapshot(snap: any) {
+        if (snap.status) this._emit(snap.status);
+        for (const m of snap.markets ?? []) this._emit(m);
+        if (snap.bank) this._emit(snap.bank);
+        if (snap.stats) this._emit(snap.stats);
+        for (const o of snap.open_orders ?? []) this._emit(o);
+        for (const t of snap.trades ?? []) this._emit(t);
+        if (snap.risk) this._emit({ type: 'risk', ...snap.risk });
+    }
+
+    private _withResume(url: string): string {
+        if (this.lastSeq === null || !this.epoch) return url;
+        const sep = url.includes('?') ? '&' : '?';
+        return `${url}${sep}since=${this.lastSeq}&epoch=${encodeURIComponent(this.epoch)}`;
+    }
+
     private _resolveUrl(): string {
         const w: any = window as any;
         if (w.__WS__)   return String(w.__WS__);